@@ -69,7 +69,25 @@ class CacheLocation(HookBaseClass):
         self._ensure_folder_exists(target_path)
         
         return target_path
-        
+
+    def configuration_cache(self, project_id, pipeline_configuration_id, cache_name):
+        """
+        Establish a cache folder for data which the core caches for a pipeline configuration.
+
+        The core caches things like compiled environments and the results of settings
+        validation between sessions. These caches are loaded with pickle, so the folder
+        should be local to the current user. Unlike the other cache methods, this method
+        doesn't need to create the folder - the core creates it, with default permissions,
+        when there is something to write.
+
+        :param project_id: The shotgun id of the project to store caches for
+        :param pipeline_configuration_id: The shotgun pipeline config id to store caches for
+        :param cache_name: The name of the cache, e.g. 'environments'
+        :returns: The path to a folder on disk.
+        """
+        cache_root = self._get_cache_root(project_id, pipeline_configuration_id)
+        return os.path.join(cache_root, "tk_core", cache_name)
+
     def _get_cache_root(self, project_id, pipeline_configuration_id):
         """
         Helper method that can be used both by subclassing hooks
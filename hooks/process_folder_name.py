@@ -28,6 +28,10 @@ from tank import TankError
 import re
 
 class ProcessFolderName(Hook):
+    
+    # this hook is stateless and executed very frequently during folder
+    # creation, so allow toolkit to reuse a single instance.
+    reusable = True
 
     def execute(self, entity_type, entity_id, field_name, value, **kwargs):
         """
@@ -20,4 +20,21 @@ from .errors import TankError, TankEngineInitError
 from .template import TemplatePath, TemplateString
 from .hook import Hook, get_hook_baseclass
 
-from .deploy.tank_command import list_commands, get_command
\ No newline at end of file
+
+def list_commands(tk=None):
+    """
+    Lists the system commands registered with the system.
+    See tank.deploy.tank_command.list_commands() for details.
+    """
+    # the commands framework is expensive to import, so load it on first use
+    from .deploy import tank_command
+    return tank_command.list_commands(tk)
+
+def get_command(command_name, tk=None):
+    """
+    Returns an instance of a command object that can be used to execute a command.
+    See tank.deploy.tank_command.get_command() for details.
+    """
+    # the commands framework is expensive to import, so load it on first use
+    from .deploy import tank_command
+    return tank_command.get_command(command_name, tk)
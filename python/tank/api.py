@@ -16,14 +16,14 @@ import os
 import glob
 import threading
 
-from tank_vendor import yaml
-
-from . import folder
+from . import hook
+from . import profiling
 from . import context
 from .util import shotgun
+from .util import shotgun_statistics
+from .util import yaml_cache
 from .errors import TankError
 from .path_cache import PathCache
-from .template import read_templates
 from .platform import constants as platform_constants
 from . import pipelineconfig
 from . import pipelineconfig_utils
@@ -52,10 +52,14 @@ class Tank(object):
             self.__pipeline_config = pipelineconfig_factory.from_path(project_path)
             
         try:
-            self.templates = read_templates(self.__pipeline_config)
+            self.templates = pipelineconfig_factory.get_templates(self.__pipeline_config)
         except TankError, e:
             raise TankError("Could not read templates configuration: %s" % e)
 
+        # load all core hooks up front so that this cost isn't paid
+        # as part of for example folder creation
+        self.__pipeline_config.preload_core_hooks()
+
         # execute a tank_init hook for developers to use.
         self.execute_core_hook(platform_constants.TANK_INIT_HOOK_NAME)
 
@@ -86,7 +90,8 @@ class Tank(object):
         will be backwards compatible.        
         """
         try:
-            self.templates = read_templates(self.__pipeline_config)
+            self.templates = pipelineconfig_factory.get_templates(self.__pipeline_config, 
+                                                                  force_reload=True)
         except TankError, e:
             raise TankError("Templates could not be reloaded: %s" % e)
 
@@ -126,6 +131,82 @@ class Tank(object):
                                                                              parent=self, 
                                                                              **kwargs)
 
+    def get_core_hook_callable(self, hook_name, method_name=None):
+        """
+        Returns a core level hook method, ready to be called. This is useful 
+        when executing the same hook many times, for example in a loop, 
+        since the hook only needs to be resolved once. Hooks which are 
+        marked as reusable will also avoid the construction of a new hook
+        instance.
+        
+        If no method name is specified, the default method of the hook 
+        will be returned, similar to execute_core_hook(). If a method name 
+        is specified, the hook is resolved the same way as with 
+        execute_core_hook_method().
+
+        Internal Use Only - We provide no guarantees that this method
+        will be backwards compatible.
+        
+        :param hook_name:   Name of hook to get a method for.
+        :param method_name: Name of method to return.
+        :returns:           Hook method, ready to be called.
+        """
+        return self.pipeline_configuration.get_core_hook_callable_internal(hook_name, 
+                                                                           method_name, 
+                                                                           parent=self)
+
+    def get_hook_statistics(self):
+        """
+        Returns execution statistics for all hooks that have been run in this 
+        session, including core, engine, app and framework hooks. Statistics are
+        only collected when hook profiling has been turned on, either by setting 
+        the TANK_HOOK_PROFILING environment variable or via hook.enable_hook_profiling().
+
+        Internal Use Only - We provide no guarantees that this method
+        will be backwards compatible.
+        
+        :returns: List of dictionaries with keys hook_path, method, calls, total_time, 
+                  max_time and exceptions, sorted by total time, most expensive first.
+                  Times are expressed in seconds.
+        """
+        return hook.get_hook_statistics()
+
+    def get_shotgun_statistics(self):
+        """
+        Returns statistics for all Shotgun API calls made in this session, 
+        aggregated by API method, entity type and the module the calls were 
+        made from. Statistics are only collected when shotgun profiling has 
+        been turned on, either by setting the TANK_SG_PROFILING environment 
+        variable or via util.shotgun_statistics.enable_shotgun_profiling().
+
+        Internal Use Only - We provide no guarantees that this method
+        will be backwards compatible.
+        
+        :returns: List of dictionaries with keys method, entity_type, subsystem, calls,
+                  retries, errors, request_bytes, response_bytes, total_time, max_time
+                  and histogram, sorted by total time, most expensive first.
+                  Times are expressed in seconds.
+        """
+        return shotgun_statistics.get_shotgun_statistics()
+
+    def get_startup_trace(self):
+        """
+        Returns the timings of the phases of toolkit startup recorded in this 
+        session, such as resolving the pipeline configuration, reading templates,
+        creating contexts and starting engines and apps. Timings are only recorded 
+        when startup profiling has been turned on, either by setting the 
+        TANK_STARTUP_PROFILING environment variable or via 
+        profiling.enable_startup_profiling().
+
+        Internal Use Only - We provide no guarantees that this method
+        will be backwards compatible.
+        
+        :returns: List of dictionaries with keys name, duration and children, where 
+                  children is a list of dictionaries for the nested phases. Durations
+                  are expressed in seconds.
+        """
+        return profiling.get_startup_trace()
+
     ################################################################################################
     # properties
 
@@ -152,7 +233,9 @@ class Tank(object):
         This Shotgun API is threadlocal, meaning that each thread will get
         a separate instance of the Shotgun API. This is in order to prevent
         concurrency issues and add a layer of basic protection around the 
-        Shotgun API, which isn't threadsafe.
+        Shotgun API, which isn't threadsafe. While the shotgun query cache
+        is turned on, the handle is wrapped so that queries are served from
+        the cache.
         """
         
         sg = getattr(self.__threadlocal_storage, "sg", None)
@@ -172,7 +255,7 @@ class Tank(object):
             # tk user agent handler associated.
             pass
 
-        return sg
+        return shotgun.get_connection_pool().query_cache.wrap(sg)
 
     @property
     def version(self):
@@ -193,11 +276,7 @@ class Tank(object):
         # read this from info.yml
         info_yml_path = os.path.abspath(os.path.join( os.path.dirname(__file__), "..", "..", "info.yml"))
         try:
-            info_fh = open(info_yml_path, "r")
-            try:
-                data = yaml.load(info_fh)
-            finally:
-                info_fh.close()
+            data = yaml_cache.load_yaml(info_yml_path)
             data = str(data.get("documentation_url"))
             if data == "":
                 data = None
@@ -524,6 +603,8 @@ class Tank(object):
                           By default, the sync is incremental.
         :returns: List of folders that were synchronized.
         """
+        # the folder module is expensive to import, so load it on first use
+        from . import folder
         return folder.synchronize_folders(self, full_sync)
 
     def create_filesystem_structure(self, entity_type, entity_id, engine=None):
@@ -548,6 +629,8 @@ class Tank(object):
 
         :returns: The number of folders processed
         """
+        # the folder module is expensive to import, so load it on first use
+        from . import folder
         folders = folder.process_filesystem_structure(self,
                                                       entity_type,
                                                       entity_id,
@@ -576,6 +659,8 @@ class Tank(object):
 
         :returns: List of items processed.
         """
+        # the folder module is expensive to import, so load it on first use
+        from . import folder
         folders = folder.process_filesystem_structure(self,
                                                       entity_type,
                                                       entity_id,
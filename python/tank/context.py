@@ -22,6 +22,7 @@ from tank_vendor import yaml
 from .util import login
 from .util import shotgun_entity
 from .util import shotgun
+from . import profiling
 from .errors import TankError
 from .path_cache import PathCache
 from .template import TemplatePath
@@ -431,6 +432,8 @@ class Context(object):
         from Shotgun fields.
         """
         fields = {}
+        # process folder name hook callable, resolved on first use
+        process_folder_name = None
         # for any sg query field
         for key in template.keys.values():
             
@@ -480,12 +483,15 @@ class Context(object):
                         # note! This means that there is no way currently to create an int key
                         # in a tank template which matches an int field in shotgun, since we are
                         # force converting everything into strings...
+                        if process_folder_name is None:
+                            process_folder_name = shotgun_entity.get_process_folder_name_callable(self.__tk)
                                  
                         processed_val = shotgun_entity.sg_entity_to_string(self.__tk,
                                                                            key.shotgun_entity_type,
                                                                            entity.get("id"),
                                                                            key.shotgun_field_name, 
-                                                                           value)
+                                                                           value,
+                                                                           process_folder_name)
                     
                         if not key.validate(processed_val):                    
                             raise TankError("Template validation failed for value '%s'. This "
@@ -685,6 +691,7 @@ def from_entity(tk, entity_type, entity_id):
 
     return Context(**context)
 
+@profiling.profiled("context.from_path")
 def from_path(tk, path, previous_context=None):
     """
     Constructs a context from a path to a folder or a file.
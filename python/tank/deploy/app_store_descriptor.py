@@ -15,18 +15,16 @@ Tank App Store Connectivity.
 import os
 import re
 import copy
+import time
 import uuid
 import tempfile
 
-# use api json to cover py 2.5
-# todo - replace with proper external library  
-from tank_vendor import shotgun_api3  
-json = shotgun_api3.shotgun.json
-
 from ..api import Tank
 from ..util import shotgun
+from ..util.json_lib import json
 from ..errors import TankError
 from ..platform import constants
+from ..platform.engine import show_global_busy, clear_global_busy
 from .descriptor import AppDescriptor
 from .zipfilehelper import unzip_file
 
@@ -533,24 +531,49 @@ class TankAppStoreDescriptor(AppDescriptor):
         except:
             raise TankError("Could not extract attachment id from data %s" % version)
 
-        # and now for the download.
-        # @todo: progress feedback here - when the SG api supports it!
-        # sometimes people report that this download fails (because of flaky connections etc)
-        # engines can often be 30-50MiB - as a quick fix, just retry the download once
-        # if it fails.
-        try:
-            bundle_content = sg.download_attachment(attachment_id)
-        except:
-            # retry once
-            bundle_content = sg.download_attachment(attachment_id)
-
+        # and now for the download. Engines can often be 30-50MiB, so the payload is
+        # streamed straight to disk. Sometimes people report that this download fails 
+        # (because of flaky connections etc) so downloads interrupted by network errors
+        # are retried after a short delay and resume where they left off.
         zip_tmp = os.path.join(tempfile.gettempdir(), "%s_tank.zip" % uuid.uuid4().hex)
-        fh = open(zip_tmp, "wb")
-        fh.write(bundle_content)
-        fh.close()
-
-        # unzip core zip file to app target location
-        unzip_file(zip_tmp, target)
+        title = "Downloading %s %s..." % (self._name, self._version)
+        reported_progress = [None]
+        
+        def report_progress(downloaded, total_size):
+            # only update the busy window when the reported figure changes
+            if total_size:
+                progress = "%d%% of %.1f MiB" % (100 * downloaded / total_size, 
+                                                 total_size / 1048576.0)
+            else:
+                progress = "%.1f MiB" % (downloaded / 1048576.0)
+            if progress != reported_progress[0]:
+                reported_progress[0] = progress
+                show_global_busy(title, "Downloaded %s from the Toolkit App Store." % progress)
+        
+        # import the shotgun API only when it is needed
+        from tank_vendor.shotgun_api3 import ShotgunFileDownloadInterruptedError
+        
+        try:
+            for attempt in range(constants.TANK_APP_STORE_DOWNLOAD_ATTEMPTS):
+                try:
+                    sg.download_attachment(attachment_id, 
+                                           file_path=zip_tmp, 
+                                           resume=True, 
+                                           progress_callback=report_progress)
+                    break
+                except ShotgunFileDownloadInterruptedError:
+                    if attempt == constants.TANK_APP_STORE_DOWNLOAD_ATTEMPTS - 1:
+                        raise
+                    time.sleep(constants.TANK_APP_STORE_DOWNLOAD_RETRY_DELAY)
+    
+            # unzip core zip file to app target location
+            unzip_file(zip_tmp, target)
+        finally:
+            # only close the busy window if the download opened it
+            if reported_progress[0] is not None:
+                clear_global_busy()
+            if os.path.exists(zip_tmp):
+                os.remove(zip_tmp)
 
         # write a record to the tank app store
         if self._type == AppDescriptor.APP:
@@ -15,14 +15,71 @@ Functionality for managing versions of apps.
 import os
 import copy
 
-from tank_vendor import yaml
-
 from .. import hook
 from ..util import shotgun
+from ..util import yaml_cache
 from ..errors import TankError
 from ..platform import constants
 
 
+class _ReadOnlyDict(dict):
+    """
+    A dictionary that cannot be modified. Used to hand out manifest data 
+    without having to copy it. Use copy.deepcopy() to get a regular, 
+    modifiable dictionary.
+    """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Manifest data is read-only. Use copy.deepcopy() to get a modifiable copy.")
+    
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+    
+    def __copy__(self):
+        return dict(self)
+    
+    def __deepcopy__(self, memo):
+        return dict((copy.deepcopy(k, memo), copy.deepcopy(v, memo)) for (k, v) in self.iteritems())
+    
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class _ReadOnlyList(list):
+    """
+    A list that cannot be modified. Used to hand out manifest data 
+    without having to copy it. Use copy.deepcopy() to get a regular, 
+    modifiable list.
+    """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("Manifest data is read-only. Use copy.deepcopy() to get a modifiable copy.")
+    
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = _read_only
+    
+    def __copy__(self):
+        return list(self)
+    
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(x, memo) for x in self]
+    
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _freeze(data):
+    """
+    Recursively converts dictionaries and lists into their read-only equivalents.
+    
+    :param data: Data structure to convert
+    :returns: Read-only version of the data structure
+    """
+    if isinstance(data, dict):
+        return _ReadOnlyDict((k, _freeze(v)) for (k, v) in data.iteritems())
+    elif isinstance(data, list):
+        return _ReadOnlyList(_freeze(x) for x in data)
+    else:
+        return data
+
+
 class AppDescriptor(object):
     """
     An app descriptor describes a particular version of an app, engine or core component.
@@ -107,6 +164,9 @@ class AppDescriptor(object):
         Note that this call involves deep introspection; in order to
         access the metadata we normally need to have the code content
         local, so this method may trigger a remote code fetch if necessary.
+        
+        The returned data is shared and read-only. Use copy.deepcopy() 
+        to get a copy that can be modified.
         """
         if self.__manifest_data is None:
             # make sure payload exists locally
@@ -122,19 +182,15 @@ class AppDescriptor(object):
                 raise TankError("Toolkit metadata file '%s' missing." % file_path)
         
             try:
-                file_data = open(file_path)
-                try:
-                    metadata = yaml.load(file_data)
-                finally:
-                    file_data.close()
+                metadata = yaml_cache.load_yaml(file_path)
             except Exception, exp:
                 raise TankError("Cannot load metadata file '%s'. Error: %s" % (file_path, exp))
         
-            # cache it
-            self.__manifest_data = metadata
+            # cache it - the data is frozen so that it can be handed
+            # out to callers without having to copy it each time.
+            self.__manifest_data = _freeze(metadata or {})
         
-        # return a copy
-        return copy.deepcopy(self.__manifest_data)
+        return self.__manifest_data
 
 
     ###############################################################################################
@@ -272,7 +328,8 @@ class AppDescriptor(object):
     def get_configuration_schema(self):
         """
         Returns the manifest configuration schema for this bundle.
-        Always returns a dictionary.
+        Always returns a dictionary. The returned dictionary is read-only, 
+        use copy.deepcopy() to get a copy that can be modified.
         """
         md  = self._get_metadata()
         cfg = md.get("configuration")
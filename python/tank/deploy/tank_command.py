@@ -55,6 +55,9 @@ BUILT_IN_ACTIONS = [setup_project.SetupProjectAction,
                     switch.SwitchAppAction,
                     app_info.AppInfoAction,
                     misc.InteractiveShellAction,
+                    misc.HookStatisticsAction,
+                    misc.ShotgunStatisticsAction,
+                    misc.YamlBenchmarkAction,
                     install.InstallAppAction,
                     push_pc.PushPCAction,
                     install.InstallEngineAction,
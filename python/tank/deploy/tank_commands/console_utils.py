@@ -12,6 +12,7 @@
 Various helper methods relating to user interaction via the shell.
 """
 
+import copy
 import textwrap
 import os
 
@@ -433,7 +434,9 @@ def _generate_settings_diff(parent_engine_name, new_descriptor, old_descriptor=N
     }
     """
     # get the new metadata (this will download the app potentially)
-    schema = new_descriptor.get_configuration_schema()
+    # default values are copied into the environment, so make sure
+    # to get a copy of the (read-only) schema that can be modified.
+    schema = copy.deepcopy(new_descriptor.get_configuration_schema())
     old_schema = {}
     if old_descriptor is not None:
         try:
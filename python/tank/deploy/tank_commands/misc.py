@@ -9,11 +9,16 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 from ...errors import TankError
+from ... import hook
+from ...platform import constants
+from ...util import yaml_cache
+from ...util import shotgun_statistics
 from .action_base import Action
 
 import code
 import sys
 import os
+import time
 
              
 
@@ -127,3 +132,260 @@ class InteractiveShellAction(Action):
         code.interact(banner = "\n".join(msg), local=tk_locals)
         
         
+
+
+class HookStatisticsAction(Action):
+    """
+    Action that reports hook execution statistics for the current session
+    """
+    def __init__(self):
+        Action.__init__(self, 
+                        "hook_statistics", 
+                        Action.TK_INSTANCE, 
+                        ("Reports how much time has been spent executing hooks in the current process. "
+                         "Statistics are only collected when the %s environment variable "
+                         "is set." % constants.HOOK_PROFILING_ENV_VAR), 
+                        "Developer")
+
+        # no tank command support for this one - the statistics are collected
+        # in the current process, so a separate tank command process has got
+        # nothing to report.
+        self.supports_tank_command = False
+
+        # this method can be executed via the API
+        self.supports_api = True
+        self.parameters = {}
+        self.parameters["reset"] = { "description": "Discard the statistics once they have been reported", 
+                                     "default": False, 
+                                     "type": "bool" }
+        self.parameters["return_value"] = { "description": ("List of dictionaries with keys hook_path, method, "
+                                                            "calls, total_time, max_time and exceptions"), 
+                                            "type": "list" }
+        
+    def run_noninteractive(self, log, parameters):
+        """
+        API accessor
+        """
+        computed_params = self._validate_parameters(parameters)
+        return self._run(log, computed_params["reset"])
+    
+    def run_interactive(self, log, args):
+        """
+        Tank command accessor
+        """
+        raise TankError("This Action does not support command line access")
+        
+    def _run(self, log, reset):
+        """
+        Actual execution payload
+        
+        :param log: logger
+        :param reset: boolean flag to indicate that statistics should be cleared afterwards
+        """
+        stats = self.tk.get_hook_statistics()
+        
+        if len(stats) == 0:
+            log.info("No hook statistics have been collected. Set the %s environment variable "
+                     "to turn on hook profiling." % constants.HOOK_PROFILING_ENV_VAR)
+        
+        for entry in stats:
+            log.info("%s (%s): %d calls, %.4fs total, %.4fs max, %d exceptions" % (entry["hook_path"],
+                                                                                   entry["method"],
+                                                                                   entry["calls"],
+                                                                                   entry["total_time"],
+                                                                                   entry["max_time"],
+                                                                                   entry["exceptions"]))
+        
+        if reset:
+            hook.clear_hook_statistics()
+            
+        return stats
+
+
+class ShotgunStatisticsAction(Action):
+    """
+    Action that reports shotgun call statistics for the current session
+    """
+    def __init__(self):
+        Action.__init__(self, 
+                        "shotgun_statistics", 
+                        Action.TK_INSTANCE, 
+                        ("Reports the calls made to Shotgun in the current process, broken down by "
+                         "API method, entity type and the core module the calls were made from. "
+                         "Statistics are only collected when the %s environment variable "
+                         "is set." % constants.SG_PROFILING_ENV_VAR), 
+                        "Developer")
+
+        # no tank command support for this one - the statistics are collected
+        # in the current process, so a separate tank command process has got
+        # nothing to report.
+        self.supports_tank_command = False
+
+        # this method can be executed via the API
+        self.supports_api = True
+        self.parameters = {}
+        self.parameters["reset"] = { "description": "Discard the statistics once they have been reported", 
+                                     "default": False, 
+                                     "type": "bool" }
+        self.parameters["return_value"] = { "description": ("List of dictionaries with keys method, entity_type, "
+                                                            "subsystem, calls, retries, errors, request_bytes, "
+                                                            "response_bytes, total_time, max_time and histogram"), 
+                                            "type": "list" }
+        
+    def run_noninteractive(self, log, parameters):
+        """
+        API accessor
+        """
+        computed_params = self._validate_parameters(parameters)
+        return self._run(log, computed_params["reset"])
+    
+    def run_interactive(self, log, args):
+        """
+        Tank command accessor
+        """
+        raise TankError("This Action does not support command line access")
+        
+    def _run(self, log, reset):
+        """
+        Actual execution payload
+        
+        :param log: logger
+        :param reset: boolean flag to indicate that statistics should be cleared afterwards
+        """
+        stats = self.tk.get_shotgun_statistics()
+        
+        if len(stats) == 0:
+            log.info("No shotgun statistics have been collected. Set the %s environment variable "
+                     "to turn on shotgun profiling." % constants.SG_PROFILING_ENV_VAR)
+        
+        bucket_names = ["<=%gs" % x for x in constants.SG_PROFILING_LATENCY_BUCKETS]
+        bucket_names.append(">%gs" % constants.SG_PROFILING_LATENCY_BUCKETS[-1])
+        
+        for entry in stats:
+            log.info("%s %s from %s: %d calls, %d retries, %d errors, %d bytes sent, %d bytes received, "
+                     "%.4fs total, %.4fs max" % (entry["method"],
+                                                 entry["entity_type"] or "",
+                                                 entry["subsystem"],
+                                                 entry["calls"],
+                                                 entry["retries"],
+                                                 entry["errors"],
+                                                 entry["request_bytes"],
+                                                 entry["response_bytes"],
+                                                 entry["total_time"],
+                                                 entry["max_time"]))
+            histogram = ["%s: %d" % (name, count) 
+                         for (name, count) in zip(bucket_names, entry["histogram"]) if count]
+            log.info("    latency: %s" % ", ".join(histogram))
+        
+        if reset:
+            shotgun_statistics.clear_shotgun_statistics()
+            
+        return stats
+
+
+class YamlBenchmarkAction(Action):
+    """
+    Action that measures how long it takes to parse the configuration files
+    """
+    def __init__(self):
+        Action.__init__(self, 
+                        "benchmark_yaml", 
+                        Action.TK_INSTANCE, 
+                        ("Measures how long it takes to parse all the yml files in this configuration, "
+                         "comparing the pure python yaml loader with the faster libyaml based loader, "
+                         "if available, and with the in-memory cache of parsed files."), 
+                        "Developer")
+
+        # this method can be executed via the API
+        self.supports_api = True
+        self.parameters = {}
+        self.parameters["iterations"] = { "description": "Number of times to parse each file", 
+                                          "default": 3, 
+                                          "type": "int" }
+        self.parameters["return_value"] = { "description": ("Dictionary with keys files, bytes, python_time, "
+                                                            "c_time and cached_time. c_time is None if the "
+                                                            "libyaml based loader is not available."), 
+                                            "type": "dict" }
+        
+    def run_noninteractive(self, log, parameters):
+        """
+        API accessor
+        """
+        computed_params = self._validate_parameters(parameters)
+        return self._run(log, computed_params["iterations"])
+    
+    def run_interactive(self, log, args):
+        """
+        Tank command accessor
+        """
+        if len(args) == 0:
+            iterations = 3
+        
+        elif len(args) == 1 and args[0].isdigit() and int(args[0]) > 0:
+            iterations = int(args[0])
+            
+        else:
+            raise TankError("Syntax: benchmark_yaml [iterations]")
+
+        return self._run(log, iterations)
+        
+    def _run(self, log, iterations):
+        """
+        Actual execution payload
+        
+        :param log: logger
+        :param iterations: number of times to parse each file
+        """
+        config_root = self.tk.pipeline_configuration.get_config_location()
+        
+        # read all the files up front so that disk access isn't part of the timings
+        file_contents = {}
+        for (dir_path, _, file_names) in os.walk(config_root):
+            for file_name in file_names:
+                if file_name.endswith(".yml"):
+                    full_path = os.path.join(dir_path, file_name)
+                    fh = open(full_path, "rt")
+                    try:
+                        file_contents[full_path] = fh.read()
+                    finally:
+                        fh.close()
+        
+        total_bytes = sum(len(x) for x in file_contents.values())
+        log.info("Parsing %d yml files (%d bytes) in %s, %d times each..." % (len(file_contents),
+                                                                            total_bytes,
+                                                                            config_root,
+                                                                            iterations))
+        
+        def _time_parse(use_c_loader):
+            start = time.time()
+            for _ in range(iterations):
+                for content in file_contents.itervalues():
+                    yaml_cache.parse_yaml(content, use_c_loader)
+            return time.time() - start
+        
+        python_time = _time_parse(use_c_loader=False)
+        log.info("Pure python loader: %.3fs" % python_time)
+        
+        c_time = None
+        if yaml_cache.is_c_loader_available():
+            c_time = _time_parse(use_c_loader=True)
+            log.info("libyaml loader: %.3fs (%.1fx faster)" % (c_time, python_time / max(c_time, 0.0001)))
+        else:
+            log.info("The libyaml loader is not available. Install PyYAML with libyaml support "
+                     "to enable it.")
+        
+        # and compare with loading files that have already been parsed
+        for path in file_contents:
+            yaml_cache.load_yaml(path)
+        start = time.time()
+        for _ in range(iterations):
+            for path in file_contents:
+                yaml_cache.load_yaml(path)
+        cached_time = time.time() - start
+        log.info("In-memory cache: %.3fs" % cached_time)
+        
+        return {"files": len(file_contents),
+                "bytes": total_bytes,
+                "python_time": python_time,
+                "c_time": c_time,
+                "cached_time": cached_time}
@@ -20,8 +20,7 @@ from .folder_types import Static, ListField, Entity, Project, UserWorkspace, Sho
 
 from ..errors import TankError
 from ..platform import constants
-
-from tank_vendor import yaml
+from ..util import yaml_cache
 
 
 def read_ignore_files(schema_config_path):
@@ -163,11 +162,7 @@ class FolderConfiguration(object):
             full_path = os.path.join(parent_path, file_name)
 
             try:
-                fh = open(full_path)
-                try:
-                    metadata = yaml.load(fh)
-                finally:
-                    fh.close()
+                metadata = yaml_cache.load_yaml(full_path)
             except Exception, error:
                 raise TankError("Cannot load config file '%s'. Error: %s" % (full_path, error))
 
@@ -198,11 +193,7 @@ class FolderConfiguration(object):
         if os.path.exists(yml_file):
             # try to parse it
             try:
-                open_file = open(yml_file)
-                try:
-                    metadata = yaml.load(open_file)
-                finally:
-                    open_file.close()
+                metadata = yaml_cache.load_yaml(yml_file)
             except Exception, error:
                 raise TankError("Cannot load config file '%s'. Error: %s" % (yml_file, error))
         return metadata
@@ -13,6 +13,7 @@ Defines the base class for all Tank Hooks.
 
 """
 import os
+import time
 import threading
 from . import loader
 from .platform import constants
@@ -26,6 +27,12 @@ class Hook(object):
     or Application instance.
     """
     
+    # Hooks which don't keep any state between calls can set this to True in order to
+    # let Toolkit create a single instance per parent and reuse it for all subsequent 
+    # calls rather than constructing a new instance each time the hook is executed.
+    # Note that a reusable hook instance may be called from several threads at once.
+    reusable = False
+    
     def __init__(self, parent):
         self.__parent = parent
     
@@ -166,14 +173,354 @@ class _HooksCache(object):
         """
         return len(self._cache)
 
+class _HookPathsCache(object):
+    """
+    A thread-safe cache of resolved hook path chains. Resolving which
+    files make up a hook involves checking the configuration on disk for 
+    overrides, something which can be expensive on network storage, so 
+    the result is computed once per session and then reused.
+    
+    Entries are only invalidated when the cache is cleared or, if a check
+    interval has been set, when the modification time of the folder that
+    was inspected during resolution has changed. The check interval can be
+    set via the TANK_HOOK_CACHE_CHECK_INTERVAL environment variable and is 
+    expressed in seconds.
+    """
+    def __init__(self):
+        """
+        Construction
+        """
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self.check_interval = None
+        
+        interval = os.environ.get(constants.HOOK_CACHE_CHECK_INTERVAL_ENV_VAR)
+        if interval:
+            try:
+                self.check_interval = float(interval)
+            except ValueError:
+                # invalid value - fall back on never checking
+                pass
+    
+    def clear(self):
+        """
+        Clear the hook paths cache
+        """
+        self._cache_lock.acquire()
+        try:
+            self._cache = {}
+        finally:
+            self._cache_lock.release()
+        
+    def find(self, key):
+        """
+        Find a hook path chain in the cache. 
+        
+        If a check interval has been specified and it has elapsed since
+        the entry was last validated, the modification time of the 
+        associated folder is checked and the entry is discarded if the 
+        folder has changed. 
+
+        :param key:     Key to look up, typically (config path, hook name)
+        :returns:       List of hook paths if found, None if not
+        """
+        self._cache_lock.acquire()
+        try:
+            entry = self._cache.get(key)
+        finally:
+            self._cache_lock.release()
+        
+        if entry is None:
+            return None
+        
+        (hook_paths, folder, folder_mtime, last_checked) = entry
+        
+        if self.check_interval is not None and time.time() - last_checked >= self.check_interval:
+            # time to revalidate this entry
+            if _get_mtime(folder) != folder_mtime:
+                # folder has changed - hooks may have been added or removed.
+                return None
+            self.add(key, hook_paths, folder, folder_mtime)
+        
+        return hook_paths
+
+    def add(self, key, hook_paths, folder, folder_mtime=None):
+        """
+        Add a resolved hook path chain to the cache.
+        
+        :param key:             Key to store the paths under
+        :param hook_paths:      List of hook paths, in inheritance order
+        :param folder:          Folder which was inspected when resolving the paths.
+                                This is used to revalidate the entry.
+        :param folder_mtime:    Modification time of the folder. If not specified, 
+                                this will be read from disk.
+        """
+        if folder_mtime is None:
+            folder_mtime = _get_mtime(folder)
+        
+        self._cache_lock.acquire()
+        try:
+            self._cache[key] = (hook_paths, folder, folder_mtime, time.time())
+        finally:
+            self._cache_lock.release()
+
+    def __len__(self):
+        """
+        Return the number of items currently in the hook paths cache
+        """
+        return len(self._cache)
+
+class _HookInstancesCache(object):
+    """
+    A thread-safe cache of hook instances for hook classes that have been
+    marked as reusable. Instances are keyed by hook class and parent. 
+    
+    Since each cached instance holds a reference to its parent, the number 
+    of instances kept is bounded and the least recently used instance is 
+    discarded once the cache is full.
+    """
+    
+    # maximum number of instances to keep around
+    MAX_SIZE = 100
+    
+    def __init__(self):
+        """
+        Construction
+        """
+        self._cache = {}
+        # cache keys, least recently used first
+        self._keys = []
+        self._cache_lock = threading.Lock()
+
+    def clear(self):
+        """
+        Clear the hook instances cache
+        """
+        self._cache_lock.acquire()
+        try:
+            self._cache = {}
+            self._keys = []
+        finally:
+            self._cache_lock.release()
+
+    def get(self, hook_class, parent):
+        """
+        Returns an instance of the given hook class for the given parent, 
+        constructing it if there isn't one in the cache already.
+        
+        :param hook_class:  The hook class to get an instance for
+        :param parent:      The parent object to pass to the hook
+        :returns:           Hook instance
+        """
+        # the parent is kept alive by the hook instance so its id is 
+        # guaranteed to be unique for as long as the entry is cached.
+        key = (hook_class, id(parent))
+        
+        self._cache_lock.acquire()
+        try:
+            hook = self._cache.get(key)
+            if hook is not None:
+                # move the key to the end to mark this entry as the most 
+                # recently used
+                self._keys.remove(key)
+                self._keys.append(key)
+                return hook
+        finally:
+            self._cache_lock.release()
+        
+        # construct the instance outside of the lock, in case the hook
+        # constructor in turn executes other hooks
+        new_hook = hook_class(parent)
+        
+        self._cache_lock.acquire()
+        try:
+            # another thread may have added an instance in the meantime - 
+            # make sure that all threads end up using the same instance.
+            hook = self._cache.get(key)
+            if hook is None:
+                hook = new_hook
+                self._cache[key] = hook
+                self._keys.append(key)
+                if len(self._keys) > self.MAX_SIZE:
+                    # discard the least recently used instance
+                    del self._cache[self._keys.pop(0)]
+            return hook
+        finally:
+            self._cache_lock.release()
+
+    def __len__(self):
+        """
+        Return the number of items currently in the hook instances cache
+        """
+        return len(self._cache)
+
+class _HookStatistics(object):
+    """
+    Thread-safe collection of hook execution statistics. For each hook path and
+    method, the number of calls, the cumulative and max wall time and the number
+    of calls that raised an exception are recorded. 
+    
+    Collection is off by default and can be turned on by setting the 
+    TANK_HOOK_PROFILING environment variable or by calling enable_hook_profiling().
+    """
+    def __init__(self):
+        """
+        Construction
+        """
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self.enabled = os.environ.get(constants.HOOK_PROFILING_ENV_VAR, "0") not in ("", "0")
+
+    def clear(self):
+        """
+        Discards all statistics collected so far
+        """
+        self._stats_lock.acquire()
+        try:
+            self._stats = {}
+        finally:
+            self._stats_lock.release()
+
+    def record(self, hook_path, method_name, duration, failed):
+        """
+        Records a single hook execution
+        
+        :param hook_path:   Path to the hook that was executed
+        :param method_name: The hook method that was executed
+        :param duration:    Execution wall time in seconds
+        :param failed:      True if the hook raised an exception
+        """
+        key = (hook_path, method_name)
+        self._stats_lock.acquire()
+        try:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = {"hook_path": hook_path,
+                         "method": method_name,
+                         "calls": 0,
+                         "total_time": 0.0,
+                         "max_time": 0.0,
+                         "exceptions": 0}
+                self._stats[key] = entry
+            entry["calls"] += 1
+            entry["total_time"] += duration
+            entry["max_time"] = max(entry["max_time"], duration)
+            if failed:
+                entry["exceptions"] += 1
+        finally:
+            self._stats_lock.release()
+
+    def wrap(self, hook_path, method_name, hook_method):
+        """
+        Wraps a hook method so that its executions are recorded.
+        
+        :param hook_path:   Path to the hook
+        :param method_name: Name of the hook method
+        :param hook_method: Bound hook method to wrap
+        :returns:           Callable with the same signature as hook_method
+        """
+        def profiled_hook_method(*args, **kwargs):
+            """
+            Executes the hook method and records the execution time
+            """
+            failed = True
+            start_time = time.time()
+            try:
+                ret_val = hook_method(*args, **kwargs)
+                failed = False
+                return ret_val
+            finally:
+                self.record(hook_path, method_name, time.time() - start_time, failed)
+        return profiled_hook_method
+
+    def get(self):
+        """
+        Returns the statistics collected so far
+        
+        :returns: List of dictionaries with keys hook_path, method, calls, total_time, 
+                  max_time and exceptions, sorted by total time, most expensive first.
+        """
+        self._stats_lock.acquire()
+        try:
+            stats = [dict(x) for x in self._stats.values()]
+        finally:
+            self._stats_lock.release()
+        return sorted(stats, key=lambda x: x["total_time"], reverse=True)
+
+def _get_mtime(path):
+    """
+    Returns the modification time of a path, or None if it doesn't exist.
+    
+    :param path: Path to check
+    :returns: modification time or None
+    """
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
 _hooks_cache = _HooksCache()
+_hook_paths_cache = _HookPathsCache()
+_hook_instances_cache = _HookInstancesCache()
+_hook_statistics = _HookStatistics()
 _current_hook_baseclass = threading.local()
 
 def clear_hooks_cache():
     """
-    Clears the cache where tank keeps hook classes
+    Clears the cache where tank keeps hook classes, resolved hook paths
+    and reusable hook instances
     """
     _hooks_cache.clear()
+    _hook_paths_cache.clear()
+    _hook_instances_cache.clear()
+
+def enable_hook_profiling(enabled=True):
+    """
+    Turns the collection of hook execution statistics on or off. 
+    Collection can also be turned on by setting the TANK_HOOK_PROFILING 
+    environment variable.
+    
+    :param enabled: True to turn profiling on, False to turn it off
+    """
+    _hook_statistics.enabled = enabled
+
+def get_hook_statistics():
+    """
+    Returns hook execution statistics collected in this session, 
+    keyed by hook path and method. Statistics are only collected
+    while hook profiling is enabled.
+    
+    :returns: List of dictionaries with keys hook_path, method, calls, total_time, 
+              max_time and exceptions, sorted by total time, most expensive first.
+              Times are expressed in seconds.
+    """
+    return _hook_statistics.get()
+
+def clear_hook_statistics():
+    """
+    Discards all hook execution statistics collected so far
+    """
+    _hook_statistics.clear()
+
+def find_hook_paths(key):
+    """
+    Returns a previously resolved hook path chain.
+    
+    :param key: Key to look up, typically (config path, hook name)
+    :returns: List of hook paths or None if not found
+    """
+    return _hook_paths_cache.find(key)
+
+def add_hook_paths(key, hook_paths, folder):
+    """
+    Stores a resolved hook path chain so that subsequent executions 
+    do not need to resolve it again.
+    
+    :param key: Key to store the paths under, typically (config path, hook name)
+    :param hook_paths: List of hook paths, in inheritance order
+    :param folder: Folder which was inspected in order to resolve the paths.
+    """
+    _hook_paths_cache.add(key, hook_paths, folder)
 
 def execute_hook(hook_path, parent, **kwargs):
     """
@@ -225,20 +572,82 @@ def execute_hook_method(hook_paths, parent, method_name, **kwargs):
     :param method_name: method to execute. If None, the default method will be executed.
     :returns: Whatever the hook returns.
     """    
+    hook_method = get_hook_callable(hook_paths, parent, method_name)
+    
+    # execute the method
+    ret_val = hook_method(**kwargs)
+    
+    return ret_val
+
+def get_hook_callable(hook_paths, parent, method_name=None):
+    """
+    Returns a hook method, ready to be called. The hook classes are loaded 
+    the same way as in execute_hook_method(). 
+    
+    If the hook class is marked as reusable, the method of a cached instance 
+    is returned. Otherwise, the returned callable constructs a new hook instance 
+    each time it is called. The returned callable can be held on to and executed 
+    several times, which avoids the cost of resolving the hook for every call 
+    when a hook is executed in a loop::
+    
+        hook_method = get_hook_callable(hook_paths, parent, "execute")
+        for item in items:
+            hook_method(item=item)
+    
+    :param hook_paths: List of full paths to hooks, in inheritance order.
+    :param parent: Parent object. This will be accessible inside
+                   the hook as self.parent, and is typically an 
+                   app, engine or core object.
+    :param method_name: method to return. If None, the default method will be returned.
+    :returns: Hook method, bound to a hook instance for reusable hooks
+    """
     method_name = method_name or constants.DEFAULT_HOOK_METHOD
+    
+    hook_class = load_hook_class(hook_paths)
+    
+    if not hasattr(hook_class, method_name):
+        raise TankError("Cannot execute hook '%s' - the hook class does not "
+                        "have a '%s' method!" % (hook_class, method_name))
+    
+    if hook_class.reusable:
+        hook = _hook_instances_cache.get(hook_class, parent)
+        hook_method = getattr(hook, method_name)
+    else:
+        # only the resolved class is held on to - a new instance
+        # is constructed for every call
+        def hook_method(*args, **kwargs):
+            return getattr(hook_class(parent), method_name)(*args, **kwargs)
+        hook_method.__name__ = method_name
+    
+    if _hook_statistics.enabled:
+        hook_method = _hook_statistics.wrap(hook_paths[-1], method_name, hook_method)
+    
+    return hook_method
 
+def load_hook_class(hook_paths):
+    """
+    Loads the hook classes for a list of hook paths, maintaining the correct
+    state of the class returned via get_hook_baseclass() while doing so. 
+    Classes are cached, meaning that each hook file is only loaded once per
+    session. See execute_hook_method() for details.
+    
+    :param hook_paths: List of full paths to hooks, in inheritance order.
+    :returns: The hook class for the last path in the list
+    """
     # keep track of the current base class - this is used when loading hooks to dynamically
     # inherit from the correct base.
     _current_hook_baseclass.value = Hook
     
     for hook_path in hook_paths:
 
-        if not os.path.exists(hook_path):
-            raise TankError("Cannot execute hook '%s' - this file does not exist on disk!" % hook_path)
-
         # look to see if we've already loaded this hook into the cache
         found_hook_class = _hooks_cache.find(hook_path, _current_hook_baseclass.value)         
         if not found_hook_class:
+            
+            # only check the file system when the hook isn't already loaded
+            if not os.path.exists(hook_path):
+                raise TankError("Cannot execute hook '%s' - this file does not exist on disk!" % hook_path)
+            
             # load the hook class from the hook file and cache it - this explicitly looks for a
             # single class from the hook file that is derived from the current base (or 'Hook' for
             # backwards compatibility).
@@ -266,23 +675,8 @@ def execute_hook_method(hook_paths, parent, method_name, **kwargs):
         _current_hook_baseclass.value = found_hook_class
     
     # all class construction done. _current_hook_baseclass contains
-    # the last class we iterated over. This is the one we want to 
-    # instantiate.
-    
-    # instantiate the class
-    hook = _current_hook_baseclass.value(parent)
-    
-    # get the method
-    try:
-        hook_method = getattr(hook, method_name)
-    except AttributeError:
-        raise TankError("Cannot execute hook '%s' - the hook class does not "
-                        "have a '%s' method!" % (hook, method_name))
-    
-    # execute the method
-    ret_val = hook_method(**kwargs)
-    
-    return ret_val
+    # the last class we iterated over. 
+    return _current_hook_baseclass.value
 
 def get_hook_baseclass():
     """
@@ -19,7 +19,9 @@ import traceback
 import inspect
 
 from .errors import TankError
+from . import profiling
 
+@profiling.profiled("loader.load_plugin")
 def load_plugin(plugin_file, valid_base_class, alternate_base_classes = None):
     """
     Load a plugin into memory and extract its single interface class.
@@ -17,16 +17,15 @@ all Tank items in the file system are kept.
 import sqlite3
 import sys
 import os
-
-# use api json to cover py 2.5
-# todo - replace with proper external library  
-from tank_vendor import shotgun_api3  
-json = shotgun_api3.shotgun.json
+import threading
+import Queue
 
 from .platform.engine import show_global_busy, clear_global_busy 
 from .platform import constants
 from .errors import TankError 
 from .util.login import get_current_user
+from .util.shotgun import clone_sg_connection
+from .util.json_lib import json
 
 # Shotgun field definitions to store the path cache data
 SHOTGUN_ENTITY = "FilesystemLocation"
@@ -39,6 +38,9 @@ SG_ENTITY_TYPE_FIELD = "linked_entity_type"
 SG_ENTITY_NAME_FIELD = "code"
 SG_PIPELINE_CONFIG_FIELD = "pipeline_configuration"
 
+# event types logged for folder operations
+SG_FOLDER_EVENT_TYPES = ["Toolkit_Folders_Create", "Toolkit_Folders_Delete"]
+
 class PathCache(object):
     """
     A global cache which holds the mapping between a shotgun entity and a location on disk.
@@ -341,27 +343,13 @@ class PathCache(object):
             # synced. This is a way of detecting that the event log chain is not broken.
             # it could break for example if someone has culled the event log table and in 
             # that case we should fall back on a full sync.
+            # Events are fetched oldest first, in windows of bounded size.
             
             self._log_debug(log, "Fetching folder event log entries...")
             
-            response = self._tk.shotgun.find("EventLogEntry", 
-                                             [ ["event_type", "in", ["Toolkit_Folders_Create", 
-                                                                     "Toolkit_Folders_Delete"]], 
-                                               ["id", "greater_than", (event_log_id - 1)],
-                                               ["project", "is", project_link] ],
-                                             ["id", "meta", "event_type"],
-                                             [{"field_name": "id", "direction": "desc"}] )   
+            response = self._find_folder_events(self._tk.shotgun, project_link, event_log_id - 1)
 
             self._log_debug(log, "Got %s event log entries" % len(response)) 
-        
-            # count creation and deletion entries
-            num_deletions = 0
-            num_creations = 0
-            for r in response:
-                if r["event_type"] == "Toolkit_Folders_Create":
-                    num_creations += 1
-                if r["event_type"] == "Toolkit_Folders_Delete":
-                    num_deletions += 1
                     
             if len(response) == 0 or response[0]["id"] != event_log_id:
                 # there is either no event log data at all or a gap
@@ -370,25 +358,15 @@ class PathCache(object):
                 self._log_debug(log, "Cannot align path cache track marker to SG Event Log. Doing Full Sync instead.")
                 return self._do_full_sync(c, log)        
             
-            elif len(response) == 1 and response[0]["id"] == event_log_id:
+            elif len(response) == 1:
                 # nothing has changed since the last sync
                 self._log_debug(log, "Path cache syncing not necessary - local folders already up to date!") 
                 return []
             
-            elif num_deletions > 0:
-                # some stuff was deleted. fall back on full sync
-                self._log_debug(log, "Deletions detected, doing full sync") 
-
-                return self._do_full_sync(c, log)
-            
-            elif num_creations > 0:
-                # we have a complete trail of increments. 
-                # note that we skip the current entity.
-                return self._do_incremental_sync(c, log, response[1:])
-            
             else:
-                # should never be here
-                raise Exception("Unknown error - please contact support.")
+                # we have a trail of increments. 
+                # note that we skip the current entity.
+                return self._do_incremental_sync(c, log, project_link, response)
 
         finally:       
             c.close()
@@ -614,7 +592,7 @@ class PathCache(object):
             
             # find the max event log id. we will store this in the sync db later.
             sg_data = self._tk.shotgun.find_one("EventLogEntry", 
-                                                [["event_type", "in", ["Toolkit_Folders_Create", "Toolkit_Folders_Delete"]]], 
+                                                [["event_type", "in", SG_FOLDER_EVENT_TYPES]], 
                                                 ["id"], 
                                                 [{"field_name": "id", "direction": "desc"}])
     
@@ -631,21 +609,97 @@ class PathCache(object):
         
         return data
 
-    def _do_incremental_sync(self, cursor, log, sg_data):
+    def _find_folder_events(self, sg, project_link, min_event_log_id):
+        """
+        Returns the next window of folder event log entries for the project,
+        ordered by id from low to high (old to new). At most 
+        PATH_CACHE_SYNC_EVENT_WINDOW_SIZE entries are returned.
+        
+        :param sg: Shotgun API instance to run the query with
+        :param project_link: Project entity dictionary
+        :param min_event_log_id: Only events with an id greater than this are returned
+        :returns: List of event log entry dictionaries with keys id, meta and event_type
+        """
+        return sg.find("EventLogEntry", 
+                       [ ["event_type", "in", SG_FOLDER_EVENT_TYPES], 
+                         ["id", "greater_than", min_event_log_id],
+                         ["project", "is", project_link] ],
+                       ["id", "meta", "event_type"],
+                       [{"field_name": "id", "direction": "asc"}],
+                       limit=constants.PATH_CACHE_SYNC_EVENT_WINDOW_SIZE)
+
+    def _find_folder_events_async(self, project_link, min_event_log_id):
+        """
+        Starts fetching the next window of folder event log entries in a 
+        background thread, using a clone of the tk instance's shotgun connection
+        so that the query runs against the same site with the same credentials.
+        See _find_folder_events() for details.
+        
+        If the connection can't be cloned, the events are fetched straight away.
+        
+        :param project_link: Project entity dictionary
+        :param min_event_log_id: Only events with an id greater than this are returned
+        :returns: Queue which will receive a single (events, exc_info) tuple once
+                  the query has completed. Exactly one of the two is None.
+        """
+        results = Queue.Queue()
+        
+        # tk.shotgun is thread local, so the clone has to be made in this thread
+        sg = clone_sg_connection(self._tk.shotgun)
+        
+        def fetch(sg):
+            """
+            Runs the query and reports the result.
+            """
+            try:
+                results.put((self._find_folder_events(sg, project_link, min_event_log_id), None))
+            except Exception:
+                results.put((None, sys.exc_info()))
+        
+        if sg is None:
+            fetch(self._tk.shotgun)
+            return results
+        
+        def worker():
+            """
+            Runs the query on the cloned connection and closes it afterwards.
+            """
+            try:
+                fetch(sg)
+            finally:
+                try:
+                    sg.close()
+                except Exception:
+                    # the connection may already be closed
+                    pass
+        
+        thread = threading.Thread(target=worker)
+        thread.setDaemon(True)
+        thread.start()
+        return results
+
+    def _do_incremental_sync(self, cursor, log, project_link, sg_data):
         """
         Ensure the local path cache is in sync with Shotgun.
         
-        Patch the existing cache with the events passed via sg_data.
+        Patch the existing cache with the events passed via sg_data and
+        all events following them. Events are processed one window at a time:
+        while the folders for a window are downloaded and added to the path cache,
+        the next window of events is fetched in the background. The sync tracking
+        marker is updated after each window, so an interrupted sync resumes 
+        from the last window applied.
+        
+        If a folder deletion event is encountered, a full sync is done instead.
         
         Assumptions:
-        - sg_data list always contains some entries
-        - sg_data list only contains Toolkit_Folders_Create records
+        - sg_data is the first window of events, as returned by _find_folder_events()
+        - the first entry in sg_data is the event that was last synced
         
         This is a list of dicts ordered by id from low to high (old to new), 
         each with keys
             - id
             - meta
-            - attribute_name
+            - event_type
         
         Example of items:
         {'event_type': 'Toolkit_Folders_Create', 
@@ -656,6 +710,7 @@ class PathCache(object):
         
         :param cursor: Sqlite database cursor
         :param log: Std python logger or None if logging is not required. 
+        :param project_link: Project entity dictionary
         :param sg_data: see details above
         :returns: A list of remote items which were detected, created remotely
                   and not existing in this path cache. These are returned as a list of 
@@ -664,31 +719,80 @@ class PathCache(object):
                     - metadata
                     - path 
         """
-
-        if len(sg_data) == 0:
-            return []
+        return_data = []
         
-        # find the max event log id in sg_data. We will store this in the sync db later.
-        max_event_log_id = max( [x["id"] for x in sg_data] )
+        # the first event has already been synced
+        window = sg_data
+        events = sg_data[1:]
         
-        created_folder_ids = []
-        for d in sg_data:
-            if d["event_type"] == "Toolkit_Folders_Create":
-                # this is a creation request! Replay it on our database
-                created_folder_ids.extend( d["meta"]["sg_folder_ids"] )
-            else:
-                # should never come here
-                raise Exception("Unsupported event type '%s'" % d)
-                
-        if len(created_folder_ids) == 0:
-            # one or more folder creation events were detected but none of them had actually
-            # resulted in any actual folders being created!
-            return []
+        while len(events) > 0:
+        
+            if len([x for x in events if x["event_type"] == "Toolkit_Folders_Delete"]) > 0:
+                # some stuff was deleted. fall back on full sync
+                self._log_debug(log, "Deletions detected, doing full sync") 
+                return self._do_full_sync(cursor, log)
+        
+            # find the max event log id in this window. We will store this in the sync db later.
+            max_event_log_id = max( [x["id"] for x in events] )
+            
+            # a full window means that there may be more events - start fetching
+            # these while this window is being processed
+            pending_events = None
+            if len(window) >= constants.PATH_CACHE_SYNC_EVENT_WINDOW_SIZE:
+                pending_events = self._find_folder_events_async(project_link, max_event_log_id)
+        
+            try:
+                created_folder_ids = []
+                for d in events:
+                    if d["event_type"] == "Toolkit_Folders_Create":
+                        # this is a creation request! Replay it on our database
+                        created_folder_ids.extend( d["meta"]["sg_folder_ids"] )
+                    else:
+                        # should never come here
+                        raise Exception("Unsupported event type '%s'" % d)
+                    
+                if len(created_folder_ids) == 0:
+                    # one or more folder creation events were detected but none of them had actually
+                    # resulted in any actual folders being created!
+                    self._set_event_log_sync_marker(cursor, max_event_log_id)
                 
-        self._log_debug(log, "Updating folders - Applying %s updates..." % len(created_folder_ids)) 
+                else:
+                    self._log_debug(log, "Updating folders - Applying %s updates..." % len(created_folder_ids)) 
+                    return_data.extend( self._replay_folder_entities(cursor, log, max_event_log_id, created_folder_ids) )
+            except:
+                exc_info = sys.exc_info()
+                if pending_events is not None:
+                    # don't leave the next window being fetched in the background
+                    pending_events.get()
+                raise exc_info[0], exc_info[1], exc_info[2]
+            
+            if pending_events is None:
+                break
+            
+            (window, exc_info) = pending_events.get()
+            if exc_info:
+                # re-raise with the traceback of the thread that fetched the window
+                raise exc_info[0], exc_info[1], exc_info[2]
+            events = window
+            
+            self._log_debug(log, "Got %s more event log entries" % len(events))
 
-        return self._replay_folder_entities(cursor, log, max_event_log_id, created_folder_ids)
+        return return_data
 
+    def _set_event_log_sync_marker(self, cursor, max_event_log_id):
+        """
+        Stores the id of the last event log entry that the path cache
+        has been synchronized with and commits the current transaction.
+        
+        :param cursor: Sqlite database cursor
+        :param max_event_log_id: Id of the last synchronized event log entry
+        """
+        # note - we don't maintain a list of event log entries but just a single
+        # value in the db, so start by clearing the table.
+        cursor.execute("DELETE FROM event_log_sync")
+        cursor.execute("INSERT INTO event_log_sync(last_id) VALUES(?)", (max_event_log_id, ))
+            
+        self._connection.commit()
 
     def _replay_folder_entities(self, cursor, log, max_event_log_id, ids=None):
         """
@@ -834,12 +938,7 @@ class PathCache(object):
                 pass  
             
         # lastly, id of this event log entry for purpose of future syncing
-        # note - we don't maintain a list of event log entries but just a single
-        # value in the db, so start by clearing the table.
-        cursor.execute("DELETE FROM event_log_sync")
-        cursor.execute("INSERT INTO event_log_sync(last_id) VALUES(?)", (max_event_log_id, ))
-            
-        self._connection.commit()
+        self._set_event_log_sync_marker(cursor, max_event_log_id)
 
         return return_data
 
@@ -23,6 +23,8 @@ from .deploy import util
 from .platform import constants
 from .platform.environment import Environment
 from .util import shotgun
+from .util import yaml_cache
+from . import profiling
 from . import hook
 from . import pipelineconfig_utils
 from . import template_includes
@@ -34,6 +36,7 @@ class PipelineConfiguration(object):
     create directly via constructor.
     """
 
+    @profiling.profiled("PipelineConfiguration.__init__")
     def __init__(self, pipeline_configuration_path):
         """
         Constructor. Do not call this directly, use the factory methods
@@ -504,6 +507,49 @@ class PipelineConfiguration(object):
         """
         return os.path.join(self._pc_root, "cache")
 
+    def get_cache_location(self, tk, cache_name):
+        """
+        returns the folder where the core caches data of the given type for
+        this configuration locally for the current user, as defined by the
+        cache_location core hook. The folder may not exist yet. 
+        May connect to Shotgun to retrieve the project and configuration ids.
+        
+        :param tk: Sgtk API instance to pass to the hook as its parent
+        :param cache_name: The name of the cache, e.g. 'environments'
+        :returns: Path to a folder on disk
+        """
+        return self.execute_core_hook_method_internal(constants.CACHE_LOCATION_HOOK_NAME,
+                                                      "configuration_cache",
+                                                      parent=tk,
+                                                      project_id=self.get_project_id(),
+                                                      pipeline_configuration_id=self.get_shotgun_id(),
+                                                      cache_name=cache_name)
+
+    def get_environment_cache_location(self, tk):
+        """
+        returns the folder where compiled environment data is cached.
+        
+        :param tk: Sgtk API instance to pass to the cache_location hook
+        """
+        return self.get_cache_location(tk, "environments")
+
+    def get_validation_cache_location(self, tk):
+        """
+        returns the folder where the results of settings validation are cached.
+        
+        :param tk: Sgtk API instance to pass to the cache_location hook
+        """
+        return self.get_cache_location(tk, "validation")
+
+    def get_app_commands_cache_location(self, tk):
+        """
+        returns the folder where the commands registered by apps are cached.
+        This is used when apps are loaded lazily.
+        
+        :param tk: Sgtk API instance to pass to the cache_location hook
+        """
+        return self.get_cache_location(tk, "app_commands")
+
     ########################################################################################
     # configuration data access
 
@@ -539,11 +585,7 @@ class PipelineConfiguration(object):
         templates_file = os.path.join(self._pc_root, "config", "core", constants.CONTENT_TEMPLATES_FILE)
 
         if os.path.exists(templates_file):
-            config_file = open(templates_file, "r")
-            try:
-                data = yaml.load(config_file) or {}
-            finally:
-                config_file.close()
+            data = yaml_cache.load_yaml(templates_file) or {}
         else:
             data = {}
 
@@ -556,6 +598,69 @@ class PipelineConfiguration(object):
     ########################################################################################
     # helpers and internal
 
+    def _get_core_hook_paths(self, hook_name, inheritance):
+        """
+        Resolves the hook files to use for a core hook. Results are cached
+        per session so that the file system is only checked once for each 
+        hook and configuration. Use hook.clear_hooks_cache() to force the 
+        paths to be resolved again.
+        
+        :param hook_name: Name of hook to resolve paths for
+        :param inheritance: If True, return the full inheritance chain for 
+                            the hook (new style hook). If False, only return the
+                            single hook file that should be executed (old style hook).
+        :returns: List of hook paths
+        """
+        hook_folder = self.get_core_hooks_location()
+        cache_key = (self._pc_root, hook_name, inheritance)
+        
+        hook_paths = hook.find_hook_paths(cache_key)
+        if hook_paths is not None:
+            return hook_paths
+
+        file_name = "%s.py" % hook_name
+        hooks_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "hooks"))
+        core_hook_path = os.path.join(hooks_path, file_name)
+        config_hook_path = os.path.join(hook_folder, file_name)
+        
+        if inheritance:
+            # this is a new style hook which supports an inheritance chain - 
+            # first add the built-in core hook to the chain and then
+            # add a custom hook if that exists.
+            hook_paths = [core_hook_path]
+            if os.path.exists(config_hook_path):
+                hook_paths.append(config_hook_path)
+        
+        elif os.path.exists(config_hook_path):
+            # first look for the hook in the pipeline configuration
+            hook_paths = [config_hook_path]
+            
+        else:
+            # no custom hook detected in the pipeline configuration
+            # fall back on the hooks that come with the currently running version
+            # of the core API.
+            hook_paths = [core_hook_path]
+        
+        hook.add_hook_paths(cache_key, hook_paths, hook_folder)
+        return hook_paths
+
+    def preload_core_hooks(self):
+        """
+        Loads all core hooks into memory, so that the work of resolving and
+        importing them is carried out up front rather than on first execution.
+        
+        Hooks which fail to load are skipped - any errors will be reported
+        when the hook is executed.
+        """
+        hooks_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "hooks"))
+        for hook_file in glob.glob(os.path.join(hooks_path, "*.py")):
+            (hook_name, _) = os.path.splitext(os.path.basename(hook_file))
+            inheritance = hook_name in constants.CORE_HOOKS_WITH_INHERITANCE
+            try:
+                hook.load_hook_class(self._get_core_hook_paths(hook_name, inheritance))
+            except TankError:
+                pass
+
     def execute_core_hook_internal(self, hook_name, parent, **kwargs):
         """
         Executes an old-style core hook, passing it any keyword arguments supplied.
@@ -569,19 +674,8 @@ class PipelineConfiguration(object):
         :param **kwargs: Named arguments to pass to the hook
         :returns: Return value of the hook.
         """
-        # first look for the hook in the pipeline configuration
-        # if it does not exist, fall back onto core API default implementation.
-        hook_folder = self.get_core_hooks_location()
-        file_name = "%s.py" % hook_name
-        hook_path = os.path.join(hook_folder, file_name)
-        if not os.path.exists(hook_path):
-            # no custom hook detected in the pipeline configuration
-            # fall back on the hooks that come with the currently running version
-            # of the core API.
-            hooks_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "hooks"))
-            hook_path = os.path.join(hooks_path, file_name)
-
-        return hook.execute_hook(hook_path, parent, **kwargs)
+        hook_paths = self._get_core_hook_paths(hook_name, inheritance=False)
+        return hook.execute_hook(hook_paths[0], parent, **kwargs)
 
     def execute_core_hook_method_internal(self, hook_name, method_name, parent, **kwargs):
         """
@@ -597,18 +691,22 @@ class PipelineConfiguration(object):
         :param **kwargs: Named arguments to pass to the hook
         :returns: Return value of the hook.
         """
-        # this is a new style hook which supports an inheritance chain
-        
-        # first add the built-in core hook to the chain
-        file_name = "%s.py" % hook_name
-        hooks_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "hooks"))
-        hook_paths = [os.path.join(hooks_path, file_name)]
-        
-        # now add a custom hook if that exists.
-        hook_folder = self.get_core_hooks_location()        
-        hook_path = os.path.join(hook_folder, file_name)
-        if os.path.exists(hook_path):
-            hook_paths.append(hook_path)
-            
+        hook_paths = self._get_core_hook_paths(hook_name, inheritance=True)
         return hook.execute_hook_method(hook_paths, parent, method_name, **kwargs)
 
+    def get_core_hook_callable_internal(self, hook_name, method_name, parent):
+        """
+        Returns a core hook method, ready to be called. 
+        
+        Typically you don't want to execute this method but instead
+        the tk.get_core_hook_callable method. Only use this one if you for 
+        some reason do not have a tk object available.
+        
+        :param hook_name: Name of hook to get a method for.
+        :param method_name: Name of hook method to return. If None, the default
+                            method of an old-style core hook is returned. 
+        :param parent: Parent object to pass down to the hook
+        :returns: Hook method, ready to be called
+        """
+        hook_paths = self._get_core_hook_paths(hook_name, inheritance=(method_name is not None))
+        return hook.get_hook_callable(hook_paths, parent, method_name)
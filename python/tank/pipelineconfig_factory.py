@@ -10,15 +10,21 @@
 
 import os
 import sys
-import urlparse
+import time
+import sqlite3
+import threading
 import collections
 import cPickle as pickle
 
 from .errors import TankError
 from .platform import constants 
 from .util import shotgun
+from .util import yaml_cache
+from . import profiling
 from . import pipelineconfig_utils
 from .pipelineconfig import PipelineConfiguration
+from .template import read_templates, copy_templates
+from . import template_includes
 
 
 
@@ -117,6 +123,7 @@ def _from_entity(entity_type, entity_id, force_reread_shotgun_cache):
 
 
 
+@profiling.profiled("pipelineconfig_factory.from_path")
 def from_path(path):
     """
     Factory method that constructs a pipeline configuration given a path on disk.
@@ -293,10 +300,12 @@ def _get_pipeline_configs_for_path(path, data):
     Given a path on disk and a cache data structure, return a list of
     associated pipeline configurations.
     
-    Based on the Shotgun cache data, generates a list of project root locations.
-    These are then compared (case insensitively) against the given path and 
-    if it is determined that the input path belongs to any of these project
-    roots, the list of pipeline configuration objects for that root is returned.
+    The Shotgun cache data holds an index of project root locations. The given
+    path and its parent paths are looked up (case insensitively) in this index, 
+    most specific path first, and if it is determined that the input path belongs 
+    to any of these project roots, the list of pipeline configuration objects for 
+    that root is returned. The cost of this is proportional to the depth of the 
+    path, regardless of the number of projects and storages.
     
     the return data structure is a list of dicts, each dict containing the 
     following fields:
@@ -313,6 +322,44 @@ def _get_pipeline_configs_for_path(path, data):
     :param data: Cache data chunk, obtained using _get_pipeline_configs()
     :returns: list of pipeline configurations matching the path, [] if no match.
     """
+    path_index = data.get("path_index")
+    if path_index is None:
+        # the cached data doesn't include an index - build it on the fly
+        path_index = _build_path_index(data)
+    
+    # look at the path we passed in - see if any of the project folders 
+    # in the index is a parent path, starting with the most specific path. 
+    # (like the SG API, this logic is case preserving, not case insensitive)
+    # Either:
+    # direct match: path: /mnt/proj_x == project path: /mnt/proj_x
+    # child path: path: /mnt/proj_x/foo/bar starts with /mnt/proj_x/
+    path_lower = os.path.normpath(path).lower()
+    while True:
+        if path_lower in path_index:
+            # found a match! Return the associated list of pipeline configurations
+            return path_index[path_lower]
+        
+        parent_path = os.path.dirname(path_lower)
+        if parent_path == path_lower:
+            # reached the root
+            break
+        path_lower = parent_path
+    
+    # no match!
+    return []
+    
+def _build_path_index(data):
+    """
+    Builds an index of project root locations for the current os, used to look 
+    up the pipeline configurations for a path. 
+    
+    Project root locations are computed from the Shotgun cache data by combining
+    each local storage with the project names of the pipeline configurations.
+    
+    :param data: Cache data chunk, obtained using _get_pipeline_configs()
+    :returns: Dictionary keyed by normalized, lower case project paths with
+              lists of pipeline configuration dicts as values.
+    """
     platform_lookup = {"linux2": "linux_path", "win32": "windows_path", "darwin": "mac_path" }
     
     # step 1 - extract all storages for the current os
@@ -323,35 +370,17 @@ def _get_pipeline_configs_for_path(path, data):
             storages.append(storage_path)
     
     # step 2 - build a dict of storage project paths and associate with project id
-    project_paths = collections.defaultdict(list)
+    path_index = collections.defaultdict(list)
     for pc in data["pipeline_configurations"]:
-
         for s in storages:
             # all pipeline configurations are associated
             # with a project which has a tank_name set
             project_path = os.path.join(s, pc["project.Project.tank_name"])
             # associate this path with the pipeline configuration
-            project_paths[project_path].append(pc)
+            path_index[os.path.normpath(project_path).lower()].append(pc)
     
-    # step 3 - look at the path we passed in - see if any of the computed
-    # project folders are determined to be a parent path
-    for project_path in project_paths:
-        
-        # (like the SG API, this logic is case preserving, not case insensitive)
-        path_lower = path.lower()
-        proj_path_lower = project_path.lower()
-        # check if the path matches. Either
-        # direct match: path: /mnt/proj_x == project path: /mnt/proj_x
-        # child path: path: /mnt/proj_x/foo/bar starts with /mnt/proj_x/
-        if path_lower == proj_path_lower or path_lower.startswith("%s%s" % (proj_path_lower, os.path.sep)):
-            # found a match! Return the associated list of pipeline configurations
-            return project_paths[project_path]
+    return dict(path_index)
     
-    # no match!
-    return []
-    
-    
-
 def _get_pipeline_configs_for_project(project_id, data):
     """
     Given a project id, return a list of associated pipeline configurations.
@@ -412,10 +441,10 @@ def __get_project_id(entity_type, entity_id, force=False):
     if force == False:
         # try to load cache first
         # if that doesn't work, fall back on shotgun
-        cache = _load_lookup_cache()
-        if cache and cache.get(CACHE_KEY):
+        cached_data = _get_from_lookup_cache(CACHE_KEY)
+        if cached_data:
             # cache hit!
-            return cache.get(CACHE_KEY)
+            return cached_data
          
     # ok, so either we are force recomputing the cache or the cache wasn't there
     sg = shotgun.get_sg_connection()
@@ -467,10 +496,10 @@ def _get_pipeline_configs(force=False):
     if force == False:
         # try to load cache first
         # if that doesn't work, fall back on shotgun
-        cache = _load_lookup_cache()
-        if cache and cache.get(CACHE_KEY):
+        cached_data = _get_from_lookup_cache(CACHE_KEY)
+        if cached_data:
             # cache hit!
-            return cache.get(CACHE_KEY)
+            return cached_data
          
     # ok, so either we are force recomputing the cache or the cache wasn't there
     sg = shotgun.get_sg_connection()
@@ -491,75 +520,117 @@ def _get_pipeline_configs(force=False):
                                 "project", 
                                 "project.Project.tank_name"])
 
-    # cache this data
+    # cache this data, together with an index to quickly look up the 
+    # pipeline configurations associated with a path
     data = {"local_storages": local_storages, "pipeline_configurations": pipeline_configs}
+    data["path_index"] = _build_path_index(data)
     _add_to_lookup_cache(CACHE_KEY, data)
     
     return data
 
-def _load_lookup_cache():
+def _connect_lookup_cache(create=False):
     """
-    Load lookup cache file from disk.
+    Opens a connection to the lookup cache database. 
     
-    :returns: cache cache, as constructed by the _add_to_lookup_cache method
-    """
-    cache_file = _get_cache_location()
-    cache_data = {}
-    
-    if os.path.exists(cache_file):
-        # try to load the cache, fail gracefully if this fails for whatever reason
-        try:
-            fh = open(cache_file, "rb")
-            try:
-                cache_data = pickle.load(fh)
-            finally:
-                fh.close()
-        except:
-            # failed to load cache from file. Continue silently. 
-            pass 
-        
-    return cache_data
-        
-def _add_to_lookup_cache(key, data):
-    """
-    Add a key to the lookup cache. This method will silently
-    fail if the cache cannot be operated on.
+    The cache uses the default (rollback) journal mode so that it keeps working 
+    on network file systems. Readers never write to the database - the cache 
+    file and its schema are only created by writers.
     
-    :param key: Dictionary key for the cache
-    :param data: Data to associate with the dictionary key
+    :param create: If True, the cache file and its schema will be created if 
+                   they don't exist.
+    :returns: sqlite3 connection object or None if create is False and the
+              cache file doesn't exist.
     """
-    
-    # first load the content
-    cache_data = _load_lookup_cache()
-    # update
-    cache_data[key] = data
-    # and write out the cache
     cache_file = _get_cache_location()
     
+    if not create:
+        if not os.path.exists(cache_file):
+            return None
+        # wait for other processes writing to the cache rather than failing straight away
+        return sqlite3.connect(cache_file, timeout=constants.SITE_INIT_CACHE_LOCK_TIMEOUT)
+    
     old_umask = os.umask(0)
     try:
-        
         # try to create the cache folder with as open permissions as possible
         cache_dir = os.path.dirname(cache_file)
         if not os.path.exists(cache_dir):
             os.makedirs(cache_dir, 0777)
         
-        # write cache file
-        fh = open(cache_file, "wb")
+        created = not os.path.exists(cache_file)
+        
+        connection = sqlite3.connect(cache_file, timeout=constants.SITE_INIT_CACHE_LOCK_TIMEOUT)
+        
+        if created:
+            # ensure the cache file has got open permissions
+            os.chmod(cache_file, 0666)
+    finally:
+        os.umask(old_umask)
+        
+    # another process may have created the file but not the schema yet,
+    # so always make sure the table exists before writing.
+    try:
+        connection.execute("CREATE TABLE IF NOT EXISTS lookup_cache (key TEXT PRIMARY KEY, "
+                           "data BLOB, created REAL)")
+    except:
+        connection.close()
+        raise
+        
+    return connection
+
+def _get_from_lookup_cache(key):
+    """
+    Reads a single item from the lookup cache. This method will silently 
+    fail if the cache cannot be operated on.
+    
+    :param key: Key to look up
+    :returns: The data associated with the key, or None if the key was not
+              found or has expired.
+    """
+    data = None
+    try:
+        connection = _connect_lookup_cache()
+        if connection is None:
+            # no cache yet
+            return None
         try:
-            cache_data = pickle.dump(cache_data, fh)
+            res = connection.execute("SELECT data FROM lookup_cache WHERE key = ? AND created > ?", 
+                                     (key, time.time() - constants.SITE_INIT_CACHE_TTL))
+            row = res.fetchone()
+            if row:
+                data = pickle.loads(str(row[0]))
         finally:
-            fh.close()
-        # and ensure the cache file has got open permissions
-        os.chmod(cache_file, 0666)
+            connection.close()
+    except:
+        # failed to read from the cache. Continue silently.
+        pass
     
+    return data
+        
+def _add_to_lookup_cache(key, data):
+    """
+    Add a key to the lookup cache. Only the given key is written and the update 
+    is atomic, so processes can safely update the cache concurrently. Entries which
+    have expired are removed. This method will silently fail if the cache cannot 
+    be operated on.
+    
+    :param key: Key for the cache
+    :param data: Data to associate with the key. This needs to be picklable.
+    """
+    try:
+        connection = _connect_lookup_cache(create=True)
+        try:
+            now = time.time()
+            connection.execute("DELETE FROM lookup_cache WHERE created < ?", 
+                               (now - constants.SITE_INIT_CACHE_TTL, ))
+            connection.execute("INSERT OR REPLACE INTO lookup_cache(key, data, created) VALUES(?, ?, ?)", 
+                               (key, sqlite3.Binary(pickle.dumps(data, pickle.HIGHEST_PROTOCOL)), now))
+            connection.commit()
+        finally:
+            connection.close()
     except:
         # silently continue in case exceptions are raised
         pass
     
-    finally:
-        os.umask(old_umask)
-    
 def _get_cache_location():    
     """
     Get the location of the initializtion lookup cache.
@@ -567,27 +638,159 @@ def _get_cache_location():
     
     :returns: A path on disk to the cache file
     """
+    # macosx: ~/Library/Caches/Shotgun/SITE_NAME/toolkit_init.db
+    # windows: $APPDATA/Shotgun/SITE_NAME/toolkit_init.db
+    # linux: ~/.shotgun/SITE_NAME/toolkit_init.db
+    return os.path.join(pipelineconfig_utils.get_local_site_cache_location(), 
+                        constants.SITE_INIT_CACHE_FILE_NAME)    
 
-    # optimized version of creating an sg instance and then calling sg.base_url
-    # this is to avoid connecting to shotgun if possible.
-    sg_base_url = shotgun.get_associated_sg_base_url()
 
-    # the default implementation will place things in the following locations:
-    # macosx: ~/Library/Caches/Shotgun/SITE_NAME/toolkit_init.cache
-    # windows: $APPDATA/Shotgun/SITE_NAME/toolkit_init.cache
-    # linux: ~/.shotgun/SITE_NAME/toolkit_init.cache
+
+#################################################################################################################
+# in-process cache of templates
+
+class _TemplatesCache(object):
+    """
+    A thread-safe, bounded cache of the templates read for pipeline configurations, 
+    keyed by pipeline configuration path. Entries are validated against the 
+    modification times and sizes of the core configuration files and of all files 
+    included by the templates file.
+    """
     
-    # first establish the root location
-    if sys.platform == "darwin":
-        root = os.path.expanduser("~/Library/Caches/Shotgun")
-    elif sys.platform == "win32":
-        root = os.path.join(os.environ["APPDATA"], "Shotgun")
-    elif sys.platform.startswith("linux"):
-        root = os.path.expanduser("~/.shotgun")
+    # the maximum number of pipeline configurations to keep templates for
+    MAX_ENTRIES = 10
+    
+    # core configuration files that the templates are based on
+    CORE_CONFIG_FILES = ["pipeline_configuration.yml",
+                         "install_location.yml",
+                         constants.STORAGE_ROOTS_FILE,
+                         constants.CONTENT_TEMPLATES_FILE]
+    
+    def __init__(self):
+        """
+        Construction
+        """
+        self._cache = {}
+        # paths in the cache, least recently used first
+        self._keys = []
+        self._cache_lock = threading.Lock()
+        
+    def clear(self):
+        """
+        Clear the cache
+        """
+        self._cache_lock.acquire()
+        try:
+            self._cache = {}
+            self._keys = []
+        finally:
+            self._cache_lock.release()
+            
+    def get_signature(self, pc_path):
+        """
+        Returns the current signature of the files that the templates of a 
+        pipeline configuration are read from. The signature is based on the 
+        modification time and size of each file, so computing it doesn't
+        read the files themselves.
+        
+        :param pc_path: Path to the pipeline configuration
+        :returns: Signature which changes whenever any of the files are modified or
+                  None if the files could not be read.
+        """
+        core_path = os.path.join(pc_path, "config", "core")
+        files = [os.path.join(core_path, x) for x in self.CORE_CONFIG_FILES]
+        
+        templates_file = os.path.join(core_path, constants.CONTENT_TEMPLATES_FILE)
+        if os.path.exists(templates_file):
+            try:
+                # parsed files are cached by the yaml cache, so this is cheap 
+                # unless the templates have changed
+                data = yaml_cache.load_yaml(templates_file) or {}
+                files.extend(template_includes.get_include_files(templates_file, data))
+            except Exception:
+                # let the template reading code report the error
+                return None
+        
+        signature = []
+        for path in files:
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime, stat.st_size))
+            except OSError:
+                # the file doesn't exist
+                signature.append((path, None, None))
+        return tuple(signature)
+    
+    def find(self, pc_path, signature):
+        """
+        Find the cached templates for a pipeline configuration.
+        
+        :param pc_path: Path to the pipeline configuration
+        :param signature: Current signature, as returned by get_signature()
+        :returns: Dictionary of templates or None if not found.
+        """
+        self._cache_lock.acquire()
+        try:
+            entry = self._cache.get(pc_path)
+            if entry is None or entry["signature"] != signature:
+                # not found or the configuration has changed on disk
+                return None
+            # mark the entry as the most recently used
+            self._keys.remove(pc_path)
+            self._keys.append(pc_path)
+            return entry["templates"]
+        finally:
+            self._cache_lock.release()
+            
+    def add(self, pc_path, signature, templates):
+        """
+        Add the templates for a pipeline configuration to the cache, evicting 
+        the least recently used entry if the cache is full.
+        
+        :param pc_path: Path to the pipeline configuration
+        :param signature: Signature of the files the templates were read from
+        :param templates: Dictionary of templates
+        """
+        self._cache_lock.acquire()
+        try:
+            self._cache[pc_path] = {"signature": signature, "templates": templates}
+            if pc_path in self._keys:
+                self._keys.remove(pc_path)
+            self._keys.append(pc_path)
+            while len(self._keys) > self.MAX_ENTRIES:
+                del self._cache[self._keys.pop(0)]
+        finally:
+            self._cache_lock.release()
+
+_templates_cache = _TemplatesCache()
 
-    # get site only; https://www.foo.com:8080 -> www.foo.com
-    base_url = urlparse.urlparse(sg_base_url)[1].split(":")[0]
+def get_templates(pc, force_reload=False):
+    """
+    Returns the templates for a pipeline configuration. Templates are only 
+    read again when the files they are defined in have changed and are shared
+    between all API instances using the same pipeline configuration.
+    
+    :param pc: Pipeline configuration object
+    :param force_reload: Set this to True to always read the templates from disk
+    :returns: Dictionary of form {template name: template object}. The dictionary
+              and the templates are copies which can safely be modified by the caller.
+    """
+    signature = _templates_cache.get_signature(pc.get_path())
+    
+    templates = None
+    if not force_reload and signature is not None:
+        templates = _templates_cache.find(pc.get_path(), signature)
+    
+    if templates is None:
+        templates = read_templates(pc)
+        if signature is not None:
+            _templates_cache.add(pc.get_path(), signature, templates)
     
-    # now structure things by site, project id, and pipeline config id
-    return os.path.join(root, base_url, constants.SITE_INIT_CACHE_FILE_NAME)    
+    return copy_templates(templates)
 
+def clear_pipeline_configuration_cache():
+    """
+    Clears the in-process cache of templates. Subsequent calls to get_templates()
+    read the templates from disk.
+    """
+    _templates_cache.clear()
@@ -14,11 +14,12 @@ across storages, configurations etc.
 """
 import os
 import sys
-
-from tank_vendor import yaml
+import urlparse
 
 from .errors import TankError
 from .platform import constants
+from .util import shotgun
+from .util import yaml_cache
 
 
 def is_localized(pipeline_config_path):
@@ -62,16 +63,13 @@ def get_metadata(pipeline_config_path):
     if not os.path.exists(cfg_yml):
         raise TankError("Configuration metadata file '%s' missing! Please contact support." % cfg_yml)
 
-    fh = open(cfg_yml, "rt")
     try:
-        data = yaml.load(fh)
+        data = yaml_cache.load_yaml(cfg_yml)
         if data is None:
             raise Exception("File contains no data!")
     except Exception, e:
         raise TankError("Looks like a config file is corrupt. Please contact "
                         "support! File: '%s' Error: %s" % (cfg_yml, e))
-    finally:
-        fh.close()
 
     return data
 
@@ -109,15 +107,12 @@ def get_roots_metadata(pipeline_config_path):
     if not os.path.exists(roots_yml):
         raise TankError("Roots metadata file '%s' missing! Please contact support." % roots_yml)
 
-    fh = open(roots_yml, "rt")
     try:
         # if file is empty, initializae with empty dict...
-        data = yaml.load(fh) or {}
+        data = yaml_cache.load_yaml(roots_yml) or {}
     except Exception, e:
         raise TankError("Looks like the roots file is corrupt. Please contact "
                         "support! File: '%s' Error: %s" % (roots_yml, e))
-    finally:
-        fh.close()
 
     # if there are more than zero storages defined, ensure one of them is the primary storage
     if len(data) > 0 and constants.PRIMARY_STORAGE_NAME not in data:
@@ -193,6 +188,40 @@ def _sanitize_path(path, separator):
 
 
 
+####################################################################################################################
+# Local cache utils
+
+def get_local_site_cache_location():
+    """
+    Returns the root folder for the caches of the associated shotgun site
+    which are local to the current user. This follows the layout of the 
+    default cache_location core hook. Just computes the path, no I/O.
+    
+    :returns: A path on disk to the cache folder
+    """
+    # optimized version of creating an sg instance and then calling sg.base_url
+    # this is to avoid connecting to shotgun if possible.
+    sg_base_url = shotgun.get_associated_sg_base_url()
+
+    # the default implementation will place things in the following locations:
+    # macosx: ~/Library/Caches/Shotgun/SITE_NAME
+    # windows: $APPDATA/Shotgun/SITE_NAME
+    # linux: ~/.shotgun/SITE_NAME
+    
+    # first establish the root location
+    if sys.platform == "darwin":
+        root = os.path.expanduser("~/Library/Caches/Shotgun")
+    elif sys.platform == "win32":
+        root = os.path.join(os.environ["APPDATA"], "Shotgun")
+    elif sys.platform.startswith("linux"):
+        root = os.path.expanduser("~/.shotgun")
+
+    # get site only; https://www.foo.com:8080 -> www.foo.com
+    base_url = urlparse.urlparse(sg_base_url)[1].split(":")[0]
+    
+    return os.path.join(root, base_url)
+
+
 ####################################################################################################################
 # Core API resolve utils 
 
@@ -325,11 +354,7 @@ def _get_install_locations(path):
 
     # load the config file
     try:
-        open_file = open(location_file)
-        try:
-            location_data = yaml.load(open_file)
-        finally:
-            open_file.close()
+        location_data = yaml_cache.load_yaml(location_file)
     except Exception, error:
         raise TankError("Cannot load core config file '%s'. Error: %s" % (location_file, error))
 
@@ -401,11 +426,7 @@ def _get_version_from_manifest(info_yml_path):
     :returns: Always a string, 'unknown' if data cannot be found
     """
     try:
-        info_fh = open(info_yml_path, "r")
-        try:
-            data = yaml.load(info_fh)
-        finally:
-            info_fh.close()
+        data = yaml_cache.load_yaml(info_yml_path)
         data = str(data.get("version", "unknown"))
     except:
         data = "unknown"
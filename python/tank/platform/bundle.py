@@ -576,6 +576,46 @@ class TankBundle(object):
         :param method_name: The method in the hook to execute, or None if the default hook method
                             is supposed to be executed.
         """
+        resolved_hook_paths = self.__get_hook_paths(settings_name, hook_expression)
+        
+        ret_value = hook.execute_hook_method(resolved_hook_paths, self, method_name, **kwargs)
+        
+        return ret_value
+
+    def __get_hook_paths(self, settings_name, hook_expression):
+        """
+        Returns the full inheritance chain of hook files for a hook expression.
+        See __execute_hook_internal for details about the supported formats.
+        
+        Resolved paths are stored in the hook paths cache, since resolving them 
+        involves reading the manifest and checking the file system. The hook 
+        expression and the values of any environment variables it refers to are
+        part of the cache key, so a change to either results in the paths being 
+        resolved again. The cache is cleared via hook.clear_hooks_cache(), which 
+        happens every time an engine is destroyed.
+        
+        :param settings_name: If this hook is associated with a setting in the bundle, this is the
+                              name of that setting, otherwise None.
+        :param hook_expression: The path expression to a hook.
+        :returns: List of full paths to hook files, in inheritance order.
+        """
+        # the resolved paths depend on the bundle, the environment it is running in 
+        # and the engine, which may be referred to by the default value in the manifest.
+        # engines have no engine attribute
+        engine_name = getattr(getattr(self, "engine", None), "name", None)
+        env_var_values = tuple([os.environ.get(x) for x in re.findall("\{\$([^\}]+)\}", hook_expression)])
+        cache_key = ("bundle_hook", 
+                     self.disk_location, 
+                     self.__environment.disk_location, 
+                     engine_name, 
+                     settings_name, 
+                     hook_expression, 
+                     env_var_values)
+        
+        resolved_hook_paths = hook.find_hook_paths(cache_key)
+        if resolved_hook_paths is not None:
+            return resolved_hook_paths
+        
         # split up the config value into distinct items
         unresolved_hook_paths = hook_expression.split(":")
         
@@ -637,12 +677,10 @@ class TankBundle(object):
         
         # resolve paths into actual file paths
         resolved_hook_paths = [self.__resolve_hook_path(settings_name, x) for x in unresolved_hook_paths]
-                
-        ret_value = hook.execute_hook_method(resolved_hook_paths, self, method_name, **kwargs)
-        
-        return ret_value
-
         
+        # the existence of the default hook is checked in the bundle's hooks folder
+        hook.add_hook_paths(cache_key, resolved_hook_paths, os.path.join(self.disk_location, "hooks"))
+        return resolved_hook_paths
 
     def __post_process_settings_r(self, key, value, schema):
         """
@@ -87,6 +87,39 @@ CACHE_LOCATION_HOOK_NAME = "cache_location"
 # hook to get current login
 CURRENT_LOGIN_HOOK_NAME = "get_current_login"
 
+# core hooks which are executed as new style hooks, supporting methods and inheritance
+CORE_HOOKS_WITH_INHERITANCE = [CACHE_LOCATION_HOOK_NAME]
+
+# environment variable holding the interval, in seconds, at which cached hook 
+# paths are revalidated against the file system. If not set, cached hook paths 
+# are only refreshed when the hooks cache is cleared.
+HOOK_CACHE_CHECK_INTERVAL_ENV_VAR = "TANK_HOOK_CACHE_CHECK_INTERVAL"
+
+# environment variable to turn on the collection of hook execution statistics
+HOOK_PROFILING_ENV_VAR = "TANK_HOOK_PROFILING"
+
+# environment variable to turn on the collection of shotgun call statistics
+SG_PROFILING_ENV_VAR = "TANK_SG_PROFILING"
+
+# upper bounds, in seconds, of the latency buckets of shotgun call statistics
+SG_PROFILING_LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+# environment variable to turn on the profiling of startup phases. If set to a file path,
+# the trace is appended to that file once an engine has started, otherwise it is printed.
+STARTUP_PROFILING_ENV_VAR = "TANK_STARTUP_PROFILING"
+
+# the maximum number of top level phases kept by the startup profiler. Instrumented
+# code such as hook loading keeps being recorded after startup, so once the limit is
+# reached the oldest phases are discarded.
+STARTUP_PROFILING_MAX_FRAMES = 1000
+
+# environment variable to turn on lazy app loading. When set, the commands registered by
+# each app are cached and, in subsequent sessions, placeholder commands are registered
+# instead of initializing the app at engine startup. The app is then initialized the 
+# first time one of its commands is executed.
+# Apps that don't register any commands are always initialized at startup.
+LAZY_APP_LOADING_ENV_VAR = "TANK_LAZY_APP_LOADING"
+
 # default value for hooks
 TANK_BUNDLE_DEFAULT_HOOK_SETTING = "default"
 
@@ -166,6 +199,13 @@ TANK_CODE_PAYLOAD_FIELD = "sg_payload"
 # app store: dummy project required when writing event data to the system
 TANK_APP_STORE_DUMMY_PROJECT = {"type": "Project", "id": 64}
 
+# app store: the number of attempts made to download a bundle payload. Downloads
+# interrupted by network errors are resumed where they left off.
+TANK_APP_STORE_DOWNLOAD_ATTEMPTS = 3
+
+# app store: the number of seconds to wait before resuming an interrupted download
+TANK_APP_STORE_DOWNLOAD_RETRY_DELAY = 2
+
 # Shotgun: The entity that represents Pipeline Configurations in Shotgun
 PIPELINE_CONFIGURATION_ENTITY = "PipelineConfiguration"
 
@@ -208,6 +248,59 @@ STUDIO_HOOK_PROJECT_NAME = "project_name.py"
 # studio level core hook for specifying shotgun connection settings
 STUDIO_HOOK_SG_CONNECTION_SETTINGS = "sg_connection.py"
 
+# the maximum number of idle shotgun connections to keep in a connection pool
+SG_CONNECTION_POOL_SIZE = 8
+
+# the time in seconds after which idle shotgun connections in a connection pool are discarded
+SG_CONNECTION_POOL_IDLE_TIMEOUT = 300
+
+# the default number of result pages a shotgun connection fetches concurrently in find().
+# Concurrent page fetching is off by default and can be turned on either by adding a 
+# max_page_threads value to shotgun.yml or by setting SG_FIND_MAX_PAGE_THREADS_ENV_VAR.
+SG_FIND_MAX_PAGE_THREADS = 1
+
+# environment variable holding the number of result pages to fetch concurrently in find().
+# This takes precedence over the max_page_threads value in shotgun.yml.
+SG_FIND_MAX_PAGE_THREADS_ENV_VAR = "TANK_SG_FIND_MAX_PAGE_THREADS"
+
+# environment variable to turn on the read-through cache for shotgun queries
+SG_QUERY_CACHE_ENV_VAR = "TANK_SG_QUERY_CACHE"
+
+# the maximum number of queries kept in the shotgun query cache
+SG_QUERY_CACHE_MAX_ENTRIES = 1000
+
+# the time in seconds after which cached shotgun queries for entity types not 
+# listed in SG_QUERY_CACHE_TTLS expire. Zero means that these are not cached.
+SG_QUERY_CACHE_DEFAULT_TTL = 0
+
+# the time in seconds after which cached shotgun queries expire, for the entity
+# types which rarely change and are safe to cache. Schema queries are cached 
+# under the __schema__ pseudo entity type.
+SG_QUERY_CACHE_TTLS = {"LocalStorage": 600, 
+                       "PublishedFileType": 600,
+                       "TankType": 600,
+                       "Step": 600,
+                       "__schema__": 3600}
+
+# the maximum number of paths to look up in a single shotgun query in find_publish
+FIND_PUBLISH_CHUNK_SIZE = 500
+
+# the maximum number of shotgun queries find_publish runs concurrently
+FIND_PUBLISH_MAX_THREADS = 4
+
+# the maximum number of create requests register_publishes sends in a single batch call
+REGISTER_PUBLISHES_BATCH_SIZE = 100
+
+# the maximum number of folder event log entries fetched per shotgun query when
+# incrementally synchronizing the path cache
+PATH_CACHE_SYNC_EVENT_WINDOW_SIZE = 200
+
 # init cache for fast initialization
-SITE_INIT_CACHE_FILE_NAME = "toolkit_init.cache"
+SITE_INIT_CACHE_FILE_NAME = "toolkit_init.db"
+
+# the time in seconds after which entries in the init cache expire
+SITE_INIT_CACHE_TTL = 24 * 60 * 60
+
+# the time in seconds to wait for other processes writing to the init cache
+SITE_INIT_CACHE_LOCK_TIMEOUT = 10.0
 
@@ -15,11 +15,15 @@ Defines the base class for all Tank Engines.
 
 import os
 import sys
+import time
+import hashlib
 import traceback
 import weakref
+import cPickle as pickle
         
 from .. import loader
 from .. import hook
+from .. import profiling
 from ..errors import TankError, TankEngineInitError
 from ..deploy import descriptor
 from ..deploy.dev_descriptor import TankDevDescriptor
@@ -37,6 +41,7 @@ class Engine(TankBundle):
     Base class for an engine in Tank.
     """
 
+    @profiling.profiled("Engine.__init__")
     def __init__(self, tk, context, engine_instance_name, env):
         """
         Constructor. Takes the following parameters:
@@ -54,6 +59,17 @@ class Engine(TankBundle):
         self.__commands = {}
         self.__currently_initializing_app = None
         
+        # lazy app loading - apps which haven't been initialized yet, keyed by 
+        # instance name, and the commands registered by each app, keyed by 
+        # instance name and then by the name the command was registered with.
+        self.__lazy_app_loading = bool(os.environ.get(constants.LAZY_APP_LOADING_ENV_VAR))
+        self.__pending_apps = {}
+        self.__app_command_names = {}
+        self.__initializing_app_commands = None
+        # the folder where the commands are cached is resolved on first use
+        self.__app_commands_cache_folder = None
+        self.__app_commands_cache_folder_resolved = False
+        
         self.__qt_widget_trash = []
         self.__created_qt_dialogs = []
         self.__qt_debug_info = {}
@@ -71,15 +87,23 @@ class Engine(TankBundle):
         # init base class
         TankBundle.__init__(self, tk, context, settings, descriptor, env)
 
-        # check that the context contains all the info that the app needs
-        validation.validate_context(descriptor, context)
+        # successful validations are cached between sessions and
+        # only need to be carried out when something has changed
+        self.__validation_cache = validation.ValidationCache(tk, context)
+        validation_key = self.__validation_cache.get_key(descriptor, settings, self.__engine_instance_name)
         
-        # make sure the current operating system platform is supported
-        validation.validate_platform(descriptor)
-
-        # Get the settings for the engine and then validate them
-        engine_schema = descriptor.get_configuration_schema()
-        validation.validate_settings(self.__engine_instance_name, tk, context, engine_schema, settings)
+        if not self.__validation_cache.is_validated(validation_key):
+            # check that the context contains all the info that the app needs
+            validation.validate_context(descriptor, context)
+            
+            # make sure the current operating system platform is supported
+            validation.validate_platform(descriptor)
+    
+            # Get the settings for the engine and then validate them
+            engine_schema = descriptor.get_configuration_schema()
+            validation.validate_settings(self.__engine_instance_name, tk, context, engine_schema, settings)
+            
+            self.__validation_cache.add(validation_key)
         
         # set up any frameworks defined
         setup_frameworks(self, self, self.__env, descriptor)
@@ -120,6 +144,7 @@ class Engine(TankBundle):
         
         # now load all apps and their settings
         self.__load_apps()
+        self.__validation_cache.save()
         
         # execute the post engine init for all apps
         # note that this is executed before the post_app_init
@@ -128,19 +153,11 @@ class Engine(TankBundle):
         # state of the apps - for example creates a menu, so at that 
         # point we want to try and have all app initialization complete.
         for app in self.__applications.values():
-
-            try:
-                app.post_engine_init()
-            except TankError, e:
-                self.log_error("App %s Failed to run its post_engine_init. It is loaded, but"
-                               "may not operate in its desired state! Details: %s" % (app, e))
-            except Exception:
-                self.log_exception("App %s failed run its post_engine_init. It is loaded, but"
-                                   "may not operate in its desired state!" % app)
+            self.__run_post_engine_init(app)
         
         # Useful dev helpers: If there is one or more dev descriptors in the 
         # loaded environment, add a reload button to the menu!
-        for app in self.__applications.values():
+        for app in self.__applications.values() + self.__pending_apps.values():
             if isinstance(app.descriptor, TankDevDescriptor):
                 self.log_debug("App %s is registerered via a dev descriptor. Will add a reload "
                                "button to the actions listings."  % app)
@@ -341,9 +358,17 @@ class Engine(TankBundle):
         """
         Dictionary of apps associated with this engine
         
+        Apps which are loaded lazily and haven't been initialized yet are represented
+        by stand-in objects, which provide the basic properties needed to build menus
+        without initializing the app. Accessing any other attribute initializes the app.
+        
         :returns: dictionary with keys being app name and values being app objects
         """
-        return self.__applications
+        if not self.__pending_apps:
+            return self.__applications
+        apps = dict(self.__pending_apps)
+        apps.update(self.__applications)
+        return apps
     
     @property
     def commands(self):
@@ -436,6 +461,13 @@ class Engine(TankBundle):
         if properties is None:
             properties = {}
         
+        if self.__initializing_app_commands is not None:
+            # keep track of the commands registered by the app being 
+            # initialized so that they can be cached for lazy loading
+            self.__initializing_app_commands.append( (name, _get_cacheable_properties(properties)) )
+        
+        original_name = name
+        
         # uniqueness prefix, populated when there are several instances of the same app
         properties["prefix"] = None
         
@@ -463,6 +495,10 @@ class Engine(TankBundle):
                 self.__commands[new_name_for_existing] = existing_item
                 self.__commands[new_name_for_existing]["properties"]["prefix"] = prefix 
                 del(self.__commands[name])
+                # and keep the name tracked for the app up to date
+                for (app_cmd_name, cmd_name) in self.__app_command_names.get(prefix, {}).items():
+                    if cmd_name == name:
+                        self.__app_command_names[prefix][app_cmd_name] = new_name_for_existing
                 # add it to our list
                 self.__commands_that_need_prefixing.append(name)
                       
@@ -476,6 +512,11 @@ class Engine(TankBundle):
             
         self.__commands[name] = { "callback": callback, "properties": properties }
         
+        if properties.get("app"):
+            # keep track of the name the command ended up being registered as
+            app_instance_name = properties.get("app").instance_name
+            self.__app_command_names.setdefault(app_instance_name, {})[original_name] = name
+        
     def execute_in_main_thread(self, func, *args, **kwargs):
         """
         Execute the specified function in the main thread when called from a non-main
@@ -987,9 +1028,14 @@ class Engine(TankBundle):
     ##########################################################################################
     # private         
         
+    @profiling.profiled("Engine.__load_apps")
     def __load_apps(self):
         """
         Populate the __applications dictionary, skip over apps that fail to initialize.
+        
+        If lazy app loading is turned on, apps for which cached commands exist are not
+        initialized. Placeholder commands are registered instead and the app is
+        initialized the first time it is needed.
         """
         for app_instance_name in self.__env.get_apps(self.__engine_instance_name):
             
@@ -999,12 +1045,41 @@ class Engine(TankBundle):
                 self.log_error("Cannot start app! %s does not exist on disk." % descriptor)
                 continue
             
-            # Load settings for app - skip over the ones that don't validate
-            try:
-                # get the app settings data and validate it.
+            if self.__lazy_app_loading:
+                cache_file = self.__get_app_commands_cache_file(app_instance_name, descriptor)
+                commands = _load_app_commands(cache_file)
+                if commands:
+                    # we know what commands this app registers so 
+                    # defer its initialization until it is needed
+                    self.__register_pending_app(app_instance_name, descriptor, commands)
+                    continue
+            
+            self.__load_app(app_instance_name, descriptor)
+    
+    def __load_app(self, app_instance_name, descriptor):
+        """
+        Validates the settings for an app and initializes it.
+        
+        :param app_instance_name: The name of the app instance, as defined in the environment
+        :param descriptor: Descriptor for the app
+        :returns: The app object or None if the app could not be loaded
+        """
+        app = None
+        
+        # Load settings for app - skip over the ones that don't validate
+        try:
+            # get the app settings data and validate it.
+            app_settings = self.__env.get_app_settings(self.__engine_instance_name, app_instance_name)
+            
+            validation_key = self.__validation_cache.get_key(descriptor, 
+                                                             app_settings, 
+                                                             app_instance_name, 
+                                                             self.__engine_instance_name, 
+                                                             self.name)
+            
+            if not self.__validation_cache.is_validated(validation_key):
                 app_schema = descriptor.get_configuration_schema()
-                app_settings = self.__env.get_app_settings(self.__engine_instance_name, app_instance_name)
-
+                
                 # check that the context contains all the info that the app needs
                 if self.__engine_instance_name != constants.SHOTGUN_ENGINE_NAME: 
                     # special case! The shotgun engine is special and does not have a 
@@ -1024,65 +1099,222 @@ class Engine(TankBundle):
                 # now validate the configuration                
                 validation.validate_settings(app_instance_name, self.tank, self.context, app_schema, app_settings)
                 
-                    
-            except TankError, e:
-                # validation error - probably some issue with the settings!
-                # report this as an error message.
-                self.log_error("App configuration Error for %s (configured in in environment '%s'). "
-                               "It will not be loaded: %s" % (app_instance_name, self.__env.disk_location, e))
-                continue
+                self.__validation_cache.add(validation_key)
             
-            except Exception:
-                # code execution error in the validation. Report this as an error 
-                # with the engire call stack!
-                self.log_exception("A general exception was caught while trying to "
-                                   "validate the configuration loaded from '%s' for app %s. "
-                                   "The app will not be loaded." % (self.__env.disk_location, app_instance_name))
-                continue
+                
+        except TankError, e:
+            # validation error - probably some issue with the settings!
+            # report this as an error message.
+            self.log_error("App configuration Error for %s (configured in in environment '%s'). "
+                           "It will not be loaded: %s" % (app_instance_name, self.__env.disk_location, e))
+            return None
+        
+        except Exception:
+            # code execution error in the validation. Report this as an error 
+            # with the engire call stack!
+            self.log_exception("A general exception was caught while trying to "
+                               "validate the configuration loaded from '%s' for app %s. "
+                               "The app will not be loaded." % (self.__env.disk_location, app_instance_name))
+            return None
+        
+                                
+        # load the app
+        try:
+            # now get the app location and resolve it into a version object
+            app_dir = descriptor.get_path()
+
+            # create the object, run the constructor
+            app = application.get_application(self, 
+                                              app_dir, 
+                                              descriptor, 
+                                              app_settings, 
+                                              app_instance_name, 
+                                              self.__env)
+            
+            # load any frameworks required
+            setup_frameworks(self, app, self.__env, descriptor)
             
-                                    
-            # load the app
+            # track the init of the app
+            self.__currently_initializing_app = app
+            self.__initializing_app_commands = []
+            profiling_token = profiling.start_phase("init_app %s" % app_instance_name)
             try:
-                # now get the app location and resolve it into a version object
-                app_dir = descriptor.get_path()
-
-                # create the object, run the constructor
-                app = application.get_application(self, 
-                                                  app_dir, 
-                                                  descriptor, 
-                                                  app_settings, 
-                                                  app_instance_name, 
-                                                  self.__env)
-                
-                # load any frameworks required
-                setup_frameworks(self, app, self.__env, descriptor)
-                
-                # track the init of the app
-                self.__currently_initializing_app = app
-                try:
-                    app.init_app()
-                finally:
-                    self.__currently_initializing_app = None
+                app.init_app()
+                app_commands = self.__initializing_app_commands
+            finally:
+                profiling.stop_phase(profiling_token)
+                self.__currently_initializing_app = None
+                self.__initializing_app_commands = None
+        
+        except TankError, e:
+            app = None
+            self.log_error("App %s failed to initialize. It will not be loaded: %s" % (app_dir, e))
             
-            except TankError, e:
-                self.log_error("App %s failed to initialize. It will not be loaded: %s" % (app_dir, e))
-                
-            except Exception:
-                self.log_exception("App %s failed to initialize. It will not be loaded." % app_dir)
-            else:
-                # note! Apps are keyed by their instance name, meaning that we 
-                # could theoretically have multiple instances of the same app.
-                self.__applications[app_instance_name] = app
-                
-            # lastly check if there are any compatibility warnings
-            messages = black_list.compare_against_black_list(descriptor)
-            if len(messages) > 0:
-                self.log_warning("Compatibility warnings were issued for %s:" % descriptor)
-                for msg in messages:
-                    self.log_warning("")
-                    self.log_warning(msg)
-                
+        except Exception:
+            app = None
+            self.log_exception("App %s failed to initialize. It will not be loaded." % app_dir)
+        else:
+            # note! Apps are keyed by their instance name, meaning that we 
+            # could theoretically have multiple instances of the same app.
+            self.__applications[app_instance_name] = app
+            
+            if self.__lazy_app_loading:
+                # cache the commands registered by the app so that 
+                # it can be loaded lazily next time around
+                cache_file = self.__get_app_commands_cache_file(app_instance_name, descriptor)
+                _save_app_commands(cache_file, app_commands)
             
+        # lastly check if there are any compatibility warnings
+        messages = black_list.compare_against_black_list(descriptor)
+        if len(messages) > 0:
+            self.log_warning("Compatibility warnings were issued for %s:" % descriptor)
+            for msg in messages:
+                self.log_warning("")
+                self.log_warning(msg)
+        
+        return app
+    
+    def __run_post_engine_init(self, app):
+        """
+        Runs the post engine init for an app, reporting any errors.
+        
+        :param app: The app to run the post engine init for
+        """
+        try:
+            app.post_engine_init()
+        except TankError, e:
+            self.log_error("App %s Failed to run its post_engine_init. It is loaded, but"
+                           "may not operate in its desired state! Details: %s" % (app, e))
+        except Exception:
+            self.log_exception("App %s failed run its post_engine_init. It is loaded, but"
+                               "may not operate in its desired state!" % app)
+    
+    def __get_app_commands_cache_file(self, app_instance_name, descriptor):
+        """
+        Returns the path to the file where the commands registered by an app are cached.
+        
+        The commands an app registers may depend on its version, its settings
+        and on the context, so these are all part of the file name.
+        
+        :param app_instance_name: The name of the app instance, as defined in the environment
+        :param descriptor: Descriptor for the app
+        :returns: Path to the cache file or None if the cache location 
+                  cannot be determined
+        """
+        if not self.__app_commands_cache_folder_resolved:
+            self.__app_commands_cache_folder_resolved = True
+            try:
+                pc = self.tank.pipeline_configuration
+                self.__app_commands_cache_folder = pc.get_app_commands_cache_location(self.tank)
+            except Exception, e:
+                # the cache is optional - apps are initialized up front without it
+                self.log_debug("Could not determine the location of the app commands cache, "
+                               "apps will not be loaded lazily: %s" % e)
+        
+        if self.__app_commands_cache_folder is None:
+            return None
+        
+        app_settings = self.__env.get_app_settings(self.__engine_instance_name, app_instance_name)
+        ctx = self.context
+        context_key = None
+        if ctx:
+            context_key = (ctx.project is not None, 
+                           ctx.entity and ctx.entity.get("type"), 
+                           ctx.step is not None, 
+                           ctx.task is not None)
+        
+        cache_key = repr( (self.__env.disk_location, 
+                           self.__engine_instance_name, 
+                           app_instance_name, 
+                           validation.get_data_hash(descriptor.get_location()), 
+                           validation.get_data_hash(app_settings), 
+                           context_key) )
+        
+        return os.path.join(self.__app_commands_cache_folder, "%s.cache" % hashlib.md5(cache_key).hexdigest())
+    
+    def __register_pending_app(self, app_instance_name, descriptor, commands):
+        """
+        Registers placeholder commands for an app which is initialized lazily.
+        
+        :param app_instance_name: The name of the app instance, as defined in the environment
+        :param descriptor: Descriptor for the app
+        :param commands: List of (name, properties) tuples for the commands that 
+                         the app registered the last time it was initialized.
+        """
+        pending_app = _PendingApp(app_instance_name, descriptor, self.__load_pending_app)
+        self.__pending_apps[app_instance_name] = pending_app
+        
+        def _get_placeholder_callback(command_name):
+            # note - use a weak reference to avoid circular references between
+            # the engine and the callbacks it stores.
+            engine_ref = weakref.ref(self)
+            def _callback(*args, **kwargs):
+                engine = engine_ref()
+                if engine is None:
+                    # the engine has been destroyed and garbage collected but a
+                    # menu still holds on to the command
+                    return None
+                return engine.__execute_pending_command(app_instance_name, command_name, *args, **kwargs)
+            return _callback
+        
+        self.__currently_initializing_app = pending_app
+        try:
+            for (command_name, properties) in commands:
+                self.register_command(command_name, _get_placeholder_callback(command_name), properties)
+        finally:
+            self.__currently_initializing_app = None
+    
+    def __execute_pending_command(self, app_instance_name, command_name, *args, **kwargs):
+        """
+        Executes a placeholder command registered for an app which is initialized lazily.
+        The app is initialized and the corresponding command registered by the app is run.
+        
+        :param app_instance_name: The name of the app instance, as defined in the environment
+        :param command_name: The name of the command, as registered by the app
+        :returns: The return value of the command
+        """
+        app = self.__load_pending_app(app_instance_name)
+        if app is None:
+            # errors have already been reported
+            return None
+        
+        registered_name = self.__app_command_names.get(app_instance_name, {}).get(command_name)
+        if registered_name is None or registered_name not in self.__commands:
+            self.log_warning("App %s did not register the command '%s' when it was initialized. "
+                             "It may have been changed since the command was cached." % (app, command_name))
+            return None
+        
+        return self.__commands[registered_name]["callback"](*args, **kwargs)
+    
+    def __load_pending_app(self, app_instance_name):
+        """
+        Initializes an app which was set up to be initialized lazily. Does nothing 
+        if the app has already been initialized.
+        
+        :param app_instance_name: The name of the app instance, as defined in the environment
+        :returns: The app object or None if the app could not be loaded
+        """
+        pending_app = self.__pending_apps.pop(app_instance_name, None)
+        if pending_app is None:
+            return self.__applications.get(app_instance_name)
+        
+        # remove the placeholder commands - the app will register the real ones
+        for command_name in self.__app_command_names.pop(app_instance_name, {}).values():
+            if command_name in self.__commands:
+                del(self.__commands[command_name])
+        
+        self.log_debug("Lazily initializing app %s..." % app_instance_name)
+        start_time = time.time()
+        
+        app = self.__load_app(app_instance_name, pending_app.descriptor)
+        if app:
+            self.__run_post_engine_init(app)
+        self.__validation_cache.save()
+        
+        self.log_debug("Lazy initialization of app %s took %.3f seconds." % (app_instance_name, 
+                                                                             time.time() - start_time))
+        return app
+    
     def __destroy_frameworks(self):
         """
         Destroy frameworks
@@ -1101,6 +1333,9 @@ class Engine(TankBundle):
         """
         Call the destroy_app method on all loaded apps
         """
+        # apps which haven't been initialized yet are never initialized 
+        # once the engine has been destroyed
+        self.__pending_apps = {}
         
         for app in self.__applications.values():
             app._destroy_frameworks()
@@ -1108,6 +1343,137 @@ class Engine(TankBundle):
             app.destroy_app()
 
 
+##########################################################################################
+# Lazy app loading
+
+class _PendingApp(object):
+    """
+    Stands in for an app which has not been initialized yet because it is
+    loaded lazily. Exposes the basic properties of the app, which are 
+    typically needed when building menus. Accessing anything else causes 
+    the app to be initialized. 
+    """
+    
+    def __init__(self, instance_name, descriptor, load_callback):
+        """
+        Constructor
+        
+        :param instance_name: The name of the app instance, as defined in the environment
+        :param descriptor: Descriptor for the app
+        :param load_callback: Callable which takes the instance name and initializes
+                              the app, returning the app object or None.
+        """
+        self.instance_name = instance_name
+        self.descriptor = descriptor
+        self.__load_callback = load_callback
+        
+    def __repr__(self):
+        return "<Sgtk App %s (not initialized yet)>" % self.instance_name
+    
+    @property
+    def name(self):
+        return self.descriptor.get_system_name()
+    
+    @property
+    def display_name(self):
+        return self.descriptor.get_display_name()
+
+    @property
+    def description(self):
+        return self.descriptor.get_description()
+
+    @property
+    def version(self):
+        return self.descriptor.get_version()
+
+    @property
+    def icon_256(self):
+        return self.descriptor.get_icon_256()
+    
+    def __getattr__(self, name):
+        """
+        Initializes the app and passes on the attribute access to it.
+        """
+        if name.startswith("__"):
+            # don't initialize the app for special attribute lookups
+            raise AttributeError(name)
+        app = self.__load_callback(self.instance_name)
+        if app is None:
+            raise AttributeError("App %s could not be initialized and has no attribute '%s'" % (self.instance_name, 
+                                                                                                name))
+        return getattr(app, name)
+
+def _is_cacheable(value):
+    """
+    Returns true if the value can be stored in the app commands cache.
+    """
+    if value is None or isinstance(value, (basestring, bool, int, long, float)):
+        return True
+    elif isinstance(value, (list, tuple)):
+        return all(_is_cacheable(x) for x in value)
+    elif isinstance(value, dict):
+        return all(_is_cacheable(k) and _is_cacheable(v) for (k, v) in value.iteritems())
+    return False
+
+def _get_cacheable_properties(properties):
+    """
+    Returns the command properties which can be cached. Properties holding 
+    objects, such as callbacks, are skipped.
+    
+    :param properties: Properties dictionary passed to register_command
+    :returns: Dictionary with all the properties that can be cached
+    """
+    return dict((k, v) for (k, v) in properties.iteritems() if _is_cacheable(v))
+
+def _load_app_commands(cache_file):
+    """
+    Loads the cached commands for an app. Fails silently if the cache 
+    cannot be read.
+    
+    :param cache_file: Path to the cache file or None if there is no cache
+    :returns: List of (name, properties) tuples or None if not cached
+    """
+    if cache_file is None or not os.path.exists(cache_file):
+        return None
+    
+    try:
+        fh = open(cache_file, "rb")
+        try:
+            return pickle.load(fh)
+        finally:
+            fh.close()
+    except:
+        # failed to load cache from file. Continue silently.
+        return None
+
+def _save_app_commands(cache_file, commands):
+    """
+    Caches the commands registered by an app. Fails silently if the cache
+    cannot be written.
+    
+    :param cache_file: Path to the cache file or None if there is no cache
+    :param commands: List of (name, properties) tuples
+    """
+    if cache_file is None:
+        return
+    
+    try:
+        # the cache is loaded with pickle, so it is written with default
+        # permissions to a folder which is local to the current user
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        
+        fh = open(cache_file, "wb")
+        try:
+            pickle.dump(commands, fh)
+        finally:
+            fh.close()
+    except:
+        # silently continue in case exceptions are raised
+        pass
+
+
 ##########################################################################################
 # Engine management
 
@@ -1152,6 +1518,19 @@ def start_engine(engine_name, tk, context):
     Raises TankEngineInitError if an engine could not be started
     for the passed context.
     """
+    try:
+        return _start_engine(engine_name, tk, context)
+    finally:
+        # startup is complete - output the timings of the startup 
+        # phases if profiling has been turned on
+        profiling.report_startup_trace()
+
+@profiling.profiled("start_engine")
+def _start_engine(engine_name, tk, context):
+    """
+    Creates an engine and makes it the current engine.
+    See start_engine() for details.
+    """
     # first ensure that an engine is not currently running
     if current_engine():
         raise TankError("An engine (%s) is already running! Before you can start a new engine, "
@@ -1343,6 +1722,7 @@ def __get_env_and_descriptor_for_engine(engine_name, tk, context):
     return (env, engine_descriptor)
 
 
+@profiling.profiled("pick_environment")
 def __pick_environment(engine_name, tk, context):
     """
     Call out to the pick_environment core hook to determine which environment we should load
@@ -22,6 +22,8 @@ from . import constants
 from . import environment_includes
 from ..errors import TankError
 from ..deploy import descriptor
+from ..util import yaml_cache
+from .. import profiling
 
 
 class Environment(object):
@@ -58,6 +60,7 @@ class Environment(object):
     def __str__(self):
         return "Environment %s" % os.path.basename(self.__env_path)
 
+    @profiling.profiled("Environment.__refresh")
     def __refresh(self):
         """Refreshes the environment data from disk
         """
@@ -65,14 +68,19 @@ class Environment(object):
         if not os.path.exists(self.__env_path):
             raise TankError("Attempting to load non-existent environment file: %s" % self.__env_path)
 
-        try:
-            env_file = open(self.__env_path, "r")
-            data = yaml.load(env_file)
-            env_file.close()
-        except Exception, exp:
-            raise TankError("Could not parse file %s. Error reported: %s" % (self.__env_path, exp))
-
-        self.__env_data = environment_includes.process_includes(self.__env_path, data, self.__context)
+        # get the flattened environment data - this is cached
+        # and only loaded from disk if the files have changed.
+        # the location of the cache on disk is determined by a core hook,
+        # which needs an API instance, so environments are only cached
+        # on disk when they are loaded for a context.
+        get_cache_folder = None
+        if self.__context:
+            tk = self.__context.tank
+            get_cache_folder = lambda: self.__pipeline_config.get_environment_cache_location(tk)
+        
+        self.__env_data = environment_includes.get_environment_data(self.__env_path,
+                                                                    self.__context,
+                                                                    get_cache_folder)
 
         if not self.__env_data:
             raise TankError('No data in env file: %s' % (self.__env_path))
@@ -90,14 +98,11 @@ class Environment(object):
         self.__app_settings = {}
 
         # populate the above data structures
-        # pass a copy of the data since process is destructive
-        d = copy.deepcopy(self.__env_data)
-        self.__process_engines(d)
+        self.__process_engines(self.__env_data)
 
         if "frameworks" in self.__env_data:
             # there are frameworks defined! Process them
-            d = copy.deepcopy(self.__env_data)
-            self.__process_frameworks(d)
+            self.__process_frameworks(self.__env_data)
 
         # now extract the location key for all the configs
         # these two dicts are keyed in the same way as the settings dicts
@@ -134,20 +139,25 @@ class Environment(object):
         # iterate over the apps dict
         for app, app_settings in data.items():
             if not self.__is_item_disabled(app_settings):
-                self.__app_settings[(engine, app)] = app_settings
+                # shallow copy so that the location can be extracted
+                # without modifying the environment data
+                self.__app_settings[(engine, app)] = dict(app_settings)
 
     def __process_engines(self, data):
         """
         Populates the __engine_settings dict
         """
         # assumes that there is an engines key in the data dict
-        engines = data.pop("engines")
+        engines = data["engines"]
         if engines is None:
             return
         # iterate over the engine dict
         for engine, engine_settings in engines.items():
             # Check for engine disabled
             if not self.__is_item_disabled(engine_settings):
+                # shallow copy so that apps and location can be extracted
+                # without modifying the environment data
+                engine_settings = dict(engine_settings)
                 engine_apps = engine_settings.pop('apps')
                 self.__process_apps(engine, engine_apps)
                 self.__engine_settings[engine] = engine_settings
@@ -157,7 +167,7 @@ class Environment(object):
         Populates the __frameworks_settings dict
         """
         # assumes that there is an frameworks key in the data dict
-        frameworks = data.pop("frameworks")
+        frameworks = data["frameworks"]
         if frameworks is None:
             return
 
@@ -165,7 +175,9 @@ class Environment(object):
         for fw, fw_settings in frameworks.items():
             # Check for engine disabled
             if not self.__is_item_disabled(fw_settings):
-                self.__framework_settings[fw] = fw_settings
+                # shallow copy so that the location can be extracted
+                # without modifying the environment data
+                self.__framework_settings[fw] = dict(fw_settings)
 
     def __extract_locations(self):
         """
@@ -342,11 +354,10 @@ class Environment(object):
         """
         loads the main data from disk, raw form
         """
-        # load the data in
+        # load the data in - this is used to modify and write back the file,
+        # so always read it from disk
         try:
-            env_file = open(path, "r")
-            data = yaml.load(env_file)
-            env_file.close()
+            data = yaml_cache.load_yaml(path, use_cache=False)
         except Exception, exp:
             raise TankError("Could not parse file %s. Error reported: %s" % (path, exp))
 
@@ -362,6 +373,9 @@ class Environment(object):
             env_file.close()
         except Exception, exp:
             raise TankError("Could not write environment file %s. Error reported: %s" % (path, exp))
+        finally:
+            yaml_cache.clear_yaml_cache(path)
+            environment_includes.clear_environment_cache(path)
 
     def find_location_for_engine(self, engine_name):
         """
@@ -31,22 +31,22 @@ relative paths are always required and context based paths are always optional.
 import os
 import re
 import sys
-import copy 
-
-from tank_vendor import yaml
+import hashlib
+import threading
+import cPickle as pickle
 
 from ..errors import TankError
+from ..util import yaml_cache
 from ..template import TemplatePath
 from ..templatekey import StringKey
 
 from . import constants
 
-def _resolve_includes(file_name, data, context):
+def _get_includes(data):
     """
-    Parses the includes section and returns a list of valid paths
+    Returns the list of raw include paths defined in the includes sections
     """
     includes = []
-    resolved_includes = []
     
     if constants.SINGLE_INCLUDE_SECTION in data:
         # single include section
@@ -55,6 +55,15 @@ def _resolve_includes(file_name, data, context):
     if constants.MULTI_INCLUDE_SECTION in data:
         # multi include section
         includes.extend( data[constants.MULTI_INCLUDE_SECTION] )
+    
+    return includes
+
+def _resolve_includes(file_name, data, context):
+    """
+    Parses the includes section and returns a list of valid paths
+    """
+    includes = _get_includes(data)
+    resolved_includes = []
 
     for include in includes:
         
@@ -163,8 +172,9 @@ def _resolve_refs_r(lookup_dict, data):
         if ref_token not in lookup_dict:
             raise TankError("Undefined Reference %s!" % ref_token)
         # other parts of the code is making changes nilly-willy to data
-        # structures (ick) so flatten everything out here.... :(
-        processed_val = copy.deepcopy(lookup_dict[ref_token])
+        # structures (ick) so give each reference its own copy. copy_data
+        # is much cheaper than a deepcopy.
+        processed_val = yaml_cache.copy_data(lookup_dict[ref_token])
         
     return processed_val
             
@@ -181,7 +191,7 @@ def _resolve_frameworks(lookup_dict, data):
             data["frameworks"] = {}
         if data["frameworks"] is None:
             data["frameworks"] = {}
-        data["frameworks"].update(fw)    
+        data["frameworks"].update(yaml_cache.copy_data(fw))
     
     return data
     
@@ -201,7 +211,7 @@ def process_includes(file_name, data, context):
     data, _ = _process_includes_r(file_name, data, context)
     return data
         
-def _process_includes_r(file_name, data, context):
+def _process_includes_r(file_name, data, context, dependencies=None):
     """
     Recursively process includes for an environment file.
     
@@ -214,6 +224,8 @@ def _process_includes_r(file_name, data, context):
     :param file_name:   The root yml file to process
     :param data:        The contents of the root yml file to process
     :param context:     The current context
+    :param dependencies: Optional dictionary which is populated with what 
+                         the result depends on. See _compile_environment.
 
     :returns:           A tuple containing the flattened yml data 
                         after all includes have been recursively processed
@@ -223,19 +235,27 @@ def _process_includes_r(file_name, data, context):
     # first build our big fat lookup dict
     include_files = _resolve_includes(file_name, data, context)
     
+    if dependencies is not None:
+        # keep track of how includes were resolved - context based paths
+        # and paths containing environment variables may resolve differently
+        # next time around.
+        dependencies["includes"].append( (file_name, _get_includes(data), include_files) )
+    
     lookup_dict = {}
     fw_lookup = {}
     for include_file in include_files:
+        
+        if dependencies is not None:
+            dependencies["files"].append( (include_file, yaml_cache.get_file_hash(include_file)) )
                 
         # path exists, so try to read it
-        fh = open(include_file, "r")
-        try:
-            included_data = yaml.load(fh) or {}
-        finally:
-            fh.close()
+        included_data = yaml_cache.load_yaml(include_file) or {}
                 
         # now resolve this data before proceeding
-        included_data, included_fw_lookup = _process_includes_r(include_file, included_data, context)
+        included_data, included_fw_lookup = _process_includes_r(include_file, 
+                                                                included_data, 
+                                                                context, 
+                                                                dependencies)
 
         # update our big lookup dict with this included data:
         if "frameworks" in included_data and isinstance(included_data["frameworks"], dict):
@@ -276,15 +296,13 @@ def find_framework_location(file_name, framework_name, context):
     :returns:               The yml file that the framework is 
                             defined in or None if not found.
     """
-    # load the data in for the root file:
+    # load the data in for the root file. This is used to find the file
+    # to update, so always read it from disk
     data = None
     try:
-        fh = open(file_name, "r")
-        data = yaml.load(fh)
+        data = yaml_cache.load_yaml(file_name, use_cache=False)
     except Exception, e:
         raise TankError("Could not parse file %s. Error reported: %s" % (file_name, e))
-    finally:
-        fh.close()
 
     # track root frameworks:
     root_fw_lookup = {}
@@ -306,14 +324,12 @@ def find_reference(file_name, context, token):
     for @token. Returns the file in which it is found.
     """
     
-    # load the data in 
+    # load the data in. This is used to find the file to update,
+    # so always read it from disk
     try:
-        fh = open(file_name, "r")
-        data = yaml.load(fh)
+        data = yaml_cache.load_yaml(file_name, use_cache=False)
     except Exception, exp:
         raise TankError("Could not parse file %s. Error reported: %s" % (file_name, exp))
-    finally:
-        fh.close()
     
     # first build our big fat lookup dict
     include_files = _resolve_includes(file_name, data, context)
@@ -323,11 +339,7 @@ def find_reference(file_name, context, token):
     for include_file in include_files:
                 
         # path exists, so try to read it
-        fh = open(include_file, "r")
-        try:
-            included_data = yaml.load(fh) or {}
-        finally:
-            fh.close()
+        included_data = yaml_cache.load_yaml(include_file, use_cache=False) or {}
         
         if token in included_data:
             found_file = include_file
@@ -336,3 +348,275 @@ def find_reference(file_name, context, token):
     
     
     
+
+
+################################################################################################
+# compiled environment cache
+
+def _compile_environment(file_name, context):
+    """
+    Loads an environment file and processes all its includes.
+    
+    :param file_name:   The root yml file to process
+    :param context:     The current context
+    :returns:           Dictionary with keys "data", holding the flattened 
+                        yml data, "files", holding (path, content hash) tuples for
+                        all files that were read and "includes", holding 
+                        (file name, includes, resolved includes) tuples for
+                        all files that were processed.
+    """
+    compiled = {"files": [(file_name, yaml_cache.get_file_hash(file_name))],
+                "includes": [],
+                "data": None}
+    
+    try:
+        data = yaml_cache.load_yaml(file_name)
+    except Exception, e:
+        raise TankError("Could not parse file %s. Error reported: %s" % (file_name, e))
+    
+    if data:
+        (data, _) = _process_includes_r(file_name, data, context, compiled)
+    
+    compiled["data"] = data
+    return compiled
+
+def _is_compiled_environment_valid(compiled, context):
+    """
+    Checks if a compiled environment is still valid, e.g. that none of 
+    the files it was compiled from have changed and that all includes
+    resolve the same way for the given context.
+    
+    :param compiled:    Compiled environment, as returned by _compile_environment
+    :param context:     The current context
+    :returns:           True if valid, False otherwise
+    """
+    for (path, signature) in compiled["files"]:
+        if signature is None or yaml_cache.get_file_hash(path) != signature:
+            return False
+    
+    for (file_name, includes, include_files) in compiled["includes"]:
+        try:
+            data = {constants.MULTI_INCLUDE_SECTION: includes}
+            if _resolve_includes(file_name, data, context) != include_files:
+                return False
+        except TankError:
+            # let a full compile report the error
+            return False
+    
+    return True
+
+class _CompiledEnvironmentCache(object):
+    """
+    A thread-safe cache of compiled environments. Loading an environment means 
+    parsing its yml file and all included files, which is expensive, so the
+    flattened result is cached in memory and, optionally, on disk.
+    
+    Each environment file can have several compiled versions, since context 
+    based includes may resolve differently for different contexts. Cached 
+    versions are validated against the contents of all the files they were 
+    compiled from and against the current context before they are used.
+    """
+    
+    # the number of compiled versions to keep for each environment file
+    MAX_ENTRIES = 5
+    
+    # bump this whenever the format of the compiled data changes
+    FORMAT_VERSION = 2
+    
+    def __init__(self):
+        """
+        Construction
+        """
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+    
+    def clear(self, path=None):
+        """
+        Clear the in-memory cache. Files cached on disk are left as is
+        and will be validated before they are used.
+        
+        :param path:    Optional path of a yml file. If specified, only the
+                        compiled environments which were compiled from
+                        this file are removed.
+        """
+        self._cache_lock.acquire()
+        try:
+            if path is None:
+                self._cache = {}
+            else:
+                for (file_name, entries) in self._cache.items():
+                    self._cache[file_name] = [x for x in entries 
+                                              if path not in [f for (f, _) in x["files"]]]
+        finally:
+            self._cache_lock.release()
+    
+    def find(self, file_name, context):
+        """
+        Find a valid compiled environment in memory.
+        
+        :param file_name:       The root yml file of the environment
+        :param context:         The current context
+        :returns:               Compiled environment or None if not found
+        """
+        self._cache_lock.acquire()
+        try:
+            entries = list(self._cache.get(file_name, []))
+        finally:
+            self._cache_lock.release()
+        
+        for compiled in entries:
+            if _is_compiled_environment_valid(compiled, context):
+                return compiled
+        
+        return None
+    
+    def find_on_disk(self, file_name, context, cache_folder):
+        """
+        Find a valid compiled environment on disk. If one is found, 
+        it is added to the in-memory cache.
+        
+        :param file_name:       The root yml file of the environment
+        :param context:         The current context
+        :param cache_folder:    Folder where compiled environments are cached on disk.
+        :returns:               Compiled environment or None if not found
+        """
+        for compiled in self._load(file_name, cache_folder):
+            if _is_compiled_environment_valid(compiled, context):
+                self._add_to_memory(file_name, compiled)
+                return compiled
+        
+        return None
+    
+    def add(self, file_name, compiled, cache_folder=None):
+        """
+        Add a compiled environment to the cache.
+        
+        :param file_name:       The root yml file of the environment
+        :param compiled:        Compiled environment, as returned by _compile_environment
+        :param cache_folder:    Optional folder where compiled environments are
+                                cached on disk. 
+        """
+        entries = self._add_to_memory(file_name, compiled)
+        if cache_folder:
+            self._save(file_name, cache_folder, entries)
+    
+    def _add_to_memory(self, file_name, compiled):
+        """
+        Adds a compiled environment to the in-memory cache, discarding 
+        the oldest versions if there are too many.
+        
+        :returns: The updated list of compiled environments for the file
+        """
+        self._cache_lock.acquire()
+        try:
+            entries = [compiled] + [x for x in self._cache.get(file_name, []) if x is not compiled]
+            entries = entries[:self.MAX_ENTRIES]
+            self._cache[file_name] = entries
+        finally:
+            self._cache_lock.release()
+        return entries
+    
+    def _get_cache_file(self, file_name, cache_folder):
+        """
+        Returns the path to the file on disk holding the compiled 
+        environments for an environment file.
+        """
+        return os.path.join(cache_folder, "%s.cache" % hashlib.md5(file_name).hexdigest())
+    
+    def _load(self, file_name, cache_folder):
+        """
+        Load compiled environments from disk. Fails silently if the cache
+        cannot be read.
+        
+        :returns: List of compiled environments
+        """
+        cache_file = self._get_cache_file(file_name, cache_folder)
+        if not os.path.exists(cache_file):
+            return []
+        
+        try:
+            fh = open(cache_file, "rb")
+            try:
+                cache_data = pickle.load(fh)
+            finally:
+                fh.close()
+        except:
+            # failed to load cache from file. Continue silently.
+            return []
+        
+        if cache_data.get("version") != self.FORMAT_VERSION or cache_data.get("file_name") != file_name:
+            return []
+        return cache_data.get("entries", [])
+    
+    def _save(self, file_name, cache_folder, entries):
+        """
+        Write compiled environments to disk. Fails silently if the cache
+        cannot be written.
+        """
+        cache_file = self._get_cache_file(file_name, cache_folder)
+        cache_data = {"version": self.FORMAT_VERSION, "file_name": file_name, "entries": entries}
+        
+        try:
+            # the cache is loaded with pickle, so it is written with default
+            # permissions to a folder which is local to the current user
+            if not os.path.exists(cache_folder):
+                os.makedirs(cache_folder)
+            
+            # write cache file
+            fh = open(cache_file, "wb")
+            try:
+                pickle.dump(cache_data, fh, pickle.HIGHEST_PROTOCOL)
+            finally:
+                fh.close()
+        except:
+            # silently continue in case exceptions are raised
+            pass
+
+_compiled_cache = _CompiledEnvironmentCache()
+
+def get_environment_data(file_name, context, get_cache_folder=None):
+    """
+    Returns the flattened data for an environment file, with all includes
+    processed. Compiled environments are cached in memory and, if a cache 
+    folder can be determined, on disk. A cached version is only used if none 
+    of the files it was compiled from have changed and all its includes
+    resolve the same way for the given context - otherwise the environment
+    is loaded from scratch.
+    
+    :param file_name:           The root yml file to process
+    :param context:             The current context
+    :param get_cache_folder:    Optional callable returning the folder where compiled 
+                                environments are cached on disk. This is only called
+                                if the environment isn't cached in memory. If it fails,
+                                the environment is not cached on disk.
+    :returns:                   The flattened yml data. This is a copy which 
+                                can safely be modified by the caller.
+    """
+    compiled = _compiled_cache.find(file_name, context)
+    if compiled is None:
+        cache_folder = None
+        if get_cache_folder:
+            try:
+                cache_folder = get_cache_folder()
+            except Exception:
+                # the disk cache is optional - continue without it
+                cache_folder = None
+        
+        if cache_folder:
+            compiled = _compiled_cache.find_on_disk(file_name, context, cache_folder)
+        
+        if compiled is None:
+            compiled = _compile_environment(file_name, context)
+            _compiled_cache.add(file_name, compiled, cache_folder)
+    
+    return yaml_cache.copy_data(compiled["data"])
+
+def clear_environment_cache(path=None):
+    """
+    Clears the in-memory cache of compiled environments. This should be
+    called whenever an environment file is written.
+    
+    :param path:    Optional path of a yml file to only clear the compiled
+                    environments which include it.
+    """
+    _compiled_cache.clear(path)
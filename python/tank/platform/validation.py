@@ -15,6 +15,10 @@ App configuration and schema validation.
 import os
 import re
 import sys
+import uuid
+import hashlib
+import threading
+import cPickle as pickle
 
 from . import constants
 from ..errors import TankError
@@ -76,7 +80,300 @@ def validate_platform(descriptor):
             raise TankError("The current operating system '%s' is not supported."
                             "Supported platforms are: %s" % (nice_system_name, supported_platforms))
 
+
+
+class ValidationCache(object):
+    """
+    Keeps track of bundles which have been successfully validated, so that
+    validation can be skipped when a bundle is loaded again with the same inputs.
+    
+    Bundles are identified by a key computed from everything the validation 
+    depends on: the settings, the bundle's location, version and manifest, the 
+    shape of the context (which of its fields are populated), the templates 
+    configuration, the core version and the hook and config files that the 
+    settings refer to. If any of these change, the key changes and the bundle 
+    is validated again. Validated keys are stored on disk in the cache folder
+    defined by the cache_location hook and are shared between sessions.
+    """
     
+    # the number of validated keys to keep on disk
+    MAX_ENTRIES = 1000
+    
+    # validated keys, keyed by pipeline configuration path. These are
+    # shared by all ValidationCache instances in the session.
+    _validated_keys = {}
+    _lock = threading.Lock()
+    
+    def __init__(self, tank_api, context):
+        """
+        Constructor. Computes the part of the validation key which is 
+        shared by all bundles.
+        
+        :param tank_api: Sgtk API instance
+        :param context: The context bundles are validated against
+        """
+        self._tank_api = tank_api
+        self._dirty = False
+        
+        pc = tank_api.pipeline_configuration
+        self._pc_path = pc.get_path()
+        
+        context_shape = None
+        if context:
+            context_shape = (context.project is not None, 
+                             context.entity and context.entity.get("type"), 
+                             context.step is not None, 
+                             context.task is not None, 
+                             context.user is not None)
+        
+        self._base_key = (context_shape, 
+                          get_data_hash(pc.get_templates_config()), 
+                          get_data_hash(tank_api.roots),
+                          # any changes to the validation code invalidate the cache too 
+                          tank_api.version)
+    
+    def get_key(self, descriptor, settings, *args):
+        """
+        Computes the validation key for a bundle.
+        
+        :param descriptor: Descriptor for the bundle
+        :param settings: The settings for the bundle
+        :param args: Any other values that the validation depends on
+        :returns: Key as a string
+        """
+        schema = descriptor.get_configuration_schema()
+        key = (self._base_key,
+               get_data_hash(descriptor.get_location()),
+               descriptor.get_version(),
+               get_data_hash(schema),
+               descriptor.get_required_context(),
+               descriptor.get_supported_platforms(),
+               descriptor.get_supported_engines(),
+               # the modification time of the bundle folder changes if it
+               # is removed from the bundle cache and downloaded again
+               get_file_signature(descriptor.get_path()),
+               get_file_signature(os.path.join(descriptor.get_path(), constants.BUNDLE_METADATA_FILE)),
+               get_data_hash(settings),
+               # the validation checks that the hook and config files referred to exist
+               _get_referenced_file_signatures(self._tank_api.pipeline_configuration, schema, settings),
+               args)
+        return hashlib.md5(repr(key)).hexdigest()
+    
+    def is_validated(self, key):
+        """
+        Returns true if a bundle with the given key has been successfully validated.
+        """
+        return key in self.__get_validated_keys()
+    
+    def add(self, key):
+        """
+        Marks a bundle with the given key as successfully validated.
+        Call save() to write the changes to disk.
+        """
+        keys = self.__get_validated_keys()
+        ValidationCache._lock.acquire()
+        try:
+            if key not in keys:
+                keys.append(key)
+                del(keys[:-self.MAX_ENTRIES])
+                self._dirty = True
+        finally:
+            ValidationCache._lock.release()
+    
+    def save(self):
+        """
+        Writes the validated keys to disk. Fails silently if the cache 
+        cannot be written.
+        """
+        if not self._dirty:
+            return
+        self._dirty = False
+        
+        keys = list(self.__get_validated_keys())
+        
+        cache_file = self.__get_cache_file()
+        if cache_file is None:
+            return
+        
+        try:
+            # the cache is loaded with pickle, so it is written with default
+            # permissions to a folder which is local to the current user
+            cache_dir = os.path.dirname(cache_file)
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            
+            # write to a temporary file first and then move it into place, so 
+            # that other processes never read a partially written cache file
+            tmp_file = "%s.%s.tmp" % (cache_file, uuid.uuid4().hex)
+            try:
+                fh = open(tmp_file, "wb")
+                try:
+                    pickle.dump(keys, fh)
+                finally:
+                    fh.close()
+                if sys.platform == "win32" and os.path.exists(cache_file):
+                    # rename doesn't replace existing files on windows
+                    os.remove(cache_file)
+                os.rename(tmp_file, cache_file)
+            finally:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+        except:
+            # silently continue in case exceptions are raised
+            pass
+    
+    def __get_cache_file(self):
+        """
+        Returns the path to the file holding the validated keys on disk, or None
+        if it cannot be determined. The cache on disk is optional, so any errors
+        raised while resolving its location are ignored.
+        """
+        try:
+            cache_folder = self._tank_api.pipeline_configuration.get_validation_cache_location(self._tank_api)
+        except Exception:
+            return None
+        return os.path.join(cache_folder, "validated_settings.cache")
+    
+    def __get_validated_keys(self):
+        """
+        Returns the list of validated keys, loading it from disk if necessary.
+        """
+        ValidationCache._lock.acquire()
+        try:
+            keys = ValidationCache._validated_keys.get(self._pc_path)
+            if keys is None:
+                keys = []
+                cache_file = self.__get_cache_file()
+                if cache_file and os.path.exists(cache_file):
+                    try:
+                        fh = open(cache_file, "rb")
+                        try:
+                            keys = pickle.load(fh)
+                        finally:
+                            fh.close()
+                    except:
+                        # failed to load cache from file. Continue silently.
+                        pass
+                ValidationCache._validated_keys[self._pc_path] = keys
+            return keys
+        finally:
+            ValidationCache._lock.release()
+
+def clear_validation_cache():
+    """
+    Clears the validated bundles held in memory. The cache on disk is left as is.
+    """
+    ValidationCache._lock.acquire()
+    try:
+        ValidationCache._validated_keys = {}
+    finally:
+        ValidationCache._lock.release()
+
+    
+def get_data_hash(data):
+    """
+    Returns a hash for a data structure loaded from yml. The hash is stable 
+    across sessions and does not depend on the ordering of dictionaries.
+
+    :param data:    Data structure to compute a hash for
+    :returns:       Hash as a hex string
+    """
+    def _get_hashable(value):
+        if isinstance(value, dict):
+            return tuple(sorted((k, _get_hashable(v)) for (k, v) in value.iteritems()))
+        elif isinstance(value, (list, tuple)):
+            return tuple(_get_hashable(x) for x in value)
+        return value
+
+    return hashlib.md5(repr(_get_hashable(data))).hexdigest()
+
+def get_file_signature(path):
+    """
+    Returns a cheap signature for a file or folder which changes whenever
+    it is modified.
+
+    :param path:    Path to a file or folder
+    :returns:       (modification time, size) tuple or None if the path
+                    could not be accessed.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+def _get_referenced_file_signatures(pipeline_config, schema, settings):
+    """
+    Returns the signatures of the hook and config files that the settings of 
+    a bundle refer to, including hooks found via environment variables. The 
+    result changes whenever one of these files is added, removed or modified.
+
+    :param pipeline_config: The pipeline configuration the settings belong to
+    :param schema:          The configuration schema of the bundle
+    :param settings:        The settings for the bundle
+    :returns:               List of (path, signature) tuples
+    """
+    signatures = []
+
+    def _process_value(value_schema, value):
+        data_type = value_schema.get("type")
+        if isinstance(value, basestring) and value.startswith("hook:"):
+            # functor values are never validated
+            return
+        elif data_type == "list" and isinstance(value, list):
+            for item in value:
+                _process_value(value_schema.get("values", {}), item)
+        elif data_type == "dict" and isinstance(value, dict):
+            for (key, item_schema) in value_schema.get("items", {}).items():
+                if key in value:
+                    _process_value(item_schema, value[key])
+        elif data_type == "hook" and isinstance(value, basestring):
+            for hook_expression in value.split(":"):
+                path = _get_hook_path(pipeline_config, hook_expression)
+                if path:
+                    signatures.append((path, get_file_signature(path)))
+        elif data_type == "config_path" and isinstance(value, basestring):
+            path = os.path.join(pipeline_config.get_config_location(), value.replace("/", os.path.sep))
+            signatures.append((path, get_file_signature(path)))
+
+    for (settings_key, value_schema) in sorted(schema.items()):
+        if settings_key in settings:
+            _process_value(value_schema, settings[settings_key])
+
+    return signatures
+
+def _get_hook_path(pipeline_config, hook_expression):
+    """
+    Resolves a hook expression which refers to a hook in the configuration
+    or to a hook found via an environment variable.
+
+    :param pipeline_config: The pipeline configuration the hook belongs to
+    :param hook_expression: Hook expression, e.g. '{config}/foo.py' or 'foo'
+    :returns:               Path to the hook file or None if the expression
+                            refers to a hook which ships with an app or framework
+    """
+    if hook_expression == constants.TANK_BUNDLE_DEFAULT_HOOK_SETTING:
+        return None
+
+    elif hook_expression.startswith("{config}"):
+        path = hook_expression.replace("{config}", pipeline_config.get_hooks_location())
+        return path.replace("/", os.path.sep)
+
+    elif hook_expression.startswith("{$") and "}" in hook_expression:
+        # environment variable: {$HOOK_PATH}/path/to/foo.py
+        env_var = re.match("^\{\$([^\}]+)\}", hook_expression).group(1)
+        if env_var not in os.environ:
+            return None
+        path = hook_expression.replace("{$%s}" % env_var, os.environ[env_var])
+        return path.replace("/", os.path.sep)
+
+    elif hook_expression.startswith("{"):
+        # {self} and bundle instance references
+        return None
+
+    # old school config hook name, e.g. just 'foo'
+    return os.path.join(pipeline_config.get_hooks_location(), "%s.py" % hook_expression)
+
 def get_missing_frameworks(descriptor, environment):
     """
     Returns a list of framework descriptors by the given descriptor required but not present 
@@ -245,7 +542,13 @@ def convert_string_to_type(string_value, schema_type):
     
 # Helper used by both schema and settings validators
 def _validate_expected_data_type(expected_type, value):
-    value_type_name = type(value).__name__
+    # note: manifest data is handed out as read-only subclasses of dict and list
+    if isinstance(value, dict):
+        value_type_name = "dict"
+    elif isinstance(value, list):
+        value_type_name = "list"
+    else:
+        value_type_name = type(value).__name__
 
     expected_type_name = expected_type
     if expected_type in constants.TANK_SCHEMA_STRING_TYPES:
@@ -303,7 +606,7 @@ class _SchemaValidator:
 
     def __validate_schema_list(self, settings_key, schema):
         # Check that the schema contains "values"
-        if not "values" in schema or type(schema["values"]) != dict:
+        if not "values" in schema or not isinstance(schema["values"], dict):
             params = (settings_key, self._display_name)
             raise TankError("Missing or invalid 'values' dict in schema '%s' for '%s'!" % params)
 
@@ -316,13 +619,13 @@ class _SchemaValidator:
 
     def __validate_schema_dict(self, settings_key, schema):
         # Check that if the schema contains "items" then it must be a dict
-        if "items" in schema and type(schema["items"]) != dict:
+        if "items" in schema and not isinstance(schema["items"], dict):
             params = (settings_key, self._display_name)
             raise TankError("Invalid 'items' dict in schema '%s' for '%s'!" % params)
 
         for key,value_schema in schema.get("items",{}).items():
             # Check that the value is a dict, and validate it...
-            if type(value_schema) != dict:
+            if not isinstance(value_schema, dict):
                 params = (key, settings_key, self._display_name)
                 raise TankError("Invalid '%s' dict in schema '%s' for '%s'" % params)
 
@@ -336,7 +639,7 @@ class _SchemaValidator:
             raise TankError("Invalid 'fields' string in schema '%s' for '%s'!" % params)
         
         # old-style - if there's a required_fields key, it should contain a list of strs.
-        if "required_fields" in schema and type(schema["required_fields"]) != list:
+        if "required_fields" in schema and not isinstance(schema["required_fields"], list):
             params = (settings_key, self._display_name)
             raise TankError("Invalid 'required_fields' list in schema '%s' for '%s'!" % params)
 
@@ -346,7 +649,7 @@ class _SchemaValidator:
                 raise TankError("Invalid 'required_fields' value '%s' in schema '%s' for '%s'!" % params)
 
         # old-style - if there's an optional_fields key, it should contain a list of strs or be "*"
-        if "optional_fields" in schema and type(schema["optional_fields"]) == list:
+        if "optional_fields" in schema and isinstance(schema["optional_fields"], list):
             for field in schema.get("optional_fields",[]):
                 if type(field) != str:
                     params = (field, settings_key, self._display_name)
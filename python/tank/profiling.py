@@ -0,0 +1,278 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Hierarchical timing of the phases of toolkit startup.
+
+Profiling is off by default and is turned on by setting the TANK_STARTUP_PROFILING
+environment variable or by calling enable_startup_profiling(). When turned on, each
+instrumented phase (resolving the pipeline configuration, reading templates, creating
+the context, picking the environment, starting the engine and its apps etc.) is
+recorded together with the phases nested inside it.
+
+The recorded trace is reported once an engine has been started. If the environment
+variable is set to a file path, the trace is appended to that file in the folded
+stack format used by flame graph tools ("frame;frame;frame microseconds"), otherwise
+it is printed to stdout. The trace can also be retrieved via get_startup_trace() and
+get_folded_startup_trace(). Only the most recent top level phases are kept, see 
+STARTUP_PROFILING_MAX_FRAMES.
+
+"""
+
+import os
+import sys
+import time
+import threading
+import functools
+
+from .platform import constants
+
+
+class _Frame(object):
+    """
+    A single timed phase and the phases nested inside it.
+    """
+    def __init__(self, name):
+        """
+        Construction
+
+        :param name: Name of the phase
+        """
+        self.name = name
+        self.start_time = time.time()
+        self.duration = None
+        self.children = []
+
+    def to_dict(self):
+        """
+        Returns the frame and its children as a dictionary.
+        """
+        return {"name": self.name,
+                "duration": self.duration,
+                "children": [x.to_dict() for x in self.children]}
+
+
+class _StartupProfiler(object):
+    """
+    Thread-safe recorder of the phases of toolkit startup. Phases are nested per
+    thread, so that work carried out in background threads ends up in separate
+    top level frames.
+    """
+    def __init__(self):
+        """
+        Construction
+        """
+        self._frames = []
+        self._num_reported = 0
+        self._frames_lock = threading.Lock()
+        self._active = threading.local()
+        self.enabled = os.environ.get(constants.STARTUP_PROFILING_ENV_VAR, "0") not in ("", "0")
+
+    def clear(self):
+        """
+        Discards all phases recorded so far
+        """
+        self._frames_lock.acquire()
+        try:
+            self._frames = []
+            self._num_reported = 0
+        finally:
+            self._frames_lock.release()
+
+    def start(self, name):
+        """
+        Starts timing a phase. Each call must be matched by a call to stop().
+
+        :param name: Name of the phase
+        :returns: Frame for the phase, to pass to stop(), or None if
+                  profiling is turned off.
+        """
+        if not self.enabled:
+            return None
+
+        stack = getattr(self._active, "stack", None)
+        if stack is None:
+            stack = []
+            self._active.stack = stack
+
+        frame = _Frame(name)
+        stack.append(frame)
+        return frame
+
+    def stop(self, frame):
+        """
+        Stops timing a phase.
+
+        :param frame: Frame returned by start()
+        """
+        if frame is None:
+            return
+
+        frame.duration = time.time() - frame.start_time
+
+        stack = self._active.stack
+        # unwind any phases that were never stopped
+        while stack and stack.pop() is not frame:
+            pass
+
+        if stack:
+            stack[-1].children.append(frame)
+        else:
+            self._frames_lock.acquire()
+            try:
+                self._frames.append(frame)
+                # discard the oldest frames once the limit is reached
+                num_discarded = len(self._frames) - constants.STARTUP_PROFILING_MAX_FRAMES
+                if num_discarded > 0:
+                    del(self._frames[:num_discarded])
+                    self._num_reported = max(self._num_reported - num_discarded, 0)
+            finally:
+                self._frames_lock.release()
+
+    def get(self):
+        """
+        Returns all completed top level frames.
+        """
+        self._frames_lock.acquire()
+        try:
+            return list(self._frames)
+        finally:
+            self._frames_lock.release()
+
+    def get_unreported(self):
+        """
+        Returns the completed top level frames which haven't been
+        reported yet and marks them as reported.
+        """
+        self._frames_lock.acquire()
+        try:
+            frames = self._frames[self._num_reported:]
+            self._num_reported = len(self._frames)
+            return frames
+        finally:
+            self._frames_lock.release()
+
+_startup_profiler = _StartupProfiler()
+
+
+def profiled(name):
+    """
+    Decorator which records each call to the decorated function as a phase.
+
+    :param name: Name of the phase
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def profiled_func(*args, **kwargs):
+            if not _startup_profiler.enabled:
+                return func(*args, **kwargs)
+            frame = _startup_profiler.start(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _startup_profiler.stop(frame)
+        return profiled_func
+    return decorator
+
+def start_phase(name):
+    """
+    Starts timing a phase. Each call must be matched by a call to stop_phase(),
+    typically in a finally clause.
+
+    :param name: Name of the phase
+    :returns: Token to pass to stop_phase()
+    """
+    return _startup_profiler.start(name)
+
+def stop_phase(token):
+    """
+    Stops timing a phase.
+
+    :param token: Token returned by start_phase()
+    """
+    _startup_profiler.stop(token)
+
+def enable_startup_profiling(enabled=True):
+    """
+    Turns the profiling of startup phases on or off. Profiling can also
+    be turned on by setting the TANK_STARTUP_PROFILING environment variable.
+
+    :param enabled: True to turn profiling on, False to turn it off
+    """
+    _startup_profiler.enabled = enabled
+
+def get_startup_trace():
+    """
+    Returns all phases recorded in this session, up to the most recent
+    STARTUP_PROFILING_MAX_FRAMES top level phases.
+
+    :returns: List of dictionaries with keys name, duration and children, where
+              children is a list of dictionaries for the nested phases. Durations
+              are expressed in seconds.
+    """
+    return [x.to_dict() for x in _startup_profiler.get()]
+
+def _get_folded_lines(frames, prefix=""):
+    """
+    Returns lines in folded stack format for a list of frames and their children.
+    """
+    lines = []
+    for frame in frames:
+        # the separator cannot be part of frame names
+        path = prefix + frame.name.replace(";", ":")
+        child_time = sum([x.duration for x in frame.children])
+        self_time = int(round(max(frame.duration - child_time, 0.0) * 1000000))
+        lines.append("%s %d" % (path, self_time))
+        lines.extend(_get_folded_lines(frame.children, path + ";"))
+    return lines
+
+def get_folded_startup_trace():
+    """
+    Returns all phases recorded in this session in the folded stack format
+    used by flame graph tools. Each line holds a semicolon separated stack
+    of phase names followed by the time spent in that phase, excluding
+    nested phases, in microseconds.
+
+    :returns: Trace as a string
+    """
+    return "\n".join(_get_folded_lines(_startup_profiler.get()))
+
+def report_startup_trace():
+    """
+    Outputs the phases recorded since the last report, as specified by the
+    TANK_STARTUP_PROFILING environment variable. Does nothing if profiling
+    is turned off. Failures to write the trace are silently ignored.
+    """
+    if not _startup_profiler.enabled:
+        return
+
+    lines = _get_folded_lines(_startup_profiler.get_unreported())
+    if not lines:
+        return
+
+    output_path = os.environ.get(constants.STARTUP_PROFILING_ENV_VAR, "0")
+    try:
+        if output_path in ("", "0", "1"):
+            sys.stdout.write("Toolkit startup trace:\n%s\n" % "\n".join(lines))
+        else:
+            fh = open(output_path, "a")
+            try:
+                fh.write("\n".join(lines) + "\n")
+            finally:
+                fh.close()
+    except:
+        # silently continue in case exceptions are raised
+        pass
+
+def clear_startup_trace():
+    """
+    Discards all phases recorded so far.
+    """
+    _startup_profiler.clear()
@@ -15,10 +15,12 @@ Management of file and directory templates.
 
 import os
 import re
+import copy
 
 from . import templatekey
 from .errors import TankError
 from .platform import constants
+from . import profiling
 from .template_path_parser import TemplatePathParser
 
 
@@ -500,6 +502,7 @@ def split_path(input_path):
     cur_path = cur_path.replace("\\", "/")
     return cur_path.split("/")
 
+@profiling.profiled("read_templates")
 def read_templates(pipeline_configuration):
     """
     Creates templates and keys based on contents of templates file.
@@ -535,6 +538,36 @@ def read_templates(pipeline_configuration):
     return templates
 
 
+def copy_templates(templates):
+    """
+    Copies a dictionary of templates, as returned by read_templates(). The 
+    templates and the template keys they use are copied, so that the copies
+    can be used and modified independently of the originals. Keys which are
+    shared by several templates and templates referred to by the validate_with
+    attribute of template strings are shared by the copies in the same way.
+    
+    :param templates: Dictionary of form {template name: template object}
+    :returns: Dictionary of form {template name: template object}
+    """
+    copies = {}
+    
+    def _copy(obj):
+        if id(obj) not in copies:
+            copies[id(obj)] = copy.copy(obj)
+        return copies[id(obj)]
+    
+    templates_copy = {}
+    for (name, template) in templates.iteritems():
+        template_copy = _copy(template)
+        template_copy._keys = [dict((key_name, _copy(key)) for (key_name, key) in keys.iteritems()) 
+                               for keys in template._keys]
+        template_copy._ordered_keys = [[_copy(key) for key in keys] for keys in template._ordered_keys]
+        if isinstance(template, TemplateString) and template.validate_with is not None:
+            template_copy.validate_with = _copy(template.validate_with)
+        templates_copy[name] = template_copy
+    
+    return templates_copy
+
 def make_template_paths(data, keys, roots):
     """
     Factory function which creates TemplatePaths.
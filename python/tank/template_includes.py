@@ -33,10 +33,9 @@ c:\foo\bar\hello.yml - absolute path, windows
 import os
 import sys
 
-from tank_vendor import yaml
-
 from .errors import TankError
 from .platform import constants
+from .util import yaml_cache
 
 
 def _get_includes(file_name, data):
@@ -106,11 +105,7 @@ def _process_template_includes_r(file_name, data):
     for included_path in included_paths:
                 
         # path exists, so try to read it
-        fh = open(included_path, "r")
-        try:
-            included_data = yaml.load(fh) or {}
-        finally:
-            fh.close()
+        included_data = yaml_cache.load_yaml(included_path) or {}
         
         # before doing any type of processing, allow the included data to be resolved.
         included_data = _process_template_includes_r(included_path, included_data)
@@ -128,6 +123,21 @@ def _process_template_includes_r(file_name, data):
     
     return output_data
         
+def get_include_files(file_name, data):
+    """
+    Returns all files included by a templates file, recursively.
+    
+    :param file_name:   Path to the templates file
+    :param data:        The contents of the templates file
+    :returns:           List of paths of included files, in the order they are processed
+    """
+    include_files = []
+    for included_path in _get_includes(file_name, data):
+        included_data = yaml_cache.load_yaml(included_path) or {}
+        include_files.extend(get_include_files(included_path, included_data))
+        include_files.append(included_path)
+    return include_files
+        
 def process_includes(file_name, data):
     """
     Processes includes for the main templates file. Will look for 
@@ -10,6 +10,7 @@
 
 
 from .shotgun import register_publish
+from .shotgun import register_publishes
 from .shotgun import find_publish
 from .shotgun import download_url
 from .shotgun import create_event_log_entry
@@ -0,0 +1,42 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Selection of the json library used by core.
+
+Code in core which reads or writes json should import the json module from
+here. The selection follows the same rule as the shotgun API: simplejson is
+used if it is installed with its C speedups, otherwise the json module of the
+standard library is preferred if its decoder is implemented in C. This is done
+without importing the shotgun API, which is only loaded when it is needed.
+
+"""
+
+def _has_c_decoder(json_module):
+    """
+    Returns True if the decoder of a json module is implemented in C.
+    """
+    scanner = getattr(json_module, "scanner", None)
+    return getattr(scanner, "c_make_scanner", None) is not None
+
+try:
+    import simplejson as json
+    if not _has_c_decoder(json):
+        # a pure python simplejson is much slower than the json module of
+        # python 2.7, which comes with a decoder implemented in C
+        import json as _std_json
+        if _has_c_decoder(_std_json):
+            json = _std_json
+except ImportError:
+    try:
+        import json
+    except ImportError:
+        # python 2.5 - use the simplejson copy bundled with the shotgun API
+        from tank_vendor.shotgun_api3.lib import simplejson as json
@@ -0,0 +1,344 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Read-through cache for Shotgun queries.
+
+Core repeatedly runs the same small queries for data which rarely changes,
+for example local storages, schema information or the entities a context
+is made of. When the query cache is turned on, the Shotgun API handles returned
+by tk.shotgun and by the connection pool are wrapped in a CachedShotgun object 
+which returns the results of identical queries from memory until they expire.
+
+Only queries for the entity types listed in SG_QUERY_CACHE_TTLS are cached,
+all other queries are always sent to Shotgun. Entries expire after the time
+to live of their entity type and are evicted least recently used first once
+the cache is full.
+Writes made through a wrapped handle discard all cached queries for the
+entity types written to.
+"""
+
+import os
+import time
+import threading
+
+from ..platform import constants
+from .yaml_cache import copy_data
+
+# pseudo entity type under which schema queries for all entity types are cached
+SCHEMA_ENTITY_TYPE = "__schema__"
+
+
+def _get_hashable(value):
+    """
+    Converts a data structure of lists and dictionaries into nested tuples
+    which can be used as a dictionary key.
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _get_hashable(v)) for (k, v) in value.iteritems()))
+    elif isinstance(value, (list, tuple)):
+        return tuple(_get_hashable(x) for x in value)
+    return value
+
+def _normalize_filters(filters):
+    """
+    Returns a hashable representation of shotgun filters which doesn't depend
+    on the order in which the conditions are listed.
+    """
+    if isinstance(filters, (list, tuple)):
+        return tuple(sorted(_get_hashable(x) for x in filters))
+    return _get_hashable(filters)
+
+
+class ShotgunQueryCache(object):
+    """
+    Thread-safe cache of Shotgun query results with per entity type
+    time to live, least recently used eviction and hit rate statistics.
+
+    The cache is off by default and can be turned on by setting the
+    TANK_SG_QUERY_CACHE environment variable or via the enabled attribute.
+    """
+
+    def __init__(self, ttls=None, default_ttl=None, max_entries=None):
+        """
+        Constructor.
+
+        :param ttls: Dictionary of time to live values in seconds, keyed by entity type.
+        :param default_ttl: Time to live in seconds for entity types not in ttls.
+                            Zero means that these are not cached.
+        :param max_entries: Maximum number of queries to keep.
+        """
+        if ttls is None:
+            ttls = constants.SG_QUERY_CACHE_TTLS
+        self.ttls = dict(ttls)
+        if default_ttl is None:
+            default_ttl = constants.SG_QUERY_CACHE_DEFAULT_TTL
+        self.default_ttl = default_ttl
+        if max_entries is None:
+            max_entries = constants.SG_QUERY_CACHE_MAX_ENTRIES
+        self.max_entries = max_entries
+        self.enabled = os.environ.get(constants.SG_QUERY_CACHE_ENV_VAR, "0") not in ("", "0")
+
+        self._entries = {}
+        # keys of the entries, least recently used first
+        self._keys = []
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, sg):
+        """
+        Returns a handle which runs queries through the cache while it is on.
+
+        :param sg: Shotgun API instance
+        :returns: The instance wrapped in a CachedShotgun object if the cache
+                  is on, otherwise the instance itself.
+        """
+        if self.enabled:
+            return CachedShotgun(sg, self)
+        return sg
+
+    def is_cached(self, entity_type):
+        """
+        Returns whether queries for an entity type are cached.
+
+        :param entity_type: Entity type, or SCHEMA_ENTITY_TYPE for schema queries
+        :returns: True if the cache is on and the entity type has a time to live
+        """
+        return self.enabled and self.ttls.get(entity_type, self.default_ttl) > 0
+
+    def get_key(self, method, entity_type, filters=None, fields=None, order=None, **kwargs):
+        """
+        Returns the cache key for a query.
+
+        :param method: Name of the shotgun API method, e.g. find_one
+        :param entity_type: Entity type queried
+        :param filters: Shotgun filters
+        :param fields: List of fields to return
+        :param order: Shotgun sort order
+        :param kwargs: Any other arguments passed to the API method
+        :returns: hashable key
+        """
+        return (method,
+                entity_type,
+                _normalize_filters(filters),
+                tuple(sorted(set(fields or []))),
+                _get_hashable(order),
+                _get_hashable(kwargs))
+
+    def get(self, key, entity_type):
+        """
+        Looks up the result of a query. The lookup is recorded in the statistics.
+
+        :param key: Key returned by get_key()
+        :param entity_type: Entity type the query is for
+        :returns: (found, result) tuple. The result is a copy which
+                  can safely be modified by the caller.
+        """
+        now = time.time()
+        self._lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                # move to the most recently used end
+                self._keys.remove(key)
+                self._keys.append(key)
+            stats = self._stats.setdefault(entity_type, {"hits": 0, "misses": 0})
+            stats[entry is None and "misses" or "hits"] += 1
+        finally:
+            self._lock.release()
+
+        if entry is None:
+            return (False, None)
+        return (True, copy_data(entry[2]))
+
+    def add(self, key, entity_type, result):
+        """
+        Adds the result of a query to the cache.
+
+        :param key: Key returned by get_key()
+        :param entity_type: Entity type the query is for
+        :param result: Result returned by shotgun
+        """
+        expires = time.time() + self.ttls.get(entity_type, self.default_ttl)
+        self._lock.acquire()
+        try:
+            if key in self._entries:
+                self._keys.remove(key)
+            self._entries[key] = (expires, entity_type, copy_data(result))
+            self._keys.append(key)
+            while len(self._keys) > self.max_entries:
+                del self._entries[self._keys.pop(0)]
+        finally:
+            self._lock.release()
+
+    def _remove(self, key):
+        """
+        Removes an entry. The lock must be held by the caller.
+        """
+        del self._entries[key]
+        self._keys.remove(key)
+
+    def invalidate(self, entity_type):
+        """
+        Discards all cached queries for an entity type.
+
+        :param entity_type: Entity type to discard queries for
+        """
+        self._lock.acquire()
+        try:
+            for (key, entry) in self._entries.items():
+                if entry[1] == entity_type:
+                    self._remove(key)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """
+        Discards all cached queries and statistics.
+        """
+        self._lock.acquire()
+        try:
+            self._entries = {}
+            self._keys = []
+            self._stats = {}
+        finally:
+            self._lock.release()
+
+    def get_statistics(self):
+        """
+        Returns the hit rates of the cache.
+
+        :returns: List of dictionaries with keys entity_type, hits, misses and
+                  hit_rate, sorted by the number of lookups, most frequent first.
+        """
+        self._lock.acquire()
+        try:
+            stats = [dict(x, entity_type=k) for (k, x) in self._stats.iteritems()]
+        finally:
+            self._lock.release()
+
+        for entry in stats:
+            entry["hit_rate"] = float(entry["hits"]) / (entry["hits"] + entry["misses"])
+        return sorted(stats, key=lambda x: x["hits"] + x["misses"], reverse=True)
+
+
+class CachedShotgun(object):
+    """
+    Wrapper around a Shotgun API instance which returns the results of
+    read queries from a ShotgunQueryCache and discards cached queries for
+    the entity types written to through it. All other attributes are
+    passed on to the wrapped instance.
+    """
+
+    def __init__(self, sg, cache):
+        """
+        Constructor.
+
+        :param sg: Shotgun API instance to wrap
+        :param cache: ShotgunQueryCache to use
+        """
+        self._sg = sg
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._sg, name)
+
+    def _read(self, method, entity_type, cache_entity_type, *args, **kwargs):
+        """
+        Runs a read query through the cache.
+
+        :param method: Name of the shotgun API method
+        :param entity_type: Entity type passed to the method, if any
+        :param cache_entity_type: Entity type to cache the query under
+        :returns: The result of the query
+        """
+        sg_method = getattr(self._sg, method)
+        if not self._cache.is_cached(cache_entity_type):
+            if entity_type is None:
+                return sg_method(*args, **kwargs)
+            return sg_method(entity_type, *args, **kwargs)
+
+        key = self._cache.get_key(method, entity_type, *args, **kwargs)
+        (found, result) = self._cache.get(key, cache_entity_type)
+        if not found:
+            if entity_type is None:
+                result = sg_method(*args, **kwargs)
+            else:
+                result = sg_method(entity_type, *args, **kwargs)
+            self._cache.add(key, cache_entity_type, result)
+        return result
+
+    def _write(self, method, entity_types, *args, **kwargs):
+        """
+        Runs a write call and discards the cached queries for the
+        entity types written to.
+
+        :param method: Name of the shotgun API method
+        :param entity_types: List of entity types that are written to
+        :returns: The result of the call
+        """
+        try:
+            return getattr(self._sg, method)(*args, **kwargs)
+        finally:
+            # even failed calls may have made partial changes
+            for entity_type in set(entity_types):
+                self._cache.invalidate(entity_type)
+
+    def find(self, entity_type, filters, fields=None, order=None, **kwargs):
+        return self._read("find", entity_type, entity_type,
+                          filters, fields, order, **kwargs)
+
+    def find_one(self, entity_type, filters, fields=None, order=None, **kwargs):
+        return self._read("find_one", entity_type, entity_type,
+                          filters, fields, order, **kwargs)
+
+    def schema_read(self, **kwargs):
+        return self._read("schema_read", None, SCHEMA_ENTITY_TYPE, **kwargs)
+
+    def schema_entity_read(self, **kwargs):
+        return self._read("schema_entity_read", None, SCHEMA_ENTITY_TYPE, **kwargs)
+
+    def schema_field_read(self, entity_type, field_name=None, **kwargs):
+        return self._read("schema_field_read", entity_type, SCHEMA_ENTITY_TYPE,
+                          field_name=field_name, **kwargs)
+
+    def create(self, entity_type, *args, **kwargs):
+        return self._write("create", [entity_type], entity_type, *args, **kwargs)
+
+    def update(self, entity_type, *args, **kwargs):
+        return self._write("update", [entity_type], entity_type, *args, **kwargs)
+
+    def delete(self, entity_type, *args, **kwargs):
+        return self._write("delete", [entity_type], entity_type, *args, **kwargs)
+
+    def revive(self, entity_type, *args, **kwargs):
+        return self._write("revive", [entity_type], entity_type, *args, **kwargs)
+
+    def batch(self, requests, *args, **kwargs):
+        entity_types = [x.get("entity_type") for x in requests]
+        return self._write("batch", entity_types, requests, *args, **kwargs)
+
+    def upload(self, entity_type, *args, **kwargs):
+        return self._write("upload", [entity_type], entity_type, *args, **kwargs)
+
+    def upload_thumbnail(self, entity_type, *args, **kwargs):
+        return self._write("upload_thumbnail", [entity_type], entity_type, *args, **kwargs)
+
+    def schema_field_create(self, *args, **kwargs):
+        return self._write("schema_field_create", [SCHEMA_ENTITY_TYPE], *args, **kwargs)
+
+    def schema_field_update(self, *args, **kwargs):
+        return self._write("schema_field_update", [SCHEMA_ENTITY_TYPE], *args, **kwargs)
+
+    def schema_field_delete(self, *args, **kwargs):
+        return self._write("schema_field_delete", [SCHEMA_ENTITY_TYPE], *args, **kwargs)
@@ -14,21 +14,42 @@ Shotgun utilities
 """
 
 import os
+import re
+import copy
 import sys
+import time
 import urllib
 import urllib2
 import urlparse
-
-from tank_vendor.shotgun_api3 import Shotgun
-from tank_vendor import yaml
+import weakref
+import threading
+import Queue
 
 from ..errors import TankError
 from .. import hook
 from ..platform import constants
 from . import login
+from . import yaml_cache
+from . import shotgun_statistics
+from .query_cache import ShotgunQueryCache, CachedShotgun
 
 g_app_store_connection = None
 
+# local storage entities, keyed by API instance
+g_local_storages = weakref.WeakKeyDictionary()
+g_local_storages_lock = threading.Lock()
+
+# normalized data root prefixes, keyed by pipeline configuration
+g_data_root_prefixes = weakref.WeakKeyDictionary()
+g_data_root_prefixes_lock = threading.Lock()
+
+# splits a path into the part before the last number, the number and the rest
+g_frame_number_regex = re.compile(r"^(.*?)(\d+)(\D*)$")
+
+# server capabilities, keyed by site url
+g_server_caps = {}
+g_server_caps_lock = threading.Lock()
+
 def __get_api_core_config_location():
     """
     Given the location of the code, find the core config location.
@@ -136,11 +157,7 @@ def __get_sg_config_data(shotgun_cfg_path, user="default"):
 
     # load the config file
     try:
-        open_file = open(shotgun_cfg_path)
-        try:
-            file_data = yaml.load(open_file)
-        finally:
-            open_file.close()
+        file_data = yaml_cache.load_yaml(shotgun_cfg_path)
     except Exception, error:
         raise TankError("Cannot load config file '%s'. Error: %s" % (shotgun_cfg_path, error))
 
@@ -189,11 +206,39 @@ def __create_sg_connection(shotgun_cfg_path, evaluate_script_user, user="default
     # get connection parameters
     config_data = __get_sg_config_data(shotgun_cfg_path, user)
 
-    # create API
+    # the server capabilities are retrieved when the first connection to a site
+    # is made and are then shared by all subsequent connections, avoiding a
+    # round trip to the server each time a connection is created.
+    g_server_caps_lock.acquire()
+    try:
+        server_caps = g_server_caps.get(config_data["host"])
+    finally:
+        g_server_caps_lock.release()
+
+    # create API - the shotgun API is imported on first use since 
+    # it is expensive to import and not needed by all toolkit code
+    from tank_vendor.shotgun_api3 import Shotgun
     sg = Shotgun(config_data["host"],
                  config_data["api_script"],
                  config_data["api_key"],
-                 http_proxy=config_data.get("http_proxy", None))
+                 http_proxy=config_data.get("http_proxy", None),
+                 connect=(server_caps is None))
+    
+    if server_caps is None:
+        g_server_caps_lock.acquire()
+        try:
+            g_server_caps[config_data["host"]] = sg.server_caps
+        finally:
+            g_server_caps_lock.release()
+    else:
+        # ServerCapabilities objects are read only, so can be safely shared
+        sg._server_caps = server_caps
+
+    # optionally fetch large result sets over several connections
+    sg.config.max_page_threads = _get_max_page_threads(config_data)
+
+    # report calls for profiling
+    sg.config.rpc_observer = shotgun_statistics.record_call
 
     # bolt on our custom user agent manager
     sg.tk_user_agent_handler = ToolkitUserAgentHandler(sg)
@@ -211,6 +256,27 @@ def __create_sg_connection(shotgun_cfg_path, evaluate_script_user, user="default
 
     return (sg, script_user)
 
+
+def _get_max_page_threads(config_data):
+    """
+    Returns the number of result pages a shotgun connection should fetch 
+    concurrently. The environment variable takes precedence over the 
+    max_page_threads value in the shotgun config. Invalid values are ignored.
+    
+    :param config_data: shotgun config data dictionary
+    :returns: Number of page threads, 1 or more
+    """
+    for value in (os.environ.get(constants.SG_FIND_MAX_PAGE_THREADS_ENV_VAR), 
+                  config_data.get("max_page_threads")):
+        if value is None or value == "":
+            continue
+        try:
+            return max(1, int(value))
+        except (TypeError, ValueError):
+            # invalid value - try the next source
+            pass
+    
+    return constants.SG_FIND_MAX_PAGE_THREADS
     
 def download_url(sg, url, location):
     """
@@ -270,11 +336,11 @@ def get_associated_sg_base_url():
     return config_data["host"]
 
     
-g_sg_cached_connection = None
 def get_sg_connection():
     """
-    Returns a shotgun connection and maintains a global, cached connection so that only one
-    object is ever returned, no matter how many times this call is made.
+    Returns a shotgun connection for the current thread. The connection is dedicated to
+    the thread by a global connection pool and the same object is returned every time 
+    this method is called from the same thread. It is not shared with tk.shotgun.
     
     If you have access to a tk API handle, DO NOT USE THIS METHOD! Instead, use the 
     tk.shotgun handle, which is also optimal and doesn't keep creating new instances.
@@ -286,16 +352,12 @@ def get_sg_connection():
     it is running the right versions etc. This is slow and inefficient and means that
     there will be a delay every time create_sg_connection is called.
 
-    This method caches a global (non-threadsafe!) sg instance and thereby avoids
+    This method reuses an sg instance per thread and thereby avoids
     the penalty of connecting to sg every single time the method is called.
     
     :return: SG API handle    
     """
-    
-    global g_sg_cached_connection
-    if g_sg_cached_connection is None:
-        g_sg_cached_connection = create_sg_connection()
-    return g_sg_cached_connection
+    return get_connection_pool().get_thread_connection()
 
 def create_sg_connection(user="default"):
     """
@@ -315,6 +377,35 @@ def create_sg_connection(user="default"):
     api_handle, _ = __create_sg_connection(__get_sg_config(), evaluate_script_user=False, user=user)
     return api_handle
 
+def clone_sg_connection(sg):
+    """
+    Creates a new Shotgun API instance which talks to the same site, with the 
+    same credentials and settings, as the given instance. This is useful for 
+    running queries on behalf of an API handle from several threads, since a 
+    Shotgun API instance must only be used by one thread at a time.
+    
+    The new instance shares the server capabilities of the given instance, so 
+    no round trip to the server is needed to create it.
+    
+    :param sg: SG API instance to clone, for example tk.shotgun
+    :returns: New SG API instance or None if the given object isn't a 
+              Shotgun API instance and therefore can't be cloned.
+    """
+    from tank_vendor.shotgun_api3 import Shotgun
+    
+    if isinstance(sg, CachedShotgun):
+        sg = sg._sg
+    if not isinstance(sg, Shotgun):
+        return None
+    
+    clone = Shotgun(sg.base_url, connect=False)
+    # the config holds the site, credentials, proxy and all other settings
+    clone.config = copy.copy(sg.config)
+    # ServerCapabilities objects are read only, so can be safely shared
+    clone._server_caps = sg._server_caps
+    clone._user_agents = list(sg._user_agents)
+    return clone
+
 def create_sg_app_store_connection():
     """
     Creates a shotgun connection to the tank app store.
@@ -333,6 +424,224 @@ def create_sg_app_store_connection():
     return g_app_store_connection
 
 
+class ShotgunConnectionPool(object):
+    """
+    A thread-safe pool of Shotgun API instances for a shotgun config user.
+    
+    The Shotgun API isn't thread-safe, so each instance should only be used by one 
+    thread at a time. The pool hands out instances in two ways: 
+    
+    - get_thread_connection() returns an instance dedicated to the calling thread, 
+      which is kept until the pool is cleared.
+    - checkout() hands out an instance for exclusive use, which should be handed
+      back via checkin() once done. Only these instances are reused once they
+      have been handed back. This is useful for short lived worker threads.
+    
+    All instances share the same connection settings and server capabilities, so 
+    only the first instance created for a site needs to connect to the server up front.
+    
+    While the pool's query cache is turned on, the instances dedicated to threads 
+    are returned wrapped so that the results of repeated queries are served from 
+    the cache.
+    """
+    
+    def __init__(self, user="default", size=None, idle_timeout=None):
+        """
+        Constructor.
+        
+        :param user: The shotgun config user to create connections for, as defined in shotgun.yml
+        :param size: The maximum number of idle instances to keep in the pool. Instances
+                     checked in when the pool is full are discarded.
+        :param idle_timeout: The time in seconds after which idle instances in the pool 
+                             are discarded.
+        """
+        self.user = user
+        if size is None:
+            size = constants.SG_CONNECTION_POOL_SIZE
+        self.size = size
+        if idle_timeout is None:
+            idle_timeout = constants.SG_CONNECTION_POOL_IDLE_TIMEOUT
+        self.idle_timeout = idle_timeout
+        
+        self._idle = []
+        self._lock = threading.Lock()
+        self._thread_local = threading.local()
+        # the instances dedicated to threads, so that they can be closed
+        # when the pool is cleared. Instances of finished threads drop out.
+        self._thread_connections = weakref.WeakKeyDictionary()
+        self.query_cache = ShotgunQueryCache()
+
+    def _create_connection(self):
+        """
+        Creates a new Shotgun API instance.
+        """
+        return create_sg_connection(self.user)
+    
+    def _close_connection(self, sg):
+        """
+        Closes the network connection held by a Shotgun API instance.
+        """
+        try:
+            sg.close()
+        except Exception:
+            # the connection may already be closed
+            pass
+
+    def checkout(self):
+        """
+        Hands out a Shotgun API instance for the exclusive use of the caller. The instance
+        should be returned via checkin() once the caller is done with it.
+        
+        :returns: SG API instance
+        """
+        sg = None
+        now = time.time()
+        
+        self._lock.acquire()
+        try:
+            # discard instances which have been idle for too long
+            expired = [x for (x, idle_since) in self._idle if now - idle_since > self.idle_timeout]
+            self._idle = [x for x in self._idle if now - x[1] <= self.idle_timeout]
+            if self._idle:
+                # reuse the most recently used instance
+                (sg, _) = self._idle.pop()
+        finally:
+            self._lock.release()
+        
+        for expired_sg in expired:
+            self._close_connection(expired_sg)
+        
+        if sg is None:
+            sg = self._create_connection()
+        return sg
+    
+    def checkin(self, sg):
+        """
+        Returns a Shotgun API instance obtained via checkout() to the pool.
+        The caller should not use the instance anymore.
+        
+        :param sg: SG API instance
+        """
+        self._lock.acquire()
+        try:
+            if len(self._idle) < self.size:
+                self._idle.append((sg, time.time()))
+                sg = None
+        finally:
+            self._lock.release()
+        
+        if sg is not None:
+            # the pool is full
+            self._close_connection(sg)
+            
+    def get_thread_connection(self):
+        """
+        Returns a Shotgun API instance dedicated to the calling thread. The same 
+        instance is returned every time this method is called from the same thread.
+        
+        :returns: SG API instance
+        """
+        sg = getattr(self._thread_local, "sg", None)
+        if sg is None:
+            sg = self._create_connection()
+            self._lock.acquire()
+            try:
+                self._thread_connections[sg] = True
+            finally:
+                self._lock.release()
+            self._thread_local.sg = sg
+        # the query cache may be turned on once the thread is already using 
+        # the instance, so check whether to wrap it every time it is requested
+        return self.query_cache.wrap(sg)
+    
+    def clear(self):
+        """
+        Closes all idle instances in the pool and all instances dedicated to 
+        threads. Threads get a new instance the next time they request one.
+        """
+        self._lock.acquire()
+        try:
+            idle = [sg for (sg, _) in self._idle]
+            self._idle = []
+            thread_connections = self._thread_connections.keys()
+            self._thread_connections = weakref.WeakKeyDictionary()
+            self._thread_local = threading.local()
+        finally:
+            self._lock.release()
+        
+        for sg in idle + thread_connections:
+            self._close_connection(sg)
+
+
+g_connection_pools = {}
+g_connection_pools_lock = threading.Lock()
+
+def get_connection_pool(user="default"):
+    """
+    Returns the global Shotgun connection pool for a shotgun config user.
+    The size and idle timeout of the pool can be adjusted via its size 
+    and idle_timeout attributes.
+    
+    :param user: Optional shotgun config user, as defined in shotgun.yml
+    :returns: ShotgunConnectionPool instance
+    """
+    g_connection_pools_lock.acquire()
+    try:
+        pool = g_connection_pools.get(user)
+        if pool is None:
+            pool = ShotgunConnectionPool(user)
+            g_connection_pools[user] = pool
+        return pool
+    finally:
+        g_connection_pools_lock.release()
+
+def clear_connection_pools():
+    """
+    Discards all pooled Shotgun connections and cached server capabilities.
+    Subsequent requests for connections will create new Shotgun API instances.
+    """
+    global g_connection_pools
+    g_connection_pools_lock.acquire()
+    try:
+        pools = g_connection_pools.values()
+        g_connection_pools = {}
+    finally:
+        g_connection_pools_lock.release()
+    
+    for pool in pools:
+        pool.clear()
+        
+    g_server_caps_lock.acquire()
+    try:
+        g_server_caps.clear()
+    finally:
+        g_server_caps_lock.release()
+
+def enable_query_cache(enabled=True, user="default"):
+    """
+    Turns the read-through cache for shotgun queries on or off. Once turned on,
+    the Shotgun API handles returned by tk.shotgun and get_sg_connection() are 
+    wrapped, and queries made through them are served from the cache until they 
+    expire or until an entity of the same type is written to. Handles obtained 
+    before the cache was turned on are not affected. The cache can also be turned 
+    on by setting the TANK_SG_QUERY_CACHE environment variable.
+    
+    :param enabled: True to turn the cache on, False to turn it off
+    :param user: Optional shotgun config user, as defined in shotgun.yml
+    """
+    get_connection_pool(user).query_cache.enabled = enabled
+
+def get_query_cache_statistics(user="default"):
+    """
+    Returns the hit rates of the read-through cache for shotgun queries.
+    
+    :param user: Optional shotgun config user, as defined in shotgun.yml
+    :returns: List of dictionaries with keys entity_type, hits, misses and hit_rate, 
+              sorted by the number of lookups, most frequent first.
+    """
+    return get_connection_pool(user).query_cache.get_statistics()
+
+
 g_entity_display_name_lookup = None
 
 def get_entity_type_display_name(tk, entity_type_code):
@@ -420,7 +729,8 @@ def find_publish(tk, list_of_paths, filters=None, fields=None):
     # - a link to a storage entity
     # ...we need to group the paths per storage and then for each storage do a
     # shotgun query on the form find all records where path_cache, in, /foo, /bar, /baz etc.
-    published_files = {}
+    # Large lists of paths are split into several queries, which are all run concurrently.
+    queries = []
 
     # get a list of all storages that we should look up.
     # for 0.12 backwards compatibility, add the Tank Storage.
@@ -431,16 +741,11 @@ def find_publish(tk, list_of_paths, filters=None, fields=None):
     published_file_entity_type = get_published_file_entity_type(tk)
     for local_storage_name in local_storage_names:
 
-        local_storage = tk.shotgun.find_one("LocalStorage", [["code", "is", local_storage_name]])
+        local_storage = _get_local_storage(tk, local_storage_name)
         if not local_storage:
             # fail gracefully here - it may be a storage which has been deleted
-            published_files[local_storage_name] = []
             continue
 
-        # make copy
-        sg_filters = filters[:]
-        path_cache_filter = ["path_cache", "in"]
-
         # now get the list of normalized files for this storage
         # 0.12 backwards compatibility: if the storage name is Tank,
         # this is the same as the primary storage.
@@ -449,24 +754,23 @@ def find_publish(tk, list_of_paths, filters=None, fields=None):
         else:
             normalized_paths = storages_paths[local_storage_name].keys()
 
-        # add all of those to the query filter
-        for path_cache_path in normalized_paths:
-            path_cache_filter.append(path_cache_path)
-
-        sg_filters.append(path_cache_filter)
-        sg_filters.append( ["path_cache_storage", "is", local_storage] )
-
-        # organize the returned data by storage
-        published_files[local_storage_name] = tk.shotgun.find(published_file_entity_type, sg_filters, sg_fields)
+        # add the paths to the query filters, in chunks of bounded size
+        chunk_size = constants.FIND_PUBLISH_CHUNK_SIZE
+        for idx in range(0, len(normalized_paths), chunk_size):
+            # make copy
+            sg_filters = filters[:]
+            sg_filters.append(["path_cache", "in"] + normalized_paths[idx:idx + chunk_size])
+            sg_filters.append( ["path_cache_storage", "is", local_storage] )
+            queries.append((local_storage_name, sg_filters))
 
 
     # PASS 2
-    # take the published_files structure, containing the shotgun data
-    # grouped by storage, and turn that into the final data structure
+    # take the shotgun data, grouped by storage, and merge it into the final 
+    # data structure as the results of each query come in
     #
     matches = {}
 
-    for local_storage_name, publishes in published_files.items():
+    for local_storage_name, publishes in _find_concurrently(tk, published_file_entity_type, queries, sg_fields):
 
         # get a dictionary which maps shotgun paths to file system paths
         if local_storage_name == "Tank":
@@ -514,6 +818,111 @@ def find_publish(tk, list_of_paths, filters=None, fields=None):
     return matches
 
 
+def _get_local_storage(tk, local_storage_name):
+    """
+    Returns the LocalStorage entity with a given name. Names are matched case 
+    insensitively, the same way shotgun matches them. All local storages are 
+    retrieved with a single query the first time this is called for an API 
+    instance and are then cached for the life of that instance. If a name isn't 
+    found in the cache, the local storages are retrieved again, in case the 
+    storage has been created since.
+    
+    :param tk: Sgtk API instance
+    :param local_storage_name: Name of the local storage
+    :returns: LocalStorage entity dictionary with keys type and id, or None if 
+              there is no storage with the given name
+    """
+    g_local_storages_lock.acquire()
+    try:
+        local_storages = g_local_storages.get(tk)
+    finally:
+        g_local_storages_lock.release()
+    
+    if local_storages is None or local_storage_name.lower() not in local_storages:
+        local_storages = {}
+        for local_storage in tk.shotgun.find("LocalStorage", [], ["code"]):
+            local_storages[local_storage["code"].lower()] = {"type": local_storage["type"], 
+                                                             "id": local_storage["id"]}
+        g_local_storages_lock.acquire()
+        try:
+            g_local_storages[tk] = local_storages
+        finally:
+            g_local_storages_lock.release()
+    
+    return local_storages.get(local_storage_name.lower())
+
+def _find_concurrently(tk, entity_type, queries, fields):
+    """
+    Runs several shotgun find queries concurrently, each on a separate 
+    connection to the site of the tk instance. The results are yielded 
+    as the queries complete, so that they can be processed while the 
+    remaining queries are still running.
+    
+    :param tk: Sgtk API instance
+    :param entity_type: The entity type to find
+    :param queries: List of (key, filters) tuples
+    :param fields: The fields to return
+    :returns: Generator yielding a (key, records) tuple for each query
+    """
+    sg = tk.shotgun
+    
+    # the worker connections are cloned from the tk instance's connection, 
+    # so that the queries run against the same site with the same credentials.
+    # Cloning doesn't involve any round trips to the server.
+    worker_sgs = []
+    if len(queries) > 1:
+        for idx in range(min(constants.FIND_PUBLISH_MAX_THREADS, len(queries))):
+            worker_sg = clone_sg_connection(sg)
+            if worker_sg is None:
+                # can't run queries concurrently on this connection
+                worker_sgs = []
+                break
+            worker_sgs.append(worker_sg)
+    
+    if not worker_sgs:
+        # no need for any threads
+        for (key, filters) in queries:
+            yield (key, sg.find(entity_type, filters, fields))
+        return
+    
+    pending_queries = Queue.Queue()
+    for query in queries:
+        pending_queries.put(query)
+    results = Queue.Queue()
+    
+    def worker(worker_sg):
+        """
+        Runs pending queries until there are none left.
+        """
+        try:
+            while True:
+                try:
+                    (key, filters) = pending_queries.get_nowait()
+                except Queue.Empty:
+                    break
+                try:
+                    results.put((key, worker_sg.find(entity_type, filters, fields), None))
+                except Exception:
+                    results.put((key, None, sys.exc_info()))
+        finally:
+            try:
+                worker_sg.close()
+            except Exception:
+                # the connection may already be closed
+                pass
+    
+    for worker_sg in worker_sgs:
+        thread = threading.Thread(target=worker, args=(worker_sg,))
+        thread.setDaemon(True)
+        thread.start()
+    
+    for idx in range(len(queries)):
+        (key, records, exc_info) = results.get()
+        if exc_info:
+            # re-raise with the traceback of the worker thread
+            raise exc_info[0], exc_info[1], exc_info[2]
+        yield (key, records)
+
 def _group_by_storage(tk, list_of_paths):
     """
     Given a list of paths on disk, groups them into a data structure suitable for
@@ -550,25 +959,84 @@ def _group_by_storage(tk, list_of_paths):
     """
     storages_paths = {}
 
-    for path in list_of_paths:
-
-        # use abstracted path if path is part of a sequence
-        abstract_path = _translate_abstract_fields(tk, path)
-        root_name, dep_path_cache = _calc_path_cache(tk, abstract_path)
+    # paths which only differ by a frame number share the same abstract path, so
+    # group these first and resolve templates and roots once per sequence
+    for (dep_path_cache, root_name, paths) in _calc_sequence_path_caches(tk, list_of_paths):
 
         # make sure that the path is even remotely valid, otherwise skip
         if dep_path_cache is None:
             continue
 
         # Update data for this storage
-        storage_info = storages_paths.get(root_name, {})
-        paths = storage_info.get(dep_path_cache, [])
-        paths.append(path)
-        storage_info[dep_path_cache] = paths
-        storages_paths[root_name] = storage_info
+        storage_info = storages_paths.setdefault(root_name, {})
+        storage_info.setdefault(dep_path_cache, []).extend(paths)
 
     return storages_paths
 
+def _calc_sequence_path_caches(tk, list_of_paths):
+    """
+    Calculates the storage and path cache for a list of paths, with abstract
+    fields such as frame numbers translated into their default values.
+
+    Paths which only differ by the value of their last number, for example the
+    frames of an image sequence, are grouped together and the template lookup is
+    only done for the first path of each group. If translating that path replaces
+    exactly the number with an abstract value, the result applies to all the paths
+    in the group. Otherwise each path in the group is translated individually.
+
+    :param tk: Sgtk API instance
+    :param list_of_paths: List of paths on disk
+    :returns: List of (path_cache, root_name, paths) tuples, where paths is the
+              list of input paths sharing that path cache, in input order.
+              path_cache and root_name are None for paths outside of any root.
+    """
+    # group paths by everything but their last number, keeping the input order
+    groups = {}
+    group_keys = []
+    for path in list_of_paths:
+        match = g_frame_number_regex.match(path)
+        if match:
+            (head, number, tail) = match.groups()
+            key = (head, len(number), tail)
+        else:
+            key = (path, 0, "")
+        if key not in groups:
+            groups[key] = []
+            group_keys.append(key)
+        groups[key].append(path)
+
+    # abstract paths, keyed by the input paths they were resolved from
+    abstract_paths = {}
+    for key in group_keys:
+        paths = groups[key]
+        abstract_path = _translate_abstract_fields(tk, paths[0])
+        (head, num_digits, tail) = key
+        if (num_digits and len(paths) > 1 and abstract_path != paths[0]
+            and abstract_path.startswith(head) and abstract_path.endswith(tail)
+            and len(abstract_path) >= len(head) + len(tail)):
+            # only the number was abstracted, so it is the same for all frames
+            for path in paths:
+                abstract_paths.setdefault(path, abstract_path)
+        else:
+            abstract_paths.setdefault(paths[0], abstract_path)
+            for path in paths[1:]:
+                if path not in abstract_paths:
+                    abstract_paths[path] = _translate_abstract_fields(tk, path)
+
+    # now resolve the path cache once for each abstract path
+    results = {}
+    result_keys = []
+    for key in group_keys:
+        for path in groups[key]:
+            abstract_path = abstract_paths[path]
+            if abstract_path not in results:
+                (root_name, path_cache) = _calc_path_cache(tk, abstract_path)
+                results[abstract_path] = (path_cache, root_name, [])
+                result_keys.append(abstract_path)
+            results[abstract_path][2].append(path)
+
+    return [results[x] for x in result_keys]
+
 
 def create_event_log_entry(tk, context, event_type, description, metadata=None):
     """
@@ -694,28 +1162,13 @@ def register_publish(tk, context, path, name, version_number, **kwargs):
     # convert the abstract fields to their defaults
     path = _translate_abstract_fields(tk, path)
 
-    published_file_entity_type = get_published_file_entity_type(tk)
-
     sg_published_file_type = None
     # query shotgun for the published_file_type
     if published_file_type:
         if not isinstance(published_file_type, basestring):
             raise TankError("published_file_type must be a string")
-
-        if published_file_entity_type == "PublishedFile":
-            filters = [["code", "is", published_file_type]]
-            sg_published_file_type = tk.shotgun.find_one('PublishedFileType', filters=filters)
-
-            if not sg_published_file_type:
-                # create a published file type on the fly
-                sg_published_file_type = tk.shotgun.create("PublishedFileType", {"code": published_file_type})
-        else:# == TankPublishedFile
-            filters = [ ["code", "is", published_file_type], ["project", "is", context.project] ]
-            sg_published_file_type = tk.shotgun.find_one('TankType', filters=filters)
-
-            if not sg_published_file_type:
-                # create a tank type on the fly
-                sg_published_file_type = tk.shotgun.create("TankType", {"code": published_file_type, "project": context.project})
+        sg_published_file_types = _get_published_file_types(tk, context, [published_file_type])
+        sg_published_file_type = sg_published_file_types[published_file_type]
 
     # create the publish
     entity = _create_published_file(tk, 
@@ -731,6 +1184,266 @@ def register_publish(tk, context, path, name, version_number, **kwargs):
                                     version_entity)
 
     # upload thumbnails
+    _upload_thumbnails(tk,
+                       context,
+                       entity,
+                       task,
+                       thumbnail_path,
+                       update_entity_thumbnail,
+                       update_task_thumbnail)
+
+    # register dependencies
+    _create_dependencies(tk, entity, dependency_paths, dependency_ids)
+
+    return entity
+
+def register_publishes(tk, context, items):
+    """
+    Creates several Tank Published Files in Shotgun in one go. This produces
+    the same publishes as calling register_publish() for each item but with
+    far fewer round trips to the server: published file types are resolved
+    once, the publishes are created in chunked batch calls, all dependency
+    paths are resolved in a single find_publish() pass and all dependencies
+    are created in a final batch.
+
+    Thumbnails cannot be batched and are still uploaded one publish at a time.
+
+    Required parameters:
+
+        tk - a Sgtk API instance
+
+        context - the context we want to associate with the publishes
+
+        items - a list of dictionaries, one per publish. Each dictionary
+                must contain the keys path, name and version_number and may
+                contain any of the optional arguments accepted by 
+                register_publish().
+
+    Returns a list with one dictionary per item, in the same order as the
+    items, with the following keys:
+
+        entity - the publish entity created in Shotgun or None if the publish
+                 could not be created.
+
+        error - None if the item was fully registered, otherwise a message
+                describing what failed. Note that the publish may still have
+                been created if only the thumbnail upload or the dependency
+                registration failed.
+    """
+    results = [{"entity": None, "error": None} for _ in items]
+
+    # resolve all publish types in one go
+    published_file_type_names = []
+    for (idx, item) in enumerate(items):
+        published_file_type = item.get("published_file_type") or item.get("tank_type")
+        if not published_file_type:
+            continue
+        if not isinstance(published_file_type, basestring):
+            results[idx]["error"] = "published_file_type must be a string"
+        elif published_file_type not in published_file_type_names:
+            published_file_type_names.append(published_file_type)
+    try:
+        sg_published_file_types = _get_published_file_types(tk, context, published_file_type_names)
+    except Exception, e:
+        # the items without a publish type can still be registered
+        sg_published_file_types = {}
+        for (idx, item) in enumerate(items):
+            if not results[idx]["error"] and (item.get("published_file_type") or item.get("tank_type")):
+                results[idx]["error"] = "Could not resolve published file type: %s" % e
+
+    # build the create requests for all publishes
+    published_file_entity_type = get_published_file_entity_type(tk)
+    requests = []
+    request_indices = []
+    for (idx, item) in enumerate(items):
+        if results[idx]["error"]:
+            continue
+        missing_keys = [k for k in ("path", "name", "version_number") if k not in item]
+        if missing_keys:
+            results[idx]["error"] = "Missing required keys: %s" % ", ".join(missing_keys)
+            continue
+
+        task = item.get("task")
+        if task is None:
+            task = context.task
+        published_file_type = item.get("published_file_type") or item.get("tank_type")
+
+        try:
+            path = _translate_abstract_fields(tk, item["path"])
+            data = _get_published_file_data(tk,
+                                            context,
+                                            path,
+                                            item["name"],
+                                            item["version_number"],
+                                            task,
+                                            item.get("comment"),
+                                            sg_published_file_types.get(published_file_type),
+                                            item.get("created_by"),
+                                            item.get("created_at"),
+                                            item.get("version_entity"))
+        except Exception, e:
+            results[idx]["error"] = "Could not prepare publish data: %s" % e
+            continue
+
+        requests.append({"request_type": "create",
+                         "entity_type": published_file_entity_type,
+                         "data": data})
+        request_indices.append(idx)
+
+    # create the publishes
+    for (idx, (entity, error)) in zip(request_indices, _batch_requests(tk, requests)):
+        results[idx]["entity"] = entity
+        if error:
+            results[idx]["error"] = "Could not create publish: %s" % error
+
+    # upload thumbnails
+    created_indices = [idx for idx in request_indices if results[idx]["entity"]]
+    for idx in created_indices:
+        item = items[idx]
+        task = item.get("task")
+        if task is None:
+            task = context.task
+        try:
+            _upload_thumbnails(tk,
+                               context,
+                               results[idx]["entity"],
+                               task,
+                               item.get("thumbnail_path"),
+                               item.get("update_entity_thumbnail", False),
+                               item.get("update_task_thumbnail", False))
+        except Exception, e:
+            results[idx]["error"] = "Could not upload thumbnail: %s" % e
+
+    # resolve all dependency paths in a single pass
+    dependency_paths = []
+    for idx in created_indices:
+        for dependency_path in items[idx].get("dependency_paths", []):
+            if dependency_path not in dependency_paths:
+                dependency_paths.append(dependency_path)
+    publishes = {}
+    if dependency_paths:
+        try:
+            publishes = find_publish(tk, dependency_paths)
+        except Exception, e:
+            for idx in created_indices:
+                if items[idx].get("dependency_paths"):
+                    results[idx]["error"] = "Could not resolve dependencies: %s" % e
+
+    # and register all dependencies in a final batch
+    requests = []
+    request_indices = []
+    for idx in created_indices:
+        item = items[idx]
+        dependency_requests = _get_dependency_requests(tk,
+                                                       results[idx]["entity"],
+                                                       publishes,
+                                                       item.get("dependency_paths", []),
+                                                       item.get("dependency_ids", []))
+        requests.extend(dependency_requests)
+        request_indices.extend([idx] * len(dependency_requests))
+
+    for (idx, (_, error)) in zip(request_indices, _batch_requests(tk, requests)):
+        if error and not results[idx]["error"]:
+            results[idx]["error"] = "Could not register dependency: %s" % error
+
+    return results
+
+def _batch_requests(tk, requests):
+    """
+    Sends a list of batch requests to shotgun in chunks of 
+    REGISTER_PUBLISHES_BATCH_SIZE requests.
+
+    Batch calls are transactional, so if the server rejects a chunk nothing in
+    it has been created. The requests in a rejected chunk are therefore retried
+    one at a time to find out exactly which of them fail. Any other error, for 
+    example a timeout, may occur after the server has committed the chunk, so 
+    the requests are not retried and are all reported as failed instead.
+
+    :param tk: API handle
+    :param requests: List of batch request dictionaries
+    :returns: List of (result, error) tuples, one per request. Error is None if
+              the request succeeded, otherwise result is None and error is a
+              message describing the failure.
+    """
+    from tank_vendor.shotgun_api3 import ShotgunError
+
+    results = []
+    chunk_size = constants.REGISTER_PUBLISHES_BATCH_SIZE
+    for start in range(0, len(requests), chunk_size):
+        chunk = requests[start:start + chunk_size]
+        try:
+            results.extend([(result, None) for result in tk.shotgun.batch(chunk)])
+        except ShotgunError:
+            # the server rejected the chunk
+            for request in chunk:
+                try:
+                    results.append((tk.shotgun.batch([request])[0], None))
+                except Exception, e:
+                    results.append((None, str(e)))
+        except Exception, e:
+            # the chunk may or may not have been created
+            error = "The outcome of the request is unknown: %s" % e
+            results.extend([(None, error)] * len(chunk))
+    return results
+
+def _get_published_file_types(tk, context, published_file_types):
+    """
+    Resolves a list of published file type names into shotgun entities, 
+    creating any types that don't exist yet. Names are matched case 
+    insensitively, the same way shotgun matches them.
+
+    :param tk: API handle
+    :param context: Context, used to find the project when tank types are used
+    :param published_file_types: List of published file type names
+    :returns: Dictionary of shotgun entities keyed by the published file type 
+              names passed in
+    """
+    if not published_file_types:
+        return {}
+
+    if get_published_file_entity_type(tk) == "PublishedFile":
+        sg_entity_type = "PublishedFileType"
+        filters = [["code", "in", published_file_types]]
+        extra_data = {}
+    else:# == TankPublishedFile
+        sg_entity_type = "TankType"
+        filters = [["code", "in", published_file_types], ["project", "is", context.project]]
+        extra_data = {"project": context.project}
+
+    # existing types, keyed by lower case name
+    existing_types = {}
+    for sg_published_file_type in tk.shotgun.find(sg_entity_type, filters, ["code"]):
+        existing_types.setdefault(sg_published_file_type["code"].lower(), sg_published_file_type)
+
+    # create any missing types on the fly
+    sg_batch_data = []
+    for published_file_type in published_file_types:
+        if published_file_type.lower() not in existing_types:
+            data = {"code": published_file_type}
+            data.update(extra_data)
+            sg_batch_data.append({"request_type": "create", 
+                                  "entity_type": sg_entity_type, 
+                                  "data": data})
+            # make sure that names only differing by case are created once
+            existing_types[published_file_type.lower()] = None
+    if sg_batch_data:
+        for sg_published_file_type in tk.shotgun.batch(sg_batch_data):
+            existing_types[sg_published_file_type["code"].lower()] = sg_published_file_type
+
+    sg_published_file_types = {}
+    for published_file_type in published_file_types:
+        sg_published_file_types[published_file_type] = existing_types[published_file_type.lower()]
+    return sg_published_file_types
+
+def _upload_thumbnails(tk, context, entity, task, thumbnail_path, 
+                       update_entity_thumbnail, update_task_thumbnail):
+    """
+    Uploads the thumbnail for a publish, optionally pushing it to the
+    context entity and the task too. If no thumbnail is given, the
+    default no preview thumbnail is uploaded for the publish.
+    """
+    published_file_entity_type = get_published_file_entity_type(tk)
+
     if thumbnail_path and os.path.exists(thumbnail_path):
 
         # publish
@@ -752,12 +1465,6 @@ def register_publish(tk, context, path, name, version_number, **kwargs):
         no_thumb = os.path.join(this_folder, "no_preview.jpg")
         tk.shotgun.upload_thumbnail(published_file_entity_type, entity.get("id"), no_thumb)
 
-
-    # register dependencies
-    _create_dependencies(tk, entity, dependency_paths, dependency_ids)
-
-    return entity
-
 def _translate_abstract_fields(tk, path):
     """
     Translates abstract fields for a path into the default abstract value.
@@ -789,11 +1496,31 @@ def _create_dependencies(tk, publish_entity, dependency_paths, dependency_ids):
     :param dependency_ids: List of publish entity ids to associate. List of ints
     
     """
-    published_file_entity_type = get_published_file_entity_type(tk)
-
     publishes = find_publish(tk, dependency_paths)
 
     # create a single batch request for maximum speed
+    sg_batch_data = _get_dependency_requests(tk, publish_entity, publishes, dependency_paths, dependency_ids)
+
+    # push to shotgun in a single xact
+    if len(sg_batch_data) > 0:
+        tk.shotgun.batch(sg_batch_data)
+
+def _get_dependency_requests(tk, publish_entity, publishes, dependency_paths, dependency_ids):
+    """
+    Returns the batch requests needed to create dependencies in shotgun 
+    from a given entity to a list of paths and ids. Paths not recognized 
+    are skipped.
+    
+    :param tk: API handle
+    :param publish_entity: The publish entity to set the dependencies for. This is a dictionary
+                           with keys type and id.
+    :param publishes: Dictionary of publishes keyed by path, as returned by find_publish
+    :param dependency_paths: List of paths on disk. List of strings.
+    :param dependency_ids: List of publish entity ids to associate. List of ints
+    :returns: List of batch request dictionaries
+    """
+    published_file_entity_type = get_published_file_entity_type(tk)
+
     sg_batch_data = []
 
     for dependency_path in dependency_paths:
@@ -847,11 +1574,7 @@ def _create_dependencies(tk, publish_entity, dependency_paths, dependency_ids):
                     } 
             sg_batch_data.append(req)
 
-
-    # push to shotgun in a single xact
-    if len(sg_batch_data) > 0:
-        tk.shotgun.batch(sg_batch_data)
-                
+    return sg_batch_data
 
 def _create_published_file(tk, context, path, name, version_number, task, comment, published_file_type, 
                            created_by_user, created_at, version_entity):
@@ -859,6 +1582,17 @@ def _create_published_file(tk, context, path, name, version_number, task, commen
     Creates a publish entity in shotgun given some standard fields.
     """
     published_file_entity_type = get_published_file_entity_type(tk)
+    data = _get_published_file_data(tk, context, path, name, version_number, task, comment, 
+                                    published_file_type, created_by_user, created_at, version_entity)
+    return tk.shotgun.create(published_file_entity_type, data)
+
+def _get_published_file_data(tk, context, path, name, version_number, task, comment, published_file_type, 
+                             created_by_user, created_at, version_entity):
+    """
+    Returns the shotgun data for a publish entity given some standard fields,
+    as processed by the publish core hook.
+    """
+    published_file_entity_type = get_published_file_entity_type(tk)
 
     # Check if path is a url or a straight file path.  Path
     # is assumed to be a url if it has a scheme or netloc, e.g.:
@@ -928,9 +1662,44 @@ def _create_published_file(tk, context, path, name, version_number, task, commen
         data["version"] = version_entity
 
     # now call out to hook just before publishing
-    data = tk.execute_core_hook(constants.TANK_PUBLISH_HOOK_NAME, shotgun_data=data, context=context)
+    return tk.execute_core_hook(constants.TANK_PUBLISH_HOOK_NAME, shotgun_data=data, context=context)
 
-    return tk.shotgun.create(published_file_entity_type, data)
+def _get_data_root_prefixes(tk):
+    """
+    Returns the data roots of the pipeline configuration in a form suitable for
+    quick prefix matching. The roots are computed once per pipeline configuration
+    and are sorted longest first, so that a root nested inside another root takes
+    precedence.
+
+    :param tk: Sgtk API instance
+    :returns: List of (normalized lower case root path, length of the
+              normalized parent directory, root name) tuples
+    """
+    pipeline_config = tk.pipeline_configuration
+
+    g_data_root_prefixes_lock.acquire()
+    try:
+        prefixes = g_data_root_prefixes.get(pipeline_config)
+    finally:
+        g_data_root_prefixes_lock.release()
+
+    if prefixes is None:
+        # get roots - don't assume data is returned on any particular form
+        # may return c:\foo, c:/foo or /foo - assume that we need to normalize this path
+        prefixes = []
+        for root_name, root_path in pipeline_config.get_data_roots().items():
+            norm_root_path = root_path.replace(os.sep, "/")
+            norm_parent_dir = os.path.dirname(norm_root_path)
+            prefixes.append((norm_root_path.lower(), len(norm_parent_dir), root_name))
+        prefixes.sort(key=lambda x: (-len(x[0]), x[0]))
+
+        g_data_root_prefixes_lock.acquire()
+        try:
+            g_data_root_prefixes[pipeline_config] = prefixes
+        finally:
+            g_data_root_prefixes_lock.release()
+
+    return prefixes
 
 def _calc_path_cache(tk, path):
     """
@@ -944,19 +1713,13 @@ def _calc_path_cache(tk, path):
 
     # normalize input path first c:\foo -> c:/foo
     norm_path = path.replace(os.sep, "/")
+    norm_path_lower = norm_path.lower()
 
-    # get roots - don't assume data is returned on any particular form
-    # may return c:\foo, c:/foo or /foo - assume that we need to normalize this path
-    roots = tk.pipeline_configuration.get_data_roots()
-
-    for root_name, root_path in roots.items():
-        norm_root_path = root_path.replace(os.sep, "/")
-
-        if norm_path.lower().startswith(norm_root_path.lower()):
-            norm_parent_dir = os.path.dirname(norm_root_path)
+    for (norm_root_path_lower, parent_dir_len, root_name) in _get_data_root_prefixes(tk):
+        if norm_path_lower.startswith(norm_root_path_lower):
             # Remove parent dir plus "/" - be careful to handle the case where
             # the parent dir ends with a '/', e.g. 'T:/' for a Windows drive
-            path_cache = norm_path[len(norm_parent_dir):].lstrip("/")
+            path_cache = norm_path[parent_dir_len:].lstrip("/")
             return root_name, path_cache
     # not found, return None values
     return None, None
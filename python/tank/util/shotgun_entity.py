@@ -19,7 +19,7 @@ from ..platform import constants
 from ..errors import TankError
 
 
-def sg_entity_to_string(tk, sg_entity_type, sg_id, sg_field_name, data):
+def sg_entity_to_string(tk, sg_entity_type, sg_id, sg_field_name, data, process_folder_name=None):
     """
     Generates a string value given a shotgun value.
     This logic is in a hook but it typically does conversions such as:
@@ -36,13 +36,27 @@ def sg_entity_to_string(tk, sg_entity_type, sg_id, sg_field_name, data):
     :param sg_id: The shotgun id for the record, e.g 1234
     :param sg_field_name: The field to generate value for, e.g. 'sg_sequence'
     :param data: The shotgun entity data chunk that should be converted to a string.
+    :param process_folder_name: Optional process folder name hook callable, as returned 
+                                by get_process_folder_name_callable(). Callers converting
+                                many values should resolve this once and pass it in.
     """
-    # call out to core hook
-    return tk.execute_core_hook(constants.PROCESS_FOLDER_NAME_HOOK_NAME, 
-                                entity_type=sg_entity_type, 
-                                entity_id=sg_id,
-                                field_name=sg_field_name,
-                                value=data)
+    if process_folder_name is None:
+        process_folder_name = get_process_folder_name_callable(tk)
+    return process_folder_name(entity_type=sg_entity_type, 
+                               entity_id=sg_id,
+                               field_name=sg_field_name,
+                               value=data)
+
+
+def get_process_folder_name_callable(tk):
+    """
+    Returns a callable for the process folder name core hook, suitable 
+    for passing to sg_entity_to_string().
+    
+    :param tk: Sgtk api instance
+    :returns: Hook method, ready to be called
+    """
+    return tk.get_core_hook_callable(constants.PROCESS_FOLDER_NAME_HOOK_NAME)
 
 
 class EntityExpression(object):
@@ -76,6 +90,10 @@ class EntityExpression(object):
         self._entity_type = entity_type
         self._field_name_expr = field_name_expr
         
+        # the process folder name hook is resolved on first use and then
+        # reused for the lifetime of this object (one folder creation pass)
+        self._process_folder_name = None
+        
         # now validate
         if "{" not in field_name_expr:
             # simple form - surround with brackets to turn into a expression
@@ -233,6 +251,9 @@ class EntityExpression(object):
         # get the shotgun id from the shotgun entity dict
         sg_id = values.get("id")
         
+        if self._process_folder_name is None:
+            self._process_folder_name = get_process_folder_name_callable(self._tk)
+        
         # first make sure that each field is valid
         for field_name in fields:
             # get value from shotgun data dict
@@ -242,7 +263,12 @@ class EntityExpression(object):
                 return None
                 
             # now cast the value to a string
-            str_data[field_name] = sg_entity_to_string(self._tk, self._entity_type, sg_id, field_name, raw_val)
+            str_data[field_name] = sg_entity_to_string(self._tk, 
+                                                         self._entity_type, 
+                                                         sg_id, 
+                                                         field_name, 
+                                                         raw_val,
+                                                         self._process_folder_name)
             
         
         # change format from {xxx} to %(xxx)s for value substitution.
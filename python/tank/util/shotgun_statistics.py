@@ -0,0 +1,187 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Collection of Shotgun API call statistics.
+
+Shotgun API instances created by core report each rpc call they make to
+record_call(). When profiling is turned on, calls are aggregated by API
+method, entity type and the core module the call was made from, so that
+it is easy to see where round trips to the server come from.
+"""
+
+import os
+import sys
+import bisect
+import threading
+
+from ..platform import constants
+
+# modules which wrap the shotgun API rather than use it
+_WRAPPER_MODULES = ("tank.util.shotgun_statistics", "tank.util.query_cache")
+
+
+def _get_calling_module(call_info):
+    """
+    Returns the name of the module which made the given shotgun call,
+    skipping frames from the shotgun API itself and the wrappers around it.
+    Calls made by the shotgun API on a worker thread, e.g. to read pages
+    concurrently, are credited to the module which made the request.
+
+    :param call_info: Dictionary describing the call, as passed to
+                      the rpc observer of the shotgun API.
+    :returns: module name, e.g. tank.path_cache
+    """
+    origin = call_info.get("origin")
+    if origin is None:
+        origin = _iter_stack_modules(sys._getframe(1))
+    for module_name in origin:
+        if not module_name.startswith("tank_vendor") and module_name not in _WRAPPER_MODULES:
+            return module_name
+    return "unknown"
+
+def _iter_stack_modules(frame):
+    """
+    Yields the names of the modules of the given frame and of the
+    frames which called it, innermost first.
+
+    :param frame: frame to start from
+    """
+    while frame is not None:
+        yield frame.f_globals.get("__name__", "")
+        frame = frame.f_back
+
+
+class ShotgunCallStatistics(object):
+    """
+    Thread-safe collection of Shotgun API call statistics. For each API method,
+    entity type and calling module, the number of calls, retries and errors,
+    the request and response sizes and a histogram of call latencies are
+    recorded.
+
+    Collection is off by default and can be turned on by setting the
+    TANK_SG_PROFILING environment variable or by calling enable_shotgun_profiling().
+    """
+    def __init__(self):
+        """
+        Construction
+        """
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self.enabled = os.environ.get(constants.SG_PROFILING_ENV_VAR, "0") not in ("", "0")
+
+    def clear(self):
+        """
+        Discards all statistics collected so far
+        """
+        self._stats_lock.acquire()
+        try:
+            self._stats = {}
+        finally:
+            self._stats_lock.release()
+
+    def record(self, call_info):
+        """
+        Records a single shotgun call.
+
+        :param call_info: Dictionary describing the call, as passed to
+                          the rpc observer of the shotgun API.
+        """
+        if not self.enabled:
+            return
+
+        subsystem = _get_calling_module(call_info)
+        key = (call_info["method"], call_info["entity_type"], subsystem)
+        duration = call_info["duration"]
+        bucket = bisect.bisect_left(constants.SG_PROFILING_LATENCY_BUCKETS, duration)
+
+        self._stats_lock.acquire()
+        try:
+            entry = self._stats.get(key)
+            if entry is None:
+                entry = {"method": call_info["method"],
+                         "entity_type": call_info["entity_type"],
+                         "subsystem": subsystem,
+                         "calls": 0,
+                         "retries": 0,
+                         "errors": 0,
+                         "request_bytes": 0,
+                         "response_bytes": 0,
+                         "total_time": 0.0,
+                         "max_time": 0.0,
+                         "histogram": [0] * (len(constants.SG_PROFILING_LATENCY_BUCKETS) + 1)}
+                self._stats[key] = entry
+            entry["calls"] += 1
+            entry["retries"] += max(call_info["attempts"] - 1, 0)
+            if call_info["error"]:
+                entry["errors"] += 1
+            entry["request_bytes"] += call_info["request_size"]
+            entry["response_bytes"] += call_info["response_size"]
+            entry["total_time"] += duration
+            entry["max_time"] = max(entry["max_time"], duration)
+            entry["histogram"][bucket] += 1
+        finally:
+            self._stats_lock.release()
+
+    def get(self):
+        """
+        Returns the statistics collected so far
+
+        :returns: List of dictionaries, see get_shotgun_statistics()
+        """
+        self._stats_lock.acquire()
+        try:
+            stats = [dict(x, histogram=list(x["histogram"])) for x in self._stats.values()]
+        finally:
+            self._stats_lock.release()
+        return sorted(stats, key=lambda x: x["total_time"], reverse=True)
+
+_shotgun_statistics = ShotgunCallStatistics()
+
+def record_call(call_info):
+    """
+    Records a shotgun call if profiling is turned on. This is set as the
+    rpc observer of all shotgun API instances created by core.
+
+    :param call_info: Dictionary describing the call, as passed to
+                      the rpc observer of the shotgun API.
+    """
+    _shotgun_statistics.record(call_info)
+
+def enable_shotgun_profiling(enabled=True):
+    """
+    Turns the collection of shotgun call statistics on or off.
+    Collection can also be turned on by setting the TANK_SG_PROFILING
+    environment variable.
+
+    :param enabled: True to turn collection on, False to turn it off
+    """
+    _shotgun_statistics.enabled = enabled
+
+def get_shotgun_statistics():
+    """
+    Returns shotgun call statistics collected in this session. Statistics
+    are only collected while shotgun profiling is enabled.
+
+    :returns: List of dictionaries with keys method, entity_type, subsystem, calls,
+              retries, errors, request_bytes, response_bytes, total_time, max_time
+              and histogram, sorted by total time, most expensive first. Subsystem
+              is the name of the module the calls were made from. Times are
+              expressed in seconds. The histogram holds the number of calls per
+              latency bucket, see SG_PROFILING_LATENCY_BUCKETS; the last bucket
+              counts the calls slower than the largest bucket boundary.
+    """
+    return _shotgun_statistics.get()
+
+def clear_shotgun_statistics():
+    """
+    Discards all shotgun call statistics collected so far
+    """
+    _shotgun_statistics.clear()
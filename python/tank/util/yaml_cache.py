@@ -0,0 +1,249 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Loading of yaml configuration files.
+
+All configuration files should be loaded via load_yaml(). Files are parsed
+using the libyaml based loader if the PyYAML installation in the python
+environment provides it and using the pure python loader in tank_vendor
+otherwise. Parsed files are cached for the life of the process and only
+parsed again when their contents change. Code which reads a file in order
+to modify it and write it back should bypass the cache by passing
+use_cache=False.
+
+To find out whether a file has changed, its modification time and size are
+checked first. Files are only read and hashed when these have changed, or 
+when the file was modified so recently that a change within the resolution 
+of the file system's timestamps would go unnoticed.
+
+"""
+
+import os
+import time
+import hashlib
+import threading
+
+from tank_vendor import yaml
+
+# the libyaml based loader is an order of magnitude faster than the pure python
+# one but is only available if PyYAML has been installed with libyaml support.
+# Note that the C loader cannot be combined with the vendored yaml module since
+# it produces nodes from the PyYAML installation it was built with.
+try:
+    import yaml as _system_yaml
+    if not getattr(_system_yaml, "__with_libyaml__", False):
+        _system_yaml = None
+except ImportError:
+    _system_yaml = None
+
+# files modified less than this number of seconds ago are always read to check
+# whether they have changed, since a second modification within the resolution 
+# of the file system's timestamps doesn't change the modification time. 
+_COARSE_TIMESTAMP_WINDOW = 2.0
+
+
+def is_c_loader_available():
+    """
+    Returns true if the libyaml based loader is used to parse files.
+    """
+    return _system_yaml is not None
+
+def parse_yaml(stream, use_c_loader=True):
+    """
+    Parses yaml data using the fastest loader available.
+
+    :param stream:          File object or string to parse
+    :param use_c_loader:    Set this to False to always use the pure python loader
+    :returns:               The parsed data
+    """
+    if use_c_loader and _system_yaml:
+        return _system_yaml.load(stream, Loader=_system_yaml.CLoader)
+    else:
+        return yaml.load(stream)
+
+def get_file_hash(path):
+    """
+    Returns a hash of the contents of a file. Unlike a signature based on
+    the modification time and size, the hash is not affected by the 
+    resolution of modification times on the file system. The file is only
+    read if it has changed since its hash was last computed.
+
+    :param path:    Path to a file
+    :returns:       Hash as a hex string or None if the file could not be read.
+    """
+    try:
+        return _hash_file(path)[0]
+    except (IOError, OSError):
+        return None
+
+def _hash_file(path):
+    """
+    Computes the hash of the contents of a file, reusing the hash computed 
+    previously if the modification time and size of the file are unchanged
+    and the file wasn't modified recently.
+
+    :param path:    Path to a file
+    :returns:       (hash of the contents, contents) tuple. The contents are
+                    None if the file wasn't read.
+    """
+    stat = os.stat(path)
+    stat_signature = (stat.st_mtime, stat.st_size)
+    stable = (time.time() - stat.st_mtime) > _COARSE_TIMESTAMP_WINDOW
+
+    if stable:
+        file_hash = _file_hashes.find(path, stat_signature)
+        if file_hash is not None:
+            return (file_hash, None)
+
+    (file_hash, content) = _read_file(path)
+    if stable:
+        # any later change will get a more recent modification time
+        _file_hashes.add(path, stat_signature, file_hash)
+    return (file_hash, content)
+
+def _read_file(path):
+    """
+    Reads the contents of a file.
+
+    :param path:    Path to a file
+    :returns:       (hash of the contents, contents) tuple
+    """
+    fh = open(path, "rb")
+    try:
+        content = fh.read()
+    finally:
+        fh.close()
+    return (hashlib.md5(content).hexdigest(), content)
+
+def copy_data(data):
+    """
+    Returns a copy of a data structure loaded from yml. Dictionaries and
+    lists are copied, all other values are immutable and are shared. This
+    is much faster than copy.deepcopy() and, unlike deepcopy, always produces
+    separate copies of data which is referenced in several places.
+
+    :param data:    Data structure to copy
+    :returns:       Copy of the data structure
+    """
+    if isinstance(data, dict):
+        return dict((k, copy_data(v)) for (k, v) in data.iteritems())
+    elif isinstance(data, list):
+        return [copy_data(x) for x in data]
+    else:
+        return data
+
+class _YamlCache(object):
+    """
+    A thread-safe cache of data computed from files, keyed by path. Entries 
+    are validated against a signature of the file each time they are accessed.
+    Used both for parsed yaml files, with a hash of the contents of the file
+    as the signature, and for the hashes, with the modification time and size
+    of the file as the signature.
+    """
+    def __init__(self):
+        """
+        Construction
+        """
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def clear(self, path=None):
+        """
+        Clear the cache
+
+        :param path:    Optional path to only remove the entry for
+        """
+        self._cache_lock.acquire()
+        try:
+            if path is None:
+                self._cache = {}
+            elif path in self._cache:
+                del self._cache[path]
+        finally:
+            self._cache_lock.release()
+
+    def find(self, path, signature):
+        """
+        Find the data for a file.
+
+        :param path:        Path to the file
+        :param signature:   Current signature of the file
+        :returns:           The data or None if not found
+        """
+        self._cache_lock.acquire()
+        try:
+            entry = self._cache.get(path)
+        finally:
+            self._cache_lock.release()
+
+        if entry is None or entry[0] != signature:
+            return None
+        return entry[1]
+
+    def add(self, path, signature, data):
+        """
+        Add the data for a file to the cache.
+
+        :param path:        Path to the file
+        :param signature:   Signature of the file the data was computed from
+        :param data:        The data
+        """
+        self._cache_lock.acquire()
+        try:
+            self._cache[path] = (signature, data)
+        finally:
+            self._cache_lock.release()
+
+_yaml_cache = _YamlCache()
+_file_hashes = _YamlCache()
+
+def load_yaml(path, use_cache=True):
+    """
+    Loads a yaml file. The parsed data is cached and returned straight away
+    if the file is loaded again and its contents haven't changed.
+
+    Any exceptions raised when reading or parsing the file are passed on
+    to the caller.
+
+    :param path:        Path to the yaml file
+    :param use_cache:   Set this to False to always parse the file, for example
+                        when the data is going to be modified and written back.
+                        The cache is still updated with the parsed data.
+    :returns:           The parsed data. This is a copy which can safely be
+                        modified by the caller.
+    """
+    if use_cache:
+        (signature, content) = _hash_file(path)
+    else:
+        (signature, content) = _read_file(path)
+
+    data = None
+    if use_cache:
+        data = _yaml_cache.find(path, signature)
+
+    if data is None:
+        if content is None:
+            # the hash was known but the file hasn't been parsed
+            (signature, content) = _read_file(path)
+        data = parse_yaml(content)
+        _yaml_cache.add(path, signature, data)
+
+    return copy_data(data)
+
+def clear_yaml_cache(path=None):
+    """
+    Clears the cache of parsed yaml files. This should be called whenever
+    a yaml file is written.
+
+    :param path:    Optional path of a file to only remove from the cache
+    """
+    _yaml_cache.clear(path)
+    _file_hashes.clear(path)
@@ -1,4 +1,5 @@
-from shotgun import (Shotgun, ShotgunError, ShotgunFileDownloadError, Fault, 
+from shotgun import (Shotgun, ShotgunError, ShotgunFileDownloadError, 
+                     ShotgunFileDownloadInterruptedError, Fault, 
                      ProtocolError, ResponseError, Error, __version__)
 from shotgun import SG_TIMEZONE as sg_timezone
 
@@ -10,8 +10,20 @@ from .lib.xmlrpclib import Error, ProtocolError, ResponseError
 LOG = logging.getLogger("shotgun_api3")
 LOG.setLevel(logging.WARN)
 
+def _has_c_decoder(json_module):
+    """Returns True if the decoder of a json module is implemented in C."""
+    scanner = getattr(json_module, "scanner", None)
+    return getattr(scanner, "c_make_scanner", None) is not None
+
 try:
     import simplejson as json
+    if not _has_c_decoder(json):
+        # a pure python simplejson is much slower than the json module of
+        # python 2.7, which comes with a decoder implemented in C
+        import json as _std_json
+        if _has_c_decoder(_std_json):
+            LOG.debug("simplejson speedups not found, using json")
+            json = _std_json
 except ImportError:
     LOG.debug("simplejson not found, dropping back to json")
     try:
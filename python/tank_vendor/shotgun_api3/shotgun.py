@@ -41,12 +41,19 @@ import re
 import copy
 import stat         # used for attachment upload
 import sys
+import threading
 import time
 import types
+import Queue
 import urllib
 import urllib2      # used for image upload
 import urlparse
-import shutil       # used for attachment download
+import socket       # used for attachment download
+import httplib      # used for attachment download
+try:
+    from hashlib import md5     # used for attachment download
+except ImportError:
+    from md5 import new as md5
 
 # use relative import for versions >=2.5 and package import for python versions <2.5
 if (sys.version_info[0] > 2) or (sys.version_info[0] == 2 and sys.version_info[1] >= 6):
@@ -65,6 +72,12 @@ LOG.setLevel(logging.WARN)
 
 SG_TIMEZONE = SgTimezone()
 
+# number of bytes read at a time when downloading attachments
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# types passed on as they are by Shotgun._transform_outbound()
+_PASSTHROUGH_TYPES = (unicode, int, long, float, bool, type(None))
+
 
 try:
     import ssl
@@ -88,6 +101,10 @@ class ShotgunFileDownloadError(ShotgunError):
     """Exception for file download-related errors"""
     pass
 
+class ShotgunFileDownloadInterruptedError(ShotgunFileDownloadError):
+    """Exception for file downloads that were interrupted by network errors"""
+    pass
+
 class Fault(ShotgunError):
     """Exception when server side exception detected."""
     pass
@@ -199,6 +216,13 @@ class _Config(object):
         self.api_ver = 'api3'
         self.convert_datetimes_to_utc = True
         self.records_per_page = 500
+        # number of pages find() fetches concurrently once the first page
+        # has revealed the total number of records. 1 fetches one page
+        # after the other.
+        self.max_page_threads = 1
+        # optional callable which is passed a dictionary describing each rpc
+        # call once it has completed, see Shotgun._call_rpc()
+        self.rpc_observer = None
         self.api_key = None
         self.script_name = None
         self.user_login = None
@@ -312,6 +336,8 @@ class Shotgun(object):
         self.config.convert_datetimes_to_utc = convert_datetimes_to_utc
         self.config.no_ssl_validation = NO_SSL_VALIDATION
         self._connection = None
+        self._page_readers = []
+        self._current_call_info = None
         self.__ca_certs = ca_certs
 
         self.base_url = (base_url or "").lower()
@@ -404,6 +430,8 @@ class Shotgun(object):
         If the client needs to connect again it will do so automatically.
         """
         self._close_connection()
+        for reader in self._page_readers:
+            reader._close_connection()
         return
 
     def info(self):
@@ -528,22 +556,184 @@ class Shotgun(object):
             return self._parse_records(records)
 
         records = []
+        for page_records in self._read_pages(params, limit):
+            records.extend(page_records)
+
+        return self._parse_records(records)
+
+    def find_iter(self, entity_type, filters, fields=None, order=None,
+            filter_operator=None, limit=0, retired_only=False,
+            include_archived_projects=True):
+        """Find entities matching the given filters, one page at a time.
+
+        Takes the same parameters as find() except for page. Instead of
+        returning all matching entities in one list, records are yielded
+        as each page arrives from the server so that large result sets
+        don't have to be held in memory at once.
+
+        :returns: generator yielding the dicts for each entity with the
+        requested fields, and their id and type.
+        """
+
+        if not isinstance(limit, int) or limit < 0:
+            raise ValueError("limit parameter must be a positive integer")
+
+        if isinstance(filters, (list, tuple)):
+            filters = _translate_filters(filters, filter_operator)
+        elif filter_operator:
+            raise ShotgunError("Deprecated: Use of filter_operator for find()"
+                " is not valid any more. See the documentation on find()")
+
+        if not include_archived_projects:
+            self.server_caps.ensure_include_archived_projects()
+
+        params = self._construct_read_parameters(entity_type,
+                                                 fields,
+                                                 filters,
+                                                 retired_only,
+                                                 order,
+                                                 include_archived_projects)
+
+        if self.server_caps.version and self.server_caps.version >= (3, 3, 0):
+            params['api_return_image_urls'] = True
+
+        for page_records in self._read_pages(params, limit):
+            for record in self._parse_records(page_records):
+                yield record
+
+    def _read_pages(self, params, limit=0):
+        """Generator which runs a paged read request and yields the raw
+        records of each page in order.
+
+        The first page is always fetched on its own. If max_page_threads is
+        larger than one, the remaining pages are then fetched concurrently.
+
+        :param params: Read parameters, as returned by
+        _construct_read_parameters().
+
+        :param limit: Optional maximum number of records to return.
+        """
+        count = 0
         result = self._call_rpc("read", params)
         while result.get("entities"):
-            records.extend(result.get("entities"))
-
-            if limit and len(records) >= limit:
-                records = records[:limit]
-                break
-            if len(records) == result["paging_info"]["entity_count"]:
-                break
+            entities = result.get("entities")
+            if limit and count + len(entities) >= limit:
+                yield entities[:limit - count]
+                return
+            count += len(entities)
+            yield entities
+
+            entity_count = result["paging_info"]["entity_count"]
+            if count == entity_count:
+                return
+
+            if self.config.max_page_threads > 1:
+                # the total is known now, so fetch all remaining pages at once
+                if limit:
+                    entity_count = min(entity_count, limit)
+                per_page = params["paging"]["entities_per_page"]
+                num_pages = (entity_count - count + per_page - 1) // per_page
+                first_page = params["paging"]["current_page"] + 1
+                pages = range(first_page, first_page + num_pages)
+                for entities in self._read_pages_concurrently(params, pages):
+                    if not entities:
+                        return
+                    if limit and count + len(entities) >= limit:
+                        yield entities[:limit - count]
+                        return
+                    count += len(entities)
+                    yield entities
+                return
 
             params['paging']['current_page'] += 1
             result = self._call_rpc("read", params)
 
-        return self._parse_records(records)
+    def _read_pages_concurrently(self, params, pages):
+        """Generator which fetches the given pages of a read request over
+        several connections and yields the raw records of each page in order.
+
+        :param params: Read parameters, as returned by
+        _construct_read_parameters().
+
+        :param pages: List of page numbers to fetch.
+        """
+        page_queue = Queue.Queue()
+        for page in pages:
+            page_queue.put(page)
+
+        results = {}
+        results_condition = threading.Condition()
 
+        # the pages are read on other threads, so tell the rpc observer 
+        # where the request was made from
+        origin = None
+        if self.config.rpc_observer is not None:
+            origin = _get_stack_modules(sys._getframe())
+
+        def read_pages(reader):
+            while True:
+                try:
+                    page = page_queue.get_nowait()
+                except Queue.Empty:
+                    return
+                page_params = params.copy()
+                page_params["paging"] = params["paging"].copy()
+                page_params["paging"]["current_page"] = page
+                page_params["return_paging_info"] = False
+                try:
+                    result = (reader._call_rpc("read", page_params, origin=origin).get("entities", []), None)
+                except Exception:
+                    result = (None, sys.exc_info())
+                results_condition.acquire()
+                try:
+                    results[page] = result
+                    results_condition.notifyAll()
+                finally:
+                    results_condition.release()
+
+        threads = []
+        for reader in self._get_page_readers(min(self.config.max_page_threads, len(pages))):
+            thread = threading.Thread(target=read_pages, args=(reader,))
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
 
+        try:
+            for page in pages:
+                results_condition.acquire()
+                try:
+                    while page not in results:
+                        results_condition.wait()
+                    entities, exc_info = results.pop(page)
+                finally:
+                    results_condition.release()
+                if exc_info:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                yield entities
+        finally:
+            # stop handing out pages and wait for the requests in flight,
+            # the readers may not be used by two threads at once
+            while True:
+                try:
+                    page_queue.get_nowait()
+                except Queue.Empty:
+                    break
+            for thread in threads:
+                thread.join()
+
+    def _get_page_readers(self, count):
+        """Returns copies of this instance which share its configuration
+        but each have their own connection to the server, for reading pages
+        concurrently. The copies are kept and reused by later requests.
+
+        :param count: Number of readers to return.
+        """
+        while len(self._page_readers) < count:
+            reader = copy.copy(self)
+            reader._connection = None
+            reader._page_readers = []
+            self._page_readers.append(reader)
+        return self._page_readers[:count]
 
     def _construct_read_parameters(self,
                                    entity_type,
@@ -1267,7 +1457,8 @@ class Shotgun(object):
         return attachment_id
 
     def download_attachment(self, attachment=False, file_path=None, 
-                            attachment_id=None):
+                            attachment_id=None, resume=False, checksum=None,
+                            progress_callback=None):
         """Downloads the file associated with a Shotgun Attachment.
 
         NOTE: On older (< v5.1.0) Shotgun versions, non-downloadable files 
@@ -1292,8 +1483,28 @@ class Shotgun(object):
         backwards compatibility for scripts specifying the parameter with
         keywords.
 
+        :param resume: (bool) Optional. Only used together with file_path. If
+        the file exists, it is assumed to hold the beginning of the Attachment
+        from an earlier, interrupted download and only the remaining data is
+        requested from the server. If the server doesn't support range 
+        requests, the whole file is downloaded again.
+
+        :param checksum: (str) Optional. Hex md5 digest of the Attachment. If 
+        the downloaded data doesn't match it, the file written to file_path is
+        removed and a ShotgunFileDownloadError is raised.
+
+        :param progress_callback: (callable) Optional. Called each time data 
+        has been received with the number of bytes downloaded so far and the 
+        total size of the Attachment in bytes, or None if the server didn't 
+        report the size.
+
         :returns: (str) If file_path is None, returns data of the Attachment 
         file as a string. If file_path is provided, returns file_path.
+
+        :raises: ShotgunFileDownloadInterruptedError if the server couldn't be
+        reached or the connection dropped before all data was received. Any 
+        data written to file_path is kept, so that the download can be resumed.
+        Other failures raise a ShotgunFileDownloadError.
         """
         # backwards compatibility when passed via keyword argument 
         if attachment is False:
@@ -1303,37 +1514,88 @@ class Shotgun(object):
                 raise TypeError("Missing parameter 'attachment'. Expected a "\
                                 "dict, int, NoneType value or"\
                                 "an int for parameter attachment_id")
+        # resolve the url before opening the file, so that nothing is
+        # written to disk if there is nothing to download
+        url = self.get_attachment_download_url(attachment)
+        if url is None:
+            return None
+
         # write to disk
+        offset = 0
         if file_path:
             try:
-                fp = open(file_path, 'wb')
-            except IOError, e:
+                if resume and os.path.exists(file_path):
+                    offset = os.path.getsize(file_path)
+                    fp = open(file_path, 'ab')
+                else:
+                    fp = open(file_path, 'wb')
+            except (IOError, OSError), e:
                 raise IOError("Unable to write Attachment to disk using "\
                               "file_path. %s" % e) 
 
-        url = self.get_attachment_download_url(attachment)
-        if url is None:
-            return None
-
         # We only need to set the auth cookie for downloads from Shotgun server
         if self.config.server in url:
             self.set_up_auth_cookie()
    
+        digest = None
+        if checksum:
+            digest = md5()
+            if offset:
+                self._update_digest_from_file(digest, file_path)
+
+        chunks = []
+        downloaded = offset
+        total_size = None
         try:
-            request = urllib2.Request(url)
-            request.add_header('user-agent', "; ".join(self._user_agents))
-            req = urllib2.urlopen(request)
-            if file_path:
-                shutil.copyfileobj(req, fp)
-            else:
-                attachment = req.read()
+            try:
+                try:
+                    req = self._open_attachment_url(url, offset)
+                except urllib2.HTTPError, e:
+                    if not offset or e.code != 416:
+                        raise
+                    # the existing data doesn't match the attachment,
+                    # so start again from scratch
+                    req = self._open_attachment_url(url, 0)
+                    offset = 0
+
+                if offset and getattr(req, "code", None) != 206:
+                    # the server ignored the range and sends the whole file
+                    offset = 0
+                if file_path and not offset:
+                    fp.seek(0)
+                    fp.truncate()
+                    downloaded = 0
+                    if digest:
+                        digest = md5()
+
+                content_length = req.info().get("content-length")
+                if content_length is not None:
+                    total_size = offset + int(content_length)
+
+                while True:
+                    data = req.read(DOWNLOAD_CHUNK_SIZE)
+                    if not data:
+                        break
+                    if file_path:
+                        fp.write(data)
+                    else:
+                        chunks.append(data)
+                    if digest:
+                        digest.update(data)
+                    downloaded += len(data)
+                    if progress_callback:
+                        progress_callback(downloaded, total_size)
+            finally:
+                if file_path:
+                    fp.close()
         # 400 [sg] Attachment id doesn't exist or is a local file
         # 403 [s3] link is invalid
         except urllib2.URLError, e:
-            if file_path:
-                fp.close()
             err = "Failed to open %s\n%s" % (url, e)
-            if hasattr(e, 'code'):
+            if not hasattr(e, 'code'):
+                # the server couldn't be reached
+                raise ShotgunFileDownloadInterruptedError(err)
+            else:
                 if e.code == 400:
                     err += "\nAttachment may not exist or is a local file?"
                 elif e.code == 403:
@@ -1349,11 +1611,59 @@ class Shotgun(object):
                             if match:
                                 err += ' - %s' % (match.group(1))
             raise ShotgunFileDownloadError(err)
-        else:
+        except (socket.error, httplib.HTTPException), e:
+            # the connection dropped during the transfer
+            raise ShotgunFileDownloadInterruptedError("Download of %s was "\
+                                                      "interrupted\n%s" % (url, e))
+
+        if total_size is not None and downloaded != total_size:
+            # keep the data received so far so that the download can be resumed
+            raise ShotgunFileDownloadInterruptedError("Incomplete download of %s: received "\
+                                                      "%d of %d bytes" % (url, downloaded, total_size))
+
+        if digest and digest.hexdigest() != checksum.lower():
             if file_path:
-                return file_path
-            else:
-                return attachment
+                os.remove(file_path)
+            raise ShotgunFileDownloadError("Checksum mismatch for %s: expected %s, "\
+                                           "got %s" % (url, checksum, digest.hexdigest()))
+
+        if file_path:
+            return file_path
+        else:
+            return "".join(chunks)
+
+    def _open_attachment_url(self, url, offset=0):
+        """Opens an attachment download url.
+
+        :param url: (str) The url to open.
+
+        :param offset: (int) Optional. If non zero, only the data from this
+        byte offset onwards is requested.
+
+        :returns: The response object.
+        """
+        request = urllib2.Request(url)
+        request.add_header('user-agent', "; ".join(self._user_agents))
+        if offset:
+            request.add_header('Range', 'bytes=%d-' % offset)
+        return urllib2.urlopen(request)
+
+    def _update_digest_from_file(self, digest, file_path):
+        """Updates a digest with the contents of a file.
+
+        :param digest: The md5 object to update.
+
+        :param file_path: (str) The file to read.
+        """
+        fp = open(file_path, 'rb')
+        try:
+            while True:
+                data = fp.read(DOWNLOAD_CHUNK_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+        finally:
+            fp.close()
 
     def set_up_auth_cookie(self):
         """Sets up urllib2 with a cookie for authentication on the Shotgun 
@@ -1515,10 +1825,56 @@ class Shotgun(object):
     # ========================================================================
     # RPC Functions
 
-    def _call_rpc(self, method, params, include_auth_params=True, first=False):
+    def _call_rpc(self, method, params, include_auth_params=True, first=False, origin=None):
         """Calls the specified method on the Shotgun Server sending the
         supplied payload.
 
+        If config.rpc_observer is set, it is called once the call has 
+        completed with a dictionary with the following keys: method, 
+        entity_type (None unless the params name one), request_size and
+        response_size in bytes, attempts, duration in seconds, error 
+        (None or the name of the exception class raised) and origin.
+
+        :param origin: For calls made on a worker thread, the module names
+        of the stack of the thread which requested the call, innermost 
+        first, as returned by _get_stack_modules(). None if the call is
+        made on the requesting thread.
+        """
+        observer = self.config.rpc_observer
+        if observer is None:
+            return self._send_rpc(method, params, include_auth_params, first)
+
+        entity_type = None
+        if isinstance(params, dict):
+            entity_type = params.get("type")
+        call_info = {"method": method, 
+                     "entity_type": entity_type,
+                     "request_size": 0,
+                     "response_size": 0,
+                     "attempts": 0,
+                     "duration": 0.0,
+                     "error": None,
+                     "origin": origin}
+        # calls can be nested, e.g. when a session token is requested
+        parent_call_info = self._current_call_info
+        self._current_call_info = call_info
+        start_time = time.time()
+        try:
+            try:
+                return self._send_rpc(method, params, include_auth_params, first)
+            except Exception, e:
+                call_info["error"] = e.__class__.__name__
+                raise
+        finally:
+            self._current_call_info = parent_call_info
+            call_info["duration"] = time.time() - start_time
+            try:
+                observer(call_info)
+            except Exception:
+                LOG.exception("rpc observer failed")
+
+    def _send_rpc(self, method, params, include_auth_params=True, first=False):
+        """Sends an rpc call to the Shotgun Server. See _call_rpc().
         """
 
         LOG.debug("Starting rpc call to %s with params %s" % (
@@ -1528,6 +1884,9 @@ class Shotgun(object):
         payload = self._build_payload(method, params,
             include_auth_params=include_auth_params)
         encoded_payload = self._encode_payload(payload)
+        call_info = self._current_call_info
+        if call_info is not None:
+            call_info["request_size"] = len(encoded_payload)
 
         req_headers = {
             "content-type" : "application/json; charset=utf-8",
@@ -1536,6 +1895,8 @@ class Shotgun(object):
         http_status, resp_headers, body = self._make_call("POST",
             self.config.api_path, encoded_payload, req_headers)
         LOG.debug("Completed rpc call to %s" % (method))
+        if call_info is not None:
+            call_info["response_size"] = len(body or "")
         try:
             self._parse_http_status(http_status)
         except ProtocolError, e:
@@ -1545,9 +1906,9 @@ class Shotgun(object):
                 e.errmsg += ": %s" % body
             raise
 
+        # datetimes are converted while the response is decoded
         response = self._decode_response(resp_headers, body)
         self._response_errors(response)
-        response = self._transform_inbound(response)
 
         if not isinstance(response, dict) or "results" not in response:
             return response
@@ -1640,6 +2001,8 @@ class Shotgun(object):
 
         while (attempt < max_rpc_attempts):
             attempt += 1
+            if self._current_call_info is not None:
+                self._current_call_info["attempts"] = attempt
             try:
                 return self._http_request(verb, path, body, req_headers)
             except Exception:
@@ -1717,33 +2080,12 @@ class Shotgun(object):
         return body
 
     def _json_loads(self, body):
-        return json.loads(body)
+        return json.loads(body, object_hook=self._get_inbound_object_hook())
 
     def _json_loads_ascii(self, body):
         '''See http://stackoverflow.com/questions/956867'''
-        def _decode_list(lst):
-            newlist = []
-            for i in lst:
-                if isinstance(i, unicode):
-                    i = i.encode('utf-8')
-                elif isinstance(i, list):
-                    i = _decode_list(i)
-                newlist.append(i)
-            return newlist
-
-        def _decode_dict(dct):
-            newdict = {}
-            for k, v in dct.iteritems():
-                if isinstance(k, unicode):
-                    k = k.encode('utf-8')
-                if isinstance(v, unicode):
-                    v = v.encode('utf-8')
-                elif isinstance(v, list):
-                    v = _decode_list(v)
-                newdict[k] = v
-            return newdict
-        return json.loads(body, object_hook=_decode_dict)
-
+        return json.loads(body, 
+            object_hook=self._get_inbound_object_hook(encode_strings=True))
 
     def _response_errors(self, sg_response):
         """Raises any API errors specified in the response.
@@ -1783,24 +2125,37 @@ class Shotgun(object):
 
         - changes timezones
         - converts dates and times to strings
+        - converts strings to unicode
+
+        This is the counterpart of the conversions made by 
+        _get_inbound_object_hook() and handles the data in a single pass.
         """
+        convert_tz = self.config.convert_datetimes_to_utc
+        local_now = datetime.datetime.now()
 
-        if self.config.convert_datetimes_to_utc:
-            def _change_tz(value):
-                if value.tzinfo == None:
-                    value = value.replace(tzinfo=SG_TIMEZONE.local)
-                return value.astimezone(SG_TIMEZONE.utc)
-        else:
-            _change_tz = None
+        def _change_tz(value):
+            if value.tzinfo == None:
+                value = value.replace(tzinfo=SG_TIMEZONE.local)
+            return value.astimezone(SG_TIMEZONE.utc)
 
-        local_now = datetime.datetime.now()
+        def _transform(value):
+            value_type = type(value)
+            if value_type in _PASSTHROUGH_TYPES:
+                return value
+
+            if value_type is dict:
+                return dict((k, _transform(v)) for (k, v) in value.iteritems())
+
+            if value_type is list:
+                return [_transform(x) for x in value]
 
-        def _outbound_visitor(value):
+            if value_type is str:
+                # Convert strings to unicode
+                return value.decode("utf-8")
 
             if isinstance(value, datetime.datetime):
-                if _change_tz:
+                if convert_tz:
                     value = _change_tz(value)
-
                 return value.strftime("%Y-%m-%dT%H:%M:%SZ")
 
             if isinstance(value, datetime.date):
@@ -1811,46 +2166,121 @@ class Shotgun(object):
                 value = local_now.replace(hour=value.hour,
                     minute=value.minute, second=value.second,
                     microsecond=value.microsecond)
-                if _change_tz:
+                if convert_tz:
                     value = _change_tz(value)
                 return value.strftime("%Y-%m-%dT%H:%M:%SZ")
 
+            if isinstance(value, dict):
+                return dict((k, _transform(v)) for (k, v) in value.iteritems())
+
+            if isinstance(value, list):
+                return [_transform(x) for x in value]
+
+            if isinstance(value, tuple):
+                return tuple(_transform(x) for x in value)
+
             if isinstance(value, str):
-                # Convert strings to unicode
                 return value.decode("utf-8")
 
             return value
 
-        return self._visit_data(data, _outbound_visitor)
+        return _transform(data)
 
     def _transform_inbound(self, data):
         """Transforms data types or values after they are received from the
-        server."""
+        server.
+
+        Responses are transformed while they are decoded, see 
+        _get_inbound_object_hook(). This method applies the same conversions
+        to data which has already been decoded.
+        """
+        object_hook = self._get_inbound_object_hook()
+
+        def _transform(value):
+            if isinstance(value, dict):
+                return dict((k, _transform(v)) for (k, v) in value.iteritems())
+            if isinstance(value, list):
+                return [_transform(x) for x in value]
+            if isinstance(value, tuple):
+                return tuple(_transform(x) for x in value)
+            if isinstance(value, basestring):
+                return object_hook({"value": value})["value"]
+            return value
+
+        return _transform(data)
+
+    def _get_inbound_object_hook(self, encode_strings=False):
+        """Returns a json object hook which transforms each json object as
+        it is decoded, so that responses are transformed in a single pass:
+
+        - converts datetime strings to datetime objects
+        - changes timezones
+        - optionally encodes unicode strings as utf-8
+
         #NOTE: The time zone is removed from the time after it is transformed
         #to the local time, otherwise it will fail to compare to datetimes
         #that do not have a time zone.
-        if self.config.convert_datetimes_to_utc:
-            _change_tz = lambda x: x.replace(tzinfo=SG_TIMEZONE.utc)\
-                .astimezone(SG_TIMEZONE.local)
-        else:
-            _change_tz = None
 
-        def _inbound_visitor(value):
-            if isinstance(value, basestring):
-                if len(value) == 20 and self._DATE_TIME_PATTERN.match(value):
-                    try:
-                        # strptime was not on datetime in python2.4
-                        value = datetime.datetime(
-                            *time.strptime(value, "%Y-%m-%dT%H:%M:%SZ")[:6])
-                    except ValueError:
-                        return value
-                    if _change_tz:
-                        return _change_tz(value)
-                    return value
+        The hook is meant to be used for a single response. It remembers the
+        datetime strings it has parsed, since many records typically share 
+        the same values.
 
+        :param encode_strings: (bool) If True, unicode strings are encoded 
+        as utf-8.
+
+        :returns: Callable taking and returning a dict.
+        """
+        convert_tz = self.config.convert_datetimes_to_utc
+        date_time_pattern = self._DATE_TIME_PATTERN
+        parsed = {}
+
+        def _parse_datetime(value):
+            # cheap checks on the fixed positions of the separators first,
+            # the vast majority of strings fail these
+            if value[10] != "T" or value[19] != "Z" or \
+                value[4] != "-" or value[7] != "-" or \
+                value[13] != ":" or value[16] != ":" or \
+                not date_time_pattern.match(value):
+                return None
+            try:
+                # slicing is much faster than time.strptime
+                result = datetime.datetime(int(value[0:4]), int(value[5:7]),
+                    int(value[8:10]), int(value[11:13]), int(value[14:16]),
+                    int(value[17:19]))
+            except ValueError:
+                return None
+            if convert_tz:
+                result = result.replace(tzinfo=SG_TIMEZONE.utc)\
+                    .astimezone(SG_TIMEZONE.local)
+            return result
+
+        def _transform(value):
+            if isinstance(value, basestring):
+                # only strings of the right length can be datetimes
+                if len(value) == 20:
+                    if value in parsed:
+                        result = parsed[value]
+                    else:
+                        result = _parse_datetime(value)
+                        parsed[value] = result
+                    if result is not None:
+                        return result
+                if encode_strings and isinstance(value, unicode):
+                    return value.encode("utf-8")
+                return value
+            if isinstance(value, list):
+                return [_transform(x) for x in value]
             return value
 
-        return self._visit_data(data, _inbound_visitor)
+        def _object_hook(data):
+            result = {}
+            for (k, v) in data.iteritems():
+                if encode_strings and isinstance(k, unicode):
+                    k = k.encode("utf-8")
+                result[k] = _transform(v)
+            return result
+
+        return _object_hook
 
     # ========================================================================
     # Connection Functions
@@ -1909,6 +2339,9 @@ class Shotgun(object):
         if not isinstance(records, (list, tuple)):
             records = [records, ]
 
+        # look this up once rather than for every field
+        local_path_field = self.client_caps.local_path_field
+
         for rec in records:
             # skip results that aren't entity dictionaries
             if not isinstance(rec, dict):
@@ -1921,7 +2354,8 @@ class Shotgun(object):
 
                 # Check for html entities in strings
                 if isinstance(v, types.StringTypes):
-                    rec[k] = rec[k].replace('&lt;', '<')
+                    if '&lt;' in v:
+                        rec[k] = v.replace('&lt;', '<')
 
                 # check for thumbnail for older version (<3.3.0) of shotgun
                 if k == 'image' and \
@@ -1932,8 +2366,8 @@ class Shotgun(object):
                     continue
 
                 if isinstance(v, dict) and v.get('link_type') == 'local' \
-                    and self.client_caps.local_path_field in v:
-                    local_path = v[self.client_caps.local_path_field]
+                    and local_path_field in v:
+                    local_path = v[local_path_field]
                     v['local_path'] = local_path
                     v['url'] = "file://%s" % (local_path or "",)
 
@@ -2102,4 +2536,11 @@ def _translate_filters_simple(sg_filter):
 
     return condition
 
-     
+def _get_stack_modules(frame):
+    """Returns the names of the modules of the given frame and of the 
+    frames which called it, innermost first."""
+    modules = []
+    while frame is not None:
+        modules.append(frame.f_globals.get("__name__", ""))
+        frame = frame.f_back
+    return modules
@@ -0,0 +1,125 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+
+import tank
+from tank import context
+from tank.path_cache import PathCache
+
+from benchmark_base import *
+
+# number of folders registered by each folder creation event
+FOLDERS_PER_EVENT = 100
+
+
+class BenchPathCacheSync(BenchmarkTestBase):
+    """
+    Synchronization of the local path cache with the folders registered in shotgun.
+    """
+    def _add_folders(self, shots):
+        """
+        Registers folders for shots in shotgun the way folder creation
+        does, with a folder creation event for every FOLDERS_PER_EVENT folders.
+        """
+        pc_link = {"type": "PipelineConfiguration", "id": self.sg_pc_entity["id"]}
+        folder_ids = []
+        for shot in shots:
+            path = os.path.join(self.project_root, "sequences", shot["sg_sequence"]["name"], shot["code"])
+            data = {"project": self.project,
+                    "pipeline_configuration": pc_link,
+                    "code": shot["code"],
+                    "linked_entity_type": "Shot",
+                    "linked_entity_id": shot["id"],
+                    "is_primary": True,
+                    "configuration_metadata": "",
+                    "path": {"local_path": path, "local_storage": self.primary_storage}}
+            folder_ids.append(self.mockgun.create("FilesystemLocation", data)["id"])
+
+        for i in range(0, len(folder_ids), FOLDERS_PER_EVENT):
+            self._add_folder_event(folder_ids[i:i + FOLDERS_PER_EVENT])
+
+    def _add_folder_event(self, folder_ids):
+        self.mockgun.create("EventLogEntry", {"event_type": "Toolkit_Folders_Create",
+                                              "project": self.project,
+                                              "meta": {"sg_folder_ids": folder_ids}})
+
+    def _synchronize(self, full_sync=False):
+        path_cache = PathCache(self.tk)
+        try:
+            path_cache.synchronize(full_sync=full_sync)
+        finally:
+            path_cache.close()
+
+    def _get_num_paths(self):
+        path_cache = PathCache(self.tk)
+        try:
+            return list(path_cache._connection.execute("SELECT count(*) FROM path_cache"))[0][0]
+        finally:
+            path_cache.close()
+
+    def test_full_sync(self):
+        self._add_folders(self.add_shots(self.scale))
+        self.measure("path_cache_full_sync", self._synchronize, full_sync=True)
+        # the shots and the project
+        self.assertEqual(self._get_num_paths(), self.scale + 1)
+
+    def test_incremental_sync(self):
+        shots = self.add_shots(self.scale)
+        self._add_folder_event([])
+        self._synchronize(full_sync=True)
+
+        self._add_folders(shots)
+        self.measure("path_cache_incremental_sync", self._synchronize)
+        self.assertEqual(self._get_num_paths(), self.scale + 1)
+
+
+class BenchFolderCreation(BenchmarkTestBase):
+    """
+    Creation of folders for shots, including their registration in shotgun.
+    """
+    def test_create_folders(self):
+        shot_ids = [x["id"] for x in self.add_shots(self.scale)]
+        self.measure("folder_creation", self.tk.create_filesystem_structure, "Shot", shot_ids)
+        self.assertEqual(len(self.mockgun.find("FilesystemLocation", [["linked_entity_type", "is", "Shot"]])),
+                         self.scale)
+
+
+class BenchPublishRegistration(BenchmarkTestBase):
+    """
+    Registration of publishes and lookup of publishes by path.
+    """
+    def test_register_publishes(self):
+        shot = self.add_shots(1)[0]
+        ctx = context.Context(tk=self.tk, project=self.project, entity=shot)
+        publish_root = os.path.join(self.project_root, "sequences", shot["sg_sequence"]["name"],
+                                    shot["code"], "publish")
+        items = [{"path": os.path.join(publish_root, "scene_%06d.ma" % i),
+                  "name": "scene_%06d" % i,
+                  "version_number": 1,
+                  "published_file_type": "Maya Scene"} for i in range(self.scale)]
+
+        results = self.measure("register_publishes", tank.util.register_publishes, self.tk, ctx, items)
+        self.assertEqual([x["error"] for x in results], [None] * self.scale)
+
+        paths = [x["path"] for x in items]
+        publishes = self.measure("find_publish", tank.util.find_publish, self.tk, paths)
+        self.assertEqual(len(publishes), self.scale)
+
+
+class BenchShotgunRead(BenchmarkTestBase):
+    """
+    Paged reads of large result sets.
+    """
+    def test_find(self):
+        self.add_shots(self.scale)
+        shots = self.measure("shotgun_find", self.tk.shotgun.find, "Shot",
+                             [["project", "is", self.project]], ["code", "sg_sequence"])
+        self.assertEqual(len(shots), self.scale)
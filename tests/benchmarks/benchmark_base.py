@@ -0,0 +1,87 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Base class for the end-to-end benchmarks.
+
+Benchmarks run core workflows against a local shotgun server (see
+tank_test.sg_server) so that the cost of every round trip is included.
+Each benchmark populates the mocked shotgun database with a number of
+entities given by its scale attribute and times one or more workflows
+with measure(). Results are collected in RESULTS and reported by
+run_benchmarks.py.
+"""
+
+import time
+
+from tank_test.tank_test_base import *
+
+# results of all workflows measured, see BenchmarkTestBase.measure()
+RESULTS = []
+
+
+class BenchmarkTestBase(TankTestBase):
+    """
+    Base class for benchmarks. The scale and latency attributes are
+    set on each test by run_benchmarks.py.
+    """
+    # number of entities to populate shotgun with
+    scale = 100
+    # time in seconds to delay each shotgun request by
+    latency = 0.0
+
+    def setUp(self):
+        super(BenchmarkTestBase, self).setUp()
+        self.setup_fixtures()
+        self.start_shotgun_server(self.latency)
+
+    def add_shots(self, num_shots, shots_per_sequence=100):
+        """
+        Adds shots to the mocked shotgun database, grouped into sequences.
+
+        :param num_shots: Number of shots to add.
+        :param shots_per_sequence: Number of shots in each sequence.
+        :returns: List of shot entity dictionaries
+        """
+        sequences = []
+        shots = []
+        for i in range(num_shots):
+            if i % shots_per_sequence == 0:
+                sequence = {"type": "Sequence",
+                            "id": len(sequences) + 1,
+                            "code": "seq_%04d" % len(sequences),
+                            "project": self.project}
+                sequences.append(sequence)
+            shots.append({"type": "Shot",
+                          "id": i + 1,
+                          "code": "shot_%06d" % i,
+                          "sg_sequence": {"type": "Sequence", "id": sequence["id"], "name": sequence["code"]},
+                          "project": self.project})
+        self.add_to_sg_mock_db(sequences + shots)
+        return shots
+
+    def measure(self, name, func, *args, **kwargs):
+        """
+        Runs and times a workflow and records the result.
+
+        :param name: Name of the workflow
+        :param func: Callable running the workflow
+        :returns: Value returned by func
+        """
+        self.sg_server.reset_call_counts()
+        before = time.time()
+        result = func(*args, **kwargs)
+        duration = time.time() - before
+        RESULTS.append({"name": name,
+                        "scale": self.scale,
+                        "latency": self.latency,
+                        "time": duration,
+                        "calls": self.sg_server.get_call_counts()})
+        return result
@@ -0,0 +1,95 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+# 
+# CONFIDENTIAL AND PROPRIETARY
+# 
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit 
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your 
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights 
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from mock import Mock, patch
+
+import tank
+from tank.deploy.app_store_descriptor import TankAppStoreDescriptor
+from tank.deploy.descriptor import AppDescriptor
+from tank_test.tank_test_base import *
+from tank_vendor import shotgun_api3
+
+
+class TestAppStoreDownload(TankTestBase):
+    """
+    Tests the retries of interrupted app store downloads.
+    """
+    def setUp(self):
+        super(TestAppStoreDownload, self).setUp()
+        self.descriptor = TankAppStoreDescriptor(self.pipeline_configuration,
+                                                 {"type": "app_store", 
+                                                  "name": "tk-multi-foo", 
+                                                  "version": "v1.0.0"},
+                                                 AppDescriptor.APP)
+        self.app_store_sg = Mock()
+        metadata = {"version": {"sg_payload": {"url": "https://unit_test/file_serve/attachment/21"}}}
+        for (target, kwargs) in [
+            ("tank.deploy.app_store_descriptor.shotgun.create_sg_app_store_connection", 
+             {"return_value": (self.app_store_sg, {"type": "ApiUser", "id": 1})}),
+            ("tank.deploy.app_store_descriptor.shotgun.get_sg_connection", {}),
+            ("tank.deploy.app_store_descriptor.TankAppStoreDescriptor."
+             "_TankAppStoreDescriptor__download_app_store_metadata", {"return_value": metadata}),
+            ("tank.deploy.app_store_descriptor.TankAppStoreDescriptor."
+             "_TankAppStoreDescriptor__cache_app_store_metadata", {}),
+            ("tank.deploy.app_store_descriptor.unzip_file", {}),
+            ("tank.deploy.app_store_descriptor.time.sleep", {}),
+        ]:
+            patcher = patch(target, **kwargs)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = patch("tank.deploy.app_store_descriptor.clear_global_busy")
+        self.clear_global_busy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retry_interrupted(self):
+        """
+        Downloads interrupted by network errors are resumed.
+        """
+        def download_attachment(attachment_id, file_path, resume, progress_callback):
+            if self.app_store_sg.download_attachment.call_count == 1:
+                raise shotgun_api3.ShotgunFileDownloadInterruptedError("connection dropped")
+        self.app_store_sg.download_attachment.side_effect = download_attachment
+        self.descriptor.download_local()
+        self.assertEqual(self.app_store_sg.download_attachment.call_count, 2)
+        self.assertTrue(self.app_store_sg.download_attachment.call_args[1]["resume"])
+
+    def test_give_up(self):
+        """
+        The last network error is raised once all attempts have been made.
+        """
+        self.app_store_sg.download_attachment.side_effect = \
+            shotgun_api3.ShotgunFileDownloadInterruptedError("connection dropped")
+        self.assertRaises(shotgun_api3.ShotgunFileDownloadInterruptedError, 
+                          self.descriptor.download_local)
+        self.assertEqual(self.app_store_sg.download_attachment.call_count, 
+                         tank.platform.constants.TANK_APP_STORE_DOWNLOAD_ATTEMPTS)
+
+    def test_no_retry_permanent(self):
+        """
+        Permanent failures, such as HTTP errors, are not retried.
+        """
+        self.app_store_sg.download_attachment.side_effect = \
+            shotgun_api3.ShotgunFileDownloadError("HTTP Error 403: Forbidden")
+        self.assertRaises(shotgun_api3.ShotgunFileDownloadError, self.descriptor.download_local)
+        self.assertEqual(self.app_store_sg.download_attachment.call_count, 1)
+
+    def test_busy_window(self):
+        """
+        The busy window is only closed if the download opened it.
+        """
+        self.descriptor.download_local()
+        self.assertFalse(self.clear_global_busy.called)
+
+        def download_attachment(attachment_id, file_path, resume, progress_callback):
+            progress_callback(100, 1000)
+        self.app_store_sg.download_attachment.side_effect = download_attachment
+        self.descriptor.download_local()
+        self.assertEqual(self.clear_global_busy.call_count, 1)
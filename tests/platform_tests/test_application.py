@@ -227,6 +227,62 @@ class TestHookCache(TestApplication):
         self.assertTrue(len(tank.hook._hooks_cache) == 0)
 
 
+class TestHookPathsCache(TestApplication):
+    """
+    Check that hook paths are only resolved once per bundle.
+    """
+    def test_resolve_once(self):
+        app = self.engine.apps["test_app"]
+        self.assertEqual(app.execute_hook_method("test_hook_inheritance_2", "foo2", bar=True), "custom class base class")
+        
+        # once resolved, the hook paths should not be resolved again
+        app._TankBundle__resolve_hook_path = None
+        try:
+            self.assertEqual(app.execute_hook_method("test_hook_inheritance_2", "foo2", bar=True), 
+                             "custom class base class")
+        finally:
+            del app._TankBundle__resolve_hook_path
+            
+    def test_restart(self):
+        tank.hook.clear_hooks_cache()
+        app = self.engine.apps["test_app"]
+        self.assertTrue(app.execute_hook("test_hook_std", dummy_param=True))
+        self.assertTrue(len(tank.hook._hook_paths_cache) == 1)
+        
+        # the cache is cleared when the engine is restarted
+        context = self.engine.context
+        self.engine.destroy()
+        self.assertTrue(len(tank.hook._hook_paths_cache) == 0)
+        self.engine = tank.platform.start_engine("test_engine", self.tk, context)
+        
+    def test_env_var(self):
+        """
+        Expressions referring to environment variables are resolved again when 
+        the value of the variable changes.
+        """
+        for name in ["a", "b"]:
+            hook_folder = os.path.join(self.tank_temp, "env_var_hooks_%s" % name)
+            if not os.path.exists(hook_folder):
+                os.makedirs(hook_folder)
+            fh = open(os.path.join(hook_folder, "env_var_hook.py"), "w")
+            try:
+                fh.write("from tank import Hook\n\n"
+                         "class EnvVarHook(Hook):\n"
+                         "    def execute(self):\n"
+                         "        return '%s'\n" % name)
+            finally:
+                fh.close()
+        
+        app = self.engine.apps["test_app"]
+        expression = "{$TANK_TEST_HOOK_ROOT}/env_var_hook.py"
+        try:
+            os.environ["TANK_TEST_HOOK_ROOT"] = os.path.join(self.tank_temp, "env_var_hooks_a")
+            self.assertEqual(app.execute_hook_expression(expression, "execute"), "a")
+            os.environ["TANK_TEST_HOOK_ROOT"] = os.path.join(self.tank_temp, "env_var_hooks_b")
+            self.assertEqual(app.execute_hook_expression(expression, "execute"), "b")
+        finally:
+            del os.environ["TANK_TEST_HOOK_ROOT"]
+
 
 
 class TestProperties(TestApplication):
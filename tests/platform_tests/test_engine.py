@@ -9,8 +9,12 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import gc
+import weakref
 import unittest2 as unittest
 
+from mock import patch
+
 from tank_test.tank_test_base import *
 
 import tank
@@ -89,3 +93,292 @@ class TestStartEngine(TankTestBase):
         
         
          
+
+
+COMMAND_APP = """
+from tank.platform import Application
+
+class CommandApp(Application):
+    
+    def init_app(self):
+        self.engine.register_command("Do Thing", self.do_thing, {"type": "context_menu", "widget": object()})
+        self.engine.register_command("Other Thing", self.do_thing)
+    
+    def do_thing(self):
+        return "done by %s" % self.instance_name
+"""
+
+class TestLazyAppLoading(TestStartEngine):
+    """
+    Tests lazy initialization of apps.
+    """
+    def setUp(self):
+        super(TestLazyAppLoading, self).setUp()
+        
+        app_path = os.path.join(self.project_config, "command_app")
+        self.create_file(os.path.join(app_path, "app.py"), COMMAND_APP)
+        self.create_file(os.path.join(app_path, "info.yml"), "display_name: Command App\nconfiguration: {}\n")
+        
+        env = self.tk.pipeline_configuration.get_environment("test")
+        env.create_app_settings("test_engine", "command_app")
+        env.update_app_settings("test_engine", "command_app", {}, {"type": "dev", "path": app_path})
+        
+        os.environ[tank.platform.constants.LAZY_APP_LOADING_ENV_VAR] = "1"
+        
+        # first time around, all apps are initialized and their commands cached
+        tank.platform.start_engine("test_engine", self.tk, self.context).destroy()
+        
+    def tearDown(self):
+        del os.environ[tank.platform.constants.LAZY_APP_LOADING_ENV_VAR]
+        super(TestLazyAppLoading, self).tearDown()
+    
+    def test_cache_location(self):
+        """
+        The commands are cached in the location defined by the cache_location hook.
+        """
+        cache_folder = self.tk.pipeline_configuration.get_app_commands_cache_location(self.tk)
+        self.assertEqual(cache_folder, self.tk.execute_core_hook_method("cache_location",
+                                                                        "configuration_cache",
+                                                                        project_id=self.project["id"],
+                                                                        pipeline_configuration_id=self.sg_pc_entity["id"],
+                                                                        cache_name="app_commands"))
+        self.assertTrue(len(os.listdir(cache_folder)) > 0)
+    
+    def test_cache_location_fails(self):
+        """
+        Apps are initialized up front if the cache location can't be determined.
+        """
+        location_patcher = patch("tank.pipelineconfig.PipelineConfiguration.get_cache_location",
+                                 side_effect=TankError("Not registered in Shotgun"))
+        location_patcher.start()
+        get_app_patcher = patch("tank.platform.application.get_application",
+                                wraps=tank.platform.application.get_application)
+        get_app_mock = get_app_patcher.start()
+        try:
+            engine = tank.platform.start_engine("test_engine", self.tk, self.context)
+            self.assertEqual(get_app_mock.call_count, 2)
+            self.assertEqual(engine.commands["Do Thing"]["callback"](), "done by command_app")
+            engine.destroy()
+        finally:
+            get_app_patcher.stop()
+            location_patcher.stop()
+    
+    def test_placeholder_commands(self):
+        """
+        Apps with cached commands are initialized when a command is executed.
+        """
+        get_app_patcher = patch("tank.platform.application.get_application",
+                                wraps=tank.platform.application.get_application)
+        get_app_mock = get_app_patcher.start()
+        try:
+            engine = tank.platform.start_engine("test_engine", self.tk, self.context)
+            # the test app doesn't register any commands so is always initialized
+            self.assertEqual(get_app_mock.call_count, 1)
+            
+            self.assertTrue("Do Thing" in engine.commands)
+            self.assertTrue("Other Thing" in engine.commands)
+            properties = engine.commands["Do Thing"]["properties"]
+            self.assertEqual(properties["type"], "context_menu")
+            self.assertEqual(properties["app"].display_name, "Command App")
+            self.assertFalse("widget" in properties)
+            self.assertEqual(get_app_mock.call_count, 1)
+            
+            self.assertEqual(engine.commands["Do Thing"]["callback"](), "done by command_app")
+            self.assertEqual(get_app_mock.call_count, 2)
+            
+            # the placeholder commands have been replaced by the real ones
+            self.assertTrue("Do Thing" in engine.commands)
+            self.assertTrue("Other Thing" in engine.commands)
+            self.assertEqual(engine.commands["Other Thing"]["properties"]["app"], engine.apps["command_app"])
+            self.assertEqual(engine.commands["Other Thing"]["callback"](), "done by command_app")
+            self.assertEqual(get_app_mock.call_count, 2)
+        finally:
+            get_app_patcher.stop()
+    
+    def test_placeholder_after_destroy(self):
+        """
+        Placeholder commands do nothing once the engine has been destroyed.
+        """
+        engine = tank.platform.start_engine("test_engine", self.tk, self.context)
+        callback = engine.commands["Do Thing"]["callback"]
+        engine.destroy()
+        self.assertEqual(callback(), None)
+        self.assertFalse("command_app" in engine.apps)
+        
+        engine_ref = weakref.ref(engine)
+        del(engine)
+        gc.collect()
+        self.assertEqual(engine_ref(), None)
+        self.assertEqual(callback(), None)
+
+    def test_apps(self):
+        """
+        Listing the apps doesn't initialize apps with cached commands, using them does.
+        """
+        get_app_patcher = patch("tank.platform.application.get_application",
+                                wraps=tank.platform.application.get_application)
+        get_app_mock = get_app_patcher.start()
+        try:
+            engine = tank.platform.start_engine("test_engine", self.tk, self.context)
+            self.assertEqual(sorted(engine.apps.keys()), ["command_app", "test_app"])
+            self.assertEqual(engine.apps["command_app"].display_name, "Command App")
+            self.assertEqual(get_app_mock.call_count, 1)
+            
+            self.assertEqual(engine.apps["command_app"].do_thing(), "done by command_app")
+            self.assertEqual(get_app_mock.call_count, 2)
+            self.assertEqual(engine.commands["Do Thing"]["callback"](), "done by command_app")
+            self.assertEqual(get_app_mock.call_count, 2)
+        finally:
+            get_app_patcher.stop()
+
+
+class TestValidationCache(TestStartEngine):
+    """
+    Tests the caching of successful settings validation.
+    """
+    def _start_engine(self):
+        """
+        Starts and destroys the test engine, returning the number of 
+        times settings were validated.
+        """
+        validate_patcher = patch("tank.platform.validation.validate_settings",
+                                 wraps=tank.platform.validation.validate_settings)
+        validate_mock = validate_patcher.start()
+        try:
+            tank.platform.start_engine("test_engine", self.tk, self.context).destroy()
+            return validate_mock.call_count
+        finally:
+            validate_patcher.stop()
+    
+    def test_cached(self):
+        """
+        Validation is skipped once the settings have been validated.
+        """
+        # the engine and the test app
+        self.assertEqual(self._start_engine(), 2)
+        self.assertEqual(self._start_engine(), 0)
+        
+        # the validated settings are cached on disk as well
+        tank.platform.validation.clear_validation_cache()
+        self.assertEqual(self._start_engine(), 0)
+        cache_folder = self.tk.pipeline_configuration.get_validation_cache_location(self.tk)
+        self.assertTrue(os.path.exists(cache_folder))
+        
+    def test_changed_settings(self):
+        """
+        Changing the settings for an app invalidates the cache.
+        """
+        self.assertEqual(self._start_engine(), 2)
+        env = self.tk.pipeline_configuration.get_environment("test")
+        location = env.get_app_descriptor("test_engine", "test_app").get_location()
+        env.update_app_settings("test_engine", "test_app", {"test_str": "changed"}, location)
+        self.assertEqual(self._start_engine(), 1)
+        
+    def test_changed_context(self):
+        """
+        Starting the engine in a context with a different shape invalidates the cache.
+        """
+        self.assertEqual(self._start_engine(), 2)
+        self.context = self.tk.context_from_entity("Project", self.project["id"])
+        self.assertEqual(self._start_engine(), 2)
+
+    def test_removed_hook(self):
+        """
+        Removing a hook file that the settings refer to invalidates the cache.
+        """
+        self.assertEqual(self._start_engine(), 2)
+        # the hook lives in a subfolder of the hooks folder
+        hook_file = os.path.join(self.project_config, "hooks", "foo", "bar.py")
+        os.rename(hook_file, "%s.bak" % hook_file)
+        try:
+            # the app no longer validates
+            self.assertEqual(self._start_engine(), 1)
+        finally:
+            os.rename("%s.bak" % hook_file, hook_file)
+        
+    def test_cache_location_fails(self):
+        """
+        Validation is still cached in memory if the cache location can't be determined.
+        """
+        location_patcher = patch("tank.pipelineconfig.PipelineConfiguration.get_cache_location",
+                                 side_effect=TankError("Not registered in Shotgun"))
+        location_patcher.start()
+        try:
+            self.assertEqual(self._start_engine(), 2)
+            self.assertEqual(self._start_engine(), 0)
+        finally:
+            location_patcher.stop()
+
+    def test_atomic_save(self):
+        """
+        The cache file is replaced in one go and failed writes leave it untouched.
+        """
+        self._start_engine()
+        cache = tank.platform.validation.ValidationCache(self.tk, self.context)
+        cache_dir = self.tk.pipeline_configuration.get_validation_cache_location(self.tk)
+        cache_file = os.path.join(cache_dir, "validated_settings.cache")
+        self.assertEqual(os.listdir(cache_dir), [os.path.basename(cache_file)])
+        contents = open(cache_file, "rb").read()
+        
+        cache.add("foo")
+        dump_patcher = patch("cPickle.dump", side_effect=IOError("disk full"))
+        dump_patcher.start()
+        try:
+            cache.save()
+        finally:
+            dump_patcher.stop()
+        self.assertEqual(open(cache_file, "rb").read(), contents)
+        self.assertEqual(os.listdir(cache_dir), [os.path.basename(cache_file)])
+
+
+class TestStartupProfiling(TestStartEngine):
+    """
+    Tests the profiling of engine startup.
+    """
+    def setUp(self):
+        super(TestStartupProfiling, self).setUp()
+        self.trace_file = os.path.join(self.tank_temp, "startup_trace.txt")
+        if os.path.exists(self.trace_file):
+            os.remove(self.trace_file)
+        os.environ[tank.platform.constants.STARTUP_PROFILING_ENV_VAR] = self.trace_file
+        tank.profiling.clear_startup_trace()
+        tank.profiling.enable_startup_profiling()
+
+    def tearDown(self):
+        del os.environ[tank.platform.constants.STARTUP_PROFILING_ENV_VAR]
+        tank.profiling.enable_startup_profiling(False)
+        tank.profiling.clear_startup_trace()
+        super(TestStartupProfiling, self).tearDown()
+
+    def test_start_engine(self):
+        """
+        Engine startup is recorded and written to file once the engine has started.
+        """
+        tank.platform.start_engine("test_engine", self.tk, self.context).destroy()
+
+        trace = self.tk.get_startup_trace()
+        self.assertEqual(trace[-1]["name"], "start_engine")
+        phases = [x["name"] for x in trace[-1]["children"]]
+        self.assertTrue("pick_environment" in phases)
+        self.assertTrue("loader.load_plugin" in phases)
+        self.assertTrue("Engine.__init__" in phases)
+        
+        engine_init = trace[-1]["children"][phases.index("Engine.__init__")]
+        load_apps = [x for x in engine_init["children"] if x["name"] == "Engine.__load_apps"][0]
+        self.assertTrue("init_app test_app" in [x["name"] for x in load_apps["children"]])
+
+        fh = open(self.trace_file)
+        try:
+            lines = fh.read().splitlines()
+        finally:
+            fh.close()
+        stack = "start_engine;Engine.__init__;Engine.__load_apps;init_app test_app "
+        self.assertTrue([x for x in lines if x.startswith(stack)])
+        
+        # the trace is only reported once
+        tank.platform.start_engine("test_engine", self.tk, self.context).destroy()
+        fh = open(self.trace_file)
+        try:
+            self.assertEqual(len([x for x in fh.read().splitlines() if x.startswith(stack)]), 2)
+        finally:
+            fh.close()
@@ -7,6 +7,7 @@ from tank.platform.environment import Environment
 from tank_vendor import yaml
 
 import copy
+from mock import patch
 
 class TestEnvironment(TankTestBase):
     """
@@ -79,6 +80,28 @@ class TestEnvironment(TankTestBase):
         self.assertEqual(self.env.get_app_descriptor("test_engine", "test_app").get_configuration_schema(), 
                          self.raw_app_metadata["configuration"])
         
+    def test_read_only_meta(self):
+        
+        desc = self.env.get_app_descriptor("test_engine", "test_app")
+        schema = desc.get_configuration_schema()
+        
+        # manifest data is shared rather than copied
+        self.assertTrue(schema is desc.get_configuration_schema())
+        
+        # and cannot be modified
+        self.assertRaises(TypeError, schema.__setitem__, "foo", "bar")
+        self.assertRaises(TypeError, schema.pop, "test_str")
+        self.assertRaises(TypeError, schema["test_simple_list"].update, {})
+        self.assertRaises(TypeError, schema["test_template"]["required_fields"].append, "foo")
+        
+        # explicit copies can be modified
+        schema_copy = copy.deepcopy(schema)
+        self.assertEqual(type(schema_copy), dict)
+        schema_copy["foo"] = "bar"
+        schema_copy["test_simple_list"]["foo"] = "bar"
+        schema_copy["test_template"]["required_fields"].append("foo")
+        self.assertFalse("foo" in schema)
+        
     
 class TestUpdateEnvironment(TankTestBase):
 
@@ -261,3 +284,154 @@ class TestUpdateEnvironment(TankTestBase):
     
     
     
+class TestEnvironmentCache(TankTestBase):
+    """
+    Tests the caching of compiled environments.
+    """
+
+    def setUp(self):
+        super(TestEnvironmentCache, self).setUp()
+        self.setup_fixtures()
+        
+        env_folder = os.path.join(self.project_config, "env")
+        self.include_file = os.path.join(env_folder, "includes", "common.yml")
+        self.create_file(os.path.join(env_folder, "cached.yml"), 
+                         "includes: ['./includes/common.yml', '$TEST_ENV_INCLUDE']\n"
+                         "description: '@description'\n"
+                         "engines:\n"
+                         "  test_engine:\n"
+                         "    location: '@engine_location'\n"
+                         "    apps:\n"
+                         "      app_a: {location: '@app_location', foo: '@shared'}\n"
+                         "      app_b: {location: '@app_location', foo: '@shared'}\n")
+        self.create_file(self.include_file,
+                         "engine_location: {type: dev, path: /foo}\n"
+                         "app_location: {type: dev, path: /bar}\n"
+                         "shared: {value: 1}\n")
+        
+        self.env_var_include_a = os.path.join(env_folder, "includes", "a.yml")
+        self.env_var_include_b = os.path.join(env_folder, "includes", "b.yml")
+        self.create_file(self.env_var_include_a, "description: a\n")
+        self.create_file(self.env_var_include_b, "description: b\n")
+        os.environ["TEST_ENV_INCLUDE"] = self.env_var_include_a
+
+    def tearDown(self):
+        del os.environ["TEST_ENV_INCLUDE"]
+        super(TestEnvironmentCache, self).tearDown()
+
+    def test_cached(self):
+        """
+        Environments are only parsed once.
+        """
+        env = self.tk.pipeline_configuration.get_environment("cached")
+        load_patcher = patch("tank_vendor.yaml.load")
+        load_mock = load_patcher.start()
+        try:
+            env_2 = self.tk.pipeline_configuration.get_environment("cached")
+            self.assertEqual(load_mock.call_count, 0)
+        finally:
+            load_patcher.stop()
+        self.assertEqual(env.get_app_settings("test_engine", "app_a"), 
+                         env_2.get_app_settings("test_engine", "app_a"))
+        self.assertEqual(env_2.get_app_descriptor("test_engine", "app_a").get_location(), 
+                         {"type": "dev", "path": "/bar"})
+    
+    def test_disk_cache(self):
+        """
+        Compiled environments are picked up from disk by new sessions.
+        """
+        context = self.tk.context_from_entity(self.project["type"], self.project["id"])
+        self.tk.pipeline_configuration.get_environment("cached", context)
+        # the cache location is defined by the cache_location hook
+        cache_folder = self.tk.pipeline_configuration.get_environment_cache_location(self.tk)
+        self.assertEqual(cache_folder, self.tk.execute_core_hook_method("cache_location",
+                                                                        "configuration_cache",
+                                                                        project_id=self.project["id"],
+                                                                        pipeline_configuration_id=self.sg_pc_entity["id"],
+                                                                        cache_name="environments"))
+        self.assertEqual(len(os.listdir(cache_folder)), 1)
+        tank.platform.environment_includes.clear_environment_cache()
+        load_patcher = patch("tank_vendor.yaml.load")
+        load_mock = load_patcher.start()
+        try:
+            env = self.tk.pipeline_configuration.get_environment("cached", context)
+            self.assertEqual(load_mock.call_count, 0)
+        finally:
+            load_patcher.stop()
+        self.assertEqual(env.get_app_settings("test_engine", "app_b"), {"foo": {"value": 1}})
+        
+    def test_disk_cache_location_fails(self):
+        """
+        Environments can still be loaded if the location of the disk cache can't be determined.
+        """
+        context = self.tk.context_from_entity(self.project["type"], self.project["id"])
+        location_patcher = patch("tank.pipelineconfig.PipelineConfiguration.get_cache_location",
+                                 side_effect=TankError("Not registered in Shotgun"))
+        location_mock = location_patcher.start()
+        try:
+            env = self.tk.pipeline_configuration.get_environment("cached", context)
+            self.assertEqual(location_mock.call_count, 1)
+            # the location is only needed when the environment isn't cached in memory
+            self.tk.pipeline_configuration.get_environment("cached", context)
+            self.assertEqual(location_mock.call_count, 1)
+        finally:
+            location_patcher.stop()
+        self.assertEqual(env.get_app_settings("test_engine", "app_b"), {"foo": {"value": 1}})
+        
+    def test_references_copied(self):
+        """
+        Settings can be modified without affecting other settings or environments.
+        """
+        env = self.tk.pipeline_configuration.get_environment("cached")
+        env.get_app_settings("test_engine", "app_a")["foo"]["value"] = 2
+        self.assertEqual(env.get_app_settings("test_engine", "app_b"), {"foo": {"value": 1}})
+        env_2 = self.tk.pipeline_configuration.get_environment("cached")
+        self.assertEqual(env_2.get_app_settings("test_engine", "app_a"), {"foo": {"value": 1}})
+    
+    def test_include_modified(self):
+        """
+        Changes to included files are picked up.
+        """
+        self.tk.pipeline_configuration.get_environment("cached")
+        self.create_file(self.include_file,
+                         "engine_location: {type: dev, path: /foo}\n"
+                         "app_location: {type: dev, path: /bar}\n"
+                         "shared: {value: 12}\n")
+        env = self.tk.pipeline_configuration.get_environment("cached")
+        self.assertEqual(env.get_app_settings("test_engine", "app_b"), {"foo": {"value": 12}})
+
+    def test_include_modified_same_size(self):
+        """
+        Edits to included files which keep their size and modification time are picked up.
+        """
+        self.tk.pipeline_configuration.get_environment("cached")
+        stat = os.stat(self.include_file)
+        self.create_file(self.include_file,
+                         "engine_location: {type: dev, path: /foo}\n"
+                         "app_location: {type: dev, path: /bar}\n"
+                         "shared: {value: 2}\n")
+        os.utime(self.include_file, (stat.st_atime, stat.st_mtime))
+        env = self.tk.pipeline_configuration.get_environment("cached")
+        self.assertEqual(env.get_app_settings("test_engine", "app_b"), {"foo": {"value": 2}})
+
+    def test_update(self):
+        """
+        Updated settings are picked up straight away by the updated and by new environments.
+        """
+        env = self.tk.pipeline_configuration.get_environment("cached")
+        env.update_app_settings("test_engine", "app_a", {"bar": 3}, {"type": "dev", "path": "/baz"})
+        self.assertEqual(env.get_app_settings("test_engine", "app_a"), {"foo": {"value": 1}, "bar": 3})
+        env_2 = self.tk.pipeline_configuration.get_environment("cached")
+        self.assertEqual(env_2.get_app_settings("test_engine", "app_a"), {"foo": {"value": 1}, "bar": 3})
+        self.assertEqual(env_2.get_app_descriptor("test_engine", "app_a").get_location(), 
+                         {"type": "dev", "path": "/baz"})
+
+    def test_include_resolved_differently(self):
+        """
+        Changes to how include paths resolve are picked up.
+        """
+        env = self.tk.pipeline_configuration.get_environment("cached")
+        self.assertEqual(env.description, "a")
+        os.environ["TEST_ENV_INCLUDE"] = self.env_var_include_b
+        env = self.tk.pipeline_configuration.get_environment("cached")
+        self.assertEqual(env.description, "b")
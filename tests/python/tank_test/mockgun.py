@@ -89,6 +89,8 @@ class Shotgun(object):
 
         # initialize the "database"
         self._db = dict((entity, {}) for entity in self._schema)
+        # (number of rows, max id) per table, see _get_next_id()
+        self._max_ids = {}
 
         self.base_url = base_url
         
@@ -414,6 +416,16 @@ class Shotgun(object):
             
         results = [row for row in self._db[entity_type].values() if self._row_matches_filters(entity_type, row, resolved_filters_2, filter_operator, retired_only)]
         
+        # sort by the last order field first, the sort is stable
+        for sort_order in reversed(order or []):
+            field_name = sort_order["field_name"]
+            results.sort(key=lambda row: self._get_field_from_row(entity_type, row, field_name),
+                         reverse=(sort_order.get("direction") == "desc"))
+        
+        if limit:
+            page = max(page, 1)
+            results = results[(page - 1) * limit:page * limit]
+        
         if fields is None:
             fields = set(["type", "id"])
         else:
@@ -474,11 +486,7 @@ class Shotgun(object):
         self._validate_entity_type(entity_type)
         self._validate_entity_data(entity_type, data)
         self._validate_entity_fields(entity_type, return_fields)
-        try:
-            # get next id in this table
-            next_id = max(self._db[entity_type]) + 1
-        except ValueError:
-            next_id = 1
+        next_id = self._get_next_id(entity_type)
         
         row = self._get_new_row(entity_type)
         
@@ -497,6 +505,16 @@ class Shotgun(object):
         
         return result
 
+    def _get_next_id(self, entity_type):
+        # finding the max id is expensive for large tables, so it is cached and
+        # only looked up again if rows have been added to the table directly
+        table = self._db[entity_type]
+        (num_rows, max_id) = self._max_ids.get(entity_type, (None, 0))
+        if num_rows != len(table):
+            max_id = max(table.keys() or [0])
+        self._max_ids[entity_type] = (len(table) + 1, max_id + 1)
+        return max_id + 1
+
     def _validate_entity_exists(self, entity_type, entity_id):
         if entity_id not in self._db[entity_type]:
             raise ShotgunError("No entity of type %s exists with id %s" % (entity_type, entity_id))
@@ -0,0 +1,514 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+"""
+Local stand-in for a Shotgun site.
+
+ShotgunServer serves the in-memory database of a mockgun instance over HTTP,
+speaking the same JSON RPC protocol as a real Shotgun server. Unlike mockgun
+itself, this means code under test goes through the real Shotgun API: requests
+are encoded, sent over a socket, paged and decoded exactly as they would be
+against a live site, so round trips, paging and batching can be measured.
+
+A fixed latency can be added to every request to simulate a remote site.
+Requests are served concurrently, so latency overlaps for concurrent clients
+just like it would with a real server.
+
+The rpc methods supported are info, read (with paging and sorting), create,
+update, delete, revive, batch, schema_read, schema_entity_read and
+schema_field_read. File and thumbnail uploads are accepted but discarded.
+"""
+
+import sys
+import time
+import datetime
+import threading
+import BaseHTTPServer
+import SocketServer
+
+from tank.util.json_lib import json
+from tank_vendor.shotgun_api3 import ShotgunError
+
+# version reported by the info rpc call
+SERVER_VERSION = [5, 3, 0]
+
+# number of read queries to keep the matching ids for
+_MAX_CACHED_READS = 100
+
+# time in seconds the server thread waits for a request before checking
+# whether it should stop
+_POLL_INTERVAL = 0.1
+
+_DATE_FORMAT = "%Y-%m-%d"
+_DATE_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+def _encode_value(value):
+    """
+    json encoder hook which converts dates and times to the wire format.
+    Naive datetimes are assumed to be in UTC.
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.replace(tzinfo=None) - value.utcoffset()
+        return value.strftime(_DATE_TIME_FORMAT)
+    elif isinstance(value, datetime.date):
+        return value.strftime(_DATE_FORMAT)
+    raise TypeError("%r is not JSON serializable" % value)
+
+
+class _ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Passes rpc calls on to the ShotgunServer the http server belongs to.
+    """
+    # keep connections alive, the shotgun API reuses them
+    protocol_version = "HTTP/1.1"
+    # send each response in one go rather than a write per header, small
+    # writes are held back by the tcp stack and add a delay to every request
+    wbufsize = -1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("content-length", 0)))
+        sg_server = self.server.sg_server
+        if self.path == sg_server.api_path:
+            response = sg_server.handle_request(body)
+            content_type = "application/json; charset=utf-8"
+        elif self.path in sg_server.upload_paths:
+            response = sg_server.handle_upload(self.path)
+            content_type = "text/plain"
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, format, *args):
+        # don't clutter the test output
+        pass
+
+
+class ShotgunServer(object):
+    """
+    Serves a mockgun database over http using the Shotgun JSON RPC protocol.
+
+    Typical use::
+
+        server = ShotgunServer(mockgun, latency=0.05)
+        server.start()
+        sg = Shotgun(server.base_url, "script_name", "api_key")
+        ...
+        server.stop()
+    """
+
+    api_path = "/api3/json"
+    upload_paths = ("/upload/upload_file", "/upload/publish_thumbnail")
+
+    def __init__(self, mockgun, latency=0.0):
+        """
+        Constructor.
+
+        :param mockgun: Mockgun instance holding the data to serve.
+        :param latency: Time in seconds to delay each response by.
+        """
+        self.mockgun = mockgun
+        self.latency = latency
+        self.base_url = None
+
+        self._http_server = None
+        self._thread = None
+        self._stop_requested = False
+        # mockgun is not thread safe
+        self._lock = threading.Lock()
+        self._call_counts = {}
+        self._num_uploads = 0
+        # matching ids of recent read queries, so that fetching the pages of
+        # a query doesn't evaluate the filters again for each page. The data
+        # may be changed via mockgun directly, so the first page of a query
+        # is always evaluated from scratch.
+        self._read_cache = {}
+
+    ############################################################################
+    # server control
+
+    def start(self):
+        """
+        Starts serving requests in a background thread on a free local port.
+        """
+        self._http_server = _ThreadedHTTPServer(("127.0.0.1", 0), _RequestHandler)
+        self._http_server.sg_server = self
+        # don't block forever waiting for requests, so that the server thread
+        # can check whether it should stop
+        self._http_server.socket.settimeout(_POLL_INTERVAL)
+        self.base_url = "http://127.0.0.1:%d" % self._http_server.server_address[1]
+        self._stop_requested = False
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops serving requests.
+        """
+        if self._http_server:
+            self._stop_requested = True
+            self._thread.join()
+            self._http_server.server_close()
+            self._http_server = None
+            self._thread = None
+
+    def _serve(self):
+        """
+        Handles requests until the server is stopped. HTTPServer.serve_forever()
+        can't be used for this since it can only be stopped from python 2.6.
+        """
+        while not self._stop_requested:
+            self._http_server.handle_request()
+
+    def get_call_counts(self):
+        """
+        Returns the number of rpc calls served so far.
+
+        :returns: Dictionary keyed by rpc method name.
+        """
+        self._lock.acquire()
+        try:
+            return dict(self._call_counts)
+        finally:
+            self._lock.release()
+
+    def reset_call_counts(self):
+        """
+        Resets the number of rpc calls served to zero.
+        """
+        self._lock.acquire()
+        try:
+            self._call_counts = {}
+        finally:
+            self._lock.release()
+
+    ############################################################################
+    # rpc handling
+
+    def handle_request(self, body):
+        """
+        Runs an rpc call.
+
+        :param body: The json encoded rpc payload sent by the client.
+        :returns: The json encoded response.
+        """
+        payload = json.loads(body)
+        method = payload["method_name"]
+        # the first parameter holds the credentials of all calls except info
+        params = payload.get("params") or []
+        if method != "info":
+            params = params[1:]
+        if params:
+            params = params[0]
+        else:
+            params = None
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        self._lock.acquire()
+        try:
+            self._call_counts[method] = self._call_counts.get(method, 0) + 1
+            try:
+                handler = getattr(self, "_rpc_%s" % method, None)
+                if handler is None:
+                    raise ShotgunError("Unsupported rpc method %s" % method)
+                response = handler(params)
+            except Exception, e:
+                response = {"exception": True, "message": str(e), "error_code": 101}
+            # encode while holding the lock, the response references rows in the db
+            return json.dumps(response, default=_encode_value)
+        finally:
+            self._lock.release()
+
+    def handle_upload(self, path):
+        """
+        Accepts a file upload. Uploaded files are not stored, the same as
+        with mockgun.
+
+        :param path: The url path the file was posted to.
+        :returns: The response expected by the shotgun API.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        self._lock.acquire()
+        try:
+            self._call_counts["upload"] = self._call_counts.get("upload", 0) + 1
+            self._num_uploads += 1
+            return "1:%d\n" % self._num_uploads
+        finally:
+            self._lock.release()
+
+    def _rpc_info(self, params):
+        return {"version": SERVER_VERSION}
+
+    def _rpc_schema_read(self, params):
+        return {"results": self.mockgun.schema_read()}
+
+    def _rpc_schema_entity_read(self, params):
+        return {"results": self.mockgun.schema_entity_read()}
+
+    def _rpc_schema_field_read(self, params):
+        return {"results": self.mockgun.schema_field_read(params["type"], params.get("field_name"))}
+
+    def _rpc_read(self, params):
+        entity_type = params["type"]
+        self.mockgun._validate_entity_type(entity_type)
+        per_page = params["paging"]["entities_per_page"]
+        page = params["paging"]["current_page"]
+        ids = self._get_matching_ids(entity_type,
+                                     params["filters"],
+                                     params.get("return_only") == "retired",
+                                     params.get("sorts"),
+                                     page > 1)
+
+        fields = set(params.get("return_fields") or []) | set(["type", "id"])
+        table = self.mockgun._db[entity_type]
+        entities = []
+        for entity_id in ids[(page - 1) * per_page:page * per_page]:
+            row = table[entity_id]
+            entities.append(dict((f, self.mockgun._get_field_from_row(entity_type, row, f))
+                                 for f in fields))
+
+        results = {"entities": entities}
+        if params.get("return_paging_info"):
+            results["paging_info"] = {"entity_count": len(ids),
+                                      "page_count": (len(ids) + per_page - 1) // per_page,
+                                      "current_page": page,
+                                      "entities_per_page": per_page}
+        return {"results": results}
+
+    def _rpc_create(self, params):
+        return {"results": self._create(params)}
+
+    def _rpc_update(self, params):
+        return {"results": self._update(params)}
+
+    def _rpc_delete(self, params):
+        self._read_cache = {}
+        return {"results": self.mockgun.delete(params["type"], params["id"])}
+
+    def _rpc_revive(self, params):
+        self._read_cache = {}
+        return {"results": self.mockgun.revive(params["type"], params["id"])}
+
+    def _rpc_batch(self, params):
+        # batches are transactions on a real server. Entities created before a
+        # request fails are removed again, updates and deletes are not undone.
+        results = []
+        created = []
+        try:
+            for request in params:
+                request_type = request["request_type"]
+                if request_type == "create":
+                    result = self._create(request)
+                    created.append((result["type"], result["id"]))
+                elif request_type == "update":
+                    result = self._update(request)
+                elif request_type == "delete":
+                    result = self.mockgun.delete(request["type"], request["id"])
+                else:
+                    raise ShotgunError("Invalid request type %s in request %s" % (request_type, request))
+                results.append(result)
+        except Exception:
+            for (entity_type, entity_id) in created:
+                del self.mockgun._db[entity_type][entity_id]
+            raise
+        finally:
+            self._read_cache = {}
+        return {"results": results}
+
+    ############################################################################
+    # helpers
+
+    def _create(self, params):
+        """
+        Creates an entity. Like a real server, the fields set are returned
+        together with any fields requested.
+        """
+        self._read_cache = {}
+        entity_type = params["type"]
+        data = self._get_field_data(entity_type, params["fields"])
+        result = self.mockgun.create(entity_type, data)
+        row = self.mockgun._db[entity_type][result["id"]]
+        self._update_path_cache(entity_type, row)
+        for field in params.get("return_fields") or []:
+            result[field] = self.mockgun._get_field_from_row(entity_type, row, field)
+        return result
+
+    def _update(self, params):
+        """
+        Updates an entity and returns the fields set.
+        """
+        self._read_cache = {}
+        data = self._get_field_data(params["type"], params["fields"])
+        result = self.mockgun.update(params["type"], params["id"], data)[0]
+        self._update_path_cache(params["type"], self.mockgun._db[params["type"]][params["id"]])
+        return result
+
+    def _update_path_cache(self, entity_type, row):
+        """
+        Like a real server, sets the path_cache and path_cache_storage fields of
+        an entity from the local path in its path field, e.g. for a local storage
+        with root /mnt/projects, the path /mnt/projects/proj/foo.ma is stored as
+        path_cache proj/foo.ma.
+        """
+        path = row.get("path")
+        if "path_cache" not in self.mockgun._schema[entity_type] or not isinstance(path, dict):
+            return
+        local_path = path.get("local_path")
+        if not local_path:
+            return
+
+        path_field = {"win32": "windows_path", "darwin": "mac_path"}.get(sys.platform, "linux_path")
+        normalized_path = local_path.replace("\\", "/")
+        for storage in self.mockgun._db["LocalStorage"].itervalues():
+            root = (storage.get(path_field) or "").replace("\\", "/").rstrip("/")
+            if root and normalized_path.lower().startswith(root.lower() + "/"):
+                storage_link = {"type": "LocalStorage", "id": storage["id"], "name": storage.get("code")}
+                path["local_storage"] = storage_link
+                row["path_cache"] = normalized_path[len(root) + 1:]
+                row["path_cache_storage"] = storage_link
+                return
+
+    def _get_field_data(self, entity_type, fields):
+        """
+        Converts the list of field values sent by the client to a dictionary
+        of values in the form mockgun stores them.
+        """
+        return dict((str(f["field_name"]), self._decode_value(entity_type, f["field_name"], f["value"]))
+                    for f in fields)
+
+    def _decode_value(self, entity_type, field, value):
+        """
+        Converts dates and times sent by the client back to python objects.
+        """
+        if not isinstance(value, basestring):
+            return value
+        try:
+            field_type = self.mockgun._get_field_type(entity_type, field)
+        except KeyError:
+            return value
+        if field_type == "date_time":
+            return datetime.datetime.strptime(value, _DATE_TIME_FORMAT)
+        elif field_type == "date":
+            return datetime.datetime.strptime(value, _DATE_FORMAT).date()
+        return value
+
+    def _get_matching_ids(self, entity_type, filters, retired_only, sorts, use_cache):
+        """
+        Returns the ids of the entities matching a query, in the requested order.
+
+        :param use_cache: If True, the ids found by the last identical query are
+                          returned. This is used when the pages after the first
+                          one are fetched, so that all pages see the same rows.
+        """
+        key = json.dumps([entity_type, filters, retired_only, sorts], sort_keys=True)
+        ids = self._read_cache.get(key)
+        if use_cache and ids is not None:
+            return ids
+
+        compiled_filters = self._compile_filters(entity_type, filters)
+        rows = [row for row in self._get_candidate_rows(entity_type, compiled_filters)
+                if row["__retired"] == retired_only and self._row_matches(entity_type, row, compiled_filters)]
+
+        rows.sort(key=lambda row: row["id"])
+        for sort in reversed(sorts or []):
+            field = sort["field_name"]
+            rows.sort(key=lambda row: self.mockgun._get_field_from_row(entity_type, row, field),
+                      reverse=(sort.get("direction") == "desc"))
+
+        ids = [row["id"] for row in rows]
+        if len(self._read_cache) >= _MAX_CACHED_READS:
+            self._read_cache = {}
+        self._read_cache[key] = ids
+        return ids
+
+    def _get_candidate_rows(self, entity_type, filters):
+        """
+        Returns the rows which may match filters returned by _compile_filters().
+        Like the indices of a real database, conditions on the id are used to
+        look rows up directly rather than by going through the whole table.
+        """
+        table = self.mockgun._db[entity_type]
+        (logical_operator, conditions) = filters
+        if logical_operator == "and":
+            for condition in conditions:
+                if isinstance(condition, list) and condition[0] == "id":
+                    if condition[1] == "is":
+                        return [table[x] for x in [condition[2]] if x in table]
+                    elif condition[1] == "in":
+                        return [table[x] for x in condition[2] if x in table]
+        return table.itervalues()
+
+    def _compile_filters(self, entity_type, filters):
+        """
+        Converts filters in the wire format, e.g.
+        {"logical_operator": "and",
+         "conditions": [{"path": "id", "relation": "in", "values": [1, 2]}]}
+        to a (logical operator, conditions) tuple where each condition is
+        either a nested tuple or a mockgun style [field, relation, value] filter.
+        """
+        conditions = []
+        for condition in filters["conditions"]:
+            if "conditions" in condition:
+                conditions.append(self._compile_filters(entity_type, condition))
+                continue
+
+            field = condition["path"]
+            if field.startswith("$FROM$"):
+                # the special $FROM$Task.step.entity syntax is not supported
+                continue
+            relation = condition["relation"]
+            values = [self._decode_value(entity_type, field, x) for x in condition["values"]]
+            if relation in ("in", "not_in"):
+                # large in filters are common, so look values up in a set if possible
+                try:
+                    value = frozenset(values)
+                except TypeError:
+                    value = values
+            elif relation in ("between", "not_between") or len(values) != 1:
+                value = values
+            else:
+                value = values[0]
+            conditions.append([field, relation, value])
+
+        return (filters["logical_operator"], conditions)
+
+    def _row_matches(self, entity_type, row, filters):
+        """
+        Evaluates filters returned by _compile_filters() for a row.
+        """
+        (logical_operator, conditions) = filters
+
+        def get_matches():
+            for condition in conditions:
+                if isinstance(condition, tuple):
+                    yield self._row_matches(entity_type, row, condition)
+                else:
+                    yield self.mockgun._row_matches_filter(entity_type, row, condition)
+
+        # conditions are evaluated lazily, like mockgun does
+        if logical_operator == "or":
+            return any(get_matches())
+        return all(get_matches())
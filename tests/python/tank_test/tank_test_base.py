@@ -19,6 +19,7 @@ import pprint
 import tempfile
 
 from mockgun import Shotgun as MockGun_Shotgun 
+from sg_server import ShotgunServer
 
 from mock import Mock
 import unittest2 as unittest
@@ -26,7 +27,9 @@ import unittest2 as unittest
 import sgtk
 import tank
 from tank import path_cache
+from tank.platform import constants
 from tank_vendor import yaml
+from tank_vendor.shotgun_api3 import Shotgun
 
 TANK_TEMP = None
 TANK_SOURCE_PATH = None
@@ -108,6 +111,22 @@ class TankTestBase(unittest.TestCase):
 
         tank.pipelineconfig_factory._get_cache_location = _get_cache_location_mock
 
+        # keep caches which are local to the current user out of the home folder
+        self.local_cache_location = os.path.join(self.tank_temp, "local_cache")
+
+        def _get_local_site_cache_location_mock():
+            return self.local_cache_location
+
+        tank.pipelineconfig_utils.get_local_site_cache_location = _get_local_site_cache_location_mock
+
+        # hooks are cached per session - make sure that each test
+        # starts with a clean slate
+        tank.hook.clear_hooks_cache()
+        tank.platform.environment_includes.clear_environment_cache()
+        tank.util.yaml_cache.clear_yaml_cache()
+        tank.platform.validation.clear_validation_cache()
+        tank.pipelineconfig_factory.clear_pipeline_configuration_cache()
+
         # define entity for test project
         self.project = {"type": "Project",
                         "id": 1,
@@ -174,11 +193,12 @@ class TankTestBase(unittest.TestCase):
         def get_associated_sg_base_url_mocker():
             return "http://unit_test_mock_sg"
         
-        def create_sg_connection_mocker():
+        def create_sg_connection_mocker(user="default"):
             return self.mockgun
             
         tank.util.shotgun.get_associated_sg_base_url = get_associated_sg_base_url_mocker
         tank.util.shotgun.create_sg_connection = create_sg_connection_mocker
+        tank.util.shotgun.clear_connection_pools()
         
         # add project to mock sg and path cache db
         self.add_production_path(self.project_root, self.project)
@@ -196,11 +216,18 @@ class TankTestBase(unittest.TestCase):
         
         self.add_to_sg_mock_db(self.primary_storage)
         
+        # local shotgun server, see start_shotgun_server()
+        self.sg_server = None
+        
         
     def tearDown(self):
         """
         Cleans up after tests.
         """
+        if self.sg_server:
+            self.sg_server.stop()
+            self.sg_server = None
+            
         # get rid of path cache from local ~/.shotgun storage
         pc = path_cache.PathCache(self.tk)
         path_cache_file = pc._get_path_cache_location()
@@ -208,13 +235,23 @@ class TankTestBase(unittest.TestCase):
         if os.path.exists(path_cache_file):
             os.remove(path_cache_file)
             
-        # clear global shotgun accessor
-        tank.util.shotgun.g_sg_cached_connection = None
+        # get rid of the caches the core keeps for the configuration
+        for cache_name in ["environments", "validation", "app_commands"]:
+            cache_folder = self.tk.pipeline_configuration.get_cache_location(self.tk, cache_name)
+            if os.path.exists(cache_folder):
+                shutil.rmtree(cache_folder)
+            
+        # clear global shotgun accessors
+        tank.util.shotgun.clear_connection_pools()
             
         # get rid of init cache
         if os.path.exists(self.init_cache_location):
             os.remove(self.init_cache_location)
             
+        # get rid of local caches
+        if os.path.exists(self.local_cache_location):
+            shutil.rmtree(self.local_cache_location)
+            
         # move project scaffold out of the way
         self._move_project_data()
         # important to delete this to free memory
@@ -239,6 +276,9 @@ class TankTestBase(unittest.TestCase):
             config_target = os.path.join(self.project_config, config_dir)
             self._copy_folder(config_source, config_target)
         
+        # the config has changed so make sure any cached hooks are discarded
+        tank.hook.clear_hooks_cache()
+        
         # Edit the test environment with correct hard-coded paths to the test engine and app
         src = open(os.path.join(test_data_path, "env", "test.yml"))
         dst = open(os.path.join(self.project_config, "env", "test.yml"), "w")
@@ -314,6 +354,58 @@ class TankTestBase(unittest.TestCase):
         
         self.tk.create_filesystem_structure("Project", self.project["id"])
         
+    def start_shotgun_server(self, latency=0.0):
+        """
+        Starts a local http server which serves the mockgun database and
+        routes all shotgun connections made by core to it. Unlike mockgun,
+        the server is accessed via the real Shotgun API, so paging, batching
+        and round trips behave as they do with a real site.
+        
+        The server is stopped when the test finishes.
+        
+        :param latency: Time in seconds to delay each request by.
+        :returns: ShotgunServer instance
+        """
+        self.sg_server = ShotgunServer(self.mockgun, latency)
+        self.sg_server.start()
+        
+        # the path cache location depends on the shotgun site
+        pc = path_cache.PathCache(self.tk)
+        mockgun_path_cache_file = pc._get_path_cache_location()
+        pc.close()
+        
+        def get_associated_sg_base_url_mocker():
+            return self.sg_server.base_url
+        
+        # configure the API the same way core does, see __create_sg_connection()
+        server_caps = []
+        def create_sg_connection_mocker(user="default"):
+            sg = Shotgun(self.sg_server.base_url, "unit_test_script", "unit_test_key",
+                         connect=not server_caps)
+            if server_caps:
+                sg._server_caps = server_caps[0]
+            else:
+                server_caps.append(sg.server_caps)
+            sg.config.max_page_threads = constants.SG_FIND_MAX_PAGE_THREADS
+            sg.config.rpc_observer = tank.util.shotgun_statistics.record_call
+            return sg
+        
+        tank.util.shotgun.get_associated_sg_base_url = get_associated_sg_base_url_mocker
+        tank.util.shotgun.create_sg_connection = create_sg_connection_mocker
+        tank.util.shotgun.clear_connection_pools()
+        
+        # make sure the tk instance doesn't hold on to a mockgun handle
+        self.tk = tank.Tank(self.pipeline_configuration)
+        
+        # move the path cache over, tearDown only cleans up the current location
+        pc = path_cache.PathCache(self.tk)
+        path_cache_file = pc._get_path_cache_location()
+        pc.close()
+        os.remove(path_cache_file)
+        shutil.move(mockgun_path_cache_file, path_cache_file)
+        
+        return self.sg_server
+        
     def add_production_path(self, path, entity=None):
         """
         Creates project directories, populates path cache and mocked shotgun from a
@@ -368,7 +460,7 @@ class TankTestBase(unittest.TestCase):
         print "-----------------------------------------------------------------------------"
         print " Shotgun contents:"
         
-        print pprint.pformat(self.tk.shotgun._db)
+        print pprint.pformat(self.mockgun._db)
         print ""
         print ""
         print "Path Cache contents:"
@@ -427,7 +519,7 @@ class TankTestBase(unittest.TestCase):
                     # print "Swapping link dict %s -> %s" % (entity[x], link_dict) 
                     entity[x] = link_dict
             
-            self.tk.shotgun._db[et][eid] = entity            
+            self.mockgun._db[et][eid] = entity            
 
     def create_file(self, file_path, data=""):
         """
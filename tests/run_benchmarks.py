@@ -0,0 +1,120 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+"""
+Runs the end-to-end benchmarks in the benchmarks folder against a local
+shotgun server and reports the time and number of shotgun requests taken
+by each workflow at each scale.
+
+    python run_benchmarks.py --scales=1000,10000 --latency=0.05 [benchmark name]
+"""
+
+import sys
+import os
+from optparse import OptionParser
+
+# prepend tank_vendor location to PYTHONPATH to make sure we are running
+# the benchmarks against the vendor libs, not local libs on the machine
+python_path = os.path.abspath(os.path.join( os.path.dirname(__file__), "..", "python"))
+sys.path = [python_path] + sys.path
+
+python_path = os.path.abspath(os.path.join( os.path.dirname(__file__), "python"))
+sys.path = [python_path] + sys.path
+
+benchmarks_path = os.path.abspath(os.path.join( os.path.dirname(__file__), "benchmarks"))
+sys.path = [benchmarks_path] + sys.path
+
+from tank.util.json_lib import json
+
+import unittest2 as unittest
+
+import benchmark_base
+
+DEFAULT_SCALES = "1000,10000,100000"
+
+
+def iter_tests(suite):
+    """
+    Yields all test cases in a test suite.
+    """
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for sub_test in iter_tests(test):
+                yield sub_test
+        else:
+            yield test
+
+def run_benchmarks(scales, latency, test_name):
+    """
+    Runs the benchmarks once for each scale.
+
+    :returns: True if all benchmarks ran successfully
+    """
+    success = True
+    for scale in scales:
+        print "Running benchmarks with %d entities..." % scale
+        loader = unittest.loader.TestLoader()
+        if test_name:
+            suite = loader.loadTestsFromName(test_name)
+        else:
+            suite = loader.discover(benchmarks_path, pattern="bench_*.py")
+        for test in iter_tests(suite):
+            test.scale = scale
+            test.latency = latency
+        result = unittest.TextTestRunner(verbosity=2).run(suite)
+        success = success and result.wasSuccessful()
+    return success
+
+def print_results(results):
+    """
+    Prints a table of benchmark results.
+    """
+    print ""
+    print "%-30s %10s %10s %10s   %s" % ("Workflow", "Entities", "Time (s)", "Requests", "Requests by method")
+    print "-" * 100
+    for result in sorted(results, key=lambda x: (x["name"], x["scale"])):
+        calls = result["calls"]
+        print "%-30s %10d %10.3f %10d   %s" % (result["name"],
+                                              result["scale"],
+                                              result["time"],
+                                              sum(calls.values()),
+                                              ", ".join("%s: %d" % x for x in sorted(calls.items())))
+
+
+if __name__ == "__main__":
+    parser = OptionParser(usage="usage: %prog [options] [benchmark name]")
+    parser.add_option("--scales",
+                      default=DEFAULT_SCALES,
+                      help="comma separated numbers of entities to run the benchmarks with "
+                           "(default %s)" % DEFAULT_SCALES)
+    parser.add_option("--latency",
+                      type="float",
+                      default=0.0,
+                      help="time in seconds to delay each shotgun request by (default 0)")
+    parser.add_option("--output",
+                      help="path to a file to write the results to as json")
+    (options, args) = parser.parse_args()
+    test_name = None
+    if args:
+        test_name = args[0]
+
+    scales = [int(x) for x in options.scales.split(",")]
+    success = run_benchmarks(scales, options.latency, test_name)
+
+    print_results(benchmark_base.RESULTS)
+    if options.output:
+        fh = open(options.output, "w")
+        try:
+            json.dump(benchmark_base.RESULTS, fh, indent=2)
+        finally:
+            fh.close()
+
+    if not success:
+        sys.exit(1)
@@ -9,6 +9,9 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
+import time
+import sqlite3
 import unittest2 as unittest
 
 from mock import Mock, patch
@@ -433,3 +436,305 @@ class TestTankFromPath(TankTestBase):
 
 
 
+
+
+class TestTemplatesCache(TankTestBase):
+    """
+    Tests the in-process cache of templates.
+    """
+    def setUp(self):
+        super(TestTemplatesCache, self).setUp()
+        self.setup_fixtures()
+        self.child_path = os.path.join(self.project_root, "child_dir")
+        os.mkdir(self.child_path)
+        self.templates_file = os.path.join(self.project_config, "core", "templates.yml")
+
+    def _append_to_file(self, path, content):
+        fh = open(path, "a")
+        try:
+            fh.write(content)
+        finally:
+            fh.close()
+
+    def _count_template_reads(self, path):
+        """
+        Creates an API instance and returns it along with the number 
+        of times the templates were read from disk for it.
+        """
+        read_patcher = patch("tank.pipelineconfig_factory.read_templates", 
+                             wraps=tank.pipelineconfig_factory.read_templates)
+        read_mock = read_patcher.start()
+        try:
+            tk = tank.tank_from_path(path)
+        finally:
+            read_patcher.stop()
+        return (tk, read_mock.call_count)
+
+    def test_reuse(self):
+        """
+        Templates are only read once, but each API instance gets its own copies.
+        """
+        tank.pipelineconfig_factory.clear_pipeline_configuration_cache()
+        (tk_a, reads) = self._count_template_reads(self.child_path)
+        self.assertEqual(reads, 1)
+        (tk_b, reads) = self._count_template_reads(self.project_root)
+        self.assertEqual(reads, 0)
+        self.assertFalse(tk_a.pipeline_configuration is tk_b.pipeline_configuration)
+        self.assertEqual(sorted(tk_a.templates.keys()), sorted(tk_b.templates.keys()))
+        
+        # each instance has its own templates dictionary
+        template_name = tk_a.templates.keys()[0]
+        del(tk_a.templates[template_name])
+        self.assertTrue(template_name in tk_b.templates)
+
+    def test_templates_copied(self):
+        """
+        Templates and template keys are not shared between API instances.
+        """
+        tk_a = tank.tank_from_path(self.child_path)
+        tk_b = tank.tank_from_path(self.child_path)
+        for (name, template_a) in tk_a.templates.items():
+            template_b = tk_b.templates[name]
+            self.assertFalse(template_a is template_b)
+            self.assertEqual(template_a.definition, template_b.definition)
+            for (key_name, key_a) in template_a.keys.items():
+                self.assertFalse(key_a is template_b.keys[key_name])
+            if getattr(template_a, "validate_with", None):
+                # template strings validate with the templates of the same instance
+                self.assertTrue(template_a.validate_with is tk_a.templates[template_a.validate_with.name])
+        
+        template_a = tk_a.templates["maya_shot_work"]
+        template_a.name = "changed"
+        template_a.keys["Shot"].default = "changed"
+        self.assertEqual(tk_b.templates["maya_shot_work"].name, "maya_shot_work")
+        self.assertEqual(tk_b.templates["maya_shot_work"].keys["Shot"].default, None)
+        
+        # keys shared between templates are still shared within an instance
+        self.assertTrue(template_a.keys["Shot"] is tk_a.templates["shot_work_area"].keys["Shot"])
+
+    def _count_init_hook_runs(self):
+        """
+        Creates an API instance and returns the number of times the 
+        pipeline_configuration_init hook was run for it.
+        """
+        hook_patcher = patch("tank.hook.execute_hook", wraps=tank.hook.execute_hook)
+        hook_mock = hook_patcher.start()
+        try:
+            tank.tank_from_path(self.child_path)
+        finally:
+            hook_patcher.stop()
+        return len([x for x in hook_mock.call_args_list 
+                    if os.path.basename(x[0][0]) == "pipeline_configuration_init.py"])
+
+    def test_init_hook(self):
+        """
+        The pipeline_configuration_init hook is run for every configuration object.
+        """
+        tank.tank_from_path(self.child_path)
+        self.assertEqual(self._count_init_hook_runs(), 1)
+        self.assertEqual(self._count_init_hook_runs(), 1)
+
+    def test_signature_once(self):
+        """
+        The templates cache signature is computed once per API instance.
+        """
+        tank.tank_from_path(self.child_path)
+        signature_patcher = patch.object(tank.pipelineconfig_factory._templates_cache, "get_signature",
+                                         wraps=tank.pipelineconfig_factory._templates_cache.get_signature)
+        signature_mock = signature_patcher.start()
+        try:
+            tank.tank_from_path(self.child_path)
+        finally:
+            signature_patcher.stop()
+        self.assertEqual(signature_mock.call_count, 1)
+
+    def test_compatibility_check(self):
+        """
+        The core version check is run for every configuration object.
+        """
+        tank.tank_from_path(self.child_path)
+        associated_patcher = patch("tank.pipelineconfig.PipelineConfiguration.get_associated_core_version",
+                                   return_value="v1.0.0")
+        associated_patcher.start()
+        current_patcher = patch("tank.pipelineconfig_utils.get_currently_running_api_version",
+                                return_value="v0.1.0")
+        current_patcher.start()
+        try:
+            self.assertRaises(TankError, tank.tank_from_path, self.child_path)
+        finally:
+            current_patcher.stop()
+            associated_patcher.stop()
+
+    def test_explicit_clear(self):
+        """
+        Templates are read again once the cache has been cleared.
+        """
+        tank.tank_from_path(self.child_path)
+        tank.pipelineconfig_factory.clear_pipeline_configuration_cache()
+        (_, reads) = self._count_template_reads(self.child_path)
+        self.assertEqual(reads, 1)
+
+    def test_modified_config(self):
+        """
+        Templates are read again when the core configuration changes on disk.
+        """
+        tank.tank_from_path(self.child_path)
+        self._append_to_file(self.templates_file, "\n")
+        (_, reads) = self._count_template_reads(self.child_path)
+        self.assertEqual(reads, 1)
+
+    def test_modified_include(self):
+        """
+        Templates are read again when a file included by the templates file changes.
+        """
+        include_file = os.path.join(self.project_config, "core", "included_templates.yml")
+        self.create_file(include_file, "strings: {included_a: 'a'}\n")
+        self._append_to_file(self.templates_file, "\ninclude: ./included_templates.yml\n")
+
+        tk_a = tank.tank_from_path(self.child_path)
+        self.assertTrue("included_a" in tk_a.templates)
+        self.create_file(include_file, "strings: {included_b: 'b'}\n")
+        tk_b = tank.tank_from_path(self.child_path)
+        self.assertTrue("included_b" in tk_b.templates)
+        self.assertFalse("included_a" in tk_b.templates)
+
+    def test_bounded(self):
+        """
+        The least recently used templates are evicted once the cache is full.
+        """
+        max_entries = tank.pipelineconfig_factory._templates_cache.MAX_ENTRIES
+        tank.pipelineconfig_factory._templates_cache.MAX_ENTRIES = 0
+        tank.pipelineconfig_factory.clear_pipeline_configuration_cache()
+        try:
+            tank.tank_from_path(self.child_path)
+            (_, reads) = self._count_template_reads(self.child_path)
+            self.assertEqual(reads, 1)
+        finally:
+            tank.pipelineconfig_factory._templates_cache.MAX_ENTRIES = max_entries
+
+
+class TestLookupCache(TankTestBase):
+    """
+    Tests the on-disk cache used to speed up the lookup of pipeline configurations.
+    """
+    def setUp(self):
+        super(TestLookupCache, self).setUp()
+        self.cache_file = os.path.join(self.tank_temp, "lookup_cache_test.db")
+        if os.path.exists(self.cache_file):
+            os.remove(self.cache_file)
+        patcher = patch("tank.pipelineconfig_factory._get_cache_location", return_value=self.cache_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_read_write(self):
+        """
+        Items are written and read back per key.
+        """
+        factory = tank.pipelineconfig_factory
+        self.assertEqual(factory._get_from_lookup_cache("foo"), None)
+        factory._add_to_lookup_cache("foo", {"paths": [1, 2]})
+        factory._add_to_lookup_cache("bar", 123)
+        factory._add_to_lookup_cache("bar", 456)
+        self.assertEqual(factory._get_from_lookup_cache("foo"), {"paths": [1, 2]})
+        self.assertEqual(factory._get_from_lookup_cache("bar"), 456)
+
+    def test_read_only(self):
+        """
+        Reading from the cache doesn't create or write to the cache file.
+        """
+        factory = tank.pipelineconfig_factory
+        self.assertEqual(factory._get_from_lookup_cache("foo"), None)
+        self.assertFalse(os.path.exists(self.cache_file))
+        
+        factory._add_to_lookup_cache("foo", 123)
+        mtime = int(os.path.getmtime(self.cache_file)) - 10
+        os.utime(self.cache_file, (mtime, mtime))
+        self.assertEqual(factory._get_from_lookup_cache("foo"), 123)
+        self.assertEqual(int(os.path.getmtime(self.cache_file)), mtime)
+        
+        # the cache uses the default rollback journal
+        connection = sqlite3.connect(self.cache_file)
+        try:
+            journal_mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            connection.close()
+        self.assertEqual(journal_mode.lower(), "delete")
+
+    def test_expiry(self):
+        """
+        Items are ignored and removed once they have expired.
+        """
+        factory = tank.pipelineconfig_factory
+        factory._add_to_lookup_cache("foo", 123)
+        ttl = tank.platform.constants.SITE_INIT_CACHE_TTL
+        time_patcher = patch("time.time", return_value=time.time() + ttl + 1)
+        time_patcher.start()
+        try:
+            self.assertEqual(factory._get_from_lookup_cache("foo"), None)
+            factory._add_to_lookup_cache("bar", 456)
+        finally:
+            time_patcher.stop()
+        
+        connection = sqlite3.connect(self.cache_file)
+        try:
+            keys = [x[0] for x in connection.execute("SELECT key FROM lookup_cache")]
+        finally:
+            connection.close()
+        self.assertEqual(keys, ["bar"])
+
+    def test_corrupt_cache(self):
+        """
+        A corrupt cache file is silently ignored.
+        """
+        fh = open(self.cache_file, "wb")
+        try:
+            fh.write("not a database" * 100)
+        finally:
+            fh.close()
+        tank.pipelineconfig_factory._add_to_lookup_cache("foo", 123)
+        self.assertEqual(tank.pipelineconfig_factory._get_from_lookup_cache("foo"), None)
+
+
+class TestPathIndex(TankTestBase):
+    """
+    Tests the lookup of pipeline configurations for a path.
+    """
+    def setUp(self):
+        super(TestPathIndex, self).setUp()
+        path_field = {"linux2": "linux_path", "win32": "windows_path", "darwin": "mac_path"}[sys.platform]
+        self.storage_a = os.path.join(self.tank_temp, "Storage_A")
+        self.storage_b = os.path.join(self.tank_temp, "storage_b")
+        storages = [{"id": 1, "code": "a", path_field: self.storage_a},
+                    {"id": 2, "code": "b", path_field: self.storage_b},
+                    {"id": 3, "code": "c", path_field: None}]
+        self.pc_x = {"id": 1, "code": "Primary", "project.Project.tank_name": "proj_x"}
+        self.pc_x2 = {"id": 2, "code": "Primary", "project.Project.tank_name": "proj_x2"}
+        self.data = {"local_storages": storages, "pipeline_configurations": [self.pc_x, self.pc_x2]}
+        
+    def _lookup(self, path):
+        return tank.pipelineconfig_factory._get_pipeline_configs_for_path(path, self.data)
+    
+    def test_lookup(self):
+        """
+        Paths inside a project are matched, regardless of case and storage.
+        """
+        self.assertEqual(self._lookup(os.path.join(self.storage_a, "proj_x")), [self.pc_x])
+        self.assertEqual(self._lookup(os.path.join(self.storage_a, "proj_x", "foo", "bar.ma")), [self.pc_x])
+        self.assertEqual(self._lookup(os.path.join(self.storage_a.lower(), "PROJ_X", "foo")), [self.pc_x])
+        self.assertEqual(self._lookup(os.path.join(self.storage_b, "proj_x2", "foo")), [self.pc_x2])
+        
+    def test_no_match(self):
+        """
+        Paths outside of projects are not matched.
+        """
+        self.assertEqual(self._lookup(self.storage_a), [])
+        self.assertEqual(self._lookup(os.path.join(self.storage_a, "proj_x3", "foo")), [])
+        self.assertEqual(self._lookup(os.path.join(self.tank_temp, "proj_x")), [])
+
+    def test_cached_index(self):
+        """
+        The index stored with the cached data is used when present.
+        """
+        self.data["path_index"] = tank.pipelineconfig_factory._build_path_index(self.data)
+        self.data["pipeline_configurations"] = []
+        self.assertEqual(self._lookup(os.path.join(self.storage_a, "proj_x", "foo")), [self.pc_x])
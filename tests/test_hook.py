@@ -0,0 +1,227 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import logging
+
+from mock import patch
+
+import tank
+from tank_test.tank_test_base import *
+
+CUSTOM_HOOK = """
+from tank import Hook
+
+class CustomTankInit(Hook):
+
+    def execute(self, **kwargs):
+        return "custom"
+"""
+
+INSTANCE_HOOK = """
+from tank import Hook
+
+class InstanceHook(Hook):
+
+    def execute(self, **kwargs):
+        return self
+"""
+
+class TestCoreHookPaths(TankTestBase):
+    """
+    Tests the caching of resolved core hook paths.
+    """
+    def setUp(self):
+        super(TestCoreHookPaths, self).setUp()
+        self.setup_fixtures()
+        self.hook_path = os.path.join(self.pipeline_configuration.get_core_hooks_location(),
+                                      "tank_init.py")
+
+    def tearDown(self):
+        tank.hook._hook_paths_cache.check_interval = None
+        if os.path.exists(self.hook_path):
+            os.remove(self.hook_path)
+        super(TestCoreHookPaths, self).tearDown()
+
+    def test_no_file_system_access(self):
+        """
+        Once a hook has been executed, no more disk checks should happen.
+        """
+        def execute_hooks():
+            self.tk.execute_core_hook("tank_init")
+            self.tk.execute_core_hook_method("cache_location", "path_cache",
+                                             project_id=1,
+                                             pipeline_configuration_id=123)
+        execute_hooks()
+        exists_patcher = patch("os.path.exists", wraps=os.path.exists)
+        exists_mock = exists_patcher.start()
+        try:
+            execute_hooks()
+            # the only checks made should be the ones inside the cache_location hook
+            checked_paths = [args[0] for (args, _) in exists_mock.call_args_list]
+            self.assertEqual([p for p in checked_paths if p.endswith(".py")], [])
+        finally:
+            exists_patcher.stop()
+
+    def test_explicit_clear(self):
+        """
+        Custom hooks added to the config are picked up once the cache is cleared.
+        """
+        self.assertEqual(self.tk.execute_core_hook("tank_init"), None)
+        self.create_file(self.hook_path, CUSTOM_HOOK)
+        self.assertEqual(self.tk.execute_core_hook("tank_init"), None)
+        tank.hook.clear_hooks_cache()
+        self.assertEqual(self.tk.execute_core_hook("tank_init"), "custom")
+
+    def test_check_interval(self):
+        """
+        Custom hooks added to the config are picked up when the check interval has passed.
+        """
+        tank.hook._hook_paths_cache.check_interval = 0
+        self.assertEqual(self.tk.execute_core_hook("tank_init"), None)
+        self.create_file(self.hook_path, CUSTOM_HOOK)
+        # make sure the folder modification time changes
+        os.utime(os.path.dirname(self.hook_path), (0, 0))
+        self.assertEqual(self.tk.execute_core_hook("tank_init"), "custom")
+
+
+class TestPreloadCoreHooks(TankTestBase):
+    """
+    Tests that core hooks are loaded as part of tank initialization.
+    """
+    def test_preload(self):
+        tank.hook.clear_hooks_cache()
+        self.assertEqual(len(tank.hook._hooks_cache), 0)
+        tank.Tank(self.pipeline_configuration)
+        core_hooks = os.path.join(self.tank_source_path, "hooks")
+        hook_path = os.path.join(core_hooks, "process_folder_name.py")
+        self.assertNotEqual(tank.hook._hooks_cache.find(hook_path, tank.Hook), None)
+
+
+class TestReusableHooks(TankTestBase):
+    """
+    Tests hook callables and the reuse of hook instances.
+    """
+    def setUp(self):
+        super(TestReusableHooks, self).setUp()
+        self.setup_fixtures()
+
+    def test_reusable_instance(self):
+        """
+        Hooks marked as reusable are only instantiated once per parent.
+        """
+        hook_method_a = self.tk.get_core_hook_callable("process_folder_name")
+        hook_method_b = self.tk.get_core_hook_callable("process_folder_name")
+        self.assertTrue(hook_method_a.im_self is hook_method_b.im_self)
+        self.assertTrue(hook_method_a.im_self.parent is self.tk)
+        self.assertEqual(hook_method_a(entity_type="Shot",
+                                       entity_id=1,
+                                       field_name="code",
+                                       value="foo bar"),
+                         "foo-bar")
+
+        # a different parent gets a different instance
+        other_tk = tank.Tank(self.pipeline_configuration)
+        hook_method_c = other_tk.get_core_hook_callable("process_folder_name")
+        self.assertFalse(hook_method_a.im_self is hook_method_c.im_self)
+
+    def test_non_reusable_instance(self):
+        """
+        Hooks not marked as reusable get a new instance for every call.
+        """
+        hook_path = os.path.join(self.tank_temp, "instance_hook.py")
+        self.create_file(hook_path, INSTANCE_HOOK)
+        hook_method = tank.hook.get_hook_callable([hook_path], self.tk)
+        instance_a = hook_method()
+        instance_b = hook_method()
+        self.assertFalse(instance_a is instance_b)
+        self.assertTrue(instance_a.parent is self.tk)
+        self.assertEqual(hook_method.__name__, "execute")
+
+    def test_missing_method(self):
+        """
+        Asking for a method that the hook class doesn't have raises.
+        """
+        self.assertRaises(tank.TankError,
+                          self.tk.get_core_hook_callable, "tank_init", "missing_method")
+
+    def test_hook_method(self):
+        """
+        Tests retrieving a specific method from a new style hook.
+        """
+        hook_method = self.tk.get_core_hook_callable("cache_location", "path_cache")
+        self.assertEqual(hook_method.__name__, "path_cache")
+
+    def test_clear(self):
+        """
+        Reusable instances are discarded when the hooks cache is cleared.
+        """
+        hook_method_a = self.tk.get_core_hook_callable("process_folder_name")
+        tank.hook.clear_hooks_cache()
+        hook_method_b = self.tk.get_core_hook_callable("process_folder_name")
+        self.assertFalse(hook_method_a.im_self is hook_method_b.im_self)
+
+
+class TestHookStatistics(TankTestBase):
+    """
+    Tests the collection of hook execution statistics.
+    """
+    def setUp(self):
+        super(TestHookStatistics, self).setUp()
+        self.setup_fixtures()
+        tank.hook.clear_hook_statistics()
+
+    def tearDown(self):
+        tank.hook.enable_hook_profiling(False)
+        tank.hook.clear_hook_statistics()
+        super(TestHookStatistics, self).tearDown()
+
+    def test_disabled(self):
+        """
+        No statistics are collected unless profiling is turned on.
+        """
+        self.tk.execute_core_hook("tank_init")
+        self.assertEqual(self.tk.get_hook_statistics(), [])
+
+    def test_statistics(self):
+        """
+        Calls and exceptions are recorded per hook path and method.
+        """
+        tank.hook.enable_hook_profiling()
+        self.tk.execute_core_hook("tank_init")
+        self.tk.execute_core_hook("tank_init")
+        self.assertRaises(TypeError, self.tk.execute_core_hook, "process_folder_name")
+
+        stats = dict(((x["hook_path"], x["method"]), x) for x in self.tk.get_hook_statistics())
+        core_hooks = os.path.join(self.tank_source_path, "hooks")
+
+        tank_init_stats = stats[(os.path.join(core_hooks, "tank_init.py"), "execute")]
+        self.assertEqual(tank_init_stats["calls"], 2)
+        self.assertEqual(tank_init_stats["exceptions"], 0)
+        self.assertTrue(tank_init_stats["total_time"] >= tank_init_stats["max_time"])
+
+        folder_name_stats = stats[(os.path.join(core_hooks, "process_folder_name.py"), "execute")]
+        self.assertEqual(folder_name_stats["calls"], 1)
+        self.assertEqual(folder_name_stats["exceptions"], 1)
+
+    def test_command(self):
+        """
+        Statistics can be retrieved and reset via the API command, which isn't 
+        available from the command line.
+        """
+        tank.hook.enable_hook_profiling()
+        self.tk.execute_core_hook("tank_init")
+        from tank.deploy import tank_command
+        (actions, _) = tank_command.get_actions(logging.getLogger("test"), self.tk, None)
+        self.assertFalse("hook_statistics" in [x.name for x in actions])
+        cmd = self.tk.get_command("hook_statistics")
+        stats = cmd.execute({"reset": True})
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(self.tk.get_hook_statistics(), [])
@@ -0,0 +1,66 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import sys
+import subprocess
+
+import tank
+from tank_test.tank_test_base import *
+
+# script which imports tank in a clean interpreter and reports
+# the modules that were loaded
+IMPORT_SCRIPT = """
+import sys
+sys.path.insert(0, %r)
+import tank
+print " ".join([name for (name, module) in sys.modules.items() if module])
+"""
+
+
+class TestImportTime(TankTestBase):
+    """
+    Tests that expensive modules are only imported when they are needed.
+    """
+    def _import_tank(self):
+        """
+        Imports tank in a separate process.
+        
+        :returns: list of loaded modules
+        """
+        python_path = os.path.dirname(os.path.dirname(tank.__file__))
+        proc = subprocess.Popen([sys.executable, "-c", IMPORT_SCRIPT % python_path],
+                                stdout=subprocess.PIPE)
+        (output, _) = proc.communicate()
+        self.assertEqual(proc.returncode, 0)
+        return output.splitlines()[-1].split()
+
+    def test_deferred_modules(self):
+        """
+        Tests that the shotgun API, the folder creation code and the tank commands
+        are not imported together with tank.
+        """
+        modules = self._import_tank()
+        for module in ["tank_vendor.shotgun_api3", 
+                       "tank.folder", 
+                       "tank.deploy.tank_command", 
+                       "tank.deploy.tank_commands", 
+                       "tank.deploy.app_store_descriptor",
+                       "tank.platform.qt.tankqdialog"]:
+            self.assertFalse(module in modules, "%s was imported together with tank" % module)
+
+    def test_commands(self):
+        """
+        Tests that the tank commands are available once they are used.
+        """
+        from tank.deploy import tank_command
+        self.assertEqual(tank.list_commands(), tank_command.list_commands())
+        self.assertTrue("hook_statistics" in tank.list_commands(self.tk))
+        self.assertEqual(tank.get_command("hook_statistics", self.tk).name, "hook_statistics")
@@ -9,9 +9,15 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import sys
+import time
 import sqlite3
+import threading
+import traceback
 import shutil
 
+from mock import patch
+
 from tank_test.tank_test_base import *
 
 from tank import path_cache
@@ -430,6 +436,219 @@ class TestShotgunSync(TankTestBase):
         
         
         
+class IncrementalSyncTestBase(TankTestBase):
+    """
+    Sets up a path cache which is in sync with shotgun and a small event window size.
+    """
+    def setUp(self):
+        super(IncrementalSyncTestBase, self).setUp()
+        self.setup_fixtures()
+
+        self.seq = {"type": "Sequence", "id": 2, "code": "seq_code", "project": self.project}
+        self.shots = [{"type": "Shot",
+                       "id": 100 + i,
+                       "code": "shot_%d" % i,
+                       "sg_sequence": self.seq,
+                       "project": self.project} for i in range(5)]
+        self.add_to_sg_mock_db([self.seq] + self.shots)
+
+        # an event to align the sync tracking marker with
+        self._add_folder_event("Toolkit_Folders_Create", [])
+        sync_path_cache(self.tk, force_full_sync=True)
+
+        patcher = patch("tank.platform.constants.PATH_CACHE_SYNC_EVENT_WINDOW_SIZE", 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _add_folder_event(self, event_type, folder_ids):
+        return self.mockgun.create("EventLogEntry", {"event_type": event_type,
+                                                     "project": self.project,
+                                                     "meta": {"sg_folder_ids": folder_ids}})
+
+    def _add_shot_folders(self):
+        """
+        Registers a folder for each shot in shotgun, with one creation event per folder.
+        """
+        for shot in self.shots:
+            data = {"project": self.project,
+                    "code": shot["code"],
+                    "linked_entity_type": "Shot",
+                    "linked_entity_id": shot["id"],
+                    "is_primary": True,
+                    "configuration_metadata": "",
+                    "path": {"local_path": os.path.join(self.project_root, shot["code"]),
+                             "local_storage": self.primary_storage}}
+            folder_id = self.mockgun.create(path_cache.SHOTGUN_ENTITY, data)["id"]
+            event = self._add_folder_event("Toolkit_Folders_Create", [folder_id])
+        return event
+
+    def _get_sync_state(self):
+        """
+        Returns the paths and the sync tracking marker of the path cache.
+        """
+        pc = path_cache.PathCache(self.tk)
+        try:
+            paths = [x[0] for x in pc._connection.execute("SELECT path FROM path_cache")]
+            marker = list(pc._connection.execute("SELECT max(last_id) FROM event_log_sync"))[0][0]
+        finally:
+            pc.close()
+        return (paths, marker)
+
+
+class TestShotgunIncrementalSync(IncrementalSyncTestBase):
+    """
+    Tests incremental path cache syncs which span several windows of event log entries.
+    """
+    def test_windows(self):
+        """
+        All windows of events are applied without falling back on a full sync.
+        """
+        last_event = self._add_shot_folders()
+        full_sync_patcher = patch.object(path_cache.PathCache, "_do_full_sync")
+        find_patcher = patch.object(self.mockgun, "find", wraps=self.mockgun.find)
+        full_sync_mock = full_sync_patcher.start()
+        find_mock = find_patcher.start()
+        try:
+            sync_path_cache(self.tk)
+            event_finds = [x for x in find_mock.call_args_list if x[0][0] == "EventLogEntry"]
+        finally:
+            find_patcher.stop()
+            full_sync_patcher.stop()
+        self.assertFalse(full_sync_mock.called)
+        # the marker and one event, then two windows of two events and an empty window
+        self.assertEqual(len(event_finds), 4)
+
+        (paths, marker) = self._get_sync_state()
+        self.assertEqual(len(paths), len(self.shots) + 1)
+        self.assertEqual(marker, last_event["id"])
+
+        # nothing left to sync
+        full_sync_patcher = patch.object(path_cache.PathCache, "_do_full_sync")
+        full_sync_mock = full_sync_patcher.start()
+        try:
+            sync_path_cache(self.tk)
+        finally:
+            full_sync_patcher.stop()
+        self.assertFalse(full_sync_mock.called)
+        self.assertEqual(self._get_sync_state(), (paths, marker))
+
+    def test_deletion(self):
+        """
+        A deletion event in a later window triggers a full sync.
+        """
+        self._add_shot_folders()
+        self._add_folder_event("Toolkit_Folders_Delete", [])
+        full_sync_patcher = patch.object(path_cache.PathCache, "_do_full_sync", return_value=[])
+        full_sync_mock = full_sync_patcher.start()
+        try:
+            sync_path_cache(self.tk)
+        finally:
+            full_sync_patcher.stop()
+        self.assertEqual(full_sync_mock.call_count, 1)
+
+    def test_query_error(self):
+        """
+        Errors fetching later windows are raised and the windows applied so far are kept.
+        """
+        self._add_shot_folders()
+        real_find = self.mockgun.find
+        def find_mock(entity_type, filters, *args, **kwargs):
+            if entity_type == "EventLogEntry" and find_mock.event_finds == 2:
+                raise ValueError("failed")
+            if entity_type == "EventLogEntry":
+                find_mock.event_finds += 1
+            return real_find(entity_type, filters, *args, **kwargs)
+        find_mock.event_finds = 0
+
+        find_patcher = patch.object(self.mockgun, "find", side_effect=find_mock)
+        find_patcher.start()
+        try:
+            self.assertRaises(ValueError, sync_path_cache, self.tk)
+        finally:
+            find_patcher.stop()
+        # the project and the folders of the first two windows
+        self.assertEqual(len(self._get_sync_state()[0]), 4)
+
+
+class TestShotgunIncrementalSyncServer(IncrementalSyncTestBase):
+    """
+    Tests incremental path cache syncs against the local shotgun server, where 
+    later windows of events are fetched in a background thread.
+    """
+    def setUp(self):
+        super(TestShotgunIncrementalSyncServer, self).setUp()
+        self.start_shotgun_server()
+
+    def test_windows(self):
+        """
+        Later windows are fetched on a separate connection to the same site.
+        """
+        last_event = self._add_shot_folders()
+        tank.util.shotgun.clear_connection_pools()
+        connection_patcher = patch("tank.util.shotgun.create_sg_connection", side_effect=tank.TankError("no pool"))
+        connection_patcher.start()
+        try:
+            sync_path_cache(self.tk)
+        finally:
+            connection_patcher.stop()
+        (paths, marker) = self._get_sync_state()
+        self.assertEqual(len(paths), len(self.shots) + 1)
+        self.assertEqual(marker, last_event["id"])
+
+    def test_query_error(self):
+        """
+        Errors fetching later windows are raised with their original traceback.
+        """
+        self._add_shot_folders()
+        real_find_folder_events = path_cache.PathCache._find_folder_events
+        def failing_find_folder_events(pc, *args, **kwargs):
+            if threading.currentThread() != main_thread:
+                raise ValueError("failed")
+            return real_find_folder_events(pc, *args, **kwargs)
+        main_thread = threading.currentThread()
+        
+        events_patcher = patch.object(path_cache.PathCache, "_find_folder_events", 
+                                      failing_find_folder_events)
+        events_patcher.start()
+        try:
+            try:
+                sync_path_cache(self.tk)
+            except ValueError:
+                stack = traceback.extract_tb(sys.exc_info()[2])
+            else:
+                self.fail("No error raised")
+        finally:
+            events_patcher.stop()
+        self.assertEqual(stack[-1][2], "failing_find_folder_events")
+
+    def test_replay_error(self):
+        """
+        The fetch of the next window is completed before an error applying a window is raised.
+        """
+        self._add_shot_folders()
+        fetched = []
+        real_find_folder_events = path_cache.PathCache._find_folder_events
+        def find_folder_events(pc, *args, **kwargs):
+            time.sleep(0.2)
+            result = real_find_folder_events(pc, *args, **kwargs)
+            fetched.append(threading.currentThread())
+            return result
+        
+        events_patcher = patch.object(path_cache.PathCache, "_find_folder_events", find_folder_events)
+        replay_patcher = patch.object(path_cache.PathCache, "_replay_folder_entities", 
+                                      side_effect=ValueError("failed"))
+        events_patcher.start()
+        replay_patcher.start()
+        try:
+            self.assertRaises(ValueError, sync_path_cache, self.tk)
+        finally:
+            replay_patcher.stop()
+            events_patcher.stop()
+        # the initial window and the window fetched in the background
+        self.assertEqual(len(fetched), 2)
+        self.assertNotEqual(fetched[1], threading.currentThread())
+
+
 class TestShotgunSync013AutoPush(TankTestBase):
     
     def setUp(self, project_tank_name = "project_code"):
@@ -0,0 +1,75 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+from mock import patch
+
+import tank
+from tank import profiling
+from tank_test.tank_test_base import *
+
+
+class TestStartupProfiling(TankTestBase):
+    """
+    Tests the profiling of startup phases.
+    """
+    def setUp(self):
+        super(TestStartupProfiling, self).setUp()
+        self.setup_fixtures()
+        profiling.clear_startup_trace()
+
+    def tearDown(self):
+        profiling.enable_startup_profiling(False)
+        profiling.clear_startup_trace()
+        super(TestStartupProfiling, self).tearDown()
+
+    def test_disabled(self):
+        """
+        Nothing is recorded unless profiling is turned on.
+        """
+        tank.Tank(self.pipeline_configuration)
+        self.assertEqual(self.tk.get_startup_trace(), [])
+
+    def test_nesting(self):
+        """
+        Phases are nested and are reported in folded stack format.
+        """
+        profiling.enable_startup_profiling()
+        outer = profiling.start_phase("outer")
+        profiling.stop_phase(profiling.start_phase("first;inner"))
+        profiling.stop_phase(profiling.start_phase("second inner"))
+        profiling.stop_phase(outer)
+
+        trace = profiling.get_startup_trace()
+        self.assertEqual(len(trace), 1)
+        self.assertEqual(trace[0]["name"], "outer")
+        self.assertEqual([x["name"] for x in trace[0]["children"]], ["first;inner", "second inner"])
+        self.assertTrue(trace[0]["duration"] >= sum([x["duration"] for x in trace[0]["children"]]))
+
+        stacks = [x.rsplit(" ", 1)[0] for x in profiling.get_folded_startup_trace().split("\n")]
+        self.assertEqual(stacks, ["outer", "outer;first:inner", "outer;second inner"])
+
+    def test_bounded(self):
+        """
+        Only the most recent top level phases are kept.
+        """
+        profiling.enable_startup_profiling()
+        max_frames_patcher = patch("tank.platform.constants.STARTUP_PROFILING_MAX_FRAMES", 3)
+        max_frames_patcher.start()
+        try:
+            for name in ["a", "b", "c"]:
+                profiling.stop_phase(profiling.start_phase(name))
+            self.assertEqual([x.name for x in profiling._startup_profiler.get_unreported()], ["a", "b", "c"])
+            for name in ["d", "e"]:
+                profiling.stop_phase(profiling.start_phase(name))
+            self.assertEqual([x["name"] for x in profiling.get_startup_trace()], ["c", "d", "e"])
+            # only the phases recorded since the last report are reported
+            self.assertEqual([x.name for x in profiling._startup_profiler.get_unreported()], ["d", "e"])
+        finally:
+            max_frames_patcher.stop()
@@ -0,0 +1,129 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+#
+# CONFIDENTIAL AND PROPRIETARY
+#
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+import time
+import datetime
+
+import tank
+from tank import folder
+from tank_test.tank_test_base import *
+from tank_vendor import shotgun_api3
+
+
+class TestShotgunServer(TankTestBase):
+    """
+    Tests the local shotgun server used to run core against the real Shotgun API.
+    """
+    def setUp(self):
+        super(TestShotgunServer, self).setUp()
+        self.setup_fixtures()
+        self.start_shotgun_server()
+
+        self.seq = {"type": "Sequence", "id": 2, "code": "seq_code", "project": self.project}
+        self.shots = [{"type": "Shot",
+                       "id": 100 + i,
+                       "code": "shot_%02d" % i,
+                       "sg_sequence": self.seq,
+                       "project": self.project} for i in range(25)]
+        self.add_to_sg_mock_db([self.seq] + self.shots)
+
+    def test_connection(self):
+        """
+        Core connects to the server through the real shotgun API.
+        """
+        self.assertTrue(isinstance(self.tk.shotgun, shotgun_api3.Shotgun))
+        self.assertEqual(self.tk.shotgun.base_url, self.sg_server.base_url)
+
+    def test_read_paging(self):
+        """
+        Large reads are paged and sorted like on a real server.
+        """
+        sg = self.tk.shotgun
+        sg.config.records_per_page = 10
+        self.sg_server.reset_call_counts()
+        shots = sg.find("Shot", [["sg_sequence", "is", self.seq]], ["code"],
+                        [{"field_name": "code", "direction": "desc"}])
+        self.assertEqual([x["code"] for x in shots], sorted([x["code"] for x in self.shots], reverse=True))
+        self.assertEqual(self.sg_server.get_call_counts(), {"read": 3})
+
+        shots = sg.find("Shot", [["id", "in", [101, 102]], ["code", "is", "shot_02"]], ["code"])
+        self.assertEqual(shots, [{"type": "Shot", "id": 102, "code": "shot_02"}])
+        shots = sg.find("Shot", [["id", "in", [101, 102]], ["code", "is", "shot_02"]], ["code"],
+                        filter_operator="any")
+        self.assertEqual([x["id"] for x in shots], [101, 102])
+
+    def test_write(self):
+        """
+        Entities can be created, updated and deleted and dates survive the round trip.
+        """
+        sg = self.tk.shotgun
+        created_at = datetime.datetime(2013, 10, 12, 12, 1, tzinfo=shotgun_api3.sg_timezone.UTC())
+        shot = sg.create("Shot", {"code": "new_shot", "project": self.project, "created_at": created_at})
+        self.assertEqual(shot["code"], "new_shot")
+        shot = sg.find_one("Shot", [["created_at", "is", created_at]], ["code", "created_at"])
+        self.assertEqual(shot["code"], "new_shot")
+        self.assertEqual(shot["created_at"], created_at)
+
+        sg.update("Shot", shot["id"], {"code": "renamed_shot"})
+        self.assertEqual(self.mockgun.find_one("Shot", [["id", "is", shot["id"]]], ["code"])["code"],
+                         "renamed_shot")
+        self.assertTrue(sg.delete("Shot", shot["id"]))
+        self.assertEqual(sg.find_one("Shot", [["id", "is", shot["id"]]]), None)
+
+    def test_batch(self):
+        """
+        Failed batches don't leave any entities behind.
+        """
+        sg = self.tk.shotgun
+        num_shots = len(self.mockgun.find("Shot", []))
+        requests = [{"request_type": "create", "entity_type": "Shot", "data": {"code": "a"}},
+                    {"request_type": "create", "entity_type": "Shot", "data": {"code": "b"}}]
+        results = sg.batch(requests)
+        self.assertEqual([x["code"] for x in results], ["a", "b"])
+        self.assertEqual(len(self.mockgun.find("Shot", [])), num_shots + 2)
+
+        requests.append({"request_type": "create", "entity_type": "Shot", "data": {"no_such_field": 1}})
+        self.assertRaises(shotgun_api3.Fault, sg.batch, requests)
+        self.assertEqual(len(self.mockgun.find("Shot", [])), num_shots + 2)
+
+    def test_schema(self):
+        """
+        Schema information is returned from the mockgun schema.
+        """
+        sg = self.tk.shotgun
+        self.assertEqual(sg.schema_field_read("Shot", "code"), self.mockgun.schema_field_read("Shot", "code"))
+        self.assertTrue("Shot" in sg.schema_entity_read())
+
+    def test_latency(self):
+        """
+        Requests are delayed by the configured latency.
+        """
+        self.sg_server.latency = 0.2
+        before = time.time()
+        self.tk.shotgun.find_one("Shot", [])
+        self.assertTrue(time.time() - before >= 0.2)
+
+    def test_folders(self):
+        """
+        Folders created via the server are picked up by a full path cache sync.
+        """
+        shot_ids = [x["id"] for x in self.shots]
+        folder.process_filesystem_structure(self.tk, "Shot", shot_ids, preview=False, engine=None)
+        # the project, the sequence and the shots
+        self.assertEqual(len(self.mockgun.find(tank.path_cache.SHOTGUN_ENTITY, [])), 27)
+
+        path_cache = tank.path_cache.PathCache(self.tk)
+        try:
+            path_cache.synchronize(full_sync=True)
+            shot_path = os.path.join(self.project_root, "sequences", "seq_code", "shot_07")
+            self.assertEqual(path_cache.get_entity(shot_path)["id"], 107)
+        finally:
+            path_cache.close()
@@ -9,7 +9,15 @@
 # not expressly granted therein are reserved by Shotgun Software Inc.
 
 import os
+import logging
+import sys
+import time
 import datetime
+import threading
+import hashlib
+import socket
+import urllib2
+import traceback
 
 from mock import Mock, patch
 
@@ -19,6 +27,7 @@ from tank import TankError
 from tank_test.tank_test_base import *
 from tank.template import TemplatePath
 from tank.templatekey import SequenceKey
+from tank_vendor import shotgun_api3
 
 
 class TestShotgunFindPublish(TankTestBase):
@@ -151,8 +160,177 @@ class TestShotgunFindPublish(TankTestBase):
         paths = [os.path.join(self.project_root, "foo", "doesnotexist")]
         d = tank.util.find_publish(self.tk, paths)
         self.assertEqual(len(d), 0)
+
+    def test_chunked_queries(self):
+        """
+        Large lists of paths are looked up via several concurrent queries.
+        """
+        paths = [os.path.join(self.project_root, "foo", "bar"),
+                 os.path.join(self.project_root, "foo", "baz"),
+                 os.path.join(self.alt_root_1, "foo", "bar")]
+        chunk_size_patcher = patch("tank.platform.constants.FIND_PUBLISH_CHUNK_SIZE", 1)
+        find_patcher = patch.object(self.mockgun, "find", wraps=self.mockgun.find)
+        chunk_size_patcher.start()
+        find_mock = find_patcher.start()
+        try:
+            d = tank.util.find_publish(self.tk, paths, fields=["code"])
+            published_file_finds = [x for x in find_mock.call_args_list if x[0][0] == "TankPublishedFile"]
+            # two for the primary storage and one for the alternate storage 
+            self.assertEqual(len(published_file_finds), 3)
+        finally:
+            find_patcher.stop()
+            chunk_size_patcher.stop()
         
+        self.assertEqual(sorted(d.keys()), sorted(paths))
+        self.assertEqual(d[paths[0]]["id"], self.pub_2["id"])
+        self.assertEqual(d[paths[0]]["code"], "more recent")
+        self.assertEqual(d[paths[1]]["id"], self.pub_3["id"])
+        self.assertEqual(d[paths[2]]["id"], self.pub_5["id"])
+
+    def test_query_error(self):
+        """
+        Errors raised by concurrent queries are passed on to the caller.
+        """
+        paths = [os.path.join(self.project_root, "foo", "bar"),
+                 os.path.join(self.project_root, "foo", "baz")]
+        chunk_size_patcher = patch("tank.platform.constants.FIND_PUBLISH_CHUNK_SIZE", 1)
+        find_patcher = patch.object(self.mockgun, "find", side_effect=ValueError("failed"))
+        chunk_size_patcher.start()
+        find_patcher.start()
+        try:
+            self.assertRaises(ValueError, tank.util.find_publish, self.tk, paths)
+        finally:
+            find_patcher.stop()
+            chunk_size_patcher.stop()
+
+    def test_storage_lookup_cached(self):
+        """
+        Local storages are only looked up once per API instance.
+        """
+        # the legacy storage is looked up together with the primary storage
+        self.add_to_sg_mock_db({"type": "LocalStorage", "id": 4712, "code": "Tank"})
+        paths = [os.path.join(self.project_root, "foo", "bar")]
+        find_patcher = patch.object(self.mockgun, "find", wraps=self.mockgun.find)
+        find_mock = find_patcher.start()
+        try:
+            tank.util.find_publish(self.tk, paths)
+            tank.util.find_publish(self.tk, paths)
+            storage_finds = [x for x in find_mock.call_args_list if x[0][0] == "LocalStorage"]
+            self.assertEqual(len(storage_finds), 1)
+        finally:
+            find_patcher.stop()
 
+    def test_storage_lookup_case(self):
+        """
+        Local storages are matched case insensitively, like shotgun does.
+        """
+        self.assertEqual(tank.util.shotgun._get_local_storage(self.tk, "PRIMARY")["id"], 
+                         self.primary_storage["id"])
+
+    def test_storage_lookup_missing(self):
+        """
+        Local storages created after the first lookup are found.
+        """
+        self.assertEqual(tank.util.shotgun._get_local_storage(self.tk, "new_storage"), None)
+        new_storage = {"type": "LocalStorage", "id": 4711, "code": "new_storage"}
+        self.add_to_sg_mock_db(new_storage)
+        self.assertEqual(tank.util.shotgun._get_local_storage(self.tk, "new_storage")["id"], 4711)
+
+    def test_sequence_frames_grouped(self):
+        """
+        Templates are only resolved once for all the frames of a sequence.
+        """
+        keys = {"seq": SequenceKey("seq", format_spec="03")}
+        template = TemplatePath("foo/seq_{seq}.ext", keys, self.project_root)
+        self.tk.templates["sequence_test"] = template
+        frames = [os.path.join(self.project_root, "foo", "seq_%03d.ext" % i) for i in range(1, 11)]
+        tfp_patcher = patch.object(self.tk, "template_from_path", wraps=self.tk.template_from_path)
+        tfp_mock = tfp_patcher.start()
+        try:
+            d = tank.util.find_publish(self.tk, frames)
+            self.assertEqual(tfp_mock.call_count, 1)
+        finally:
+            tfp_patcher.stop()
+        self.assertEqual(sorted(d.keys()), sorted(frames))
+        self.assertEqual(set(x["id"] for x in d.values()), set([self.pub_4["id"]]))
+
+    def test_numbered_paths_not_grouped(self):
+        """
+        Paths which only differ by a number that is not abstract are looked up individually.
+        """
+        paths = [os.path.join(self.project_root, "foo", "bar_%d" % i) for i in range(1, 4)]
+        self.add_to_sg_mock_db({"type": "TankPublishedFile",
+                                "id": 6,
+                                "code": "numbered",
+                                "path_cache": "%s/foo/bar_2" % os.path.basename(self.project_root),
+                                "created_at": datetime.datetime(2012, 10, 13, 12, 2),
+                                "path_cache_storage": self.primary_storage})
+        d = tank.util.find_publish(self.tk, paths)
+        self.assertEqual(d.keys(), [paths[1]])
+        self.assertEqual(d[paths[1]]["id"], 6)
+        
+
+
+
+class TestFindConcurrently(TankTestBase):
+    """
+    Tests running shotgun queries on several threads on behalf of an API instance.
+    """
+    def setUp(self):
+        super(TestFindConcurrently, self).setUp()
+        self.shots = [{"type": "Shot", "id": 100 + i, "code": "shot_%d" % i, "project": self.project} 
+                      for i in range(6)]
+        self.add_to_sg_mock_db(self.shots)
+        self.start_shotgun_server()
+        self.queries = [(x["id"], [["id", "is", x["id"]]]) for x in self.shots]
+
+    def test_clone_connection(self):
+        """
+        Cloned connections talk to the same site with the same credentials.
+        """
+        sg = self.tk.shotgun
+        clone = tank.util.shotgun.clone_sg_connection(sg)
+        self.assertNotEqual(clone, sg)
+        self.assertEqual(clone.base_url, sg.base_url)
+        self.assertEqual(clone.config.script_name, sg.config.script_name)
+        self.assertEqual(clone.config.api_key, sg.config.api_key)
+        self.assertEqual(clone.server_caps, sg.server_caps)
+        self.assertEqual(tank.util.shotgun.clone_sg_connection(self.mockgun), None)
+
+    def test_uses_tk_connection(self):
+        """
+        Queries run against the site of the tk instance rather than the global connection pool.
+        """
+        sg = self.tk.shotgun
+        tank.util.shotgun.clear_connection_pools()
+        create_sg_connection_patcher = patch("tank.util.shotgun.create_sg_connection", side_effect=TankError("no pool"))
+        create_sg_connection_patcher.start()
+        try:
+            results = dict(tank.util.shotgun._find_concurrently(self.tk, "Shot", self.queries, ["code"]))
+        finally:
+            create_sg_connection_patcher.stop()
+        self.assertEqual(sorted(results.keys()), [x["id"] for x in self.shots])
+        self.assertEqual(results[101], [{"type": "Shot", "id": 101, "code": "shot_1"}])
+
+    def test_error_traceback(self):
+        """
+        Errors raised by worker threads are passed on with their original traceback.
+        """
+        def failing_find(*args, **kwargs):
+            raise ValueError("failed")
+        
+        find_patcher = patch("tank_vendor.shotgun_api3.Shotgun.find", failing_find)
+        find_patcher.start()
+        try:
+            try:
+                list(tank.util.shotgun._find_concurrently(self.tk, "Shot", self.queries, ["code"]))
+            except ValueError:
+                stack = traceback.extract_tb(sys.exc_info()[2])
+            else:
+                self.fail("No error raised")
+        finally:
+            find_patcher.stop()
+        self.assertEqual(stack[-1][2], "failing_find")
 
 
 class TestShotgunFindPublishTankStorage(TankTestBase):
@@ -363,6 +541,185 @@ class TestShotgunRegisterPublish(TankTestBase):
 
 
 
+class TestShotgunRegisterPublishes(TankTestBase):
+    """
+    Tests the bulk registration of publishes.
+    """
+    def setUp(self):
+        super(TestShotgunRegisterPublishes, self).setUp()
+        self.setup_fixtures()
+
+        self.tank_type = {"type": "TankType", "id": 1, "code": "Maya Scene", "project": self.project}
+        self.shot = {"type": "Shot", "name": "shot_name", "id": 2, "project": self.project}
+        project_name = os.path.basename(self.project_root)
+        self.dependency = {"type": "TankPublishedFile",
+                           "id": 1,
+                           "code": "dep",
+                           "path_cache": "%s/foo/dep.ma" % project_name,
+                           "created_at": datetime.datetime(2012, 10, 12, 12, 1),
+                           "path_cache_storage": self.primary_storage}
+        self.add_to_sg_mock_db([self.tank_type, self.shot, self.dependency])
+
+        self.context = context.Context(tk=self.tk, project=self.project, entity=self.shot)
+        self.dependency_path = os.path.join(self.project_root, "foo", "dep.ma")
+
+    def _get_item(self, name, **kwargs):
+        item = {"path": os.path.join(self.project_root, "foo", "%s.ma" % name),
+                "name": name,
+                "version_number": 1}
+        item.update(kwargs)
+        return item
+
+    def test_register(self):
+        """
+        Publishes, types and dependencies are created with a fixed number of calls.
+        """
+        items = [self._get_item("a", published_file_type="Maya Scene", 
+                                dependency_paths=[self.dependency_path]),
+                 self._get_item("b", published_file_type="Nuke Script", 
+                                dependency_paths=[self.dependency_path]),
+                 self._get_item("c", published_file_type="Nuke Script", dependency_ids=[1])]
+
+        batch_patcher = patch.object(self.mockgun, "batch", wraps=self.mockgun.batch)
+        find_patcher = patch("tank.util.shotgun.find_publish", wraps=tank.util.shotgun.find_publish)
+        batch_mock = batch_patcher.start()
+        find_mock = find_patcher.start()
+        try:
+            results = tank.util.register_publishes(self.tk, self.context, items)
+        finally:
+            find_patcher.stop()
+            batch_patcher.stop()
+
+        self.assertEqual([r["error"] for r in results], [None, None, None])
+        publishes = [self.mockgun.find_one("TankPublishedFile", [["id", "is", r["entity"]["id"]]], 
+                                           ["name", "tank_type", "entity"]) for r in results]
+        self.assertEqual([p["name"] for p in publishes], ["a", "b", "c"])
+        self.assertEqual(publishes[0]["tank_type"]["id"], self.tank_type["id"])
+        self.assertEqual(publishes[1]["tank_type"]["id"], publishes[2]["tank_type"]["id"])
+        self.assertEqual(publishes[0]["entity"]["id"], self.shot["id"])
+        self.assertEqual(len(self.mockgun.find("TankType", [["code", "is", "Nuke Script"]])), 1)
+
+        # one batch each for the new type, the publishes and the dependencies
+        self.assertEqual(batch_mock.call_count, 3)
+        self.assertEqual(find_mock.call_count, 1)
+        dependencies = self.mockgun.find("TankDependency", [], ["tank_published_file", 
+                                                                 "dependent_tank_published_file"])
+        self.assertEqual(len(dependencies), 3)
+        for dependency in dependencies:
+            self.assertEqual(dependency["dependent_tank_published_file"]["id"], self.dependency["id"])
+
+    def test_chunks(self):
+        """
+        Publishes are created in chunks of bounded size.
+        """
+        items = [self._get_item("item_%d" % i) for i in range(5)]
+        batch_size_patcher = patch("tank.platform.constants.REGISTER_PUBLISHES_BATCH_SIZE", 2)
+        batch_patcher = patch.object(self.mockgun, "batch", wraps=self.mockgun.batch)
+        batch_size_patcher.start()
+        batch_mock = batch_patcher.start()
+        try:
+            results = tank.util.register_publishes(self.tk, self.context, items)
+        finally:
+            batch_patcher.stop()
+            batch_size_patcher.stop()
+        self.assertEqual(batch_mock.call_count, 3)
+        self.assertEqual(len(set(r["entity"]["id"] for r in results)), 5)
+
+    def test_item_errors(self):
+        """
+        Failures are reported per item and don't prevent the other items from being registered.
+        """
+        real_batch = self.mockgun.batch
+        def batch_mock(requests):
+            if [r for r in requests if r["data"].get("name") == "bad"]:
+                raise shotgun_api3.Fault("Invalid data")
+            return real_batch(requests)
+
+        items = [self._get_item("good"), 
+                 self._get_item("bad"), 
+                 {"path": self.dependency_path},
+                 self._get_item("no_type", published_file_type=123),
+                 self._get_item("also_good")]
+        batch_patcher = patch.object(self.mockgun, "batch", side_effect=batch_mock)
+        batch_patcher.start()
+        try:
+            results = tank.util.register_publishes(self.tk, self.context, items)
+        finally:
+            batch_patcher.stop()
+
+        self.assertEqual(results[0]["error"], None)
+        self.assertEqual(results[4]["error"], None)
+        self.assertEqual(results[1]["entity"], None)
+        self.assertTrue("Invalid data" in results[1]["error"])
+        self.assertTrue("name" in results[2]["error"])
+        self.assertEqual(results[3]["entity"], None)
+        self.assertTrue(results[3]["error"])
+        names = sorted(p["name"] for p in self.mockgun.find("TankPublishedFile", [], ["name"]) if p["name"])
+        self.assertEqual(names, ["also_good", "good"])
+
+    def test_unknown_outcome(self):
+        """
+        Chunks which fail without being rejected by the server are not retried.
+        """
+        items = [self._get_item("a"), self._get_item("b")]
+        batch_patcher = patch.object(self.mockgun, "batch", side_effect=IOError("timed out"))
+        batch_mock = batch_patcher.start()
+        try:
+            results = tank.util.register_publishes(self.tk, self.context, items)
+        finally:
+            batch_patcher.stop()
+        self.assertEqual(batch_mock.call_count, 1)
+        self.assertEqual([r["entity"] for r in results], [None, None])
+        self.assertTrue("timed out" in results[0]["error"])
+        self.assertTrue("timed out" in results[1]["error"])
+
+    def test_type_errors(self):
+        """
+        Items are still registered when the publish types can't be resolved.
+        """
+        items = [self._get_item("typed", published_file_type="Nuke Script"), 
+                 self._get_item("untyped")]
+        patcher = patch("tank.util.shotgun._get_published_file_types", 
+                        side_effect=shotgun_api3.Fault("Permission denied"))
+        patcher.start()
+        try:
+            results = tank.util.register_publishes(self.tk, self.context, items)
+        finally:
+            patcher.stop()
+        self.assertEqual(results[0]["entity"], None)
+        self.assertTrue("Permission denied" in results[0]["error"])
+        self.assertEqual(results[1]["error"], None)
+        names = [p["name"] for p in self.mockgun.find("TankPublishedFile", [], ["name"]) if p["name"]]
+        self.assertEqual(names, ["untyped"])
+
+    def test_type_case(self):
+        """
+        Publish types are matched case insensitively, like shotgun does.
+        """
+        real_find = self.mockgun.find
+        def find_mock(entity_type, filters, *args, **kwargs):
+            if entity_type == "TankType":
+                # emulate the case insensitive matching of the server
+                return [{"type": "TankType", "id": self.tank_type["id"], "code": self.tank_type["code"]}]
+            return real_find(entity_type, filters, *args, **kwargs)
+
+        find_patcher = patch.object(self.mockgun, "find", side_effect=find_mock)
+        find_patcher.start()
+        try:
+            results = tank.util.register_publishes(self.tk, self.context, 
+                                                   [self._get_item("a", published_file_type="maya scene")])
+            entity = tank.util.register_publish(self.tk, self.context, self._get_item("b")["path"], "b", 1,
+                                                published_file_type="MAYA SCENE")
+        finally:
+            find_patcher.stop()
+
+        self.assertEqual(results[0]["error"], None)
+        for publish_id in (results[0]["entity"]["id"], entity["id"]):
+            publish = self.mockgun.find_one("TankPublishedFile", [["id", "is", publish_id]], ["tank_type"])
+            self.assertEqual(publish["tank_type"]["id"], self.tank_type["id"])
+        self.assertEqual(len(self.mockgun.find("TankType", [])), 1)
+
+
 class TestCalcPathCache(TankTestBase):
     
     @patch("tank.pipelineconfig.PipelineConfiguration.get_data_roots")
@@ -382,4 +739,658 @@ class TestCalcPathCache(TankTestBase):
         self.assertEqual("primary", root_name)
         self.assertEqual(expected, path_cache)
 
+    @patch("tank.pipelineconfig.PipelineConfiguration.get_data_roots")
+    def test_nested_roots(self, get_data_roots):
+        """
+        Roots are only looked up once and the most specific root matching a path wins.
+        """
+        nested_root = os.path.join(self.project_root, "nested")
+        get_data_roots.return_value = {"primary": self.project_root, "nested": nested_root}
+
+        input_path = os.path.join(nested_root, "Some", "Path")
+        for idx in range(3):
+            root_name, path_cache = tank.util.shotgun._calc_path_cache(self.tk, input_path)
+            self.assertEqual("nested", root_name)
+            self.assertEqual("nested/Some/Path", path_cache)
+        self.assertEqual(get_data_roots.call_count, 1)
+
+
+
+
+class TestConnectionPool(TankTestBase):
+    """
+    Tests the pooling of shotgun connections.
+    """
+    def setUp(self):
+        super(TestConnectionPool, self).setUp()
+        patcher = patch("tank.util.shotgun.create_sg_connection", 
+                        side_effect=lambda user="default": Mock())
+        self.create_mock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = tank.util.shotgun.ShotgunConnectionPool(size=2, idle_timeout=60)
+        
+    def test_thread_connection(self):
+        """
+        Each thread gets its own connection, which is reused within the thread.
+        """
+        sg = self.pool.get_thread_connection()
+        self.assertTrue(self.pool.get_thread_connection() is sg)
+        
+        other_sgs = []
+        thread = threading.Thread(target=lambda: other_sgs.append(self.pool.get_thread_connection()))
+        thread.start()
+        thread.join()
+        self.assertFalse(other_sgs[0] is sg)
+        self.assertEqual(self.create_mock.call_count, 2)
+        
+    def test_checkout(self):
+        """
+        Checked in connections are handed out again.
+        """
+        sg_a = self.pool.checkout()
+        sg_b = self.pool.checkout()
+        self.assertFalse(sg_a is sg_b)
+        self.pool.checkin(sg_a)
+        self.assertTrue(self.pool.checkout() is sg_a)
+        self.assertEqual(self.create_mock.call_count, 2)
+        
+    def test_size(self):
+        """
+        Connections checked in when the pool is full are closed.
+        """
+        sgs = [self.pool.checkout() for x in range(3)]
+        for sg in sgs:
+            self.pool.checkin(sg)
+        self.assertEqual([x.close.call_count for x in sgs], [0, 0, 1])
+        
+    def test_idle_timeout(self):
+        """
+        Connections which have been idle for too long are closed.
+        """
+        sg = self.pool.checkout()
+        self.pool.checkin(sg)
+        time_patcher = patch("time.time", return_value=time.time() + 61)
+        time_patcher.start()
+        try:
+            self.assertFalse(self.pool.checkout() is sg)
+        finally:
+            time_patcher.stop()
+        self.assertEqual(sg.close.call_count, 1)
+        
+    def test_clear(self):
+        """
+        Clearing the pool closes idle connections and connections dedicated to threads.
+        """
+        thread_sg = self.pool.get_thread_connection()
+        idle_sg = self.pool.checkout()
+        self.pool.checkin(idle_sg)
+        self.pool.clear()
+        self.assertEqual(thread_sg.close.call_count, 1)
+        self.assertEqual(idle_sg.close.call_count, 1)
+        self.assertFalse(self.pool.get_thread_connection() is thread_sg)
+        
+    def test_tank_shotgun(self):
+        """
+        Each API handle has its own connection, which isn't taken from the pool.
+        """
+        tk = tank.Tank(self.pipeline_configuration)
+        self.assertTrue(tk.shotgun is tk.shotgun)
+        self.assertFalse(tk.shotgun is self.tk.shotgun)
+        self.assertFalse(tank.util.shotgun.get_sg_connection() is tk.shotgun)
+
+
+class TestServerCapsSharing(TankTestBase):
+    """
+    Tests that only the first shotgun connection to a site connects to the server.
+    """
+    def test_shared_caps(self):
+        config_data = {"host": "https://foo.shotgunstudio.com", "api_script": "script", "api_key": "key"}
+        create_connection = getattr(tank.util.shotgun, "__create_sg_connection")
+        config_data_patcher = patch("tank.util.shotgun.__get_sg_config_data", return_value=config_data)
+        shotgun_patcher = patch("tank_vendor.shotgun_api3.Shotgun")
+        config_data_patcher.start()
+        shotgun_mock = shotgun_patcher.start()
+        try:
+            (sg_a, _) = create_connection("shotgun.yml", False)
+            (sg_b, _) = create_connection("shotgun.yml", False)
+        finally:
+            shotgun_patcher.stop()
+            config_data_patcher.stop()
+        
+        self.assertEqual(shotgun_mock.call_args_list[0][1]["connect"], True)
+        self.assertEqual(shotgun_mock.call_args_list[1][1]["connect"], False)
+        self.assertTrue(sg_b._server_caps is sg_a.server_caps)
+
+
+class TestShotgunPaging(TankTestBase):
+    """
+    Tests the paged reads of the shotgun API.
+    """
+    def setUp(self):
+        super(TestShotgunPaging, self).setUp()
+        self.sg = shotgun_api3.Shotgun("https://unit_test", "script", "key", connect=False)
+        self.sg._server_caps = shotgun_api3.shotgun.ServerCapabilities("unit_test", {"version": [5, 0, 0]})
+        self.sg.config.records_per_page = 10
+        self.records = [{"type": "Shot", "id": i} for i in range(1, 96)]
+        self.pages_read = []
+        self.sg._call_rpc = self._call_rpc
+
+    def _call_rpc(self, method, params, origin=None):
+        page = params["paging"]["current_page"]
+        per_page = params["paging"]["entities_per_page"]
+        self.pages_read.append(page)
+        return {"entities": self.records[(page - 1) * per_page:page * per_page],
+                "paging_info": {"entity_count": len(self.records)}}
+
+    def test_sequential(self):
+        self.assertEqual(self.sg.find("Shot", []), self.records)
+        self.assertEqual(self.pages_read, range(1, 11))
+
+    def test_concurrent(self):
+        """
+        Pages fetched concurrently are returned in order.
+        """
+        self.sg.config.max_page_threads = 3
+        self.assertEqual(self.sg.find("Shot", []), self.records)
+        self.assertEqual(sorted(self.pages_read), range(1, 11))
+        self.assertEqual(len(self.sg._page_readers), 3)
+        self.assertEqual(self.sg.find("Shot", [], limit=25), self.records[:25])
+
+    def test_concurrent_error(self):
+        """
+        Errors raised while fetching pages concurrently are passed on.
+        """
+        def call_rpc(method, params, origin=None):
+            if params["paging"]["current_page"] == 4:
+                raise shotgun_api3.Fault("page error")
+            return self._call_rpc(method, params)
+        self.sg._call_rpc = call_rpc
+        self.sg.config.max_page_threads = 3
+        self.assertRaises(shotgun_api3.Fault, self.sg.find, "Shot", [])
+
+    def test_find_iter(self):
+        """
+        Records are yielded one page at a time.
+        """
+        records = self.sg.find_iter("Shot", [])
+        self.assertEqual(records.next(), self.records[0])
+        self.assertEqual(self.pages_read, [1])
+        self.assertEqual(list(records), self.records[1:])
+        self.assertEqual(list(self.sg.find_iter("Shot", [], limit=15)), self.records[:15])
+
+    def test_page_threads_opt_in(self):
+        """
+        Concurrent page fetching is off unless turned on in the config or environment.
+        """
+        get_max_page_threads = tank.util.shotgun._get_max_page_threads
+        env_var = tank.platform.constants.SG_FIND_MAX_PAGE_THREADS_ENV_VAR
+        environ_patcher = patch.dict(os.environ, {})
+        environ_patcher.start()
+        try:
+            os.environ.pop(env_var, None)
+            self.assertEqual(get_max_page_threads({}), 1)
+            self.assertEqual(get_max_page_threads({"max_page_threads": 3}), 3)
+            self.assertEqual(get_max_page_threads({"max_page_threads": "foo"}), 1)
+            os.environ[env_var] = "4"
+            self.assertEqual(get_max_page_threads({"max_page_threads": 3}), 4)
+            os.environ[env_var] = "foo"
+            self.assertEqual(get_max_page_threads({"max_page_threads": 3}), 3)
+        finally:
+            environ_patcher.stop()
+
+
+class TestQueryCache(TankTestBase):
+    """
+    Tests the read-through cache for shotgun queries.
+    """
+    def setUp(self):
+        super(TestQueryCache, self).setUp()
+        self.shot = {"type": "Shot", "id": 1, "code": "shot_1", "project": self.project}
+        self.add_to_sg_mock_db(self.shot)
+        self.pool = tank.util.shotgun.get_connection_pool()
+        self.pool.clear()
+        tank.util.shotgun.enable_query_cache()
+        # only static lookups are cached by default
+        self.pool.query_cache.ttls["Shot"] = 60
+        self.sg = self.pool.get_thread_connection()
+
+    def test_disabled(self):
+        """
+        Queries are sent to shotgun while the cache is turned off.
+        """
+        tank.util.shotgun.enable_query_cache(False)
+        find_patcher = patch.object(self.mockgun, "find", wraps=self.mockgun.find)
+        find_mock = find_patcher.start()
+        try:
+            self.sg.find("Shot", [])
+            self.sg.find("Shot", [])
+        finally:
+            find_patcher.stop()
+        self.assertEqual(find_mock.call_count, 2)
+        self.assertEqual(tank.util.shotgun.get_query_cache_statistics(), [])
+
+    def test_unwrapped_when_disabled(self):
+        """
+        Handles are only wrapped while the cache is turned on.
+        """
+        tank.util.shotgun.enable_query_cache(False)
+        self.assertTrue(self.tk.shotgun is self.mockgun)
+        self.assertTrue(tank.util.shotgun.get_sg_connection() is self.mockgun)
+        tank.util.shotgun.enable_query_cache()
+        self.assertTrue(isinstance(self.tk.shotgun, tank.util.query_cache.CachedShotgun))
+
+    def test_enable_in_use(self):
+        """
+        Turning the cache on affects the connections already in use by threads.
+        """
+        tank.util.shotgun.enable_query_cache(False)
+        self.pool.clear()
+        tank.util.shotgun.get_sg_connection().find("Shot", [])
+        self.tk.shotgun.find("Shot", [])
+        tank.util.shotgun.enable_query_cache()
+        find_patcher = patch.object(self.mockgun, "find", wraps=self.mockgun.find)
+        find_mock = find_patcher.start()
+        try:
+            tank.util.shotgun.get_sg_connection().find("Shot", [])
+            tank.util.shotgun.get_sg_connection().find("Shot", [])
+            self.tk.shotgun.find("Shot", [])
+        finally:
+            find_patcher.stop()
+        self.assertEqual(find_mock.call_count, 1)
+
+    def test_hits(self):
+        """
+        Repeated queries are only sent to shotgun once.
+        """
+        filters = [["code", "is", "shot_1"], ["project", "is", self.project]]
+        find_patcher = patch.object(self.mockgun, "find", wraps=self.mockgun.find)
+        find_mock = find_patcher.start()
+        try:
+            shots_a = self.sg.find("Shot", filters, ["code", "project"])
+            # the order of filters and fields does not matter
+            shots_b = self.sg.find("Shot", list(reversed(filters)), ["project", "code"])
+        finally:
+            find_patcher.stop()
+        self.assertEqual(find_mock.call_count, 1)
+        self.assertEqual(shots_a, shots_b)
+
+        # results are copies
+        shots_a[0]["code"] = "modified"
+        self.assertEqual(self.sg.find("Shot", filters, ["code", "project"])[0]["code"], "shot_1")
+
+        stats = tank.util.shotgun.get_query_cache_statistics()
+        self.assertEqual(stats, [{"entity_type": "Shot", "hits": 2, "misses": 1, "hit_rate": 2.0 / 3}])
+
+    def test_write_invalidation(self):
+        """
+        Writes through the same handle discard cached queries for the entity type.
+        """
+        self.assertEqual(len(self.sg.find("Shot", [])), 1)
+        self.sg.create("Shot", {"code": "shot_2", "project": self.project})
+        self.assertEqual(len(self.sg.find("Shot", [])), 2)
+        self.sg.batch([{"request_type": "create", "entity_type": "Shot", "data": {"code": "shot_3"}}])
+        self.assertEqual(len(self.sg.find("Shot", [])), 3)
+
+    def test_expiry(self):
+        """
+        Queries are sent to shotgun again once their time to live has passed.
+        """
+        self.pool.query_cache.ttls["Shot"] = 0.05
+        find_patcher = patch.object(self.mockgun, "find_one", wraps=self.mockgun.find_one)
+        find_mock = find_patcher.start()
+        try:
+            self.sg.find_one("Shot", [["id", "is", 1]])
+            self.sg.find_one("Shot", [["id", "is", 1]])
+            self.assertEqual(find_mock.call_count, 1)
+            time.sleep(0.1)
+            self.sg.find_one("Shot", [["id", "is", 1]])
+            self.assertEqual(find_mock.call_count, 2)
+        finally:
+            find_patcher.stop()
+
+    def test_uncached_types(self):
+        """
+        Only the entity types with a time to live are cached.
+        """
+        self.assertFalse(self.pool.query_cache.is_cached("EventLogEntry"))
+        self.assertFalse(self.pool.query_cache.is_cached("FilesystemLocation"))
+        self.assertTrue(self.pool.query_cache.is_cached("LocalStorage"))
+        find_patcher = patch.object(self.mockgun, "find", wraps=self.mockgun.find)
+        find_mock = find_patcher.start()
+        try:
+            self.sg.find("EventLogEntry", [])
+            self.sg.find("EventLogEntry", [])
+        finally:
+            find_patcher.stop()
+        self.assertEqual(find_mock.call_count, 2)
+        self.assertEqual(tank.util.shotgun.get_query_cache_statistics(), [])
+
+    def test_lru(self):
+        """
+        The least recently used queries are evicted once the cache is full.
+        """
+        self.pool.query_cache.max_entries = 2
+        find_patcher = patch.object(self.mockgun, "find_one", wraps=self.mockgun.find_one)
+        find_mock = find_patcher.start()
+        try:
+            for shot_id in (1, 2, 1, 3, 1, 2):
+                self.sg.find_one("Shot", [["id", "is", shot_id]])
+        finally:
+            find_patcher.stop()
+        # 2 is evicted when 3 is added since 1 was used more recently
+        self.assertEqual(find_mock.call_count, 4)
+
+
+class _MockDownloadResponse(object):
+    """
+    Mock of the response returned by urllib2.urlopen for attachment downloads.
+    """
+    def __init__(self, data, code=200, content_length=None):
+        self._data = data
+        self.code = code
+        if content_length is None:
+            content_length = len(data)
+        self._headers = {"content-length": str(content_length)}
+
+    def info(self):
+        return self._headers
+
+    def read(self, size):
+        (data, self._data) = (self._data[:size], self._data[size:])
+        return data
+
+
+class TestAttachmentDownload(TankTestBase):
+    """
+    Tests the streamed attachment downloads of the shotgun API.
+    """
+    def setUp(self):
+        super(TestAttachmentDownload, self).setUp()
+        self.sg = shotgun_api3.Shotgun("https://unit_test", "script", "key", connect=False)
+        self.attachment = {"url": "https://s3.amazonaws.com/bucket/payload.zip"}
+        self.data = "".join(chr(x % 256) for x in range(200000))
+        self.checksum = hashlib.md5(self.data).hexdigest()
+        self.file_path = os.path.join(self.tank_temp, "payload.zip")
+        self.requests = []
+
+        patcher = patch("tank_vendor.shotgun_api3.shotgun.urllib2.urlopen", side_effect=self._urlopen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _urlopen(self, request):
+        range_header = request.get_header("Range")
+        self.requests.append(range_header)
+        if range_header:
+            offset = int(range_header[len("bytes="):-1])
+            return _MockDownloadResponse(self.data[offset:], code=206)
+        return _MockDownloadResponse(self.data)
+
+    def _write_partial_file(self, data):
+        fh = open(self.file_path, "wb")
+        fh.write(data)
+        fh.close()
+
+    def _read_file(self):
+        fh = open(self.file_path, "rb")
+        try:
+            return fh.read()
+        finally:
+            fh.close()
+
+    def test_stream_to_disk(self):
+        progress = []
+        self.sg.download_attachment(self.attachment, 
+                                    file_path=self.file_path, 
+                                    checksum=self.checksum,
+                                    progress_callback=lambda *args: progress.append(args))
+        self.assertEqual(self._read_file(), self.data)
+        self.assertTrue(len(progress) > 1)
+        self.assertEqual(progress[-1], (len(self.data), len(self.data)))
+        # downloads without a file path return the data
+        self.assertEqual(self.sg.download_attachment(self.attachment), self.data)
+
+    def test_resume(self):
+        """
+        Only the missing data is requested when resuming a download.
+        """
+        self._write_partial_file(self.data[:1000])
+        self.sg.download_attachment(self.attachment, file_path=self.file_path, 
+                                    resume=True, checksum=self.checksum)
+        self.assertEqual(self.requests, ["bytes=1000-"])
+        self.assertEqual(self._read_file(), self.data)
+
+    def test_resume_unsupported(self):
+        """
+        The whole file is downloaded again if the server ignores the range.
+        """
+        self._write_partial_file("garbage")
+        urlopen_patcher = patch("tank_vendor.shotgun_api3.shotgun.urllib2.urlopen",
+                                return_value=_MockDownloadResponse(self.data))
+        urlopen_patcher.start()
+        try:
+            self.sg.download_attachment(self.attachment, file_path=self.file_path, resume=True)
+        finally:
+            urlopen_patcher.stop()
+        self.assertEqual(self._read_file(), self.data)
+
+    def test_incomplete(self):
+        """
+        Truncated downloads raise an error and can be resumed.
+        """
+        urlopen_patcher = patch("tank_vendor.shotgun_api3.shotgun.urllib2.urlopen",
+                                return_value=_MockDownloadResponse(self.data[:5000], content_length=len(self.data)))
+        urlopen_patcher.start()
+        try:
+            self.assertRaises(shotgun_api3.ShotgunFileDownloadInterruptedError, self.sg.download_attachment, 
+                              self.attachment, file_path=self.file_path)
+        finally:
+            urlopen_patcher.stop()
+        self.assertEqual(self._read_file(), self.data[:5000])
+        self.sg.download_attachment(self.attachment, file_path=self.file_path, resume=True)
+        self.assertEqual(self._read_file(), self.data)
+
+    def test_connection_dropped(self):
+        """
+        Network errors during the transfer are reported as interrupted downloads.
+        """
+        response = _MockDownloadResponse(self.data)
+        response.read = Mock(side_effect=socket.error("Connection reset by peer"))
+        urlopen_patcher = patch("tank_vendor.shotgun_api3.shotgun.urllib2.urlopen",
+                                return_value=response)
+        urlopen_mock = urlopen_patcher.start()
+        try:
+            self.assertRaises(shotgun_api3.ShotgunFileDownloadInterruptedError, self.sg.download_attachment, 
+                              self.attachment, file_path=self.file_path)
+            # the server can't be reached
+            urlopen_mock.side_effect = urllib2.URLError("Name or service not known")
+            self.assertRaises(shotgun_api3.ShotgunFileDownloadInterruptedError, self.sg.download_attachment, 
+                              self.attachment, file_path=self.file_path)
+        finally:
+            urlopen_patcher.stop()
+
+    def test_http_error(self):
+        """
+        HTTP errors are permanent failures.
+        """
+        error = urllib2.HTTPError(self.attachment["url"], 400, "Bad Request", {}, None)
+        urlopen_patcher = patch("tank_vendor.shotgun_api3.shotgun.urllib2.urlopen",
+                                side_effect=error)
+        urlopen_patcher.start()
+        try:
+            try:
+                self.sg.download_attachment(self.attachment, file_path=self.file_path)
+            except shotgun_api3.ShotgunFileDownloadError, e:
+                self.assertFalse(isinstance(e, shotgun_api3.ShotgunFileDownloadInterruptedError))
+            else:
+                self.fail("No ShotgunFileDownloadError raised")
+        finally:
+            urlopen_patcher.stop()
+
+    def test_no_attachment(self):
+        """
+        Nothing is written to disk when there is no attachment to download.
+        """
+        if os.path.exists(self.file_path):
+            os.remove(self.file_path)
+        self.assertEqual(self.sg.download_attachment(None, file_path=self.file_path), None)
+        self.assertFalse(os.path.exists(self.file_path))
+
+    def test_checksum_mismatch(self):
+        self.assertRaises(shotgun_api3.ShotgunFileDownloadError, self.sg.download_attachment, 
+                          self.attachment, file_path=self.file_path, checksum="0" * 32)
+        self.assertFalse(os.path.exists(self.file_path))
+
+
+class TestShotgunStatistics(TankTestBase):
+    """
+    Tests the collection of shotgun call statistics.
+    """
+    def setUp(self):
+        super(TestShotgunStatistics, self).setUp()
+        self.setup_fixtures()
+        tank.util.shotgun_statistics.clear_shotgun_statistics()
+        tank.util.shotgun_statistics.enable_shotgun_profiling()
+
+        self.sg = shotgun_api3.Shotgun("https://unit_test", "script", "key", connect=False)
+        self.sg._server_caps = shotgun_api3.shotgun.ServerCapabilities("unit_test", {"version": [5, 0, 0]})
+        self.sg.config.rpc_observer = tank.util.shotgun_statistics.record_call
+        self.responses = []
+        self.sg._http_request = self._http_request
+
+    def tearDown(self):
+        tank.util.shotgun_statistics.enable_shotgun_profiling(False)
+        tank.util.shotgun_statistics.clear_shotgun_statistics()
+        super(TestShotgunStatistics, self).tearDown()
+
+    def _http_request(self, verb, path, body, headers):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return ((200, "OK"), {"content-type": "application/json"}, response)
+
+    def test_statistics(self):
+        """
+        Calls are recorded per method, entity type and calling module.
+        """
+        read_response = '{"results": {"entities": [{"type": "Shot", "id": 1}], "paging_info": {"entity_count": 1}}}'
+        self.responses = [read_response, IOError("connection reset"), read_response]
+        self.sg.find("Shot", [])
+        self.sg.find("Shot", [])
+
+        stats = self.tk.get_shotgun_statistics()
+        self.assertEqual(len(stats), 1)
+        entry = stats[0]
+        self.assertEqual((entry["method"], entry["entity_type"], entry["subsystem"]), ("read", "Shot", __name__))
+        self.assertEqual(entry["calls"], 2)
+        self.assertEqual(entry["retries"], 1)
+        self.assertEqual(entry["errors"], 0)
+        self.assertEqual(entry["response_bytes"], 2 * len(read_response))
+        self.assertTrue(entry["request_bytes"] > 0)
+        self.assertEqual(sum(entry["histogram"]), 2)
+
+    def test_concurrent_pages(self):
+        """
+        Pages read on worker threads are credited to the module which made the request.
+        """
+        self.sg.config.records_per_page = 1
+        self.sg.config.max_page_threads = 2
+        self.responses = ['{"results": {"entities": [{"type": "Shot", "id": 1}], "paging_info": {"entity_count": 3}}}',
+                          '{"results": {"entities": [{"type": "Shot", "id": 2}]}}',
+                          '{"results": {"entities": [{"type": "Shot", "id": 3}]}}']
+        self.assertEqual(len(self.sg.find("Shot", [])), 3)
+
+        stats = self.tk.get_shotgun_statistics()
+        self.assertEqual([(x["subsystem"], x["calls"]) for x in stats], [(__name__, 3)])
+
+    def test_errors(self):
+        self.responses = [IOError("connection reset")] * 3
+        self.assertRaises(IOError, self.sg.find, "Shot", [])
+        entry = self.tk.get_shotgun_statistics()[0]
+        self.assertEqual((entry["calls"], entry["retries"], entry["errors"]), (1, 2, 1))
+
+    def test_disabled(self):
+        tank.util.shotgun_statistics.enable_shotgun_profiling(False)
+        self.responses = ['{"results": {"entities": [], "paging_info": {"entity_count": 0}}}']
+        self.sg.find("Shot", [])
+        self.assertEqual(self.tk.get_shotgun_statistics(), [])
+
+    def test_command(self):
+        """
+        Statistics can be retrieved and reset via the API command, which isn't 
+        available from the command line.
+        """
+        self.responses = ['{"results": {"entities": [], "paging_info": {"entity_count": 0}}}']
+        self.sg.find("Shot", [])
+        from tank.deploy import tank_command
+        (actions, _) = tank_command.get_actions(logging.getLogger("test"), self.tk, None)
+        self.assertFalse("shotgun_statistics" in [x.name for x in actions])
+        stats = self.tk.get_command("shotgun_statistics").execute({"reset": True})
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(self.tk.get_shotgun_statistics(), [])
+
+
+class TestShotgunWireFormat(TankTestBase):
+    """
+    Tests the conversion of data sent to and received from shotgun.
+    """
+    def setUp(self):
+        super(TestShotgunWireFormat, self).setUp()
+        self.sg = shotgun_api3.Shotgun("https://unit_test", "script", "key", connect=False)
+        self.sg.config.convert_datetimes_to_utc = False
+
+    def test_decode(self):
+        """
+        Datetimes are converted while responses are decoded.
+        """
+        body = ('{"results": {"entities": [{"type": "Shot", "id": 1, '
+                '"created_at": "2012-10-12T12:01:02Z", "code": "2012-13-12T12:01:02Z", '
+                '"sg_dates": ["2012-10-13T00:00:00Z", "not a date"], '
+                '"entity": {"type": "Sequence", "updated_at": "2013-01-02T03:04:05Z"}, '
+                '"description": "abcdefghijklmnopqrst"}]}}')
+        response = self.sg._decode_response({"content-type": "application/json"}, body)
+        record = response["results"]["entities"][0]
+        self.assertEqual(record["created_at"], datetime.datetime(2012, 10, 12, 12, 1, 2))
+        self.assertEqual(record["code"], "2012-13-12T12:01:02Z")
+        self.assertEqual(record["sg_dates"], [datetime.datetime(2012, 10, 13), "not a date"])
+        self.assertEqual(record["entity"]["updated_at"], datetime.datetime(2013, 1, 2, 3, 4, 5))
+        self.assertEqual(record["description"], "abcdefghijklmnopqrst")
+
+    def test_decode_utc(self):
+        """
+        Datetimes are converted to local time if requested.
+        """
+        self.sg.config.convert_datetimes_to_utc = True
+        response = self.sg._decode_response({}, '{"results": {"created_at": "2012-10-12T12:01:02Z"}}')
+        expected = datetime.datetime(2012, 10, 12, 12, 1, 2, tzinfo=shotgun_api3.shotgun.SG_TIMEZONE.utc)
+        self.assertEqual(response["results"]["created_at"], expected)
+        self.assertEqual(response["results"]["created_at"].tzinfo, shotgun_api3.shotgun.SG_TIMEZONE.local)
+
+    def test_transform_inbound(self):
+        data = {"a": ["2012-10-12T12:01:02Z", {"b": "2012-10-12T12:01:02Z"}], "c": ("x",)}
+        expected = datetime.datetime(2012, 10, 12, 12, 1, 2)
+        self.assertEqual(self.sg._transform_inbound(data), {"a": [expected, {"b": expected}], "c": ("x",)})
+
+    def test_transform_outbound(self):
+        data = {"created_at": datetime.datetime(2012, 10, 12, 12, 1, 2),
+                "date": datetime.date(2012, 10, 12),
+                "filters": [("code", "is", "foo"), ["id", "in", [1, 2L]]],
+                "flag": True,
+                "empty": "",
+                "none": None}
+        result = self.sg._transform_outbound(data)
+        self.assertEqual(result, {"created_at": "2012-10-12T12:01:02Z",
+                                  "date": "2012-10-12",
+                                  "filters": [("code", "is", "foo"), ["id", "in", [1, 2L]]],
+                                  "flag": True,
+                                  "empty": "",
+                                  "none": None})
+        self.assertTrue(isinstance(result["filters"][0], tuple))
+        self.assertTrue(isinstance(result["filters"][0][2], unicode))
+        self.assertTrue(isinstance(result["empty"], unicode))
 
+    def test_transform_outbound_midnight(self):
+        # midnight evaluates to False but still has to be converted
+        midnight = datetime.time(0, 0)
+        result = self.sg._transform_outbound({"t": midnight})
+        expected = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.assertEqual(result, {"t": expected.strftime("%Y-%m-%dT%H:%M:%SZ")})
@@ -0,0 +1,128 @@
+# Copyright (c) 2013 Shotgun Software Inc.
+# 
+# CONFIDENTIAL AND PROPRIETARY
+# 
+# This work is provided "AS IS" and subject to the Shotgun Pipeline Toolkit 
+# Source Code License included in this distribution package. See LICENSE.
+# By accessing, using, copying or modifying this work you indicate your 
+# agreement to the Shotgun Pipeline Toolkit Source Code License. All rights 
+# not expressly granted therein are reserved by Shotgun Software Inc.
+
+import os
+
+from mock import patch
+
+import tank
+from tank.util import yaml_cache
+from tank_test.tank_test_base import *
+
+
+class TestYamlCache(TankTestBase):
+    """
+    Tests the loading and caching of yaml files.
+    """
+    def setUp(self):
+        super(TestYamlCache, self).setUp()
+        self.yml_file = os.path.join(self.tank_temp, "yaml_cache_test", "test.yml")
+        self.create_file(self.yml_file, "foo: [1, 2, {bar: baz}]\n")
+
+    def test_cached(self):
+        """
+        Files are only parsed once.
+        """
+        self.assertEqual(yaml_cache.load_yaml(self.yml_file), {"foo": [1, 2, {"bar": "baz"}]})
+        parse_patcher = patch("tank.util.yaml_cache.parse_yaml")
+        parse_mock = parse_patcher.start()
+        try:
+            self.assertEqual(yaml_cache.load_yaml(self.yml_file), {"foo": [1, 2, {"bar": "baz"}]})
+            self.assertEqual(parse_mock.call_count, 0)
+        finally:
+            parse_patcher.stop()
+
+    def test_modified(self):
+        """
+        Files are parsed again when they change.
+        """
+        yaml_cache.load_yaml(self.yml_file)
+        self.create_file(self.yml_file, "foo: [1, 2, 3, 4]\n")
+        self.assertEqual(yaml_cache.load_yaml(self.yml_file), {"foo": [1, 2, 3, 4]})
+
+    def test_modified_same_size(self):
+        """
+        Edits which keep the size and modification time of a file are picked up.
+        """
+        self.create_file(self.yml_file, "version: v0.1.8\n")
+        stat = os.stat(self.yml_file)
+        self.assertEqual(yaml_cache.load_yaml(self.yml_file), {"version": "v0.1.8"})
+        self.create_file(self.yml_file, "version: v0.1.9\n")
+        os.utime(self.yml_file, (stat.st_atime, stat.st_mtime))
+        self.assertEqual(yaml_cache.load_yaml(self.yml_file), {"version": "v0.1.9"})
+
+    def test_unchanged_not_read(self):
+        """
+        Files which haven't been modified recently are only read again when 
+        their modification time or size changes.
+        """
+        stat = os.stat(self.yml_file)
+        os.utime(self.yml_file, (stat.st_atime, stat.st_mtime - 60))
+        yaml_cache.load_yaml(self.yml_file)
+        read_patcher = patch("tank.util.yaml_cache._read_file", wraps=yaml_cache._read_file)
+        read_mock = read_patcher.start()
+        try:
+            self.assertEqual(yaml_cache.load_yaml(self.yml_file), {"foo": [1, 2, {"bar": "baz"}]})
+            self.assertNotEqual(yaml_cache.get_file_hash(self.yml_file), None)
+            self.assertEqual(read_mock.call_count, 0)
+            
+            self.create_file(self.yml_file, "foo: [1, 2, 3, 4]\n")
+            os.utime(self.yml_file, (stat.st_atime, stat.st_mtime - 30))
+            self.assertEqual(yaml_cache.load_yaml(self.yml_file), {"foo": [1, 2, 3, 4]})
+            self.assertEqual(read_mock.call_count, 1)
+        finally:
+            read_patcher.stop()
+
+    def test_bypass_cache(self):
+        """
+        Files are always parsed when the cache is bypassed.
+        """
+        yaml_cache.load_yaml(self.yml_file)
+        parse_patcher = patch("tank.util.yaml_cache.parse_yaml", return_value={})
+        parse_mock = parse_patcher.start()
+        try:
+            yaml_cache.load_yaml(self.yml_file, use_cache=False)
+            self.assertEqual(parse_mock.call_count, 1)
+        finally:
+            parse_patcher.stop()
+
+    def test_copy(self):
+        """
+        Modifying loaded data doesn't affect the cache.
+        """
+        data = yaml_cache.load_yaml(self.yml_file)
+        data["foo"][2]["bar"] = "modified"
+        self.assertEqual(yaml_cache.load_yaml(self.yml_file), {"foo": [1, 2, {"bar": "baz"}]})
+
+    def test_loaders(self):
+        """
+        The python and libyaml based loaders produce the same data.
+        """
+        if not yaml_cache.is_c_loader_available():
+            self.skipTest("The libyaml based loader is not available.")
+        
+        env_file = os.path.join(self.tank_source_path, "tests", "data", "env", "test.yml")
+        fh = open(env_file)
+        try:
+            content = fh.read()
+        finally:
+            fh.close()
+        self.assertEqual(yaml_cache.parse_yaml(content, use_c_loader=False),
+                         yaml_cache.parse_yaml(content, use_c_loader=True))
+
+    def test_benchmark_command(self):
+        """
+        The benchmark command parses all files in the configuration.
+        """
+        self.setup_fixtures()
+        results = self.tk.get_command("benchmark_yaml").execute({"iterations": 1})
+        self.assertTrue(results["files"] > 0)
+        self.assertTrue(results["python_time"] > 0)
+        self.assertEqual(results["c_time"] is None, not yaml_cache.is_c_loader_available())